@@ -0,0 +1,109 @@
+# -*- coding: utf-8 -*-
+# vispy: testskip
+# -----------------------------------------------------------------------------
+# Copyright (c) 2014, Vispy Development Team.
+# Distributed under the (new) BSD License. See LICENSE.txt for more info.
+# -----------------------------------------------------------------------------
+"""
+Benchmark baking of agg-method lines: the previous implementation based on
+repeated np.repeat calls, the chunked AggLineBaker in serial and threaded
+mode, and incremental baking when new vertices are appended to the line.
+"""
+
+import sys
+from timeit import default_timer
+
+import numpy as np
+
+from vispy.visuals.line.baking import AggLineBaker
+
+
+_vtype = np.dtype([('a_position', 'f4', 2),
+                   ('a_tangents', 'f4', 4),
+                   ('a_segment',  'f4', 2),
+                   ('a_angles',   'f4', 2),
+                   ('a_texcoord', 'f4', 2),
+                   ('alength', 'f4', 1),
+                   ('color', 'f4', 4)])
+
+
+def legacy_bake(vertices, color):
+    """ Reference implementation that was used by _AggLineVisual.
+    """
+    n = len(vertices)
+    P = np.array(vertices).reshape(n, 2).astype(float)
+    idx = np.arange(n)
+
+    V = np.zeros(len(P), dtype=_vtype)
+    V['a_position'] = P
+
+    T = P[1:] - P[:-1]
+    N = np.sqrt(T[:, 0]**2 + T[:, 1]**2)
+    V['a_tangents'][+1:, :2] = T
+    V['a_tangents'][0, :2] = T[0]
+    V['a_tangents'][:-1, 2:] = T
+    V['a_tangents'][-1, 2:] = T[-1]
+
+    T1 = V['a_tangents'][:, :2]
+    T2 = V['a_tangents'][:, 2:]
+    A = np.arctan2(T1[:, 0]*T2[:, 1]-T1[:, 1]*T2[:, 0],
+                   T1[:, 0]*T2[:, 0]+T1[:, 1]*T2[:, 1])
+    V['a_angles'][:-1, 0] = A[:-1]
+    V['a_angles'][:-1, 1] = A[+1:]
+
+    L = np.cumsum(N)
+    V['a_segment'][+1:, 0] = L
+    V['a_segment'][:-1, 1] = L
+
+    V = np.repeat(V, 2, axis=0)[1:-1]
+    V['a_segment'][1:] = V['a_segment'][:-1]
+    V['a_angles'][1:] = V['a_angles'][:-1]
+    V['a_texcoord'][0::2] = -1
+    V['a_texcoord'][1::2] = +1
+    idx = np.repeat(idx, 2)[1:-1]
+
+    V = np.repeat(V, 2, axis=0)
+    V['a_texcoord'][0::2, 1] = -1
+    V['a_texcoord'][1::2, 1] = +1
+    idx = np.repeat(idx, 2)
+
+    index = np.resize(np.array([0, 1, 2, 1, 2, 3], dtype=np.uint32),
+                      (n-1)*(2*3))
+    index += np.repeat(4*np.arange(n-1, dtype=np.uint32), 6)
+
+    V['alength'] = L[-1] * np.ones(len(V))
+    V['color'] = color[idx] if color.ndim == 2 else color
+    return V, index
+
+
+def timeit(name, func, *args):
+    func(*args)  # warm up
+    n_iter = 5
+    t0 = default_timer()
+    for i in range(n_iter):
+        func(*args)
+    dt = (default_timer() - t0) / n_iter
+    print('%-40s %8.1f ms' % (name, dt * 1000))
+
+
+if __name__ == '__main__':
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 1000000
+    pos = np.cumsum(np.random.normal(size=(n, 2)), axis=0).astype('f4')
+    color = np.random.uniform(size=(n, 4)).astype('f4')
+    print('Baking a %d-vertex antialiased line' % n)
+
+    timeit('legacy', legacy_bake, pos, color)
+    timeit('AggLineBaker (1 thread)', AggLineBaker(n_threads=1).bake,
+           pos, color)
+    timeit('AggLineBaker (threads)', AggLineBaker().bake, pos, color)
+
+    # Streaming: append 1000 vertices to the line at every iteration
+    baker = AggLineBaker()
+    step = 1000
+    baker.update(pos[:n // 2], color[:n // 2])
+    state = {'n': n // 2}
+
+    def append():
+        state['n'] = min(state['n'] + step, n)
+        baker.update(pos[:state['n']], color[:state['n']])
+    timeit('AggLineBaker.update (append %d)' % step, append)
@@ -0,0 +1,44 @@
+# -*- coding: utf-8 -*-
+# vispy: testskip
+# -----------------------------------------------------------------------------
+# Copyright (c) 2014, Vispy Development Team.
+# Distributed under the (new) BSD License. See LICENSE.txt for more info.
+# -----------------------------------------------------------------------------
+"""
+Benchmark the mapping of large arrays to colors: the exact evaluation of
+the colormaps by indexing, and their lookup tables in float32 and uint8.
+"""
+
+import sys
+from timeit import default_timer
+
+import numpy as np
+
+from vispy.color import get_colormap
+
+
+def timeit(func, *args, **kwargs):
+    start = default_timer()
+    func(*args, **kwargs)
+    return '%.3f s' % (default_timer() - start)
+
+
+def main(size=4096):
+    data = np.random.RandomState(0).normal(size=(size, size))
+    data = data.astype(np.float32)
+    clim = (-3., 3.)
+    print('%d x %d values' % data.shape)
+    print('%10s %12s %12s %12s' % ('colormap', 'exact', 'lut float32',
+                                   'lut uint8'))
+    for name in ('cubehelix', 'fire', 'hot', 'autumn'):
+        cmap = get_colormap(name)
+        cmap.lut(), cmap.lut(dtype=np.uint8)  # computed once per colormap
+        exact = timeit(lambda: cmap[(data.ravel() - clim[0]) /
+                                    (clim[1] - clim[0])])
+        print('%10s %12s %12s %12s'
+              % (name, exact, timeit(cmap.map_lut, data, clim),
+                 timeit(cmap.map_lut, data, clim, dtype=np.uint8)))
+
+
+if __name__ == '__main__':
+    main(*[int(arg) for arg in sys.argv[1:]])
@@ -0,0 +1,99 @@
+# -*- coding: utf-8 -*-
+# vispy: testskip
+# -----------------------------------------------------------------------------
+# Copyright (c) 2014, Vispy Development Team.
+# Distributed under the (new) BSD License. See LICENSE.txt for more info.
+# -----------------------------------------------------------------------------
+"""
+Benchmark the triangulation of polygons: the sweep-line Triangulation, the
+constrained Delaunay triangulation used by triangulate(), the tessellation
+cache in memory and on disk, the triangulation of many polygons in parallel
+processes, and the splitting of the edges of self-intersecting polygons.
+"""
+
+import sys
+import shutil
+import tempfile
+from timeit import default_timer
+
+import numpy as np
+
+from vispy.geometry import (Triangulation, triangulate, triangulate_polygons,
+                            tessellation_cache)
+from vispy.geometry.delaunay import constrained_delaunay
+
+
+def star(n, seed=0):
+    """ A star-shaped polygon of n vertices, with many concave corners """
+    rng = np.random.RandomState(seed)
+    theta = np.sort(rng.uniform(0, 2 * np.pi, n))
+    r = rng.uniform(0.5, 1, n)
+    return np.column_stack((r * np.cos(theta), r * np.sin(theta),
+                            np.zeros(n)))
+
+
+def ring(n):
+    return np.column_stack((np.arange(n), (np.arange(n) + 1) % n))
+
+
+def timeit(func, *args):
+    start = default_timer()
+    try:
+        func(*args)
+    except Exception as exp:
+        return '%s' % type(exp).__name__
+    return '%.3f s' % (default_timer() - start)
+
+
+def sweep(pts, edges):
+    Triangulation(pts, edges).triangulate()
+
+
+def normalize(pts, edges):
+    Triangulation(pts, edges).normalize()
+
+
+def main(sizes=(100, 300, 1000, 3000)):
+    print('%8s %14s %14s' % ('vertices', 'sweep', 'delaunay'))
+    for n in sizes:
+        pts = star(n)[:, :2]
+        print('%8d %14s %14s' % (n, timeit(sweep, pts, ring(n)),
+                                 timeit(constrained_delaunay, pts, ring(n))))
+
+    polygon = star(sizes[-1])
+    tessellation_cache.clear()
+    print('\ntriangulate(), %d vertices: %s, cached: %s'
+          % (len(polygon), timeit(triangulate, polygon),
+             timeit(triangulate, polygon)))
+
+    polygons = [star(500, seed) for seed in range(64)]
+    for n_processes in (1, None):
+        tessellation_cache.clear()
+        print('64 polygons of 500 vertices, %s processes: %s'
+              % (n_processes or 'all', timeit(triangulate_polygons, polygons,
+                                              n_processes)))
+
+    # bulk loading of many small polygons, e.g. a GIS layer
+    polygons = [star(50, seed) for seed in range(2000)]
+    tessellation_cache.directory = tempfile.mkdtemp()
+    try:
+        tessellation_cache.clear()
+        print('2000 polygons of 50 vertices: %s, cached in memory: %s'
+              % (timeit(triangulate_polygons, polygons),
+                 timeit(triangulate_polygons, polygons)))
+        tessellation_cache.clear()
+        print('2000 polygons of 50 vertices, cached on disk: %s'
+              % timeit(triangulate_polygons, polygons))
+    finally:
+        shutil.rmtree(tessellation_cache.directory)
+        tessellation_cache.directory = None
+
+    # a random walk, which intersects itself about twice per edge
+    for n in (1000, 10000, 100000):
+        pts = np.random.RandomState(0).normal(size=(n, 2)).cumsum(axis=0)
+        print('normalize a random walk of %d edges: %s'
+              % (n, timeit(normalize, pts, ring(n))))
+
+
+if __name__ == '__main__':
+    main(*[tuple(int(n) for n in arg.split(',')) for arg in sys.argv[1:]])
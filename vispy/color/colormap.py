@@ -13,6 +13,11 @@ from ..ext.cubehelix import cubehelix
 ###############################################################################
 # Color maps
 
+# The default number of entries of the lookup tables of colormaps, and the
+# number of values that map_lut() maps at once
+_LUT_SIZE = 1024
+_LUT_CHUNK = 2**18
+
 
 # Utility functions for interpolation in NumPy.
 def _vector_or_scalar(x, type='row'):
@@ -165,6 +170,14 @@ def _process_glsl_template(template, colors):
     return template
 
 
+# GLSL colormap sampling a lookup table, at the center of its entries
+_GLSL_LUT = """
+vec4 colormap_lut(float t) {
+    return texture1D($lut, clamp(t, 0.0, 1.0) * %r + %r);
+}
+"""
+
+
 class BaseColormap(object):
     """Class representing a colormap:
 
@@ -189,6 +202,12 @@ class BaseColormap(object):
     # GLSL string with a function implementing the color map.
     glsl_map = None
 
+    # The texture interpolation of the lookup table on the GPU.
+    _lut_interpolation = 'linear'
+
+    # The lookup tables of the colormap, by size and dtype.
+    _luts = None
+
     def __init__(self, colors=None):
         # Ensure the colors are arrays.
         if colors is not None:
@@ -240,6 +259,124 @@ class BaseColormap(object):
         colors = self.map(item)
         return ColorArray(colors)
 
+    def lut(self, size=_LUT_SIZE, dtype=np.float32):
+        """Return the colormap as a lookup table
+
+        The colormap is evaluated at ``size`` values evenly spaced in [0, 1].
+        The table is computed once and cached.
+
+        Parameters
+        ----------
+        size : int
+            The number of entries of the table.
+        dtype : dtype
+            Either float32, for rgba values in [0, 1], or uint8, for rgba
+            values in [0, 255].
+
+        Returns
+        -------
+        lut : ndarray, shape (size, 4)
+            The read-only lookup table.
+        """
+        dtype = np.dtype(dtype)
+        if dtype not in (np.float32, np.uint8):
+            raise ValueError('dtype must be float32 or uint8, not %s' % dtype)
+        if size < 2:
+            raise ValueError('size must be at least 2, not %s' % size)
+        if self._luts is None:
+            self._luts = {}
+        key = (int(size), dtype.char)
+        if key not in self._luts:
+            if dtype == np.uint8:
+                lut = self.lut(size, np.float32) * 255.
+                lut = np.round(np.clip(lut, 0., 255.)).astype(np.uint8)
+            else:
+                x = np.linspace(0., 1., size).astype(np.float32)[:, None]
+                lut = np.array(self.map(x), dtype=np.float32).reshape(size, 4)
+            lut.flags.writeable = False
+            self._luts[key] = lut
+        return self._luts[key]
+
+    def map_lut(self, x, clim=(0., 1.), size=_LUT_SIZE, dtype=np.float32,
+                out=None):
+        """Map an array of values to colors with a lookup table
+
+        This is much faster and uses less memory than ``__getitem__`` for
+        large arrays, but the values are quantized to the ``size`` entries
+        of the table. The values are mapped chunk by chunk, so that the
+        temporary arrays are small.
+
+        Parameters
+        ----------
+        x : array-like
+            The values, of any shape.
+        clim : tuple
+            The values mapped to the first and last colors. Values out of
+            these limits are clipped. If they are equal, all values map to
+            the middle color. NaN values map to the first color.
+        size : int
+            The number of entries of the lookup table.
+        dtype : dtype
+            The type of the colors: float32 or uint8 (see ``lut``).
+        out : ndarray | None
+            The contiguous array of shape ``x.shape + (4,)`` where the
+            colors are written.
+
+        Returns
+        -------
+        rgba : ndarray
+            The colors, of shape ``x.shape + (4,)``.
+        """
+        lut = self.lut(size, dtype)
+        x = np.asarray(x)
+        if out is None:
+            out = np.empty(x.shape + (4,), lut.dtype)
+        elif out.shape != x.shape + (4,) or out.dtype != lut.dtype:
+            raise ValueError('out must have shape %s and dtype %s'
+                             % (x.shape + (4,), lut.dtype))
+        flat_x = x.reshape(-1)
+        flat_out = out.view()
+        flat_out.shape = (-1, 4)  # raises if out is not contiguous
+        lo, hi = float(clim[0]), float(clim[1])
+        scale = 0. if hi == lo else (size - 1) / (hi - lo)
+        # the index of the nearest entry, as floor(t + 0.5)
+        offset = (size - 1) / 2. if hi == lo else 0.5
+        t = np.empty(min(len(flat_x), _LUT_CHUNK))
+        for start in range(0, len(flat_x), _LUT_CHUNK):
+            chunk = flat_x[start:start + _LUT_CHUNK]
+            tc = t[:len(chunk)]
+            np.subtract(chunk, lo, out=tc)
+            tc *= scale
+            tc += offset
+            np.clip(tc, 0, size - 1, out=tc)
+            tc[np.isnan(tc)] = 0
+            np.take(lut, tc.astype(np.intp), axis=0,
+                    out=flat_out[start:start + _LUT_CHUNK])
+        return out
+
+    @property
+    def glsl_lut(self):
+        """The GLSL function that samples the lookup table of the colormap
+
+        Its ``$lut`` variable must be set to the texture returned by
+        ``texture_lut``. This takes one texture fetch, rather than the
+        evaluation of ``glsl_map``.
+        """
+        return _GLSL_LUT % ((_LUT_SIZE - 1.) / _LUT_SIZE, .5 / _LUT_SIZE)
+
+    def texture_lut(self):
+        """Return a new texture holding the float32 lookup table
+
+        Returns
+        -------
+        texture : Texture1D
+            The texture, for the ``$lut`` variable of ``glsl_lut``.
+        """
+        from ..gloo import Texture1D  # gloo imports this module
+        return Texture1D(self.lut(_LUT_SIZE, np.float32),
+                         interpolation=self._lut_interpolation,
+                         wrapping='clamp_to_edge')
+
     def __setitem__(self, item, value):
         raise RuntimeError("It is not possible to set items to "
                            "BaseColormap instances.")
@@ -353,6 +490,12 @@ class Colormap(BaseColormap):
         # Python map function.
         self._map_function = info['map']
         self._interpolation = val
+        self._luts = None
+
+    @property
+    def _lut_interpolation(self):
+        # keep the steps of a 'zero' colormap sharp on the GPU
+        return 'nearest' if self._interpolation == 'zero' else 'linear'
 
     def map(self, x):
         """The Python mapping function from the [0,1] interval to a
@@ -331,6 +331,53 @@ def test_colormap():
         assert colors.rgba.max() <= 1
 
 
+def test_colormap_lut():
+    """Test the lookup tables of colormaps."""
+    from vispy.color import colormap as colormap_module
+    x = np.random.RandomState(0).uniform(-1., 2., (30, 20))
+    for name in get_colormaps():
+        colormap = get_colormap(name)
+        lut = colormap.lut()
+        assert_true(lut is colormap.lut())
+        assert_equal(lut.shape, (1024, 4))
+        assert_equal(lut.dtype, np.float32)
+        assert_raises(ValueError, lut.__setitem__, 0, 0)
+        # the quantization error is at most half an entry
+        assert_allclose(colormap.map_lut(x, (-1., 2.)),
+                        colormap[(x.ravel() + 1.) / 3.].rgba.reshape(
+                            x.shape + (4,)), atol=0.01)
+        assert_allclose(colormap.map_lut(x, dtype=np.uint8),
+                        255 * colormap.map_lut(x), atol=0.5)
+        Function(colormap.glsl_lut)
+
+    # quantization, clipping, NaN, equal limits
+    cm = Colormap(['r', 'g', 'b'], interpolation='zero')
+    assert_array_equal(cm.lut(3)[:, :3], np.eye(3))
+    assert_array_equal(cm.map_lut([-5, 0, 0.24, 0.26, 0.74, 0.76, 5, np.nan],
+                                  size=3, dtype=np.uint8)[:, 0],
+                       [255, 255, 255, 0, 0, 0, 0, 255])
+    assert_array_equal(cm.map_lut([-1, 3], clim=(2, 2), size=3),
+                       cm.lut(3)[[1, 1]])
+    assert_equal(cm.map_lut(np.zeros((0, 2))).shape, (0, 2, 4))
+    lut = cm.lut(3)
+    cm.interpolation = 'zero'  # the tables are computed again
+    assert_true(cm.lut(3) is not lut)
+
+    # chunks and out
+    chunk = colormap_module._LUT_CHUNK
+    try:
+        colormap_module._LUT_CHUNK = 7
+        out = np.empty(x.shape + (4,), np.float32)
+        assert_true(cm.map_lut(x, out=out) is out)
+    finally:
+        colormap_module._LUT_CHUNK = chunk
+    assert_array_equal(out, cm.map_lut(x))
+    assert_raises(ValueError, cm.map_lut, x, out=out[..., :3])
+    assert_raises(ValueError, cm.map_lut, x, out=out.astype(np.uint8))
+    assert_raises(ValueError, cm.lut, 256, np.float64)
+    assert_raises(ValueError, cm.lut, 1)
+
+
 def test_normalize():
     """Test the _normalize() function."""
     from vispy.color.colormap import _normalize
@@ -9,13 +9,16 @@ This module implements classes and methods for handling geometric data.
 from __future__ import division
 
 __all__ = ['MeshData', 'PolygonData', 'Rect', 'Triangulation', 'triangulate',
-           'create_arrow', 'create_cone', 'create_cube', 'create_cylinder',
-           'create_sphere', 'resize']
+           'triangulate_polygons', 'tessellate', 'TessellationCache',
+           'tessellation_cache', 'create_arrow', 'create_cone',
+           'create_cube', 'create_cylinder', 'create_sphere', 'resize']
 
 from .polygon import PolygonData  # noqa
 from .meshdata import MeshData  # noqa
 from .rect import Rect  # noqa
-from .triangulation import Triangulation, triangulate  # noqa
+from .triangulation import (Triangulation, triangulate,  # noqa
+                            triangulate_polygons, tessellate)  # noqa
+from .tessellation import TessellationCache, tessellation_cache  # noqa
 from .torusknot import TorusKnot  # noqa
 from .calculations import (_calculate_normals, _fast_cross_3d,  # noqa
                            resize)  # noqa
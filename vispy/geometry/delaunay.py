@@ -0,0 +1,447 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2014, Vispy Development Team.
+# Distributed under the (new) BSD License. See LICENSE.txt for more info.
+
+"""
+Constrained Delaunay triangulation
+
+The points are inserted one by one in a Delaunay triangulation, which is
+restored with Lawson flips after each insertion. The constraining edges are
+then recovered by flipping the edges that cross them [1], and the triangles
+outside of the constraining edges are removed with the even-odd rule.
+
+The points are inserted in the order of a spatial hash: a grid of about
+four points per cell, visited row by row in alternating directions. Each
+cell remembers a triangle created there, from which the walk that locates
+the next point in that cell starts, so the walks are short.
+
+The sequential steps evaluate their predicates on Python floats, which is
+much faster than numpy calls on single values. The predicates are exact:
+they are evaluated with Python integers when rounding errors could change
+their sign [2]. The steps that apply to whole arrays use numpy: the ordering of
+the points, the detection of the constraining edges that are already in the
+Delaunay triangulation (most of them, for typical polygons) and the
+indexing of the result.
+
+References
+----------
+[1] S. W. Sloan. A fast algorithm for generating constrained Delaunay
+    triangulations. Computers & Structures 47(3), 1993.
+[2] J. R. Shewchuk. Adaptive precision floating-point arithmetic and fast
+    robust geometric predicates. Discrete & Computational Geometry 18, 1997.
+"""
+
+from __future__ import division
+
+from collections import deque
+
+import numpy as np
+
+_ORIENT_BOUND = 3.3306690738754716e-16
+_INCIRCLE_BOUND = 1.1102230246251577e-15
+
+
+def _sign(value):
+    return (value > 0) - (value < 0)
+
+
+def _exact(*values):
+    """ The values as integers, scaled by a common power of two. Floats are
+    integers divided by powers of two, so this is exact, and the sign of
+    the homogeneous predicates is not changed by the scaling.
+    """
+    ratios = [float(v).as_integer_ratio() for v in values]
+    den = max(d for _, d in ratios)
+    return [n * (den // d) for n, d in ratios]
+
+
+def _orient(ax, ay, bx, by, cx, cy):
+    """ Positive if a, b, c are counterclockwise, negative if they are
+    clockwise and zero if they are collinear. The sign is exact.
+    """
+    left = (bx - ax) * (cy - ay)
+    right = (by - ay) * (cx - ax)
+    det = left - right
+    bound = _ORIENT_BOUND * (abs(left) + abs(right))
+    if abs(det) > bound or bound == 0:
+        return det
+    ax, ay, bx, by, cx, cy = _exact(ax, ay, bx, by, cx, cy)
+    return _sign((bx - ax) * (cy - ay) - (by - ay) * (cx - ax))
+
+
+def _incircle(ax, ay, bx, by, cx, cy, dx, dy):
+    """ Positive if d is inside the circle through the counterclockwise
+    points a, b, c, negative if it is outside and zero if it is on the
+    circle. The sign is exact.
+    """
+    adx, ady = ax - dx, ay - dy
+    bdx, bdy = bx - dx, by - dy
+    cdx, cdy = cx - dx, cy - dy
+    alift = adx * adx + ady * ady
+    blift = bdx * bdx + bdy * bdy
+    clift = cdx * cdx + cdy * cdy
+    det = (alift * (bdx * cdy - cdx * bdy) +
+           blift * (cdx * ady - adx * cdy) +
+           clift * (adx * bdy - bdx * ady))
+    permanent = ((abs(bdx * cdy) + abs(cdx * bdy)) * alift +
+                 (abs(cdx * ady) + abs(adx * cdy)) * blift +
+                 (abs(adx * bdy) + abs(bdx * ady)) * clift)
+    if abs(det) > _INCIRCLE_BOUND * permanent:
+        return det
+    ax, ay, bx, by, cx, cy, dx, dy = _exact(ax, ay, bx, by, cx, cy, dx, dy)
+    adx, ady = ax - dx, ay - dy
+    bdx, bdy = bx - dx, by - dy
+    cdx, cdy = cx - dx, cy - dy
+    return _sign((adx * adx + ady * ady) * (bdx * cdy - cdx * bdy) +
+                 (bdx * bdx + bdy * bdy) * (cdx * ady - adx * cdy) +
+                 (cdx * cdx + cdy * cdy) * (adx * bdy - bdx * ady))
+
+
+class _Triangulation(object):
+    """ Triangles with their neighbors, stored in flat lists
+
+    Triangle t has the counterclockwise vertices ``tv[3 * t:3 * t + 3]``.
+    ``tn[3 * t + i]`` is the triangle across the edge opposite to vertex
+    ``tv[3 * t + i]``, or -1. ``vt[v]`` is a triangle of vertex v.
+    """
+
+    def __init__(self, x, y):
+        self.x = x
+        self.y = y
+        self.tv = []
+        self.tn = []
+        self.vt = [-1] * len(x)
+        self.constrained = set()
+
+    def add(self, a, b, c, na, nb, nc, t=None):
+        """ Set triangle t, or a new one, and return it """
+        if t is None:
+            t = len(self.tv) // 3
+            self.tv.extend((a, b, c))
+            self.tn.extend((na, nb, nc))
+        else:
+            self.tv[3 * t:3 * t + 3] = a, b, c
+            self.tn[3 * t:3 * t + 3] = na, nb, nc
+        self.vt[a] = self.vt[b] = self.vt[c] = t
+        return t
+
+    def relink(self, t, old, new):
+        """ Make the neighbor t of triangle *old* point to *new* """
+        if t >= 0:
+            tn = self.tn
+            tn[3 * t + tn[3 * t:3 * t + 3].index(old)] = new
+
+    def orient(self, a, b, c):
+        x, y = self.x, self.y
+        return _orient(x[a], y[a], x[b], y[b], x[c], y[c])
+
+    def incircle(self, a, b, c, d):
+        x, y = self.x, self.y
+        return _incircle(x[a], y[a], x[b], y[b], x[c], y[c], x[d], y[d])
+
+    def locate(self, px, py, t):
+        """ Walk from triangle t to the triangle containing (px, py).
+        Returns the triangle and the local index of the vertex opposite to
+        the edge that the point is on, or -1.
+        """
+        tv, tn, x, y = self.tv, self.tn, self.x, self.y
+        k = 0
+        while True:
+            base = 3 * t
+            on_edge = -1
+            k += 1  # start from another edge at each step, to avoid cycles
+            for i in (k % 3, (k + 1) % 3, (k + 2) % 3):
+                a = tv[base + (i + 1) % 3]
+                b = tv[base + (i + 2) % 3]
+                o = _orient(x[a], y[a], x[b], y[b], px, py)
+                if o < 0:
+                    t = tn[base + i]
+                    break
+                elif o == 0:
+                    on_edge = i
+            else:
+                return t, on_edge
+
+    def insert(self, p, t, on_edge):
+        """ Insert point p in triangle t, or on its edge """
+        tv, tn = self.tv, self.tn
+        base = 3 * t
+        if on_edge < 0:
+            a, b, c = tv[base:base + 3]
+            na, nb, nc = tn[base:base + 3]
+            t1 = len(tv) // 3
+            t2 = t1 + 1
+            self.add(a, b, p, t1, t2, nc, t)
+            self.add(b, c, p, t2, t, na)
+            self.add(c, a, p, t, t1, nb)
+            self.relink(na, t, t1)
+            self.relink(nb, t, t2)
+            stack = [(t, 2), (t1, 2), (t2, 2)]
+        else:
+            k = on_edge
+            a, b, c = [tv[base + (k + i) % 3] for i in range(3)]
+            nb, nc = tn[base + (k + 1) % 3], tn[base + (k + 2) % 3]
+            u = tn[base + k]
+            j = tn[3 * u:3 * u + 3].index(t)
+            d = tv[3 * u + j]
+            mc, mb = tn[3 * u + (j + 1) % 3], tn[3 * u + (j + 2) % 3]
+            t1 = len(tv) // 3
+            u1 = t1 + 1
+            self.add(a, b, p, u1, t1, nc, t)
+            self.add(a, p, c, u, nb, t)
+            self.add(d, c, p, t1, u1, mb, u)
+            self.add(d, p, b, t, mc, u)
+            self.relink(nb, t, t1)
+            self.relink(mc, u, u1)
+            stack = [(t, 2), (t1, 1), (u, 2), (u1, 1)]
+        self.legalize(stack, around=True)
+        return t
+
+    def flip(self, t, i, u, j):
+        """ Flip the edge between triangles t and u, opposite to their local
+        vertices i and j. The new triangles are (p, x, q) and (p, q, y),
+        where p and q were the opposite vertices.
+        """
+        tv, tn = self.tv, self.tn
+        p = tv[3 * t + i]
+        x = tv[3 * t + (i + 1) % 3]
+        y = tv[3 * t + (i + 2) % 3]
+        q = tv[3 * u + j]
+        n_x, n_y = tn[3 * t + (i + 1) % 3], tn[3 * t + (i + 2) % 3]
+        m_y, m_x = tn[3 * u + (j + 1) % 3], tn[3 * u + (j + 2) % 3]
+        self.add(p, x, q, m_y, u, n_y, t)
+        self.add(p, q, y, m_x, n_x, t, u)
+        self.relink(m_y, u, t)
+        self.relink(n_x, t, u)
+
+    def legalize(self, stack, around=False):
+        """ Flip the edges of the stack, given as (triangle, local index of
+        the opposite vertex) or as vertex pairs, that are not locally
+        Delaunay. With *around*, only the edges opposite to the new point
+        need to be checked after a flip.
+        """
+        tv, tn = self.tv, self.tn
+        while stack:
+            t, i = stack.pop()
+            if not around:
+                t, i = self.find_edge(t, i)
+                if t < 0:
+                    continue
+            u = tn[3 * t + i]
+            if u < 0:
+                continue
+            p = tv[3 * t + i]
+            x = tv[3 * t + (i + 1) % 3]
+            y = tv[3 * t + (i + 2) % 3]
+            if (min(x, y), max(x, y)) in self.constrained:
+                continue
+            j = tn[3 * u:3 * u + 3].index(t)
+            q = tv[3 * u + j]
+            if self.incircle(p, x, y, q) > 0:
+                self.flip(t, i, u, j)
+                if around:
+                    stack.extend(((t, 0), (u, 0)))
+                else:
+                    stack.extend(((x, q), (q, y), (y, p), (p, x)))
+
+    def find_edge(self, a, b):
+        """ The triangle containing the edge a-b, with the local index of
+        its vertex opposite to the edge, or (-1, -1)
+        """
+        tv, tn = self.tv, self.tn
+        t = start = self.vt[a]
+        while True:
+            base = 3 * t
+            i = tv[base:base + 3].index(a)
+            if tv[base + (i + 1) % 3] == b:
+                return t, (i + 2) % 3
+            if tv[base + (i + 2) % 3] == b:
+                return t, (i + 1) % 3
+            t = tn[base + (i + 1) % 3]
+            if t == start or t < 0:
+                return -1, -1
+
+    def crossed_edges(self, a, b):
+        """ The edges crossed by the segment a-b, as vertex pairs (right of
+        a-b, left of a-b), or a vertex that the segment goes through
+        """
+        tv, tn = self.tv, self.tn
+        t = start = self.vt[a]
+        while True:
+            base = 3 * t
+            i = tv[base:base + 3].index(a)
+            x, y = tv[base + (i + 1) % 3], tv[base + (i + 2) % 3]
+            ox, oy = self.orient(a, b, x), self.orient(a, b, y)
+            for v, o in ((x, ox), (y, oy)):
+                if o == 0 and self._ahead(a, b, v):
+                    return None, v
+            if ox < 0 and oy > 0:
+                break
+            t = tn[base + (i + 1) % 3]
+            if t == start or t < 0:
+                raise RuntimeError('Could not insert edge (%d, %d)' % (a, b))
+        crossed = [(x, y)]
+        u = tn[base + i]
+        while True:
+            base = 3 * u
+            vertices = tv[base:base + 3]
+            q = [v for v in vertices if v != x and v != y][0]
+            if q == b:
+                return crossed, -1
+            o = self.orient(a, b, q)
+            if o == 0:
+                return None, q
+            if o < 0:
+                x, old = q, x
+            else:
+                y, old = q, y
+            crossed.append((x, y))
+            u = tn[base + vertices.index(old)]
+
+    def _ahead(self, a, b, v):
+        """ Whether v is on the side of b from a """
+        x, y = self.x, self.y
+        return ((x[v] - x[a]) * (x[b] - x[a]) +
+                (y[v] - y[a]) * (y[b] - y[a])) > 0
+
+    def insert_edge(self, a, b):
+        """ Recover the constraining edge a-b by flips """
+        work = [(a, b)]
+        while work:
+            a, b = work.pop()
+            if a == b:
+                continue
+            if self.find_edge(a, b)[0] < 0:
+                crossed, through = self.crossed_edges(a, b)
+                if crossed is None:
+                    # split the constraint at the point it goes through
+                    work.extend(((a, through), (through, b)))
+                    continue
+                new = self._flip_crossed(a, b, crossed)
+            else:
+                new = []
+            self.constrained.add((min(a, b), max(a, b)))
+            self.legalize(new)
+
+    def _flip_crossed(self, a, b, crossed):
+        """ Flip the crossed edges until none crosses a-b, and return the
+        new edges
+        """
+        tn = self.tn
+        queue = deque(crossed)
+        new = []
+        attempts = 0
+        while queue:
+            attempts += 1
+            if attempts > 100 * (len(crossed) + 10) ** 2:
+                raise RuntimeError('Could not insert edge (%d, %d)' % (a, b))
+            x, y = queue.popleft()
+            t, i = self.find_edge(x, y)
+            u = tn[3 * t + i]
+            j = tn[3 * u:3 * u + 3].index(t)
+            p, q = self.tv[3 * t + i], self.tv[3 * u + j]
+            if _sign(self.orient(p, q, x)) * _sign(self.orient(p, q, y)) >= 0:
+                queue.append((x, y))  # not convex, try again later
+                continue
+            self.flip(t, i, u, j)
+            if p not in (a, b) and q not in (a, b) and \
+                    _sign(self.orient(a, b, p)) * \
+                    _sign(self.orient(a, b, q)) < 0:
+                queue.append((p, q))
+            else:
+                new.append((p, q))
+        return new
+
+    def inside(self, start):
+        """ The triangles inside the constraining edges by the even-odd
+        rule, starting from a triangle outside
+        """
+        tv, tn, constrained = self.tv, self.tn, self.constrained
+        state = [-1] * (len(tv) // 3)
+        state[start] = 0
+        stack = [start]
+        while stack:
+            t = stack.pop()
+            for i in range(3):
+                u = tn[3 * t + i]
+                if u < 0 or state[u] >= 0:
+                    continue
+                a, b = tv[3 * t + (i + 1) % 3], tv[3 * t + (i + 2) % 3]
+                state[u] = state[t] ^ ((min(a, b), max(a, b)) in constrained)
+                stack.append(u)
+        return np.array(state) == 1
+
+
+def constrained_delaunay(points, edges):
+    """Constrained Delaunay triangulation of points and edges
+
+    Parameters
+    ----------
+    points : ndarray, shape (N, 2)
+        The points. Duplicate points are merged.
+    edges : ndarray, shape (Ne, 2)
+        The constraining edges, as point indices. They must not cross each
+        other, but may go through points (they are then split there).
+
+    Returns
+    -------
+    triangles : ndarray, shape (Nt, 3)
+        The counterclockwise triangles inside the edges by the even-odd rule,
+        as point indices.
+    """
+    points = np.asarray(points, np.float64)[:, :2]
+    edges = np.asarray(edges, np.intp).reshape((-1, 2))
+    n = len(points)
+    if n < 3 or not len(edges):
+        return np.zeros((0, 3), np.intp)
+
+    # a big triangle around the points, whose vertices are n, n + 1, n + 2
+    lo, hi = points.min(axis=0), points.max(axis=0)
+    center = (lo + hi) / 2.
+    r = max((hi - lo).max(), 1e-30) * 100.
+    big = center + r * np.array([[-1., -1.], [1., -1.], [0., 1.]])
+    xy = np.concatenate((points, big))
+    tri = _Triangulation(xy[:, 0].tolist(), xy[:, 1].tolist())
+    tri.add(n, n + 1, n + 2, -1, -1, -1)
+
+    # spatial hash: the points are inserted cell by cell, in a serpentine
+    # order, and each cell remembers a triangle to start the walks from
+    g = max(int(np.sqrt(n / 4.)), 1)
+    cell = ((points - lo) / np.maximum(hi - lo, 1e-300) * g).astype(np.intp)
+    cell = np.minimum(cell, g - 1)
+    cx = np.where(cell[:, 1] % 2, g - 1 - cell[:, 0], cell[:, 0])
+    key = cell[:, 1] * g + cx
+    order = np.argsort(key, kind='mergesort')
+    hint = [-1] * (g * g)
+    same = np.arange(n)  # the point that each one is merged to
+    t = 0
+    x, y, vt = tri.x, tri.y, tri.vt
+    for p, k in zip(order.tolist(), key[order].tolist()):
+        start = hint[k] if hint[k] >= 0 else t
+        t, on_edge = tri.locate(x[p], y[p], start)
+        base = 3 * t
+        for v in tri.tv[base:base + 3]:
+            if x[v] == x[p] and y[v] == y[p]:
+                same[p] = v
+                break
+        else:
+            t = tri.insert(p, t, on_edge)
+            hint[k] = vt[p]
+
+    # recover the constraining edges that are not Delaunay edges
+    edges = same[edges]
+    edges = edges[edges[:, 0] != edges[:, 1]]
+    tv = np.array(tri.tv, np.intp).reshape((-1, 3))
+    size = n + 3
+    present = np.concatenate([np.minimum(tv[:, i], tv[:, (i + 1) % 3]) *
+                              size + np.maximum(tv[:, i], tv[:, (i + 1) % 3])
+                              for i in range(3)])
+    lo_hi = np.sort(edges, axis=1)
+    found = np.in1d(lo_hi[:, 0] * size + lo_hi[:, 1], present)
+    tri.constrained.update(map(tuple, lo_hi[found].tolist()))
+    for a, b in edges[~found].tolist():
+        tri.insert_edge(a, b)
+
+    tv = np.array(tri.tv, np.intp).reshape((-1, 3))
+    keep = tri.inside(vt[n]) & (tv < n).all(axis=1)
+    return tv[keep]
@@ -3,11 +3,60 @@
 # Copyright (c) 2014, Vispy Development Team. All Rights Reserved.
 # Distributed under the (new) BSD License. See LICENSE.txt for more info.
 # -----------------------------------------------------------------------------
+"""
+Marching squares isocurve extraction.
+
+All levels are extracted in a single pass over the data: each value is
+binned by the levels, and only the cells whose corners fall in different
+bins are visited, once for each level that crosses them. The data is
+divided in tiles whose segments are kept, so that changing part of the
+data or adding a level only extracts the affected tiles and levels.
+"""
 
 from __future__ import division
 
 import numpy as np
 
+# The pairs of cell sides (see _SIDE_CORNERS) joined by a segment, for
+# each of the 16 cell indices. Cells 6 and 9 are saddles, with two
+# segments.
+_SIDE_TABLE = np.array([
+    [-1, -1, -1, -1],
+    [0, 1, -1, -1],
+    [1, 2, -1, -1],
+    [0, 2, -1, -1],
+    [0, 3, -1, -1],
+    [1, 3, -1, -1],
+    [0, 1, 2, 3],
+    [2, 3, -1, -1],
+    [2, 3, -1, -1],
+    [0, 1, 2, 3],
+    [1, 3, -1, -1],
+    [0, 3, -1, -1],
+    [0, 2, -1, -1],
+    [1, 2, -1, -1],
+    [0, 1, -1, -1],
+    [-1, -1, -1, -1],
+])
+_N_SEGMENTS = (_SIDE_TABLE >= 0).sum(axis=1) // 2
+
+# The two corners, as (i, j) offsets in the cell, at the ends of each side
+_SIDE_CORNERS = np.array([
+    [(0, 1), (0, 0)],
+    [(0, 0), (1, 0)],
+    [(1, 0), (1, 1)],
+    [(1, 1), (0, 1)]
+])
+
+# The grid edge of each side, as an (i, j) offset and the axis it is
+# parallel to, to identify the vertices shared by neighbouring cells
+_SIDE_EDGES = np.array([
+    [0, 0, 1],
+    [0, 0, 0],
+    [1, 0, 1],
+    [0, 1, 0],
+])
+
 
 def isocurve(data, level, connected=False, extend_to_edge=False):
     """
@@ -21,155 +70,295 @@ def isocurve(data, level, connected=False, extend_to_edge=False):
         The level at which to generate an isosurface
     connected : bool
         If False, return a single long list of point pairs
-        If True, return multiple long lists of connected point 
-        locations. (This is slower but better for drawing 
+        If True, return multiple long lists of connected point
+        locations. (This is slower but better for drawing
         continuous lines)
     extend_to_edge : bool
-        If True, extend the curves to reach the exact edges of 
-        the data. 
-    """    
-    # This function is SLOW; plenty of room for optimization here.
-    
-    if extend_to_edge:
-        d2 = np.empty((data.shape[0]+2, data.shape[1]+2), dtype=data.dtype)
-        d2[1:-1, 1:-1] = data
-        d2[0, 1:-1] = data[0]
-        d2[-1, 1:-1] = data[-1]
-        d2[1:-1, 0] = data[:, 0]
-        d2[1:-1, -1] = data[:, -1]
-        d2[0, 0] = d2[0, 1]
-        d2[0, -1] = d2[1, -1]
-        d2[-1, 0] = d2[-1, 1]
-        d2[-1, -1] = d2[-1, -2]
-        data = d2
-    
-    side_table = [
-        [],
-        [0, 1],
-        [1, 2],
-        [0, 2],
-        [0, 3],
-        [1, 3],
-        [0, 1, 2, 3],
-        [2, 3],
-        [2, 3],
-        [0, 1, 2, 3],
-        [1, 3],
-        [0, 3],
-        [0, 2],
-        [1, 2],
-        [0, 1],
-        []
-    ]
-    
-    edge_key = [
-        [(0, 1), (0, 0)],
-        [(0, 0), (1, 0)],
-        [(1, 0), (1, 1)],
-        [(1, 1), (0, 1)]
-    ]
-    
-    level = float(level)
-    lines = []
-    
-    # mark everything below the isosurface level
-    mask = data < level
-    
-    ## make four sub-fields and compute indexes for grid cells
-    index = np.zeros([x-1 for x in data.shape], dtype=np.ubyte)
-    fields = np.empty((2, 2), dtype=object)
-    slices = [slice(0, -1), slice(1, None)]
-    for i in [0, 1]:
-        for j in [0, 1]:
-            fields[i, j] = mask[slices[i], slices[j]]
-            vertIndex = i+2*j
-            index += (fields[i, j] * 2**vertIndex).astype(np.ubyte)
-    
-    # add lines
-    for i in range(index.shape[0]):                 # data x-axis
-        for j in range(index.shape[1]):             # data y-axis     
-            sides = side_table[index[i, j]]
-            for l in range(0, len(sides), 2):     # faces for this grid cell
-                edges = sides[l:l+2]
-                pts = []
-                for m in [0, 1]:      # points in this face
-                    # p1, p2 are points at either side of an edge
-                    p1 = edge_key[edges[m]][0] 
-                    p2 = edge_key[edges[m]][1]
-                    # v1 and v2 are the values at p1 and p2
-                    v1 = data[i+p1[0], j+p1[1]] 
-                    v2 = data[i+p2[0], j+p2[1]]
-                    f = (level-v1) / (v2-v1)
-                    fi = 1.0 - f
-                    # interpolate between corners
-                    p = (p1[0]*fi + p2[0]*f + i + 0.5, 
-                         p1[1]*fi + p2[1]*f + j + 0.5)
-                    if extend_to_edge:
-                        # check bounds
-                        p = (min(data.shape[0]-2, max(0, p[0]-1)),
-                             min(data.shape[1]-2, max(0, p[1]-1)))
-                    if connected:
-                        gridKey = (i + (1 if edges[m] == 2 else 0), 
-                                   j + (1 if edges[m] == 3 else 0), 
-                                   edges[m] % 2)
-                        # give the actual position and a key identifying the 
-                        # grid location (for connecting segments)
-                        pts.append((p, gridKey))
-                    else:
-                        pts.append(p)
-                
-                lines.append(pts)
-
+        If True, extend the curves to reach the exact edges of
+        the data.
+    """
+    data = np.asarray(data)
+    grid = _Grid(data, extend_to_edge)
+    pos, _, keys = _march_squares(grid.read((0, grid.shape[0]),
+                                            (0, grid.shape[1])),
+                                  np.array([float(level)]))
+    pos = grid.to_data(pos)
     if not connected:
-        return lines
-                
-    # turn disjoint list of segments into continuous lines
-
-    points = {}  # maps each point to its connections
-    for a, b in lines:
-        if a[1] not in points:
-            points[a[1]] = []
-        points[a[1]].append([a, b])
-        if b[1] not in points:
-            points[b[1]] = []
-        points[b[1]].append([b, a])
-
-    # rearrange into chains
-    for k in list(points.keys()):
-        try:
-            chains = points[k]
-        except KeyError:  # already used this point elsewhere
+        return pos.tolist()
+    return _chain(pos, keys)
+
+
+def _chain(pos, keys):
+    """ Join segments that share an end into continuous lines """
+    ends = keys.ravel()
+    pos = pos.reshape(-1, 2).tolist()
+    order = np.argsort(ends, kind='mergesort')
+    same = np.nonzero(ends[order[1:]] == ends[order[:-1]])[0]
+    # the end of another segment at the same place as each segment end
+    link = np.empty(len(ends), np.intp)
+    link.fill(-1)
+    link[order[same + 1]] = order[same]
+    link[order[same]] = order[same + 1]
+    link = link.tolist()
+
+    used = [False] * (len(ends) // 2)
+    lines = []
+    # open lines start at an end without neighbour; what is left is closed
+    starts = [e for e in range(len(ends)) if link[e] < 0]
+    for start in starts + list(range(0, len(ends), 2)):
+        if used[start // 2]:
             continue
-        for chain in chains:
-            x = None
-            while True:
-                if x == chain[-1][1]:
-                    break  # nothing left to do on this chain
-                    
-                x = chain[-1][1]
-                if x == k:
-                    # chain has looped; we're done and can ignore the opposite
-                    # chain
-                    break
-                y = chain[-2][1]
-                connects = points[x]
-                for conn in connects[:]:
-                    if conn[1][1] != y:
-                        chain.extend(conn[1:])
-                del points[x]
-            if chain[0][1] == chain[-1][1]:
-                # looped chain; no need to continue the other direction
-                chains.pop()
+        line = [tuple(pos[start])]
+        end = start
+        while True:
+            used[end // 2] = True
+            end ^= 1  # the other end of the segment
+            line.append(tuple(pos[end]))
+            end = link[end]
+            if end < 0 or used[end // 2]:
                 break
-                
-    # extract point locations 
-    lines = []
-    for chain in points.values():
-        if len(chain) == 2:
-            # join together ends of chain
-            chain = chain[1][1:][::-1] + chain[0]
+        lines.append(line)
+    return lines
+
+
+def _march_squares(data, levels, offset=(0, 0), grid_shape=None):
+    """ Marching squares for several levels at once
+
+    Parameters
+    ----------
+    data : ndarray
+        The 2D values of the grid points of the cells.
+    levels : ndarray
+        The levels, sorted and unique.
+    offset : tuple of int
+        The (i, j) position of the data in the grid.
+    grid_shape : tuple of int | None
+        The shape of the grid, to compute the keys of the vertices.
+        Default is the shape of the data.
+
+    Returns
+    -------
+    pos : ndarray
+        The (N, 2, 2) ends of the N segments, in grid index order.
+    level_index : ndarray
+        The index of the level of each segment.
+    keys : ndarray
+        The (N, 2) indices of the grid edges of the ends of the segments.
+    """
+    data = np.asarray(data, np.float64)
+    if grid_shape is None:
+        grid_shape = data.shape
+    if min(data.shape) < 2 or len(levels) == 0:
+        return (np.zeros((0, 2, 2)), np.zeros(0, np.intp),
+                np.zeros((0, 2), np.intp))
+    # a value is below level k if less than k + 1 levels are below it
+    bins = np.searchsorted(levels, data, side='right')
+    corners = [bins[:-1, :-1], bins[1:, :-1], bins[:-1, 1:], bins[1:, 1:]]
+    lo = np.minimum(np.minimum(corners[0], corners[1]),
+                    np.minimum(corners[2], corners[3]))
+    hi = np.maximum(np.maximum(corners[0], corners[1]),
+                    np.maximum(corners[2], corners[3]))
+
+    # each cell is visited once for each level between its corners
+    cells = np.flatnonzero(hi > lo)
+    n = (hi.ravel()[cells] - lo.ravel()[cells])
+    first = np.cumsum(n) - n
+    cells = np.repeat(cells, n)
+    k = lo.ravel()[cells] + np.arange(len(cells)) - np.repeat(first, n)
+    index = np.zeros(len(cells), np.intp)
+    for bit, corner in enumerate(corners):
+        index |= (corner.ravel()[cells] <= k) << bit
+
+    # and has one or two segments
+    n = _N_SEGMENTS[index]
+    first = np.cumsum(n) - n
+    seg = np.arange(n.sum()) - np.repeat(first, n)
+    cells, k, index = np.repeat(cells, n), np.repeat(k, n), np.repeat(index, n)
+    sides = _SIDE_TABLE[index[:, None], 2 * seg[:, None] + [0, 1]]
+
+    ci, cj = np.divmod(cells, data.shape[1] - 1)
+    cell = np.c_[ci, cj][:, None, :]
+    c1, c2 = _SIDE_CORNERS[sides, 0], _SIDE_CORNERS[sides, 1]
+    v1 = data[c1[..., 0] + cell[..., 0], c1[..., 1] + cell[..., 1]]
+    v2 = data[c2[..., 0] + cell[..., 0], c2[..., 1] + cell[..., 1]]
+    f = ((levels[k][:, None] - v1) / (v2 - v1))[..., None]
+    # positions in the grid, computed the same way for any tiling
+    cell = cell + offset
+    pos = (c1 + cell) * (1 - f) + (c2 + cell) * f + 0.5
+    edges = _SIDE_EDGES[sides]
+    keys = (((edges[..., 0] + cell[..., 0]) * grid_shape[1] +
+             edges[..., 1] + cell[..., 1]) * 2 + edges[..., 2])
+    return pos, k, keys
+
+
+class _Grid(object):
+    """ The grid of values to contour: the data, or the data surrounded
+    by a copy of its edges if the curves extend to the edges.
+    """
+
+    def __init__(self, data, extend_to_edge):
+        if data.ndim != 2:
+            raise ValueError('data must be 2D, not %s' % (data.shape,))
+        self.data = data
+        self.extend = bool(extend_to_edge)
+        self.shape = tuple(s + 2 * self.extend for s in data.shape)
+
+    def read(self, rows, cols):
+        """ The values of the grid points in a (start, stop) range of rows
+        and columns """
+        if not self.extend:
+            return self.data[rows[0]:rows[1], cols[0]:cols[1]]
+        shape = self.data.shape
+        r = np.clip(np.arange(rows[0] - 1, rows[1] - 1), 0, shape[0] - 1)
+        c = np.clip(np.arange(cols[0] - 1, cols[1] - 1), 0, shape[1] - 1)
+        return self.data[r[:, None], c]
+
+    def reads(self, axis, cells, region):
+        """ Whether the grid points of a (start, stop) range of cells along
+        an axis read a (start, stop) range of the data """
+        n = self.data.shape[axis]
+        first = min(max(cells[0] - self.extend, 0), n - 1)
+        last = min(max(cells[1] - self.extend, 0), n - 1)
+        return first < region[1] and last >= region[0]
+
+    def to_data(self, pos):
+        """ Map grid positions to data positions """
+        if self.extend:
+            pos = pos - 1
+            pos[..., 0] = np.clip(pos[..., 0], 0, self.data.shape[0])
+            pos[..., 1] = np.clip(pos[..., 1], 0, self.data.shape[1])
+        return pos
+
+
+class TiledIsocurve(object):
+    """ Isocurves at several levels, extracted tile by tile
+
+    The segments of each tile and level are kept, so that only the tiles
+    that overlap a change of the data, and only new levels, are extracted
+    again.
+
+    Parameters
+    ----------
+    data : ndarray
+        2D array of scalar values.
+    levels : array-like
+        The levels at which to generate isocurves.
+    tile_shape : tuple of int
+        The number of cells of a tile along each axis.
+    extend_to_edge : bool
+        If True, extend the curves to reach the exact edges of the data.
+    """
+
+    def __init__(self, data, levels=(), tile_shape=(256, 256),
+                 extend_to_edge=False):
+        self.tile_shape = tuple(int(t) for t in tile_shape)
+        self._extend = bool(extend_to_edge)
+        self._levels = np.zeros(0)
+        self._output = None
+        self.set_data(data)
+        self.set_levels(levels)
+
+    @property
+    def levels(self):
+        """ The levels of the isocurves """
+        return self._levels
+
+    def set_levels(self, levels):
+        """ Set the levels of the isocurves
+
+        Parameters
+        ----------
+        levels : array-like
+            The levels at which to generate isocurves.
+        """
+        self._levels = np.atleast_1d(np.asarray(levels, np.float64))
+        self._output = None
+
+    def set_data(self, data, region=None):
+        """ Set the data
+
+        Parameters
+        ----------
+        data : ndarray
+            2D array of scalar values.
+        region : tuple | None
+            The ((row_start, row_stop), (col_start, col_stop)) range of
+            the values that changed since the last call. Only allowed if
+            the shape is unchanged. Default assumes all data changed.
+        """
+        data = np.asarray(data)
+        old = getattr(self, '_grid', None)
+        if region is not None and (old is None or
+                                   data.shape != old.data.shape):
+            raise ValueError('region requires data of the same shape')
+        self._grid = _Grid(data, self._extend)
+        self._output = None
+        if region is None:
+            shape = self._grid.shape
+            self._tiles = [((i, min(i + self.tile_shape[0], shape[0] - 1)),
+                            (j, min(j + self.tile_shape[1], shape[1] - 1)))
+                           for i in range(0, max(shape[0] - 1, 0),
+                                          self.tile_shape[0])
+                           for j in range(0, max(shape[1] - 1, 0),
+                                          self.tile_shape[1])]
+            self._cache = [None] * len(self._tiles)
+            return
+        # a tile reads its cells and the grid points that follow them
+        for t, tile in enumerate(self._tiles):
+            if all(self._grid.reads(axis, tile[axis], region[axis])
+                   for axis in (0, 1)):
+                self._cache[t] = None
+
+    def _tile_segments(self, t, levels):
+        """ The segments of a tile for each level, as a dict """
+        values = None
+        if self._cache[t] is None:
+            values = self._grid.read(*[(lo, hi + 1) for lo, hi in
+                                       self._tiles[t]])
+            self._cache[t] = [(values.min(), values.max()), {}]
+        (vmin, vmax), segs = self._cache[t]
+        # only levels between the extreme values cross the tile
+        todo = sorted(lev for lev in levels
+                      if vmin < lev <= vmax and lev not in segs)
+        if todo:
+            if values is None:
+                values = self._grid.read(*[(lo, hi + 1) for lo, hi in
+                                           self._tiles[t]])
+            offset = [lo for lo, _ in self._tiles[t]]
+            pos, k, _ = _march_squares(values, np.array(todo), offset)
+            pos = self._grid.to_data(pos).astype(np.float32)
+            for i, lev in enumerate(todo):
+                segs[lev] = pos[k == i]
+        # forget levels that are no longer used
+        for lev in list(segs):
+            if lev not in levels:
+                del segs[lev]
+        return segs
+
+    def segments(self):
+        """ The segments of all isocurves, packed for a line visual with
+        ``connect='segments'``
+
+        Returns
+        -------
+        pos : ndarray
+            The (2 * N, 2) ends of the N segments, in data index order.
+        level_index : ndarray
+            The index in ``levels`` of the level of each vertex.
+        """
+        if self._output is not None:
+            return self._output
+        levels = np.unique(self._levels)
+        lookup = dict((lev, i) for i, lev in enumerate(self._levels))
+        pos, index = [], []
+        for t in range(len(self._tiles)):
+            segs = self._tile_segments(t, set(levels.tolist()))
+            for lev in levels.tolist():
+                if lev in segs and len(segs[lev]):
+                    pos.append(segs[lev].reshape(-1, 2))
+                    index.append(np.repeat(lookup[lev], len(pos[-1])))
+        if pos:
+            self._output = np.concatenate(pos), np.concatenate(index)
         else:
-            chain = chain[0]
-        lines.append([pt[0] for pt in chain])
-    
-    return lines  # a list of pairs of points
+            self._output = np.zeros((0, 2), np.float32), np.zeros(0, np.intp)
+        return self._output
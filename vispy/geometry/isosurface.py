@@ -1,9 +1,37 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2014, Vispy Development Team.
+# Distributed under the (new) BSD License. See LICENSE.txt for more info.
+"""
+Marching cubes isosurface extraction.
+
+The volume is processed in slabs of cells along its first axis, which
+can be extracted in parallel and are kept small enough to bound the
+memory used by temporaries. Each vertex is identified by the edge of the
+grid it lies on, so that vertices on the planes shared by two slabs are
+merged into a single welded mesh. The result does not depend on the size
+of the slabs.
+"""
+
+from __future__ import division
+
+from multiprocessing.pool import ThreadPool
+
 import numpy as np
 
+from .calculations import _calculate_normals
+
 _data_cache = None
 
+# Number of cells per slab when no chunk size is given
+_SLAB_CELLS = 2 ** 20
+
+# The result of a slab without surface: keys, vertices and faces
+_EMPTY = (np.zeros(0, np.int64), np.zeros((0, 3), np.float32),
+          np.zeros((0, 3), np.intp))
 
-def isosurface(data, level):
+
+def isosurface(data, level, chunk_size=None, n_threads=1,
+               compute_normals=False):
     """
     Generate isosurface from volumetric data using marching cubes algorithm.
     See Paul Bourke, "Polygonising a Scalar Field"  
@@ -11,9 +39,15 @@ def isosurface(data, level):
     
     *data*   3D numpy array of scalar values
     *level*  The level at which to generate an isosurface
+    *chunk_size*  The number of cells along the first axis of the data
+                  processed at once. Default chooses slabs of about
+                  a million cells.
+    *n_threads*   The number of threads used to process the slabs.
+    *compute_normals*  Whether to also return vertex normals.
     
     Returns an array of vertex coordinates (Nv, 3) and an array of 
-    per-face vertex indexes (Nf, 3)    
+    per-face vertex indexes (Nf, 3), followed by an array of vertex
+    normals (Nv, 3) if *compute_normals* is True.
     """
     # For improvement, see:
     # 
@@ -21,112 +55,232 @@ def isosurface(data, level):
     # guarantees.
     # Thomas Lewiner, Helio Lopes, Antonio Wilson Vieira and Geovan Tavares.
     # Journal of Graphics Tools 8(2): pp. 1-15 (december 2003)
-    
-    (face_shift_tables, edge_shifts, 
-     edge_table, n_table_faces) = _get_data_cache()
-    
-    ## mark everything below the isosurface level
-    mask = data < level
-    
-    ### make eight sub-fields and compute indexes for grid cells
-    index = np.zeros([x-1 for x in data.shape], dtype=np.ubyte)
-    fields = np.empty((2, 2, 2), dtype=object)
+    iso = ChunkedIsosurface(data, chunk_size, n_threads)
+    return iso.extract(level, compute_normals)
+
+
+class ChunkedIsosurface(object):
+    """ Isosurface extraction that keeps the result of each slab
+
+    The volume is split in slabs of *chunk_size* cells along its first
+    axis. When the level changes, only the slabs whose range of values
+    includes the old or the new level are extracted again, and when part
+    of the data changes, only the slabs that overlap the change.
+
+    Parameters
+    ----------
+    data : ndarray
+        3D array of scalar values.
+    chunk_size : int | None
+        The number of cells along the first axis of each slab. Default
+        chooses slabs of about a million cells.
+    n_threads : int
+        The number of threads used to extract the slabs.
+    """
+
+    def __init__(self, data, chunk_size=None, n_threads=1):
+        self.chunk_size = chunk_size
+        self.n_threads = int(n_threads)
+        self._data = None
+        self.set_data(data)
+
+    @property
+    def data(self):
+        """ The volume """
+        return self._data
+
+    def set_data(self, data, zrange=None):
+        """ Set the volume
+
+        Parameters
+        ----------
+        data : ndarray
+            3D array of scalar values.
+        zrange : tuple of int | None
+            The (start, stop) range along the first axis where the data has
+            changed since the last call. Only allowed if the shape is
+            unchanged. Default assumes all data changed.
+        """
+        data = np.asarray(data)
+        if data.ndim != 3:
+            raise ValueError('Volume must be 3D, not %s' % (data.shape,))
+        if zrange is not None and (self._data is None or
+                                   data.shape != self._data.shape):
+            raise ValueError('zrange requires data of the same shape')
+        self._data = data
+        if zrange is None:
+            nz = data.shape[0]
+            K = self.chunk_size
+            if K is None:
+                K = _SLAB_CELLS // max(data.shape[1] * data.shape[2], 1)
+            K = max(int(K), 1)
+            self._slabs = [(z, min(z + K, nz - 1))
+                           for z in range(0, max(nz - 1, 0), K)]
+            self._ranges = [None] * len(self._slabs)
+            self._results = [None] * len(self._slabs)
+        else:
+            # a slab reads its cells and the plane that follows them
+            z0, z1 = zrange
+            for i, (a, b) in enumerate(self._slabs):
+                if a < z1 and b >= z0:
+                    self._ranges[i] = self._results[i] = None
+        self._mesh = None
+
+    def extract(self, level, compute_normals=False):
+        """ Extract the isosurface
+
+        Parameters
+        ----------
+        level : float
+            The level at which to generate the isosurface.
+        compute_normals : bool
+            Whether to also return vertex normals.
+
+        Returns
+        -------
+        vertices : ndarray
+            The (Nv, 3) vertex positions, in array index order.
+        faces : ndarray
+            The (Nf, 3) vertex indices of each triangle.
+        normals : ndarray
+            The (Nv, 3) vertex normals. Only returned if *compute_normals*
+            is True.
+        """
+        level = float(level)
+        todo = []
+        for i, (z0, z1) in enumerate(self._slabs):
+            res = self._results[i]
+            if res is not None and res[0] == level:
+                continue
+            if self._ranges[i] is None:
+                slab = self._data[z0:z1 + 1]
+                self._ranges[i] = (slab.min(), slab.max())
+            lo, hi = self._ranges[i]
+            if not lo < level <= hi:
+                # no surface through this slab
+                self._results[i] = (level,) + _EMPTY
+                continue
+            todo.append(i)
+        if todo or self._mesh is None or self._mesh[0] != level:
+            self._update(level, todo)
+        verts, faces = self._mesh[1:3]
+        if not compute_normals:
+            return verts, faces
+        if self._mesh[3] is None:
+            normals = _calculate_normals(verts, faces).astype(np.float32)
+            self._mesh = self._mesh[:3] + (normals,)
+        return verts, faces, self._mesh[3]
+
+    def _update(self, level, todo):
+        """ Extract the slabs in *todo* and weld all slabs """
+        tables = _get_data_cache()
+        shape = self._data.shape
+
+        def run(i):
+            z0, z1 = self._slabs[i]
+            res = _march(self._data[z0:z1 + 1], level, z0, shape, tables)
+            self._results[i] = (level,) + res
+
+        if len(todo) > 1 and self.n_threads > 1:
+            # the pool only lives during the extraction, so that no threads
+            # are left behind
+            pool = ThreadPool(min(self.n_threads, len(todo)))
+            try:
+                pool.map(run, todo)
+            finally:
+                pool.close()
+                pool.join()
+        else:
+            for i in todo:
+                run(i)
+
+        # The vertices on the plane between two slabs are found by both
+        # slabs. They are kept by the second one, so that the keys of all
+        # vertices stay sorted.
+        plane = 3 * shape[1] * shape[2]
+        verts, faces = [], []
+        offset = 0
+        for i, (_, keys, v, f) in enumerate(self._results):
+            n_own = len(keys)
+            remap = np.arange(n_own) + offset
+            if i + 1 < len(self._results):
+                n_own = np.searchsorted(keys, self._slabs[i][1] * plane)
+                shared = np.searchsorted(self._results[i + 1][1],
+                                         keys[n_own:])
+                remap[n_own:] = offset + n_own + shared
+            verts.append(v[:n_own])
+            faces.append(remap[f])
+            offset += n_own
+        if offset == 0:
+            self._mesh = (level, np.zeros((0, 3), np.float32),
+                          np.zeros((0, 3), np.uint32), None)
+            return
+        self._mesh = (level, np.concatenate(verts),
+                      np.concatenate(faces).astype(np.uint32), None)
+
+
+def _march(data, level, z0, shape, tables):
+    """ Marching cubes on the cells of one slab
+
+    Returns the sorted keys of the vertices, i.e. the index of the grid
+    edge they lie on (``((z * ny + y) * nx + x) * 3 + axis``), their
+    positions and the faces, indexing these vertices.
+    """
+    tri_table, edge_shifts, _, n_table_faces = tables
+    if min(data.shape) < 2:
+        return _EMPTY
+    data = np.ascontiguousarray(data)
+    nz, ny, nx = data.shape
+
+    # index of each cell, with one bit per corner below the level. Cells
+    # are indexed by their first corner; the last planes have no cells.
+    mask = (data < level).view(np.uint8)
+    index = np.zeros(data.shape, dtype=np.uint8)
+    cell_index = index[:-1, :-1, :-1]
     slices = [slice(0, -1), slice(1, None)]
     for i in [0, 1]:
         for j in [0, 1]:
             for k in [0, 1]:
-                fields[i, j, k] = mask[slices[i], slices[j], slices[k]]
                 # this is just to match Bourk's vertex numbering scheme:
                 vertIndex = i - 2*j*i + 3*j + 4*k
-                index += (fields[i, j, k] * 2**vertIndex).astype(np.ubyte)
-    
-    ### Generate table of edges that have been cut
-    cut_edges = np.zeros([x+1 for x in index.shape]+[3], dtype=np.uint32)
-    edges = edge_table[index]
-    for i, shift in enumerate(edge_shifts[:12]):        
-        slices = [slice(shift[j], cut_edges.shape[j]+(shift[j]-1)) 
-                  for j in range(3)]
-        cut_edges[slices[0], slices[1], slices[2], shift[3]] += edges & 2**i
-    
-    # for each cut edge, interpolate to see where exactly the edge is cut and 
-    # generate vertex positions
-    m = cut_edges > 0
-    vertex_inds = np.argwhere(m)  # argwhere is slow!
-    vertexes = vertex_inds[:, :3].astype(np.float32).copy()
-    dataFlat = data.reshape(data.shape[0]*data.shape[1]*data.shape[2])
-    
-    ## re-use the cut_edges array as a lookup table for vertex IDs
-    cut_edges[vertex_inds[:, 0], 
-              vertex_inds[:, 1], 
-              vertex_inds[:, 2], 
-              vertex_inds[:, 3]] = np.arange(vertex_inds.shape[0])
-    
-    for i in [0, 1, 2]:
-        vim = vertex_inds[:, 3] == i
-        vi = vertex_inds[vim, :3]
-        vi_flat = (vi * (np.array(data.strides[:3]) // 
-                         data.itemsize)[np.newaxis, :]).sum(axis=1)
-        v1 = dataFlat[vi_flat]
-        v2 = dataFlat[vi_flat + data.strides[i]//data.itemsize]
-        vertexes[vim, i] += (level-v1) / (v2-v1)
-    
-    ### compute the set of vertex indexes for each face. 
-    
-    ## This works, but runs a bit slower.
-    ## all cells with at least one face:
-    #cells = np.argwhere((index != 0) & (index != 255))  
-    #cellInds = index[cells[:, 0], cells[:, 1], cells[:, 2]]
-    #verts = faceTable[cellInds]
-    #mask = verts[..., 0, 0] != 9
-    ## we now have indexes into cut_edges:
-    #verts[...,:3] += cells[:, np.newaxis, np.newaxis,:]
-    #verts = verts[mask]
-    ## and these are the vertex indexes we want:
-    #faces = cut_edges[verts[..., 0], verts[..., 1], verts[..., 2], 
-    #                  verts[..., 3]]  
-    
-    # To allow this to be vectorized efficiently, we count the number of faces 
-    # in each grid cell and handle each group of cells with the same number 
-    # together.
-    
-    # determine how many faces to assign to each grid cell
-    n_faces = n_table_faces[index]
-    tot_faces = n_faces.sum()
-    faces = np.empty((tot_faces, 3), dtype=np.uint32)
-    ptr = 0
-    
-    ## this helps speed up an indexing operation later on
-    cs = np.array(cut_edges.strides)//cut_edges.itemsize
-    cut_edges = cut_edges.flatten()
-
-    ## this, strangely, does not seem to help.
-    #ins = np.array(index.strides)/index.itemsize
-    #index = index.flatten()
-
-    for i in range(1, 6):
-        # expensive:
-        # all cells which require i faces  (argwhere is expensive)
-        cells = np.argwhere(n_faces == i)  
-        if cells.shape[0] == 0:
-            continue
-        # index values of cells to process for this round:
-        cellInds = index[cells[:, 0], cells[:, 1], cells[:, 2]]
-        
-        # expensive:
-        verts = face_shift_tables[i][cellInds]
-        # we now have indexes into cut_edges:
-        verts[..., :3] += (cells[:, np.newaxis,
-                                 np.newaxis, :]).astype(np.uint16)
-        verts = verts.reshape((verts.shape[0]*i,)+verts.shape[2:])
-        
-        # expensive:
-        verts = (verts * cs[np.newaxis, np.newaxis, :]).sum(axis=2)
-        vert_inds = cut_edges[verts]
-        nv = vert_inds.shape[0]
-        faces[ptr:ptr+nv] = vert_inds  # .reshape((nv, 3))
-        ptr += nv
-        
-    return vertexes, faces
+                corner = mask[slices[i], slices[j], slices[k]]
+                cell_index |= corner << vertIndex
+
+    # vertices are where an edge of the grid is cut by the surface
+    cut = np.zeros(data.shape + (3,), dtype=bool)
+    cut[:-1, :, :, 0] = mask[:-1] != mask[1:]
+    cut[:, :-1, :, 1] = mask[:, :-1] != mask[:, 1:]
+    cut[:, :, :-1, 2] = mask[:, :, :-1] != mask[:, :, 1:]
+    keys = np.flatnonzero(cut)
+    if len(keys) == 0:
+        return _EMPTY
+    vertex_ids = np.empty(cut.size, dtype=np.int32)
+    vertex_ids[keys] = np.arange(len(keys))
+
+    # interpolate along the edges to find where they are cut
+    axis = keys % 3
+    voxel = keys // 3
+    strides = np.array([ny * nx, nx, 1])
+    v1 = data.flat[voxel].astype(np.float64)
+    v2 = data.flat[voxel + strides[axis]].astype(np.float64)
+    verts = np.empty((len(keys), 3), np.float32)
+    verts[:, 0] = voxel // (ny * nx) + z0
+    verts[:, 1] = (voxel // nx) % ny
+    verts[:, 2] = voxel % nx
+    verts[np.arange(len(keys)), axis] += (level - v1) / (v2 - v1)
+
+    # triangles of the cells that the surface goes through
+    cells = np.flatnonzero(n_table_faces[index])
+    codes = index.flat[cells]
+    n_faces = n_table_faces[codes].astype(np.intp)
+    first = np.cumsum(n_faces) - n_faces
+    tri = np.arange(first[-1] + n_faces[-1]) - np.repeat(first, n_faces)
+    edges = tri_table[np.repeat(codes, n_faces), tri]
+    shifts = edge_shifts.astype(np.intp)
+    edge_offsets = (shifts[:, :3] * strides).sum(axis=1) * 3 + shifts[:, 3]
+    corners = np.repeat(cells * 3, n_faces)[:, None] + edge_offsets[edges]
+    faces = vertex_ids[corners]
+    return keys + z0 * ny * nx * 3, verts, faces
 
 
 def _get_data_cache():
@@ -437,7 +591,7 @@ def _get_data_cache():
             []
         ]
         
-        # maps edge ID (0-11) to (x, y, z) cell offset and edge ID (0-2)
+        # maps edge ID (0-11) to (i, j, k) cell offset and edge axis (0-2)
         edge_shifts = np.array([
             [0, 0, 0, 0],   
             [1, 0, 0, 1],
@@ -451,22 +605,14 @@ def _get_data_cache():
             [1, 0, 0, 2],
             [1, 1, 0, 2],
             [0, 1, 0, 2],
-            #[9, 9, 9, 9]  ## fake
-            # don't use ubyte here! This value gets added to cell index later; 
-            # will need the extra precision.
-        ], dtype=np.uint16) 
-        n_table_faces = np.array([len(f)/3 for f in triTable], dtype=np.ubyte)
-        face_shift_tables = [None]
-        for i in range(1, 6):
-            ## compute lookup table of index: vertexes mapping
-            faceTableI = np.zeros((len(triTable), i*3), dtype=np.ubyte)
-            faceTableInds = np.argwhere(n_table_faces == i)
-            faceTableI[faceTableInds[:, 0]] = np.array([triTable[j] for j in 
-                                                        faceTableInds])
-            faceTableI = faceTableI.reshape((len(triTable), i, 3))
-            face_shift_tables.append(edge_shifts[faceTableI])
-            
-        _data_cache = (face_shift_tables, edge_shifts, edge_table, 
-                       n_table_faces)
+        ], dtype=np.uint8)
+        n_table_faces = np.array([len(f) // 3 for f in triTable],
+                                 dtype=np.ubyte)
+        # edges of the (up to 5) triangles of each cell index
+        tri_table = np.zeros((len(triTable), 5, 3), dtype=np.ubyte)
+        for i, f in enumerate(triTable):
+            tri_table[i, :len(f) // 3] = np.reshape(f, (-1, 3))
+
+        _data_cache = (tri_table, edge_shifts, edge_table, n_table_faces)
         
     return _data_cache
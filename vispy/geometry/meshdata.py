@@ -4,7 +4,12 @@
 
 import numpy as np
 
-from ..ext.six.moves import xrange
+from .optimization import (optimize_face_order, optimize_vertex_order,
+                           simulate_vertex_cache)
+from .simplification import LODChain
+
+# the default fractions of the faces kept by the levels of detail
+_LOD_RATIOS = (0.5, 0.25, 0.125, 0.0625)
 
 
 def _fix_colors(colors):
@@ -67,6 +72,7 @@ class MeshData(object):
         self._vertices = None  # (Nv,3) array of vertex coordinates
         self._vertices_indexed_by_faces = None  # (Nf, 3, 3) vertex coordinates
         self._vertices_indexed_by_edges = None  # (Ne, 2, 3) vertex coordinates
+        self._face_indexed = False  # whether vertices were given by face
 
         # mappings between vertices, faces, and edges
         self._faces = None  # Nx3 indices into self._vertices, 3 verts/face
@@ -74,7 +80,7 @@ class MeshData(object):
         self._edges_indexed_by_faces = None  # (Ne, 3, 2) indices into
         # self._vertices, 3 edge / face and 2 verts/edge
         # inverse mappings
-        self._vertex_faces = None  # maps vertex ID to a list of face IDs
+        self._vertex_faces = None  # (offsets, face IDs) of each vertex (CSR)
         self._vertex_edges = None  # maps vertex ID to a list of edge IDs
 
         # Per-vertex data
@@ -97,6 +103,13 @@ class MeshData(object):
         # default color to use if no face/edge/vertex colors are given
         # self._meshColor = (1, 1, 1, 0.1)
 
+        # number of changes of each kind of data, see get_versions()
+        self._versions = dict(vertices=0, faces=0, normals=0, colors=0)
+
+        # (versions, LODChain, {level: (colors version, MeshData)}) of the
+        # levels of detail of the mesh, see get_lod_chain()
+        self._lods = None
+
         if vertices is not None:
             if faces is None:
                 self.set_vertices(vertices, indexed='faces')
@@ -112,6 +125,20 @@ class MeshData(object):
                 if face_colors is not None:
                     self.set_face_colors(face_colors)
 
+    def get_versions(self):
+        """Return a dict counting the changes of the 'vertices', 'faces',
+        'normals' and 'colors' of the mesh.
+
+        Users of the mesh can compare these counters to the ones they saw
+        last, to only update the data that changed. Changes made in place
+        to the arrays of the mesh are not counted.
+        """
+        return dict(self._versions)
+
+    def _changed(self, *names):
+        for name in names:
+            self._versions[name] += 1
+
     def get_faces(self):
         """Array (Nf, 3) of vertex indices, three per triangular face.
 
@@ -146,6 +173,7 @@ class MeshData(object):
         self.reset_normals()
         self._vertex_colors_indexed_by_faces = None
         self._face_colors_indexed_by_faces = None
+        self._changed('faces')
 
     def get_vertices(self, indexed=None):
         """Return an array (N,3) of the positions of vertices in the mesh.
@@ -187,14 +215,26 @@ class MeshData(object):
         """
         if indexed is None:
             if verts is not None:
+                if (self._vertices is None or
+                        len(verts) != len(self._vertices)):
+                    # the adjacency only depends on the faces otherwise
+                    self._vertex_faces = None
                 self._vertices = verts
             self._vertices_indexed_by_faces = None
+            self._face_indexed = False
         elif indexed == 'faces':
             self._vertices = None
+            self._face_indexed = True
             if verts is not None:
                 self._vertices_indexed_by_faces = verts
+                # welding the new vertices gives new faces
+                self._faces = None
+                self._edges = None
+                self._vertex_faces = None
+                self._changed('faces')
         else:
             raise Exception("Invalid indexing mode. Accepts: None, 'faces'")
+        self._changed('vertices')
 
         if reset_normals:
             self.reset_normals()
@@ -204,11 +244,13 @@ class MeshData(object):
         self._vertex_normals_indexed_by_faces = None
         self._face_normals = None
         self._face_normals_indexed_by_faces = None
+        self._changed('normals')
 
     def has_face_indexed_data(self):
-        """Return True if this object already has vertex positions indexed
-        by face"""
-        return self._vertices_indexed_by_faces is not None
+        """Return True if the vertex positions of this object were given
+        indexed by face"""
+        return (self._face_indexed and
+                self._vertices_indexed_by_faces is not None)
 
     def has_edge_indexed_data(self):
         return self._vertices_indexed_by_edges is not None
@@ -237,7 +279,10 @@ class MeshData(object):
         copied three times).
         """
         if self._face_normals is None:
-            v = self.get_vertices(indexed='faces')
+            v = self._vertices_indexed_by_faces
+            if v is None:
+                # don't keep these, which would make the data face-indexed
+                v = self.get_vertices()[self.get_faces()]
             self._face_normals = np.cross(v[:, 1] - v[:, 0],
                                           v[:, 2] - v[:, 0])
 
@@ -262,19 +307,20 @@ class MeshData(object):
         repeated).
         """
         if self._vertex_normals is None:
-            faceNorms = self.get_face_normals()
-            vertFaces = self.get_vertex_faces()
-            self._vertex_normals = np.empty(self._vertices.shape,
-                                            dtype=np.float32)
-            for vindex in xrange(self._vertices.shape[0]):
-                faces = vertFaces[vindex]
-                if len(faces) == 0:
-                    self._vertex_normals[vindex] = (0, 0, 0)
-                    continue
-                norms = faceNorms[faces]  # get all face normals
-                norm = norms.sum(axis=0)  # sum normals
-                norm /= (norm**2).sum()**0.5  # and re-normalize
-                self._vertex_normals[vindex] = norm
+            n = len(self.get_vertices())
+            faces = np.asarray(self.get_faces(), np.intp)
+            face_norms = self.get_face_normals()
+            # sum the normals of the faces of each vertex
+            norms = np.zeros((n, 3))
+            for corner in faces.T:
+                for axis in range(3):
+                    norms[:, axis] += np.bincount(corner,
+                                                  face_norms[:, axis],
+                                                  minlength=n)
+            size = np.sqrt((norms ** 2).sum(axis=1))
+            size[size == 0] = 1.  # vertices without faces
+            self._vertex_normals = (norms / size[:, np.newaxis]).astype(
+                np.float32)
 
         if indexed is None:
             return self._vertex_normals
@@ -328,6 +374,7 @@ class MeshData(object):
             self._vertex_colors_indexed_by_faces = colors
         else:
             raise ValueError('indexed must be None or "faces"')
+        self._changed('colors')
 
     def get_face_colors(self, indexed=None):
         """
@@ -377,6 +424,7 @@ class MeshData(object):
             self._face_colors_indexed_by_faces = colors
         else:
             raise ValueError('indexed must be None or "faces"')
+        self._changed('colors')
 
     @property
     def n_faces(self):
@@ -396,6 +444,121 @@ class MeshData(object):
     def get_edge_colors(self):
         return self._edge_colors
 
+    def get_lod_chain(self, ratios=None):
+        """Return the LODChain of simplified levels of detail of the mesh
+
+        The chain is computed when first needed, and kept until the
+        vertices or faces change.
+
+        Parameters
+        ----------
+        ratios : sequence of float | None
+            The decreasing fractions of the faces kept by the levels. If
+            None, the ratios of the current chain are used, or by default
+            (0.5, 0.25, 0.125, 0.0625).
+        """
+        if ratios is None:
+            ratios = _LOD_RATIOS if self._lods is None else \
+                self._lods[1].ratios
+        ratios = tuple(float(r) for r in ratios)
+        key = (self._versions['vertices'], self._versions['faces'])
+        if (self._lods is None or self._lods[0] != key or
+                self._lods[1].ratios != ratios):
+            chain = LODChain(self.get_vertices(), self.get_faces(), ratios)
+            self._lods = (key, chain, {})
+        return self._lods[1]
+
+    def get_lod(self, level, ratios=None):
+        """Return a MeshData of a level of ``get_lod_chain(ratios)``
+
+        The level shares the vertices and vertex colors of this mesh, and
+        keeps the colors of the faces that remain.
+        """
+        chain = self.get_lod_chain(ratios)
+        lods = self._lods[2]
+        version = self._versions['colors']
+        if lods.get(level, (None,))[0] != version:
+            lods[level] = (version, self._lod_meshdata(chain, level))
+        return lods[level][1]
+
+    def simplify(self, ratio):
+        """Return a MeshData with about *ratio* of the faces of this mesh
+
+        See LODChain for the method. The simplified mesh uses the same
+        vertices as this mesh, some of which are left unused.
+        """
+        chain = LODChain(self.get_vertices(), self.get_faces(), (ratio,))
+        return self._lod_meshdata(chain, 0)
+
+    def optimize(self, cache_size=32, overdraw=True):
+        """Reorder the faces and vertices of the mesh for the GPU caches
+
+        The faces are ordered for the post-transform vertex cache, and
+        optionally to reduce overdraw, and the vertices by first use. The
+        colors follow their faces and vertices. Vertices given indexed by
+        faces are welded first.
+
+        Parameters
+        ----------
+        cache_size : int
+            The number of vertices in the post-transform cache of the GPU.
+        overdraw : bool
+            Whether to also sort groups of faces to reduce overdraw.
+
+        Returns
+        -------
+        acmr : tuple of float
+            The average number of cache misses per face before and after,
+            simulated for a FIFO cache of *cache_size* vertices.
+
+        See Also
+        --------
+        vispy.geometry.optimization
+        """
+        vertices = self.get_vertices()
+        faces = self.get_faces()
+        before = simulate_vertex_cache(faces, cache_size)
+        face_order = optimize_face_order(vertices, faces, cache_size,
+                                         overdraw)
+        faces = faces[face_order]
+        vertex_order = optimize_vertex_order(faces, len(vertices))
+        new_index = np.empty(len(vertex_order), np.uint32)
+        new_index[vertex_order] = np.arange(len(vertex_order))
+        vertex_colors = self.get_vertex_colors()
+        vertex_face_colors = self._vertex_colors_indexed_by_faces
+        face_colors = self.get_face_colors()
+        face_face_colors = self._face_colors_indexed_by_faces
+
+        self.set_vertices(vertices[vertex_order])
+        self.set_faces(new_index[faces])
+        if vertex_colors is not None:
+            self.set_vertex_colors(vertex_colors[vertex_order])
+        elif vertex_face_colors is not None:
+            self.set_vertex_colors(vertex_face_colors[face_order],
+                                   indexed='faces')
+        if face_colors is not None:
+            self.set_face_colors(face_colors[face_order])
+        elif face_face_colors is not None:
+            self.set_face_colors(face_face_colors[face_order],
+                                 indexed='faces')
+        return before, simulate_vertex_cache(self._faces, cache_size)
+
+    def _lod_meshdata(self, chain, level):
+        md = MeshData(vertices=self.get_vertices(),
+                      faces=chain.get_faces(level))
+        index = chain.get_face_index(level)
+        if self._vertex_colors is not None:
+            md.set_vertex_colors(self._vertex_colors)
+        elif self._vertex_colors_indexed_by_faces is not None:
+            md.set_vertex_colors(self._vertex_colors_indexed_by_faces[index],
+                                 indexed='faces')
+        if self._face_colors is not None:
+            md.set_face_colors(self._face_colors[index])
+        elif self._face_colors_indexed_by_faces is not None:
+            md.set_face_colors(self._face_colors_indexed_by_faces[index],
+                               indexed='faces')
+        return md
+
     def _compute_unindexed_vertices(self):
         # Given (Nv, 3, 3) array of vertices-indexed-by-face, convert
         # backward to unindexed vertices
@@ -404,40 +567,46 @@ class MeshData(object):
 
         # I think generally this should be discouraged..
         faces = self._vertices_indexed_by_faces
-        verts = {}  # used to remember the index of each vertex position
-        self._faces = np.empty(faces.shape[:2], dtype=np.uint32)
-        self._vertices = []
-        self._vertex_faces = []
+        pts = faces.reshape(-1, faces.shape[-1])
+        # quantize to ensure nearly-identical points will be merged; adding
+        # zero turns -0. into 0.
+        keys = np.round(pts.astype(np.float64) * 1e14) + 0.
+        keys = np.ascontiguousarray(keys).view(
+            np.dtype((np.void, keys.dtype.itemsize * keys.shape[1])))
+        _, first, inverse = np.unique(keys.ravel(), return_index=True,
+                                      return_inverse=True)
+        # number the vertices in order of first appearance
+        order = np.argsort(first)
+        rank = np.empty(len(order), np.intp)
+        rank[order] = np.arange(len(order))
+        self._faces = rank[inverse].astype(np.uint32).reshape(faces.shape[:2])
+        self._vertices = pts[first[order]].astype(np.float32)
+        self._vertex_faces = None
+        self._edges = None
         self._face_normals = None
         self._vertex_normals = None
-        for i in xrange(faces.shape[0]):
-            face = faces[i]
-            for j in range(face.shape[0]):
-                pt = face[j]
-                # quantize to ensure nearly-identical points will be merged
-                pt2 = tuple([round(x*1e14) for x in pt])
-                index = verts.get(pt2, None)
-                if index is None:
-                    self._vertices.append(pt)
-                    self._vertex_faces.append([])
-                    index = len(self._vertices)-1
-                    verts[pt2] = index
-                # track which vertices belong to which faces
-                self._vertex_faces[index].append(i)
-                self._faces[i, j] = index
-        self._vertices = np.array(self._vertices, dtype=np.float32)
-
-    def get_vertex_faces(self):
+
+    def get_vertex_faces(self, csr=False):
         """
-        List mapping each vertex index to a list of face indices that use it.
+        List mapping each vertex index to an array of the indices of the
+        faces that use it.
+
+        If csr is True, return the mapping in compressed sparse row format
+        instead: a tuple (offsets, faces) of arrays, where the faces of
+        vertex i are ``faces[offsets[i]:offsets[i + 1]]``.
         """
         if self._vertex_faces is None:
-            self._vertex_faces = [[] for i in xrange(len(self.get_vertices()))]
-            for i in xrange(self._faces.shape[0]):
-                face = self._faces[i]
-                for ind in face:
-                    self._vertex_faces[ind].append(i)
-        return self._vertex_faces
+            n = len(self.get_vertices())  # welds face-indexed vertices
+            faces = np.asarray(self.get_faces(), np.intp).ravel()
+            # a stable sort keeps the faces of each vertex in order
+            order = np.argsort(faces, kind='mergesort')
+            offsets = np.zeros(n + 1, np.intp)
+            np.cumsum(np.bincount(faces, minlength=n), out=offsets[1:])
+            self._vertex_faces = (offsets, order // 3)
+        if csr:
+            return self._vertex_faces
+        offsets, faces = self._vertex_faces
+        return np.split(faces, offsets[1:-1])
 
     def _compute_edges(self, indexed=None):
         if indexed is None:
@@ -500,7 +669,9 @@ class MeshData(object):
         """Restore the state of a mesh previously saved using save()"""
         import pickle
         state = pickle.loads(state)
+        self._face_indexed = '_vertices_indexed_by_faces' in state
         for k in state:
             if isinstance(state[k], list):
                 state[k] = np.array(state[k])
             setattr(self, k, state[k])
+        self._changed('vertices', 'faces', 'normals', 'colors')
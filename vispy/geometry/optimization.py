@@ -0,0 +1,192 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2014, Vispy Development Team.
+# Distributed under the (new) BSD License. See LICENSE.txt for more info.
+
+"""
+Reordering of triangle meshes for the caches of the GPU
+
+The faces are ordered for the post-transform vertex cache with the
+Tipsify algorithm [1], and clusters of faces are sorted to reduce overdraw.
+The vertices are then ordered by first use, for the locality of vertex
+fetches.
+
+References
+----------
+[1] P. V. Sander, D. Nehab and J. Barczak. Fast triangle reordering for
+    vertex locality and reduced overdraw. SIGGRAPH 2007.
+"""
+
+from __future__ import division
+
+import numpy as np
+
+
+def simulate_vertex_cache(faces, cache_size=32):
+    """Return the average number of vertex cache misses per face (ACMR)
+
+    The cache is simulated as a FIFO of *cache_size* vertices, like the
+    post-transform cache of most GPUs. The ACMR is between 0.5 (for large
+    regular meshes) and 3.
+
+    Parameters
+    ----------
+    faces : ndarray, shape (Nf, 3)
+        The vertex indices of the faces, in drawing order.
+    cache_size : int
+        The number of vertices in the cache.
+    """
+    faces = np.asarray(faces, np.intp)
+    if not len(faces):
+        return 0.
+    stamp = [-cache_size - 1] * (int(faces.max()) + 1)
+    misses = 0
+    for v in faces.ravel().tolist():
+        if misses - stamp[v] > cache_size:
+            stamp[v] = misses
+            misses += 1
+    return misses / len(faces)
+
+
+def _tipsify(faces, n_vertices, cache_size):
+    """ The order of the faces by the Tipsify algorithm, and the positions
+    in that order where it reached a dead end
+    """
+    flat = faces.ravel()
+    counts = np.bincount(flat, minlength=n_vertices)
+    offsets = np.zeros(n_vertices + 1, np.intp)
+    np.cumsum(counts, out=offsets[1:])
+    vertex_faces = (np.argsort(flat, kind='mergesort') // 3).tolist()
+    offsets = offsets.tolist()
+    live = counts.tolist()  # the number of faces left for each vertex
+    tri = faces.tolist()
+    stamp = [0] * n_vertices
+    emitted = bytearray(len(faces))
+    dead = []  # the recently used vertices, for the dead ends
+    order = []
+    ends = []
+    time = cache_size + 1
+    cursor = 0
+    fan = -1
+    while True:
+        if fan < 0:
+            # dead end: back to a recent vertex, or to the next unused one
+            ends.append(len(order))
+            while dead:
+                v = dead.pop()
+                if live[v]:
+                    fan = v
+                    break
+            else:
+                while cursor < n_vertices and not live[cursor]:
+                    cursor += 1
+                if cursor == n_vertices:
+                    break
+                fan = cursor
+        # emit the faces around the fanning vertex
+        near = []
+        for f in vertex_faces[offsets[fan]:offsets[fan + 1]]:
+            if emitted[f]:
+                continue
+            emitted[f] = 1
+            order.append(f)
+            for v in tri[f]:
+                dead.append(v)
+                near.append(v)
+                live[v] -= 1
+                if time - stamp[v] > cache_size:
+                    stamp[v] = time
+                    time += 1
+        # fan next around the oldest neighbor that stays in the cache while
+        # emitting its faces
+        fan = -1
+        best = -1
+        for v in near:
+            if live[v]:
+                age = time - stamp[v]
+                priority = age if age + 2 * live[v] <= cache_size else 0
+                if priority > best:
+                    best = priority
+                    fan = v
+    return np.array(order, np.intp), np.array(ends[1:-1], np.intp)
+
+
+def optimize_face_order(vertices, faces, cache_size=32, overdraw=True):
+    """Return an order of the faces of a mesh for the vertex cache
+
+    Parameters
+    ----------
+    vertices : ndarray, shape (Nv, 3)
+        The vertex coordinates.
+    faces : ndarray, shape (Nf, 3)
+        The vertex indices of the faces.
+    cache_size : int
+        The number of vertices in the post-transform cache of the GPU.
+    overdraw : bool
+        Whether to also sort clusters of faces from the outside of the mesh
+        to its inside, so that the faces drawn first tend to hide the
+        others. The clusters are split where the order for the cache
+        reaches a dead end, so that the sort hardly changes the cache
+        misses.
+
+    Returns
+    -------
+    order : ndarray, shape (Nf,)
+        The indices of the faces, in drawing order.
+    """
+    vertices = np.asarray(vertices, np.float64)
+    faces = np.asarray(faces, np.intp)
+    if not len(faces):
+        return np.zeros(0, np.intp)
+    order, ends = _tipsify(faces, len(vertices), cache_size)
+    if not overdraw or not len(ends):
+        return order
+    # merge the clusters shorter than the cache, which would lose more of it
+    ends = ends[np.diff(np.concatenate(([0], ends))) >= cache_size]
+    cluster = np.zeros(len(order), np.intp)
+    cluster[ends] = 1
+    cluster = np.cumsum(cluster)
+    # sort the clusters by the position of their center along their normal,
+    # relative to the center of the mesh
+    tri = vertices[faces[order]]
+    normals = np.cross(tri[:, 1] - tri[:, 0], tri[:, 2] - tri[:, 0])
+    area = np.sqrt((normals ** 2).sum(axis=1))
+    centers = tri.mean(axis=1)
+    center = (centers * area[:, np.newaxis]).sum(axis=0) / area.sum()
+    weights = np.maximum(np.bincount(cluster, area), 1e-300)[:, np.newaxis]
+    c = np.column_stack([np.bincount(cluster, x * area)
+                         for x in centers.T]) / weights
+    n = np.column_stack([np.bincount(cluster, x) for x in normals.T])
+    key = ((c - center) * n).sum(axis=1)
+    key /= np.maximum(np.sqrt((n ** 2).sum(axis=1)), 1e-300)
+    position = np.empty(len(key), np.intp)
+    position[np.argsort(-key, kind='mergesort')] = np.arange(len(key))
+    return order[np.argsort(position[cluster], kind='mergesort')]
+
+
+def optimize_vertex_order(faces, n_vertices=None):
+    """Return an order of the vertices of a mesh for the vertex fetches
+
+    The vertices are ordered by their first use in *faces*, followed by the
+    unused vertices.
+
+    Parameters
+    ----------
+    faces : ndarray, shape (Nf, 3)
+        The vertex indices of the faces, in drawing order.
+    n_vertices : int | None
+        The number of vertices. Default is the largest index plus one.
+
+    Returns
+    -------
+    order : ndarray, shape (Nv,)
+        The indices of the vertices in their new order. The faces of the
+        reordered vertices are ``np.argsort(order)[faces]``.
+    """
+    flat = np.asarray(faces, np.intp).ravel()
+    if n_vertices is None:
+        n_vertices = int(flat.max()) + 1 if len(flat) else 0
+    first = np.empty(n_vertices, np.intp)
+    first.fill(len(flat))
+    used, index = np.unique(flat, return_index=True)
+    first[used] = index
+    return np.argsort(first, kind='mergesort')
@@ -6,7 +6,7 @@
 
 import numpy as np
 
-from .triangulation import Triangulation
+from .triangulation import tessellate
 
 
 class PolygonData(object):
@@ -114,21 +114,14 @@ class PolygonData(object):
         the convex hull in convex_hull.
         """
         npts = self._vertices.shape[0]
-        if np.any(self._vertices[0] != self._vertices[1]):
-            # start != end, so edges must wrap around to beginning.
-            edges = np.empty((npts, 2), dtype=np.uint32)
-            edges[:, 0] = np.arange(npts)
-            edges[:, 1] = edges[:, 0] + 1
-            edges[-1, 1] = 0
-        else:
-            # start == end; no wrapping required.
-            edges = np.empty((npts-1, 2), dtype=np.uint32)
-            edges[:, 0] = np.arange(npts)
-            edges[:, 1] = edges[:, 0] + 1
-
-        tri = Triangulation(self._vertices, edges)
-        tri.triangulate()
-        return tri.pts, tri.tris
+        # The outline wraps around to the beginning. If the last vertex
+        # repeats the first one, they are merged by the triangulation.
+        edges = np.empty((npts, 2), dtype=np.uint32)
+        edges[:, 0] = np.arange(npts)
+        edges[:, 1] = edges[:, 0] + 1
+        edges[-1, 1] = 0
+
+        return tessellate(self._vertices[:, :2], edges)
 
     def add_vertex(self, vertex):
         """
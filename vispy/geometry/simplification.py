@@ -0,0 +1,352 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2014, Vispy Development Team.
+# Distributed under the (new) BSD License. See LICENSE.txt for more info.
+
+"""
+Simplification of triangle meshes by quadric error edge collapses
+"""
+
+from __future__ import division
+
+import numpy as np
+
+# the quadrics are symmetric 4x4 matrices, stored as rows of the 10
+# coefficients of their upper triangle
+_TRIU = np.triu_indices(4)
+_TRIU_FACTOR = np.where(_TRIU[0] == _TRIU[1], 1., 2.)
+
+# the number of times the candidate collapses are chosen again without the
+# invalid ones
+_MATCHING_ROUNDS = 4
+
+# the fraction of the edges, of least error, among which the collapses of a
+# pass are chosen, unless none of them can be collapsed
+_ELIGIBLE = 0.25
+
+# the squared cosine of the largest rotation of a face by a collapse
+_MIN_COS2 = 0.25 ** 2
+
+
+def _plane_quadrics(normals, points, weights):
+    """ Quadrics (N, 10) of the squared distance to the planes of unit
+    *normals* through *points*, scaled by *weights*
+    """
+    p = np.empty((len(normals), 4))
+    p[:, :3] = normals
+    p[:, 3] = -(normals * points).sum(axis=1)
+    return p[:, _TRIU[0]] * p[:, _TRIU[1]] * weights[:, np.newaxis]
+
+
+def _quadric_error(quadrics, points):
+    """ The errors of the (N, 10) *quadrics* at the (N, 3) *points* """
+    h = np.empty((len(points), 4))
+    h[:, :3] = points
+    h[:, 3] = 1.
+    terms = h[:, _TRIU[0]] * h[:, _TRIU[1]] * _TRIU_FACTOR
+    return (quadrics * terms).sum(axis=1)
+
+
+def _face_normals(vertices, faces):
+    """ The normals of the faces, with the double of their area as size """
+    tri = vertices[faces]
+    return np.cross(tri[:, 1] - tri[:, 0], tri[:, 2] - tri[:, 0])
+
+
+def _edges(faces, n_vertices):
+    """ Sorted keys ``lo * n_vertices + hi`` of the edges of the faces,
+    the index in ``faces.ravel()`` of the first corner of one of their
+    half-edges, and the number of faces of each edge
+    """
+    a = faces.ravel()
+    b = faces[:, [1, 2, 0]].ravel()
+    keys = np.minimum(a, b) * n_vertices + np.maximum(a, b)
+    return np.unique(keys, return_index=True, return_counts=True)
+
+
+def _vertex_quadrics(vertices, faces, boundary_weight):
+    """ The sum of the quadrics of the faces of each vertex, and of the
+    planes orthogonal to the faces through the open boundaries
+    """
+    n_v = len(vertices)
+    normals = _face_normals(vertices, faces)
+    size = np.sqrt((normals ** 2).sum(axis=1))
+    normals /= np.maximum(size, 1e-300)[:, np.newaxis]
+    # weight the faces by their area
+    quadrics = _plane_quadrics(normals, vertices[faces[:, 0]], size / 2.)
+    q = np.zeros((n_v, 10))
+    for corner in faces.T:
+        for k in range(10):
+            q[:, k] += np.bincount(corner, quadrics[:, k], minlength=n_v)
+
+    keys, first, counts = _edges(faces, n_v)
+    first = first[counts == 1]
+    if len(first):
+        a = faces.ravel()[first]
+        b = faces[:, [1, 2, 0]].ravel()[first]
+        edge = vertices[b] - vertices[a]
+        length2 = (edge ** 2).sum(axis=1)
+        side = np.cross(edge, normals[first // 3])
+        side /= np.maximum(np.sqrt((side ** 2).sum(axis=1)),
+                           1e-300)[:, np.newaxis]
+        quadrics = _plane_quadrics(side, vertices[a],
+                                   boundary_weight * length2)
+        for corner in (a, b):
+            for k in range(10):
+                q[:, k] += np.bincount(corner, quadrics[:, k], minlength=n_v)
+    return q
+
+
+def _invalid_collapses(vertices, faces, normals, keys, counts, boundary,
+                       keep, remove):
+    """ Whether the collapses of the vertices *remove* onto their neighbors
+    *keep*, which have no common vertices, would flip faces or make the
+    mesh non-manifold
+    """
+    n_v = len(vertices)
+    n_c = len(keep)
+    cid = np.empty(n_v, np.intp)
+    cid.fill(n_c)
+    cid[remove] = np.arange(n_c)
+    bad = np.zeros(n_c + 1, bool)
+
+    # the faces moved by a collapse must not flip, or turn too much
+    fcid = cid[faces]
+    for k in range(3):
+        c = fcid[:, k]
+        moved = c < n_c
+        # the faces of the collapsed edge disappear
+        moved[moved] = ~(faces[moved] == keep[c[moved], np.newaxis]).any(1)
+        c = c[moved]
+        new = faces[moved]
+        new[:, k] = keep[c]
+        old = normals[moved]
+        new = _face_normals(vertices, new)
+        dot = (old * new).sum(axis=1)
+        size2 = (old ** 2).sum(axis=1) * (new ** 2).sum(axis=1)
+        # degenerate faces may take any orientation
+        flip = (dot <= 0) | (dot ** 2 < _MIN_COS2 * size2)
+        bad[c[flip & (old != 0).any(axis=1)]] = True
+
+    # the vertices of a collapsed edge must only have the opposite vertices
+    # of its faces as common neighbors, and an inner edge must not join two
+    # boundary vertices
+    e0 = keys // n_v
+    e1 = keys % n_v
+    sel0 = cid[e0] < n_c
+    sel1 = cid[e1] < n_c
+    c = np.concatenate((cid[e0[sel0]], cid[e1[sel1]]))
+    w = np.concatenate((e1[sel0], e0[sel1]))
+    sel = w != keep[c]
+    c, w = c[sel], w[sel]
+    v = keep[c]
+    link = np.minimum(v, w) * n_v + np.maximum(v, w)
+    found = np.minimum(np.searchsorted(keys, link), len(keys) - 1)
+    common = np.bincount(c[keys[found] == link], minlength=n_c)
+    n_faces = counts[np.searchsorted(keys, np.minimum(keep, remove) * n_v +
+                                     np.maximum(keep, remove))]
+    bad[:n_c] |= ((common > n_faces) | (n_faces > 2) |
+                  ((n_faces == 2) & boundary[keep] & boundary[remove]))
+    return bad[:n_c]
+
+
+def _select_collapses(vertices, quadrics, faces, max_collapses, rng,
+                      fraction):
+    """ Choose up to *max_collapses* valid edge collapses among the
+    *fraction* of the edges of least error, which do not move the same
+    faces
+
+    Returns the arrays of the vertices to remove, and of the vertices they
+    are collapsed onto.
+    """
+    n_v = len(vertices)
+    keys, _, counts = _edges(faces, n_v)
+    e0 = keys // n_v
+    e1 = keys % n_v
+    boundary = np.zeros(n_v, bool)
+    boundary[e0[counts == 1]] = True
+    boundary[e1[counts == 1]] = True
+    # collapse each edge onto the vertex of least error
+    q = quadrics[e0] + quadrics[e1]
+    cost0 = _quadric_error(q, vertices[e0])
+    cost1 = _quadric_error(q, vertices[e1])
+    swap = cost1 < cost0
+    keep = np.where(swap, e1, e0)
+    remove = np.where(swap, e0, e1)
+    cost = np.where(swap, cost1, cost0)
+
+    # the candidates are those of the cheapest edges of least random
+    # priority at both their vertices, hence without common vertices.
+    # Invalid collapses are dropped, and the candidates of their vertices
+    # are chosen again.
+    n_eligible = max(int(len(keys) * fraction), 1)
+    valid = np.zeros(len(keys), bool)
+    valid[np.argpartition(cost, n_eligible - 1)[:n_eligible]] = True
+    order = np.flatnonzero(valid)
+    order = order[rng.permutation(len(order))]
+    rank = np.empty(len(keys), np.intp)
+    rank.fill(len(keys))
+    rank[order] = np.arange(len(order))
+    normals = _face_normals(vertices, faces)
+    checked = np.zeros(len(keys), bool)
+    for _ in range(_MATCHING_ROUNDS):
+        sel = order[valid[order]]
+        vertex, first = np.unique(np.column_stack((e0[sel], e1[sel])),
+                                  return_index=True)
+        best = np.empty(n_v, np.intp)
+        best.fill(-1)
+        best[vertex] = rank[sel[first // 2]]
+        cand = np.flatnonzero(valid & (best[e0] == rank) &
+                              (best[e1] == rank))
+        new = cand[~checked[cand]]
+        invalid = _invalid_collapses(vertices, faces, normals, keys, counts,
+                                     boundary, keep[new], remove[new])
+        checked[new] = True
+        valid[new[invalid]] = False
+        if not invalid.any():
+            break
+    cand = cand[valid[cand]]
+    cand = cand[np.argsort(cost[cand], kind='mergesort')]
+    keep, remove = keep[cand], remove[cand]
+
+    # the kept vertices do not move: of the collapses moving the same face,
+    # greedily do the cheapest
+    n_c = len(cand)
+    cid = np.empty(n_v, np.intp)
+    cid.fill(n_c)
+    cid[remove] = np.arange(n_c)
+    fcid = cid[faces]
+    fcid = fcid[(fcid < n_c).sum(axis=1) > 1]
+    state = np.zeros(n_c + 1, np.int8)  # 1 for done, -1 for not done
+    state[n_c] = -1
+    for _ in range(_MATCHING_ROUNDS):
+        fcid = fcid[(state[fcid] == 0).any(axis=1)]
+        if not len(fcid):
+            break
+        active = np.where(state[fcid] < 0, n_c, fcid)
+        low = active.min(axis=1)[:, np.newaxis]
+        blocked = np.zeros(n_c + 1, bool)
+        blocked[active[active > low]] = True
+        state[(state == 0) & ~blocked] = 1
+        undone = active[(active > low) & (state[low] == 1)]
+        state[undone[state[undone] == 0]] = -1
+    ok = np.flatnonzero(state[:n_c] == 1)[:max_collapses]
+    return remove[ok], keep[ok]
+
+
+class LODChain(object):
+    """Levels of detail of a triangle mesh
+
+    Each level is simplified from the previous one by collapsing the edges
+    of least quadric error [1] onto one of their vertices. Since no vertex
+    moves, a level is stored as a map of the vertices of the mesh to the
+    vertices that remain, and as the indices of the faces that remain. The
+    faces of all the levels index the vertices of the mesh, so that they
+    can share its vertex buffers.
+
+    Parameters
+    ----------
+    vertices : ndarray, shape (Nv, 3)
+        The vertex coordinates of the mesh, which may also be 2D.
+    faces : ndarray, shape (Nf, 3)
+        The vertex indices of the faces.
+    ratios : sequence of float
+        The decreasing fractions of the faces of the mesh kept by the levels.
+    boundary_weight : float
+        The weight of the error of moving open boundaries, relative to the
+        error of moving the faces.
+
+    Notes
+    -----
+    Rather than one edge at a time, the edges are collapsed in vectorized
+    passes, each collapsing independent edges among those of least error.
+    Collapses that would flip faces or make the mesh non-manifold are not
+    done, so that a level may keep more faces than requested.
+
+    References
+    ----------
+    [1] M. Garland and P. S. Heckbert. Surface simplification using quadric
+        error metrics. SIGGRAPH 1997.
+    """
+    def __init__(self, vertices, faces, ratios=(0.5, 0.25, 0.125, 0.0625),
+                 boundary_weight=100.):
+        vertices = np.asarray(vertices, np.float64)
+        if vertices.ndim != 2 or vertices.shape[1] not in (2, 3):
+            raise ValueError('vertices must have shape (Nv, 2) or (Nv, 3)')
+        if vertices.shape[1] == 2:
+            vertices = np.column_stack((vertices, np.zeros(len(vertices))))
+        faces = np.asarray(faces, np.intp)
+        if faces.ndim != 2 or faces.shape[1] != 3:
+            raise ValueError('faces must have shape (Nf, 3)')
+        self.ratios = tuple(float(r) for r in ratios)
+        if (any(not 0 < r <= 1 for r in self.ratios) or
+                list(self.ratios) != sorted(self.ratios, reverse=True)):
+            raise ValueError('ratios must decrease in (0, 1], not %r'
+                             % (ratios,))
+        self._faces = faces
+        self._levels = []
+
+        n_v = len(vertices)
+        quadrics = _vertex_quadrics(vertices, faces, boundary_weight)
+        rng = np.random.RandomState(0)
+        rep = np.arange(n_v)
+        index = np.arange(len(faces))
+        current = faces
+        for ratio in self.ratios:
+            target = int(round(ratio * len(faces)))
+            while len(current) > target:
+                # most collapses remove two faces
+                n = (len(current) - target + 1) // 2
+                for fraction in (_ELIGIBLE, 1.):
+                    remove, keep = _select_collapses(
+                        vertices, quadrics, current, n, rng, fraction)
+                    if len(remove):
+                        break
+                else:
+                    break
+                quadrics[keep] += quadrics[remove]
+                remap = np.arange(n_v)
+                remap[remove] = keep
+                rep = remap[rep]
+                current = remap[current]
+                good = ((current[:, 0] != current[:, 1]) &
+                        (current[:, 1] != current[:, 2]) &
+                        (current[:, 2] != current[:, 0]))
+                current = current[good]
+                index = index[good]
+            self._levels.append((rep.astype(np.uint32),
+                                 index.astype(np.uint32)))
+
+    @property
+    def n_levels(self):
+        """ The number of levels """
+        return len(self._levels)
+
+    def get_remap(self, level):
+        """ Array (Nv,) mapping each vertex of the mesh to the vertex that
+        replaces it in *level*
+        """
+        return self._levels[level][0]
+
+    def get_face_index(self, level):
+        """ The indices of the faces of the mesh that remain in *level* """
+        return self._levels[level][1]
+
+    def get_faces(self, level):
+        """ Array (Nf, 3) of the faces of *level*, as indices into the
+        vertices of the mesh
+        """
+        rep, index = self._levels[level]
+        return rep[self._faces[index]]
+
+    def get_n_faces(self, level):
+        """ The number of faces of *level* """
+        return len(self._levels[level][1])
+
+    def select(self, max_faces):
+        """ Return the finest level with at most *max_faces* faces, or the
+        coarsest level if they all have more
+        """
+        for level in range(self.n_levels):
+            if self.get_n_faces(level) <= max_faces:
+                return level
+        return self.n_levels - 1
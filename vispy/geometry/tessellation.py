@@ -0,0 +1,193 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2014, Vispy Development Team.
+# Distributed under the (new) BSD License. See LICENSE.txt for more info.
+
+"""
+Content-addressed cache of polygon tessellations
+
+The triangulation of a polygon only depends on its vertices and edges, so
+it is stored under a hash of their bytes. Visuals that are updated with the
+same geometry (e.g. to change its color) then get their triangles from
+the cache instead of triangulating again. The cache is bounded by the
+memory of the arrays it holds, and drops the least recently used ones
+first. It can also store the tessellations in a directory, where they
+persist between sessions.
+"""
+
+import os
+import hashlib
+import threading
+
+import numpy as np
+
+from ..ext.ordereddict import OrderedDict
+from ..util import logger
+
+_VERSION = 1  # of the key, to be changed with the triangulation algorithm
+
+
+class TessellationCache(object):
+    """Cache of polygon tessellations, keyed by the hash of the polygons
+
+    The cache is thread-safe.
+
+    Parameters
+    ----------
+    max_bytes : int
+        The maximum memory of the vertices and triangles held by the cache.
+    directory : str | None
+        The directory where the tessellations are also stored, as ``.npz``
+        files. If None, they are only kept in memory.
+    """
+
+    def __init__(self, max_bytes=64 * 2**20, directory=None):
+        self._entries = OrderedDict()  # the most recently used is last
+        self._nbytes = 0
+        self._lock = threading.Lock()
+        self.max_bytes = max_bytes
+        self.directory = directory
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, key):
+        return key in self._entries
+
+    @property
+    def max_bytes(self):
+        """ The maximum memory of the arrays held by the cache """
+        return self._max_bytes
+
+    @max_bytes.setter
+    def max_bytes(self, max_bytes):
+        self._max_bytes = int(max_bytes)
+        with self._lock:
+            self._evict()
+
+    @property
+    def nbytes(self):
+        """ The memory of the arrays held by the cache """
+        return self._nbytes
+
+    @staticmethod
+    def key(vertices, edges):
+        """Return the key of a polygon
+
+        Parameters
+        ----------
+        vertices : ndarray, shape (Nv, 2)
+            The vertices of the polygon.
+        edges : ndarray
+            The vertex indices of the edges of the polygon.
+
+        Returns
+        -------
+        key : str
+            The hexadecimal SHA-1 hash of the dtype, shape and bytes of the
+            vertices and edges.
+        """
+        vertices = np.ascontiguousarray(vertices)
+        edges = np.ascontiguousarray(edges, np.int64)
+        digest = hashlib.sha1(('%d %s %s %s' % (
+            _VERSION, vertices.dtype.str, vertices.shape,
+            edges.shape)).encode('ascii'))
+        digest.update(vertices.data)
+        digest.update(edges.data)
+        return digest.hexdigest()
+
+    def get(self, key):
+        """Return the tessellation of a key, or None
+
+        The tessellation is looked for in memory, then in the directory.
+
+        Parameters
+        ----------
+        key : str
+            The key of the polygon.
+
+        Returns
+        -------
+        tessellation : tuple | None
+            The (vertices, triangles) arrays. They must not be modified.
+        """
+        with self._lock:
+            entry = self._entries.pop(key, None)
+            if entry is not None:
+                self._entries[key] = entry
+                return entry
+        if self.directory is None:
+            return None
+        fname = os.path.join(self.directory, key + '.npz')
+        if not os.path.isfile(fname):
+            return None
+        try:
+            with np.load(fname) as data:
+                entry = data['vertices'], data['triangles']
+        except Exception as exp:
+            logger.debug('Could not read tessellation %s: %s' % (fname, exp))
+            return None
+        self._store(key, entry)
+        return entry
+
+    def put(self, key, vertices, triangles):
+        """Add the tessellation of a polygon
+
+        Parameters
+        ----------
+        key : str
+            The key of the polygon.
+        vertices : ndarray, shape (Nv, 2)
+            The vertices of the triangles, which may include vertices added
+            by the triangulation.
+        triangles : ndarray, shape (Nt, 3)
+            The vertex indices of the triangles.
+        """
+        entry = (np.asarray(vertices), np.asarray(triangles))
+        self._store(key, entry)
+        if self.directory is None:
+            return
+        fname = os.path.join(self.directory, key + '.npz')
+        if os.path.isfile(fname):
+            return
+        # write to a temporary file first, so that others never read a
+        # partial file
+        temp = '%s.%d.%d.tmp' % (fname, os.getpid(),
+                                 threading.current_thread().ident)
+        try:
+            if not os.path.isdir(self.directory):
+                os.makedirs(self.directory)
+            with open(temp, 'wb') as f:
+                np.savez(f, vertices=entry[0], triangles=entry[1])
+            os.rename(temp, fname)
+        except (IOError, OSError) as exp:
+            if os.path.isfile(temp):
+                os.remove(temp)
+            if not os.path.isfile(fname):
+                logger.warning('Could not write tessellation %s: %s'
+                               % (fname, exp))
+
+    def clear(self):
+        """ Remove all tessellations from memory (not from the directory)
+        """
+        with self._lock:
+            self._entries.clear()
+            self._nbytes = 0
+
+    def _store(self, key, entry):
+        nbytes = entry[0].nbytes + entry[1].nbytes
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._nbytes -= old[0].nbytes + old[1].nbytes
+            if nbytes <= self._max_bytes:
+                self._entries[key] = entry
+                self._nbytes += nbytes
+                self._evict()
+
+    def _evict(self):
+        while self._nbytes > self._max_bytes:
+            _, entry = self._entries.popitem(last=False)
+            self._nbytes -= entry[0].nbytes + entry[1].nbytes
+
+
+tessellation_cache = TessellationCache()
@@ -0,0 +1,137 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2014, Vispy Development Team.
+# Distributed under the (new) BSD License. See LICENSE.txt for more info.
+
+import numpy as np
+from numpy.testing import assert_allclose, assert_array_equal
+
+from vispy.geometry import (PolygonData, triangulate, triangulate_polygons,
+                            tessellation_cache)
+from vispy.geometry import triangulation
+from vispy.geometry.delaunay import constrained_delaunay
+from vispy.geometry.triangulation import Triangulation
+from vispy.testing import run_tests_if_main, assert_equal, assert_raises
+
+
+def _ring(n, offset=0):
+    return np.column_stack((np.arange(n), (np.arange(n) + 1) % n)) + offset
+
+
+def _areas(pts, tris):
+    p = pts[tris]
+    return 0.5 * ((p[:, 1, 0] - p[:, 0, 0]) * (p[:, 2, 1] - p[:, 0, 1]) -
+                  (p[:, 1, 1] - p[:, 0, 1]) * (p[:, 2, 0] - p[:, 0, 0]))
+
+
+def _polygon_area(pts):
+    x, y = pts[:, 0], pts[:, 1]
+    return 0.5 * abs((x * np.roll(y, -1) - np.roll(x, -1) * y).sum())
+
+
+def _edges(tris):
+    return set((min(a, b), max(a, b)) for t in tris.tolist()
+               for a, b in zip(t, t[1:] + t[:1]))
+
+
+def _check(pts, edges, tris, area):
+    """ Counterclockwise triangles with the given area, and the edges """
+    areas = _areas(pts, tris)
+    assert_equal((areas > 0).all(), True)
+    assert_allclose(areas.sum(), area)
+    assert_equal(set(map(tuple, np.sort(edges, axis=1).tolist())) <=
+                 _edges(tris), True)
+
+
+def _star(n, seed=0):
+    rng = np.random.RandomState(seed)
+    theta = np.sort(rng.uniform(0, 2 * np.pi, n))
+    r = rng.uniform(0.5, 1, n)
+    return np.column_stack((r * np.cos(theta), r * np.sin(theta)))
+
+
+def test_constrained_delaunay():
+    """Test the constrained Delaunay triangulation of polygons"""
+    square = np.array([[0, 0], [1, 0], [1, 1], [0, 1.]])
+    tris = constrained_delaunay(square, _ring(4))
+    _check(square, _ring(4), tris, 1.)
+    assert_equal(tris.shape, (2, 3))
+
+    # concave polygons, whose edges are not Delaunay edges
+    for n in (10, 300):
+        pts = _star(n)
+        _check(pts, _ring(n), constrained_delaunay(pts, _ring(n)),
+               _polygon_area(pts))
+
+    # a hole, with collinear points on the outline
+    outer = np.array([[0, 0], [1, 0], [2, 0], [3, 0], [3, 1], [3, 2],
+                      [3, 3], [2, 3], [1, 3], [0, 3], [0, 2], [0, 1.]])
+    hole = np.array([[1, 1], [2, 1], [2, 2], [1, 2.]])
+    pts = np.concatenate((outer, hole))
+    edges = np.concatenate((_ring(12), _ring(4, 12)))
+    _check(pts, edges, constrained_delaunay(pts, edges), 8.)
+
+    # cocircular points, whose predicates are all degenerate
+    theta = np.linspace(0, 2 * np.pi, 200, endpoint=False)
+    pts = np.column_stack((np.cos(theta), np.sin(theta)))
+    tris = constrained_delaunay(pts, _ring(200))
+    _check(pts, _ring(200), tris, _polygon_area(pts))
+    assert_equal(len(tris), 198)
+
+    # an edge through a point is split there, and duplicates are merged
+    pts = np.array([[0, 0], [2, 0], [2, 2], [0, 2], [1, 0], [2, 2.]])
+    edges = np.array([[0, 1], [1, 5], [2, 3], [3, 0]])
+    tris = constrained_delaunay(pts, edges)
+    _check(pts, [[0, 4], [4, 1], [1, 2]], tris, 4.)
+    assert_equal(5 in tris, False)
+
+    assert_equal(constrained_delaunay(square[:2], [[0, 1]]).shape, (0, 3))
+
+
+def test_compare_sweep():
+    """Test the triangulation against the sweep-line Triangulation"""
+    rng = np.random.RandomState(0)
+    for i in range(5):
+        # self-intersecting polygons are filled by the even-odd rule
+        pts = rng.normal(size=(10, 3))
+        t = Triangulation(pts, _ring(10))
+        t.triangulate()
+        vertices, tris = triangulate(pts)
+        assert_allclose(vertices[:, 2], pts[:, 2].mean())
+        assert_allclose(np.abs(_areas(vertices, tris)).sum(),
+                        np.abs(_areas(t.pts, t.tris)).sum(), rtol=1e-5)
+
+
+def test_polygon_data():
+    """Test the triangulation of PolygonData"""
+    pts = _star(50)
+    for closed in (False, True):
+        vertices = np.concatenate((pts, pts[:1])) if closed else pts
+        vertices, tris = PolygonData(vertices=vertices).triangulate()
+        assert_equal(len(vertices), 50)
+        _check(vertices, _ring(50), tris, _polygon_area(pts))
+
+
+def test_triangulate_polygons():
+    """Test the parallel triangulation of polygons"""
+    polygons = [np.column_stack((_star(n, n), np.ones(n) * n))
+                for n in (20, 30, 40)]
+    expected = [triangulate(p) for p in polygons]
+    size = triangulation._PARALLEL_SIZE
+    try:
+        for parallel_size in (size, 0):
+            triangulation._PARALLEL_SIZE = parallel_size
+            for n in (1, 2):
+                tessellation_cache.clear()
+                results = triangulate_polygons(polygons, n, n)
+                assert_equal(len(results), 3)
+                for (v1, t1), (v2, t2) in zip(results, expected):
+                    assert_array_equal(v1, v2)
+                    assert_array_equal(t1, t2)
+                assert_equal(len(tessellation_cache), 3)
+    finally:
+        triangulation._PARALLEL_SIZE = size
+    assert_equal(triangulate_polygons([]), [])
+    assert_raises(IndexError, triangulate_polygons, [np.zeros((3, 2))])
+
+
+run_tests_if_main()
@@ -0,0 +1,96 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2014, Vispy Development Team.
+# Distributed under the (new) BSD License. See LICENSE.txt for more info.
+
+import numpy as np
+from numpy.testing import assert_allclose, assert_array_equal
+
+from vispy.geometry.isocurve import isocurve, TiledIsocurve
+from vispy.testing import run_tests_if_main, assert_equal, assert_raises
+
+
+def _circle(shape=(40, 50), center=(19.5, 24.5)):
+    i, j = np.ogrid[:shape[0], :shape[1]]
+    return np.sqrt((i - center[0]) ** 2 + (j - center[1]) ** 2)
+
+
+def _sorted_segments(pos):
+    """ Segments as sorted rows, for comparisons regardless of order """
+    seg = np.asarray(pos, np.float32).reshape(-1, 4)
+    return seg[np.lexsort(seg.T[::-1])]
+
+
+def test_isocurve():
+    """Test marching squares on a circle"""
+    data = _circle()
+    segs = np.array(isocurve(data, 10.))
+    assert_equal(segs.shape[1:], (2, 2))
+    # points lie on the circle (data values are at pixel centers)
+    radius = np.sqrt(((segs - (20., 25.)) ** 2).sum(axis=-1))
+    assert_allclose(radius, 10., atol=0.1)
+    # one closed line
+    lines = isocurve(data, 10., connected=True)
+    assert_equal(len(lines), 1)
+    assert_equal(len(lines[0]), len(segs) + 1)
+    assert_equal(lines[0][0], lines[0][-1])
+    # open lines end at the edges of the data
+    lines = isocurve(data, 30., connected=True, extend_to_edge=True)
+    assert_equal(len(lines), 4)
+    for line in lines:
+        for p in (line[0], line[-1]):
+            assert_equal(p[0] in (0, 40) or p[1] in (0, 50), True)
+    assert_equal(isocurve(data, 100.), [])
+    assert_raises(ValueError, isocurve, data[0], 1.)
+
+
+def test_tiled_isocurve():
+    """Test multi-level tiled isocurves"""
+    np.random.seed(0)
+    data = _circle() + np.random.uniform(0, 1, (40, 50))
+    levels = [12., 5., 8.5]
+    ref = TiledIsocurve(data, levels, tile_shape=(100, 100)).segments()
+    for i, level in enumerate(levels):
+        # each level gives the same segments as alone
+        assert_array_equal(_sorted_segments(ref[0][ref[1] == i]),
+                           _sorted_segments(isocurve(data, level)))
+    for extend in (False, True):
+        ref = TiledIsocurve(data, levels, tile_shape=(100, 100),
+                            extend_to_edge=extend).segments()
+        for tile_shape in ((7, 9), (1, 50), (16, 16)):
+            pos, index = TiledIsocurve(data, levels, tile_shape,
+                                       extend).segments()
+            assert_equal(pos.dtype, np.float32)
+            for i in range(3):
+                assert_array_equal(_sorted_segments(pos[index == i]),
+                                   _sorted_segments(ref[0][ref[1] == i]))
+
+
+def test_tiled_isocurve_updates():
+    """Test that only the affected tiles and levels are extracted"""
+    data = _circle()
+    iso = TiledIsocurve(data, [5.], tile_shape=(10, 10),
+                        extend_to_edge=True)
+    iso.segments()
+    cache = [c[1] for c in iso._cache]
+    segs = [c.get(5.) for c in cache]
+    # a new level does not extract the first one again
+    iso.set_levels([5., 10.])
+    pos, index = iso.segments()
+    assert_equal([c[1] for c in iso._cache], cache)
+    assert_equal([c.get(5.) for c in cache], segs)
+    assert_equal(sorted(set(index.tolist())), [0, 1])
+    # a change of data only affects the tiles that read it
+    data = data.copy()
+    data[10:12, 30] = 0.
+    iso.set_data(data, ((10, 12), (30, 31)))
+    changed = [i for i, c in enumerate(iso._cache) if c is None]
+    # the extended grid is shifted by one: tile (1, 3) reads data rows
+    # 9 to 19 and columns 29 to 39
+    assert_equal(changed, [9])
+    pos, index = iso.segments()
+    ref = TiledIsocurve(data, [5., 10.], extend_to_edge=True).segments()
+    assert_array_equal(_sorted_segments(pos), _sorted_segments(ref[0]))
+    assert_raises(ValueError, iso.set_data, data[1:], ((0, 1), (0, 1)))
+
+
+run_tests_if_main()
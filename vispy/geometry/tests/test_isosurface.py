@@ -0,0 +1,103 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2014, Vispy Development Team.
+# Distributed under the (new) BSD License. See LICENSE.txt for more info.
+
+import numpy as np
+from numpy.testing import assert_array_equal, assert_allclose
+
+from vispy.geometry.isosurface import (isosurface, ChunkedIsosurface,
+                                       _get_data_cache)
+from vispy.testing import run_tests_if_main, assert_equal, assert_raises
+
+
+def _sphere(shape=(30, 25, 20)):
+    z, y, x = np.ogrid[:shape[0], :shape[1], :shape[2]]
+    return np.sqrt((z - 14.) ** 2 + (y - 12.) ** 2 + (x - 9.5) ** 2)
+
+
+def _interp(data, verts):
+    """ Value of the data at vertices lying on the edges of the grid """
+    i0 = np.floor(verts).astype(int)
+    i1 = np.minimum(np.ceil(verts).astype(int), np.array(data.shape) - 1)
+    f = (verts - i0).max(axis=1)
+    v0 = data[i0[:, 0], i0[:, 1], i0[:, 2]]
+    v1 = data[i1[:, 0], i1[:, 1], i1[:, 2]]
+    return v0 + (v1 - v0) * f
+
+
+def test_isosurface():
+    """Test marching cubes on a sphere"""
+    # the triangles of each cell use exactly the edges that are cut
+    tri_table, edge_shifts, edge_table, n_table_faces = _get_data_cache()
+    for i in range(256):
+        edges = tri_table[i, :n_table_faces[i]].ravel()
+        assert_equal(np.bitwise_or.reduce(1 << edges.astype(int))
+                     if len(edges) else 0, edge_table[i])
+
+    data = _sphere()
+    verts, faces = isosurface(data, 8.)
+    assert_equal(verts.dtype, np.float32)
+    assert_equal(faces.dtype, np.uint32)
+    assert_allclose(_interp(data, verts), 8., atol=1e-4)
+    # the surface is closed and welded: each edge is shared by two faces
+    edges = np.sort(faces[:, [0, 1, 1, 2, 2, 0]].reshape(-1, 2), axis=1)
+    _, counts = np.unique(edges[:, 0] * len(verts) + edges[:, 1],
+                          return_counts=True)
+    assert_equal(np.all(counts == 2), True)
+    assert_equal(len(np.unique(faces)), len(verts))
+    # normals follow the winding of the faces, towards lower values
+    verts, faces, normals = isosurface(data, 8., compute_normals=True)
+    radial = verts - (14., 12., 9.5)
+    assert_equal(np.all((normals * radial).sum(axis=1) < 0), True)
+    assert_allclose((normals ** 2).sum(axis=1), 1., atol=1e-5)
+
+    # integer data, and no surface
+    v, f = isosurface(np.round(data * 10).astype(np.uint8), 80)
+    assert_allclose(v, isosurface(np.round(data * 10), 80)[0])
+    v, f = isosurface(data, 100.)
+    assert_equal((v.shape, f.shape), ((0, 3), (0, 3)))
+    assert_raises(ValueError, isosurface, data[0], 1.)
+
+
+def test_isosurface_chunks():
+    """Test that chunked extraction gives the same mesh"""
+    np.random.seed(0)
+    data = _sphere() + np.random.uniform(0, 2, (30, 25, 20))
+    ref = isosurface(data, 8., chunk_size=100)
+    for chunk_size in (1, 2, 7):
+        for n_threads in (1, 3):
+            v, f = isosurface(data, 8., chunk_size, n_threads)
+            assert_array_equal(v, ref[0])
+            assert_array_equal(f, ref[1])
+    # non-contiguous data
+    v, f = isosurface(np.asfortranarray(data), 8., chunk_size=4)
+    assert_array_equal(v, ref[0])
+
+
+def test_chunked_isosurface_updates():
+    """Test that only the affected slabs are extracted again"""
+    data = _sphere()
+    iso = ChunkedIsosurface(data, chunk_size=4)
+    assert_equal(len(iso._slabs), 8)
+    v, f = iso.extract(3.)
+    keys = [r[1] for r in iso._results]
+    # a level change re-extracts the slabs that have surface
+    v, f = iso.extract(4.)
+    assert_array_equal(v, isosurface(data, 4.)[0])
+    same = [r[1] is k for r, k in zip(iso._results, keys)]
+    assert_equal(same, [True, True, False, False, False, True, True, True])
+    # a data change only affects the slabs that read it
+    keys = [r[1] for r in iso._results]
+    data = data.copy()
+    data[13:15, 5:10, 5:10] = 0.
+    iso.set_data(data, zrange=(13, 15))
+    v, f = iso.extract(4.)
+    ref = isosurface(data, 4.)
+    assert_array_equal(v, ref[0])
+    assert_array_equal(f, ref[1])
+    same = [r[1] is k for r, k in zip(iso._results, keys)]
+    assert_equal(same, [True, True, True, False, True, True, True, True])
+    assert_raises(ValueError, iso.set_data, data[1:], (0, 1))
+
+
+run_tests_if_main()
@@ -3,9 +3,10 @@
 # Distributed under the (new) BSD License. See LICENSE.txt for more info.
 
 import numpy as np
-from numpy.testing import assert_array_equal
+from numpy.testing import assert_array_equal, assert_allclose
 
-from vispy.testing import run_tests_if_main
+from vispy.testing import run_tests_if_main, assert_equal
+from vispy.geometry import create_sphere
 from vispy.geometry.meshdata import MeshData
 
 
@@ -31,4 +32,46 @@ def test_meshdata():
     assert_array_equal(square_edges, mesh.get_edges())
 
 
+def test_meshdata_welding():
+    """Test welding of face-indexed vertices and vertex adjacency"""
+    sphere = create_sphere(10, 12, radius=2.)
+    verts, faces = sphere.get_vertices(), sphere.get_faces()
+    mesh = MeshData(vertices=verts[faces])
+    assert_equal(mesh.n_vertices, len(verts))
+    # vertices are numbered in order of first appearance
+    first = np.unique(faces.ravel(), return_index=True)[1]
+    order = faces.ravel()[np.sort(first)]
+    assert_array_equal(mesh.get_vertices(), verts[order])
+    assert_array_equal(mesh.get_vertices()[mesh.get_faces()], verts[faces])
+    assert_equal(mesh.get_faces().dtype, np.uint32)
+    # -0. and 0. are the same vertex
+    v = np.array([[[0., 0, 0], [1, 0, 0], [0, 1, 0]],
+                  [[-0., 0, 0], [0, 1, 0], [0, 0, 1]]])
+    assert_equal(MeshData(vertices=v).n_vertices, 4)
+
+    # adjacency in compressed sparse row format
+    offsets, vfaces = mesh.get_vertex_faces(csr=True)
+    assert_equal(len(offsets), mesh.n_vertices + 1)
+    lists = mesh.get_vertex_faces()
+    for i, f in enumerate(mesh.get_faces()):
+        for vi in f:
+            assert_equal(i in vfaces[offsets[vi]:offsets[vi + 1]], True)
+    assert_equal(sum(len(f) for f in lists), 3 * mesh.n_faces)
+    assert_array_equal(lists[5], vfaces[offsets[5]:offsets[6]])
+    # vertex normals of a sphere point outward
+    normals = mesh.get_vertex_normals()
+    assert_allclose(normals, mesh.get_vertices() / 2., atol=0.05)
+
+    # caches follow the data
+    mesh.set_vertices(mesh.get_vertices() * 2)
+    assert_equal(mesh.get_vertex_faces(csr=True)[0] is offsets, True)
+    assert_allclose(mesh.get_vertex_normals(), normals, atol=1e-6)
+    mesh.set_faces(mesh.get_faces()[:10])
+    assert_equal(len(mesh.get_vertex_faces(csr=True)[1]), 30)
+    mesh.set_vertices(v, indexed='faces')
+    assert_equal(mesh.n_vertices, 4)
+    assert_equal(len(mesh.get_vertex_faces()), 4)
+    assert_equal(mesh.get_edges().shape, (5, 2))
+
+
 run_tests_if_main()
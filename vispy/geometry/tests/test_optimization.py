@@ -0,0 +1,85 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2014, Vispy Development Team.
+# Distributed under the (new) BSD License. See LICENSE.txt for more info.
+
+import numpy as np
+from numpy.testing import assert_array_equal
+
+from vispy.geometry import create_sphere
+from vispy.geometry.optimization import (simulate_vertex_cache,
+                                         optimize_face_order,
+                                         optimize_vertex_order)
+from vispy.testing import run_tests_if_main, assert_equal
+
+
+def _shuffled_sphere():
+    md = create_sphere(30, 40)
+    faces = md.get_faces()
+    rng = np.random.RandomState(0)
+    return md.get_vertices(), faces[rng.permutation(len(faces))]
+
+
+def test_simulate_vertex_cache():
+    """Test the FIFO vertex cache simulation"""
+    assert_equal(simulate_vertex_cache([[0, 1, 2]]), 3.)
+    assert_equal(simulate_vertex_cache([[0, 1, 2], [2, 1, 3]]), 2.)
+    faces = [[0, 1, 2], [3, 4, 5], [0, 1, 2]]
+    assert_equal(simulate_vertex_cache(faces, cache_size=6), 2.)
+    # first in first out: 0, 1, 2 were evicted by 3, 4, 5
+    assert_equal(simulate_vertex_cache(faces, cache_size=3), 3.)
+    assert_equal(simulate_vertex_cache(np.zeros((0, 3), int)), 0.)
+
+
+def test_optimize_face_order():
+    """Test the reordering of faces for the vertex cache"""
+    vertices, faces = _shuffled_sphere()
+    before = simulate_vertex_cache(faces)
+    assert_equal(before > 2.5, True)
+    for overdraw in (False, True):
+        order = optimize_face_order(vertices, faces, overdraw=overdraw)
+        assert_array_equal(np.sort(order), np.arange(len(faces)))
+        assert_equal(simulate_vertex_cache(faces[order]) < 0.8, True)
+    assert_equal(len(optimize_face_order(vertices, faces[:0])), 0)
+
+
+def test_optimize_vertex_order():
+    """Test the reordering of vertices by first use"""
+    faces = np.array([[3, 1, 4], [1, 5, 4]])
+    order = optimize_vertex_order(faces, 7)
+    assert_array_equal(order, [3, 1, 4, 5, 0, 2, 6])
+    assert_array_equal(np.argsort(order)[faces], [[0, 1, 2], [1, 3, 2]])
+    assert_array_equal(optimize_vertex_order(faces), [3, 1, 4, 5, 0, 2])
+
+
+def test_meshdata_optimize():
+    """Test the reordering of mesh data"""
+    vertices, faces = _shuffled_sphere()
+    rng = np.random.RandomState(1)
+    for indexed in (None, 'faces'):
+        vertex_colors = rng.rand(len(vertices), 4)
+        face_colors = rng.rand(len(faces), 4)
+        md = create_sphere(2, 3)
+        if indexed is None:
+            md.set_vertices(vertices)
+            md.set_faces(faces)
+            md.set_vertex_colors(vertex_colors)
+        else:
+            md.set_vertices(vertices[faces], indexed='faces')
+            md.set_vertex_colors(vertex_colors[faces], indexed='faces')
+        md.set_face_colors(face_colors)
+        before, after = md.optimize()
+        assert_equal(after < 0.8 < before, True)
+        # the same triangles, with the same colors
+        ref = np.concatenate((vertices[faces].reshape(-1, 9),
+                              vertex_colors[faces].reshape(-1, 12),
+                              face_colors), axis=1)
+        new = np.concatenate((
+            md.get_vertices(indexed='faces').reshape(-1, 9),
+            md.get_vertex_colors(indexed='faces').reshape(-1, 12),
+            md.get_face_colors()), axis=1)
+        assert_array_equal(np.sort(new.view([('', new.dtype)] * 25), 0),
+                           np.sort(ref.view([('', ref.dtype)] * 25), 0))
+        assert_equal(md.has_face_indexed_data(), False)
+
+
+run_tests_if_main()
@@ -0,0 +1,109 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2014, Vispy Development Team.
+# Distributed under the (new) BSD License. See LICENSE.txt for more info.
+
+import numpy as np
+from numpy.testing import assert_array_equal, assert_allclose
+
+from vispy.geometry import create_sphere
+from vispy.geometry.simplification import LODChain
+from vispy.testing import run_tests_if_main, assert_equal, assert_raises
+
+
+def _grid(n=30):
+    """ A flat open square of (n - 1) ** 2 quads """
+    i = np.arange(n * n).reshape(n, n)[:-1, :-1].ravel()
+    faces = np.concatenate((np.column_stack((i, i + 1, i + n)),
+                            np.column_stack((i + 1, i + n + 1, i + n))))
+    y, x = np.mgrid[:n, :n]
+    vertices = np.column_stack((x.ravel(), y.ravel(), np.zeros(n * n)))
+    return vertices, faces
+
+
+def _normals(vertices, faces):
+    tri = vertices[faces]
+    return np.cross(tri[:, 1] - tri[:, 0], tri[:, 2] - tri[:, 0])
+
+
+def _edge_counts(faces):
+    a = faces.ravel().astype(np.int64)
+    b = faces[:, [1, 2, 0]].ravel()
+    _, counts = np.unique(np.minimum(a, b) * len(a) + np.maximum(a, b),
+                          return_counts=True)
+    return np.bincount(counts)
+
+
+def test_lod_chain():
+    """Test the levels of detail of a closed mesh"""
+    md = create_sphere(20, 40)
+    vertices, faces = md.get_vertices(), md.get_faces()
+    ratios = (0.5, 0.2, 0.05)
+    chain = LODChain(vertices, faces, ratios)
+    assert_equal(chain.ratios, ratios)
+    assert_equal(chain.n_levels, 3)
+    for level, ratio in enumerate(ratios):
+        lod = chain.get_faces(level)
+        assert_equal(len(lod), int(round(ratio * len(faces))))
+        assert_equal(chain.get_n_faces(level), len(lod))
+        # the faces index the vertices that remain
+        remap = chain.get_remap(level)
+        assert_array_equal(remap[remap], remap)
+        assert_array_equal(
+            lod, remap[faces[chain.get_face_index(level)]])
+        assert_equal(np.in1d(lod, remap).all(), True)
+        # the surface stays closed and manifold
+        assert_equal(_edge_counts(lod)[1:].tolist(),
+                     [0, len(lod) * 3 // 2])
+        # and close to the sphere (the centers of the faces of an
+        # icosahedron are at 0.79)
+        radius = np.sqrt((vertices[lod].mean(axis=1) ** 2).sum(axis=1))
+        assert_equal(radius.min() > 0.85, True)
+    assert_equal(chain.select(len(faces)), 0)
+    assert_equal(chain.select(len(faces) // 4), 1)
+    assert_equal(chain.select(1), 2)
+
+
+def test_lod_chain_boundary():
+    """Test that simplification keeps the boundaries of open meshes"""
+    vertices, faces = _grid()
+    area = _normals(vertices, faces)[:, 2].sum()
+    chain = LODChain(vertices[:, :2], faces, (0.5, 0.1))
+    for level in range(2):
+        # no face flipped, and the square is still covered
+        normals = _normals(vertices, chain.get_faces(level))
+        assert_equal((normals[:, 2] > 0).all(), True)
+        assert_allclose(normals[:, 2].sum(), area)
+    assert_equal(chain.get_n_faces(1) < len(faces) / 9., True)
+    assert_raises(ValueError, LODChain, vertices, faces, (0.5, 0.8))
+    assert_raises(ValueError, LODChain, vertices, faces, (0,))
+    assert_raises(ValueError, LODChain, vertices[:, :1], faces)
+    assert_raises(ValueError, LODChain, vertices, faces[:, :2])
+
+
+def test_meshdata_lod():
+    """Test the levels of detail of mesh data"""
+    md = create_sphere(10, 20)
+    colors = np.random.RandomState(0).rand(md.n_faces, 4)
+    md.set_face_colors(colors)
+    chain = md.get_lod_chain()
+    assert_equal(md.get_lod_chain() is chain, True)
+    lod = md.get_lod(1)
+    assert_equal(md.get_lod(1) is lod, True)
+    assert_equal(lod.n_faces, chain.get_n_faces(1))
+    assert_equal(lod.get_vertices() is md.get_vertices(), True)
+    assert_array_equal(lod.get_face_colors(),
+                       colors[chain.get_face_index(1)])
+    # other ratios replace the chain, which is then used by default
+    chain = md.get_lod_chain((0.3,))
+    assert_equal(md.get_lod_chain() is chain, True)
+    # changes of the mesh are followed
+    md.set_vertices(md.get_vertices() * 2)
+    assert_equal(md.get_lod_chain() is chain, False)
+    md.set_face_colors(colors[::-1])
+    assert_array_equal(md.get_lod(0).get_face_colors(),
+                       colors[::-1][md.get_lod_chain().get_face_index(0)])
+    simple = md.simplify(0.3)
+    assert_array_equal(simple.get_faces(), md.get_lod(0).get_faces())
+
+
+run_tests_if_main()
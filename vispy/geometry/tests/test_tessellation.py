@@ -0,0 +1,90 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2014, Vispy Development Team.
+# Distributed under the (new) BSD License. See LICENSE.txt for more info.
+
+import os.path as op
+
+import numpy as np
+from numpy.testing import assert_array_equal
+
+from vispy.geometry import (PolygonData, TessellationCache, tessellate,
+                            tessellation_cache, triangulate)
+from vispy.geometry import triangulation
+from vispy.testing import run_tests_if_main, assert_equal
+from vispy.util import _TempDir
+
+temp_dir = _TempDir()
+
+
+def _square(offset=0.):
+    return np.array([[0, 0], [1, 0], [1, 1], [0, 1.]]) + offset
+
+
+def test_tessellation_cache():
+    """Test the memory bound and the directory of the tessellation cache"""
+    edges = triangulation._outline(4)
+    key = TessellationCache.key(_square(), edges)
+    assert_equal(key, TessellationCache.key(_square(), edges.astype('u4')))
+    assert_equal(key == TessellationCache.key(_square(1), edges), False)
+    assert_equal(key == TessellationCache.key(_square().astype('f4'), edges),
+                 False)
+
+    vertices, triangles = _square(), np.array([[0, 1, 2], [0, 2, 3]])
+    nbytes = vertices.nbytes + triangles.nbytes
+    cache = TessellationCache(max_bytes=2 * nbytes)
+    assert_equal(cache.get(key), None)
+    for i in range(3):
+        cache.put(str(i), vertices, triangles)
+    # the least recently used is dropped
+    assert_equal('0' in cache, False)
+    assert_equal(cache.nbytes, 2 * nbytes)
+    cache.get('1')
+    cache.put('3', vertices, triangles)
+    assert_equal(['1' in cache, '2' in cache, '3' in cache],
+                 [True, False, True])
+    cache.max_bytes = nbytes
+    assert_equal(len(cache), 1)
+    cache.put('4', np.zeros((1000, 2)), triangles)  # too large
+    assert_equal(['3' in cache, '4' in cache], [True, False])
+    cache.clear()
+    assert_equal((len(cache), cache.nbytes), (0, 0))
+
+    # the directory keeps the tessellations, also those too large
+    directory = op.join(temp_dir, 'tessellations')
+    cache = TessellationCache(max_bytes=0, directory=directory)
+    cache.put(key, vertices, triangles)
+    assert_equal(len(cache), 0)
+    assert_equal(op.isfile(op.join(directory, key + '.npz')), True)
+    cache = TessellationCache(directory=directory)
+    v, t = cache.get(key)
+    assert_array_equal(v, vertices)
+    assert_array_equal(t, triangles)
+    assert_equal(key in cache, True)
+    # unreadable files are misses
+    with open(op.join(directory, 'bad.npz'), 'wb') as f:
+        f.write(b'not a npz file')
+    assert_equal(cache.get('bad'), None)
+
+
+def test_tessellate():
+    """Test that polygons are triangulated once"""
+    tessellation_cache.clear()
+    pts = np.array([[0, 0], [2, 0], [2, 2], [1, 0.5], [0, 2]], np.float32)
+    vertices, triangles = tessellate(pts, triangulation._outline(5))
+    assert_equal(len(tessellation_cache), 1)
+    # the same polygon, by PolygonData and triangulate()
+    v, t = PolygonData(vertices=pts).triangulate()
+    assert_array_equal(v, vertices)
+    assert_array_equal(t, triangles)
+    v, t = triangulate(np.column_stack((pts, np.ones(5, np.float32))))
+    assert_array_equal(v[:, :2], vertices)
+    assert_array_equal(v[:, 2], 1)
+    assert_equal(len(tessellation_cache), 1)
+    # the results are copies
+    t[:] = 0
+    assert_array_equal(tessellate(pts, triangulation._outline(5))[1],
+                       triangles)
+    tessellation_cache.clear()
+
+
+run_tests_if_main()
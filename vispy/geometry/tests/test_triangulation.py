@@ -192,6 +192,51 @@ def test_merge_duplicate_points():
     assert np.all(t.edges == edges)
 
 
+def test_merge_many_duplicate_points():
+    # points repeated several times, and edges between duplicates
+    np.random.seed(0)
+    pts = np.random.randint(0, 4, size=(60, 2)).astype(float)
+    edges = np.column_stack((np.arange(60), np.arange(1, 61) % 60))
+    t = T(pts, edges.copy())
+    t.merge_duplicate_points()
+    assert len(t.pts) == len(set(map(tuple, pts.tolist())))
+    assert np.all(t.edges[:, 0] != t.edges[:, 1])
+    # the edges join the same positions
+    expect = [tuple(e) for e in pts[edges].tolist() if e[0] != e[1]]
+    assert [tuple(e) for e in t.pts[t.edges].tolist()] == expect
+
+
+def test_edge_intersections_broad_phase():
+    # the candidate pairs give the same cuts as testing all pairs
+    np.random.seed(0)
+    N = 300
+    pts = np.cumsum(np.random.normal(size=(N, 2)), axis=0)
+    pts[::7] = np.round(pts[::7])
+    pts[10] = [100., -50.]  # long edges
+    edges = np.column_stack((np.arange(N), np.arange(1, N+1) % N))
+    t = T(pts, edges)
+    cuts = t.find_edge_intersections()
+
+    lines = t.pts[t.edges]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        # intercepts along edge i of its intersections with the edges j
+        along = t.intersection_matrix(lines).T
+        inside = ((along > 0) & (along < 1) & (along.T >= 0) &
+                  (along.T <= 1))
+    expect = dict((i, np.unique(along[i][inside[i]])) for i in range(N)
+                  if inside[i].any())
+    assert len(expect) > 50
+    for i, intercepts in expect.items():
+        assert_array_almost_equal([c[0] for c in cuts[i]], intercepts)
+    for i, v in cuts.items():
+        assert len(v) == 0 or i in expect
+
+    # every cut is split
+    t.split_intersecting_edges()
+    assert len(t.pts) == N + sum(len(v) for v in cuts.values())
+    assert len(t.edges) == len(t.pts)
+
+
 def test_initialize():
     # check points are correctly sorted
     # check artificial points are outside bounds of all others
@@ -4,9 +4,13 @@ from __future__ import division, print_function
 import sys
 
 from itertools import permutations
+from multiprocessing import Pool, cpu_count
+from multiprocessing.pool import ThreadPool
 import numpy as np
 
 from ..ext.ordereddict import OrderedDict
+from .delaunay import constrained_delaunay
+from .tessellation import tessellation_cache
 
 try:
     # Try to use the C++ triangle library, faster than the
@@ -19,6 +23,10 @@ try:
 except (ImportError, AssertionError):
     _TRIANGLE_AVAILABLE = False
 
+_PARALLEL_SIZE = 5000  # the number of vertices worth several processes
+_GRID_PIECES = 8  # the average number of pieces of the edges on the grid
+_INTERSECT_CHUNK = 1000000  # the pairs of edges tested at once
+
 
 class Triangulation(object):
     """Constrained delaunay triangulation
@@ -599,138 +607,175 @@ class Triangulation(object):
             if self.edges_intersect(edge, cut_edge):
                 return edge
 
+    def candidate_pairs(self, lines):
+        """
+        Generate the pairs of lines that may intersect, as chunks of index
+        arrays (i, j), with i < j.
+
+        *lines* is an array of shape (N, 2, 2), as in intersection_matrix().
+        This is the broad phase of find_edge_intersections(): the lines are
+        cut in pieces no longer than the cells of a uniform grid, and only
+        lines that have pieces in the same cell are paired. A pair may be
+        generated more than once.
+        """
+        n = len(lines)
+        lines = lines.astype(np.float64)
+        index = np.nonzero(np.isfinite(lines).all(axis=(1, 2)))[0]
+        if len(index) < 2:
+            return
+        a, b = lines[index, 0], lines[index, 1]
+        lo = np.minimum(a, b).min(axis=0)
+        size = np.maximum(a, b).max(axis=0) - lo
+        extent = np.abs(b - a).max(axis=1)
+        # cells for about one line each, unless the lines are so long that
+        # they would have too many pieces
+        cell = np.sqrt(size.prod() / len(index)) or size.max() / len(index)
+        cell = max(cell, extent.sum() / (_GRID_PIECES * len(index))) or 1.
+        pieces = (extent / cell).astype(np.intp) + 1
+
+        # the pieces, from a + (b - a) * t0 to a + (b - a) * t1
+        line = np.repeat(np.arange(len(index)), pieces)
+        k = np.arange(len(line)) - np.repeat(np.cumsum(pieces) - pieces,
+                                             pieces)
+        t0 = (k / pieces[line])[:, np.newaxis]
+        t1 = ((k + 1) / pieces[line])[:, np.newaxis]
+        p0 = a[line] * (1 - t0) + b[line] * t0
+        p1 = a[line] * (1 - t1) + b[line] * t1
+        c0 = np.floor((np.minimum(p0, p1) - lo) / cell).astype(np.int64)
+        c1 = np.floor((np.maximum(p0, p1) - lo) / cell).astype(np.int64)
+        # a piece is in at most two cells along each axis
+        span = np.minimum(c1 - c0, 1)
+        rows = c1[:, 1].max() + 2
+        keys = []
+        for dx in (0, 1):
+            for dy in (0, 1):
+                sel = (span[:, 0] >= dx) & (span[:, 1] >= dy)
+                keys.append(((c0[sel, 0] + dx) * rows + c0[sel, 1] + dy) *
+                            len(index) + line[sel])
+        # the (cell, line) entries, sorted by cell
+        keys = np.unique(np.concatenate(keys))
+        cells, line = keys // len(index), index[keys % len(index)]
+
+        # pair each entry with the next ones of its cell, chunk by chunk
+        position = np.arange(len(cells))
+        counts = np.searchsorted(cells, cells, 'right') - position - 1
+        total = np.cumsum(counts)
+        bounds = np.searchsorted(total, np.arange(0, total[-1],
+                                                  _INTERSECT_CHUNK), 'right')
+        for start, stop in zip(bounds, np.append(bounds[1:], len(cells))):
+            c = counts[start:stop]
+            first = np.repeat(position[start:stop], c)
+            second = first + 1 + np.arange(len(first)) - np.repeat(
+                np.cumsum(c) - c, c)
+            key = np.unique(line[first].astype(np.int64) * n + line[second])
+            yield (key // n).astype(np.intp), (key % n).astype(np.intp)
+
+    def _edge_cuts(self):
+        """
+        Return, for all intersections of the edges, the edge that is cut,
+        its intercept and the position of the cut, sorted by edge and
+        intercept, without duplicates. Also return the edges that touch a
+        later edge.
+        """
+        lines = self.pts[self.edges]
+        cut_edge, other, intercept, cut_pts = [], [], [], []
+        touching = [np.zeros(0, np.intp)]
+        err = np.geterr()
+        np.seterr(divide='ignore', invalid='ignore')
+        try:
+            for i, j in self.candidate_pairs(lines):
+                # intercepts of edge j on edge i, and of edge i on edge j
+                int1 = self.intersect_edge_arrays(lines[i], lines[j])
+                int2 = self.intersect_edge_arrays(lines[j], lines[i])
+                mask = (int1 >= 0) & (int1 <= 1) & (int2 >= 0) & (int2 <= 1)
+                i, j, int1, int2 = i[mask], j[mask], int1[mask], int2[mask]
+                h = int2[:, np.newaxis]
+                pts = lines[i, 0] * (1.0 - h) + lines[i, 1] * h
+                touching.append(i)
+                for edge, partner, inter in ((i, j, int2), (j, i, int1)):
+                    inside = (inter > 0) & (inter < 1)
+                    cut_edge.append(edge[inside])
+                    other.append(partner[inside])
+                    intercept.append(inter[inside])
+                    cut_pts.append(pts[inside])
+        finally:
+            np.seterr(**err)
+
+        touching = np.unique(np.concatenate(touching))
+        if not cut_edge:
+            return (np.zeros(0, np.intp), np.zeros(0, self.pts.dtype),
+                    np.zeros((0, 2), self.pts.dtype), touching)
+        cut_edge = np.concatenate(cut_edge)
+        intercept = np.concatenate(intercept)
+        cut_pts = np.concatenate(cut_pts)
+        # if several cuts have the same intercept, the one found with the
+        # first other edge is kept
+        order = np.lexsort((np.concatenate(other), intercept, cut_edge))
+        cut_edge, intercept = cut_edge[order], intercept[order]
+        cut_pts = cut_pts[order]
+        keep = np.ones(len(order), bool)
+        keep[1:] = ((cut_edge[1:] != cut_edge[:-1]) |
+                    (intercept[1:] != intercept[:-1]))
+        return cut_edge[keep], intercept[keep], cut_pts[keep], touching
+
     def find_edge_intersections(self):
         """
         Return a dictionary containing, for each edge in self.edges, a list
         of the positions at which the edge should be split.
+
+        Only the pairs of edges found by candidate_pairs() are tested for
+        intersections.
         """
-        edges = self.pts[self.edges]
-        cuts = {}  # { edge: [(intercept, point), ...], ... }
-        for i in range(edges.shape[0]-1):
-            # intersection of edge i onto all others
-            int1 = self.intersect_edge_arrays(edges[i:i+1], edges[i+1:])
-            # intersection of all edges onto edge i
-            int2 = self.intersect_edge_arrays(edges[i+1:], edges[i:i+1])
-        
-            # select for pairs that intersect
-            err = np.geterr()
-            np.seterr(divide='ignore', invalid='ignore')
-            try:
-                mask1 = (int1 >= 0) & (int1 <= 1)
-                mask2 = (int2 >= 0) & (int2 <= 1)
-                mask3 = mask1 & mask2  # all intersections
-            finally:
-                np.seterr(**err)
-            
-            # compute points of intersection
-            inds = np.argwhere(mask3)[:, 0]
-            if len(inds) == 0:
-                continue
-            h = int2[inds][:, np.newaxis]
-            pts = (edges[i, 0][np.newaxis, :] * (1.0 - h) + 
-                   edges[i, 1][np.newaxis, :] * h)
-            
-            # record for all edges the location of cut points
-            edge_cuts = cuts.setdefault(i, [])
-            for j, ind in enumerate(inds):
-                if 0 < int2[ind] < 1:
-                    edge_cuts.append((int2[ind], pts[j]))
-                if 0 < int1[ind] < 1:
-                    other_cuts = cuts.setdefault(ind+i+1, [])
-                    other_cuts.append((int1[ind], pts[j]))
-        
-        # sort all cut lists by intercept, remove duplicates
-        for k, v in cuts.items():
-            v.sort(key=lambda x: x[0])
-            for i in range(len(v)-2, -1, -1):
-                if v[i][0] == v[i+1][0]:
-                    v.pop(i+1)
+        cut_edge, intercept, cut_pts, touching = self._edge_cuts()
+        cuts = dict((edge, []) for edge in touching.tolist())
+        for edge, h, pt in zip(cut_edge.tolist(), intercept, cut_pts):
+            cuts.setdefault(edge, []).append((h, pt))
         return cuts
 
     def split_intersecting_edges(self):
-        # we can do all intersections at once, but this has excessive memory
-        # overhead.
-        #int1 = self.intersection_matrix(edges)
-        #int2 = int1.T
-        
         # measure intersection point between all pairs of edges
-        all_cuts = self.find_edge_intersections()
+        cut_edge, _, cut_pts, _ = self._edge_cuts()
+        if not len(cut_edge):
+            return
 
-        # cut edges at each intersection
-        add_pts = []
-        add_edges = []
-        for edge, cuts in all_cuts.items():
-            if len(cuts) == 0:
-                continue
-            
-            #debug("Edge intersections:", edge, self.edges[edge], 
-            #      self.pts[self.edges[edge]], cuts)
-            
-            # add new points
-            pt_offset = self.pts.shape[0] + len(add_pts)
-            new_pts = [x[1] for x in cuts]
-            add_pts.extend(new_pts)
-            #debug("Add new points:", new_pts)
-            
-            # list of point indexes for all new edges
-            pt_indexes = list(range(pt_offset, pt_offset + len(cuts)))
-            pt_indexes.append(self.edges[edge, 1])
-            
-            # modify original edge
-            self.edges[edge, 1] = pt_indexes[0]
-            
-            # add new edges
-            new_edges = [[pt_indexes[i-1], pt_indexes[i]] 
-                         for i in range(1, len(pt_indexes))] 
-            add_edges.extend(new_edges)
-            
-        #debug("Adding %d points and %d edges to remove intersections." % 
-        #      (len(add_pts), len(add_edges)))
-        if add_pts:
-            add_pts = np.array(add_pts, dtype=self.pts.dtype)
-            self.pts = np.append(self.pts, add_pts, axis=0)
-        if add_edges:
-            add_edges = np.array(add_edges, dtype=self.edges.dtype)
-            self.edges = np.append(self.edges, add_edges, axis=0)
+        # cut edges at each intersection: edge a-b with the cuts p0..pk
+        # becomes a-p0, and the edges p0-p1, ..., pk-b are added
+        new = np.arange(len(self.pts), len(self.pts) + len(cut_edge))
+        last = np.ones(len(cut_edge), bool)
+        last[:-1] = cut_edge[1:] != cut_edge[:-1]
+        first = np.roll(last, 1)
+        end = np.empty(len(cut_edge), np.intp)
+        end[:-1] = new[1:]
+        end[last] = self.edges[cut_edge[last], 1]
+        self.edges[cut_edge[first], 1] = new[first]
+        add_edges = np.column_stack((new, end)).astype(self.edges.dtype)
+        self.pts = np.append(self.pts, cut_pts.astype(self.pts.dtype), axis=0)
+        self.edges = np.append(self.edges, add_edges, axis=0)
 
     def merge_duplicate_points(self):
-        # generate a list of all pairs (i,j) of identical points
-        dups = []
-        for i in range(self.pts.shape[0]-1):
-            test_pt = self.pts[i:i+1]
-            comp_pts = self.pts[i+1:]
-            eq = test_pt == comp_pts
-            eq = eq[:, 0] & eq[:, 1]
-            for j in np.argwhere(eq)[:, 0]:
-                dups.append((i, i+1+j))
-
-        dups_arr = np.array(dups)
-        # remove duplicate points
-        pt_mask = np.ones(self.pts.shape[0], dtype=bool)
-        for i, inds in enumerate(dups_arr):
-            # remove j from points
-            # (note we pull the index from the original dups instead of 
-            # dups_arr because the indexes in pt_mask do not change)
-            pt_mask[dups[i][1]] = False
-            
-            i, j = inds
-            
-            # rewrite edges to use i instead of j
-            self.edges[self.edges == j] = i
-            
-            #assert not np.any(self.edges[:,0] == self.edges[:,1])
-            
-            # decrement all point indexes > j
-            self.edges[self.edges > j] -= 1
-            dups_arr[dups_arr > j] -= 1
-            #assert not np.any(self.edges[:,0] == self.edges[:,1])
-        
+        # Sort the points, so that identical points are adjacent. Each one
+        # is replaced by the first of them.
+        n = len(self.pts)
+        if n == 0:
+            return
+        order = np.lexsort((self.pts[:, 1], self.pts[:, 0]))
+        sorted_pts = self.pts[order]
+        start = np.ones(n, bool)
+        start[1:] = (sorted_pts[1:] != sorted_pts[:-1]).any(axis=1)
+        # the sort is stable, so the first of each group has the lowest index
+        first = np.empty(n, np.intp)
+        first[order] = order[start][np.cumsum(start) - 1]
+        pt_mask = first == np.arange(n)
+        index = np.cumsum(pt_mask) - 1
+
+        # rewrite edges to use the remaining points
+        self.edges = index[first[self.edges]].astype(self.edges.dtype)
         self.pts = self.pts[pt_mask]
-        
+
         # remove zero-length edges
         mask = self.edges[:, 0] != self.edges[:, 1]
         self.edges = self.edges[mask]
-    
+
     def distance(self, A, B):
         # Distance between points A and B
         n = len(A)
@@ -972,13 +1017,20 @@ class Triangulation(object):
         return k
 
 
+def _outline(n):
+    """ The edges of a closed outline of n vertices """
+    edges = np.empty((n, 2), np.intp)
+    edges[:, 0] = np.arange(n)
+    edges[:, 1] = edges[:, 0] + 1
+    edges[-1, 1] = 0
+    return edges
+
+
 def _triangulate_python(vertices_2d, segments):
-    segments = segments.reshape(len(segments) / 2, 2)
-    T = Triangulation(vertices_2d, segments)
-    T.triangulate()
-    vertices_2d = T.pts
-    triangles = T.tris.ravel()
-    return vertices_2d, triangles
+    T = Triangulation(np.asarray(vertices_2d),
+                      np.asarray(segments, np.intp).reshape((-1, 2)))
+    T.normalize()
+    return T.pts, constrained_delaunay(T.pts, T.edges)
 
 
 def _triangulate_cpp(vertices_2d, segments):
@@ -989,24 +1041,123 @@ def _triangulate_cpp(vertices_2d, segments):
     return vertices_2d, triangles
 
 
-def triangulate(vertices):
-    """Triangulate a set of vertices. Returns a pair (vertices, triangles)."""
-    n = len(vertices)
-    vertices = np.asarray(vertices)
-    zmean = vertices[:, 2].mean()
-    vertices_2d = vertices[:, :2]
-    segments = np.repeat(np.arange(n + 1), 2)[1:-1]
-    segments[-2:] = n - 1, 0
-
+def _tessellate(args):
+    """ The triangulation of (vertices_2d, edges), by the triangle module
+    if it is available
+    """
     if _TRIANGLE_AVAILABLE:
-        vertices_2d, triangles = _triangulate_cpp(vertices_2d, segments)
-    else:
-        vertices_2d, triangles = _triangulate_python(vertices_2d, segments)
+        return _triangulate_cpp(args[0], args[1].ravel())
+    return _triangulate_python(*args)
+
 
+def _lookup(args):
+    key = tessellation_cache.key(*args)
+    return key, tessellation_cache.get(key)
+
+
+def tessellate(vertices_2d, edges):
+    """Triangulate the inside of edges, using the tessellation cache
+
+    Parameters
+    ----------
+    vertices_2d : ndarray, shape (Nv, 2)
+        The vertices.
+    edges : ndarray, shape (Ne, 2)
+        The vertex indices of the edges, which may intersect each other.
+
+    Returns
+    -------
+    vertices : ndarray, shape (Nv', 2)
+        The vertices of the triangles, including the intersections of the
+        edges.
+    triangles : ndarray, shape (Nt, 3)
+        The vertex indices of the triangles that are inside the edges, by
+        the even-odd rule.
+    """
+    args = (np.asarray(vertices_2d), np.asarray(edges).reshape((-1, 2)))
+    key, result = _lookup(args)
+    if result is None:
+        result = _tessellate(args)
+        tessellation_cache.put(key, *result)
+    return result[0].copy(), result[1].copy()
+
+
+def _lift(vertices_2d, z):
     vertices = np.empty((len(vertices_2d), 3))
     vertices[:, :2] = vertices_2d
-    vertices[:, 2] = zmean
-    return vertices, triangles
+    vertices[:, 2] = z
+    return vertices
+
+
+def triangulate(vertices):
+    """Triangulate a set of vertices. Returns a pair (vertices, triangles).
+
+    The vertices are the outline of a polygon, which may intersect itself.
+    The triangulation is cached in the tessellation cache.
+    """
+    vertices = np.asarray(vertices)
+    vertices_2d, triangles = tessellate(vertices[:, :2],
+                                        _outline(len(vertices)))
+    return _lift(vertices_2d, vertices[:, 2].mean()), triangles
+
+
+def triangulate_polygons(polygons, n_processes=None, n_threads=None):
+    """Triangulate many polygons, e.g. to fill the tessellation cache
+
+    The polygons are hashed and looked for in the cache by a pool of
+    threads. The others are triangulated in a pool of processes, as the
+    triangulation is done in Python (unless the triangle module is
+    available), and added to the cache.
+
+    Parameters
+    ----------
+    polygons : list of arrays
+        The vertices of the polygons, each of shape (Nv, 3).
+    n_processes : int | None
+        The number of processes. Default is the number of CPUs. The
+        polygons are triangulated in this process if there are too few
+        vertices to benefit from several processes.
+    n_threads : int | None
+        The number of threads that look for the polygons in the cache.
+        Default is the number of CPUs.
+
+    Returns
+    -------
+    results : list of tuples
+        The (vertices, triangles) of each polygon, as returned by
+        `triangulate`.
+    """
+    polygons = [np.asarray(p) for p in polygons]
+    args = [(p[:, :2], _outline(len(p))) for p in polygons]
+    n_threads = cpu_count() if n_threads is None else n_threads
+    if n_threads > 1 and len(args) > 1:
+        pool = ThreadPool(min(n_threads, len(args)))
+        try:
+            found = pool.map(_lookup, args)
+        finally:
+            pool.close()
+            pool.join()
+    else:
+        found = [_lookup(a) for a in args]
+
+    # triangulate the others
+    todo = [i for i, (_, result) in enumerate(found) if result is None]
+    n_processes = cpu_count() if n_processes is None else n_processes
+    if (not _TRIANGLE_AVAILABLE and n_processes > 1 and len(todo) > 1 and
+            sum(len(polygons[i]) for i in todo) >= _PARALLEL_SIZE):
+        pool = Pool(min(n_processes, len(todo)))
+        try:
+            computed = pool.map(_tessellate, [args[i] for i in todo])
+        finally:
+            pool.close()
+            pool.join()
+    else:
+        computed = [_tessellate(args[i]) for i in todo]
+    for i, result in zip(todo, computed):
+        tessellation_cache.put(found[i][0], *result)
+        found[i] = found[i][0], result
+    return [(_lift(pts, p[:, 2].mean()), tris.copy())
+            for p, (_, (pts, tris)) in zip(polygons, found)]
 
 
 # Note: using custom #debug instead of logging because
@@ -8,25 +8,34 @@
 from os import path as op
 
 from .wavefront import WavefrontReader, WavefrontWriter
+from .ply import PlyReader, PlyWriter
+from .stl import StlReader, StlWriter
 
 
-def read_mesh(fname):
+def read_mesh(fname, cache=False):
     """Read mesh data from file.
 
     Parameters
     ----------
     fname : str
         File name to read. Format will be inferred from the filename.
-        Currently only '.obj' and '.obj.gz' are supported.
+        Currently '.obj', '.obj.gz', '.ply' (binary) and '.stl' (binary)
+        are supported. PLY and STL files are memory-mapped, and the arrays
+        are views on the file when its layout allows it.
+    cache : bool
+        If True, the mesh is also stored in a ``.npz`` file next to the
+        file, and read from there as long as the file does not change.
+        Only used for OBJ files.
 
     Returns
     -------
     vertices : array
         Vertices.
     faces : array | None
-        Triangle face definitions.
-    normals : array
-        Normals for the mesh.
+        Triangle face definitions. Faces with more vertices are
+        triangulated.
+    normals : array | None
+        Normals for the mesh. None for PLY files without normals.
     texcoords : array | None
         Texture coordinates.
     """
@@ -36,7 +45,11 @@ def read_mesh(fname):
         fmt = op.splitext(op.splitext(fname)[0])[1].lower()
 
     if fmt in ('.obj'):
-        return WavefrontReader.read(fname)
+        return WavefrontReader.read(fname, cache)
+    elif fmt == '.ply':
+        return PlyReader.read(fname)
+    elif fmt == '.stl':
+        return StlReader.read(fname)
     elif not format:
         raise ValueError('read_mesh needs could not determine format.')
     else:
@@ -44,13 +57,14 @@ def read_mesh(fname):
 
 
 def write_mesh(fname, vertices, faces, normals, texcoords, name='',
-               format='obj', overwrite=False):
+               format=None, overwrite=False):
     """ Write mesh data to file.
 
     Parameters
     ----------
     fname : str
-        Filename to write. Must end with ".obj" or ".gz".
+        Filename to write. Must end with ".obj" or ".gz" for the "obj"
+        format.
     vertices : array
         Vertices.
     faces : array | None
@@ -61,8 +75,10 @@ def write_mesh(fname, vertices, faces, normals, texcoords, name='',
         Texture coordinates.
     name : str
         Name of the object.
-    format : str
-        Currently only "obj" is supported.
+    format : str | None
+        Can be "obj", "ply" (binary) or "stl" (binary). If None, it is
+        inferred from the filename. PLY and STL files are written chunk by
+        chunk, and STL files only store the triangles and their normals.
     overwrite : bool
         If the file exists, overwrite it.
     """
@@ -71,6 +87,12 @@ def write_mesh(fname, vertices, faces, normals, texcoords, name='',
         raise IOError('file "%s" exists, use overwrite=True' % fname)
 
     # Check format
-    if format not in ('obj'):
-        raise ValueError('Only "obj" format writing currently supported')
-    WavefrontWriter.write(fname, vertices, faces, normals, texcoords, name)
+    if format is None:
+        format = op.splitext(fname)[1].lower()[1:]
+        if format == 'gz':
+            format = 'obj'
+    writers = dict(obj=WavefrontWriter, ply=PlyWriter, stl=StlWriter)
+    if format not in writers:
+        raise ValueError('Only "obj", "ply" and "stl" format writing '
+                         'currently supported, not "%s"' % format)
+    writers[format].write(fname, vertices, faces, normals, texcoords, name)
@@ -0,0 +1,420 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2014, Vispy Development Team.
+# Distributed under the (new) BSD License. See LICENSE.txt for more info.
+
+"""
+Reading and writing of binary PLY (Stanford polygon) files.
+
+http://paulbourke.net/dataformats/ply/
+
+The file is memory-mapped and each element of the file is viewed as a
+numpy record array, so that no per-element parsing is done in Python. When
+their layout allows it (little-endian float32 coordinates and triangles
+only), the arrays returned by the reader are views on the memory-mapped
+file, and even very large meshes open almost instantly. Otherwise the
+polygons are triangulated as fans, and the arrays are converted in bulk.
+The records of faces with different numbers of vertices (e.g. triangles
+and quads) are located with vectorized scans of the file, rather than
+one by one.
+
+The writer streams the vertices and faces to the file chunk by chunk.
+Only binary PLY files are supported.
+"""
+
+import numpy as np
+from numpy.lib.stride_tricks import as_strided
+
+from .wavefront import _fan_triangles, _WRITE_CHUNK
+
+_TYPES = {'char': 'i1', 'uchar': 'u1', 'short': 'i2', 'ushort': 'u2',
+          'int': 'i4', 'uint': 'u4', 'float': 'f4', 'double': 'f8',
+          'int8': 'i1', 'uint8': 'u1', 'int16': 'i2', 'uint16': 'u2',
+          'int32': 'i4', 'uint32': 'u4', 'float32': 'f4', 'float64': 'f8'}
+_ENDIANS = {'binary_little_endian': '<', 'binary_big_endian': '>'}
+_TEXCOORDS = (('u', 'v'), ('s', 't'), ('texture_u', 'texture_v'),
+              ('texture_s', 'texture_t'))
+_COUNT_WIDTH = 12  # the digits reserved for the counts of streamed elements
+_SCAN_BLOCK = 2 ** 18  # the bytes of records with lists scanned at once
+_MIN_RUN = 32  # shorter runs of records of the same size are not followed
+
+
+def _field_view(records, names, dtype):
+    """ The fields of a record array as the columns of a 2D array, viewed
+    when they are consecutive and of the given dtype, else converted
+    """
+    fields = [records.dtype.fields[name] for name in names]
+    size = fields[0][0].itemsize
+    if all(f[0] == np.dtype(dtype) and f[1] == fields[0][1] + i * size
+           for i, f in enumerate(fields)):
+        return as_strided(records[names[0]],
+                          shape=(len(records), len(names)),
+                          strides=(records.dtype.itemsize, size),
+                          writeable=False)
+    return np.column_stack([records[name] for name in names]).astype(dtype)
+
+
+def _follow(size, count):
+    """ The positions of the first *count* records that follow the one at
+    position 0, given the size of a record at each position, up to the end
+    of the array. The chain of records is found by pointer doubling: each
+    step follows twice as many records as the previous one.
+    """
+    m = len(size)
+    jump = np.append(np.minimum(np.arange(m) + size, m), m)
+    chain = np.zeros(1, np.int64)
+    while len(chain) < count:
+        more = jump[chain]
+        grown = np.union1d(chain, more[more < m])
+        if len(grown) == len(chain):
+            break
+        chain = grown
+        jump = jump[jump]
+    return chain[:count]
+
+
+class PlyReader(object):
+    """ Reader of binary PLY files
+
+    Parameters
+    ----------
+    fname : str
+        The name of the file to read.
+    """
+
+    def __init__(self, fname):
+        self._data = np.memmap(fname, np.uint8, mode='r')
+        head = self._data[:65536].tostring()
+        end = head.find(b'end_header')
+        if not head.startswith(b'ply') or end < 0:
+            raise ValueError('%s is not a PLY file' % fname)
+        end = head.find(b'\n', end) + 1
+        lines = [line.split() for line in
+                 head[:end].decode('ascii', 'ignore').splitlines()]
+
+        # Parse the header into a list of (name, count, properties)
+        elements = []
+        endian = None
+        for line in lines[1:]:
+            if not line or line[0] in ('comment', 'obj_info',
+                                       'end_header'):
+                continue
+            elif line[0] == 'format':
+                if line[1] not in _ENDIANS:
+                    raise ValueError('Only binary PLY files are supported, '
+                                     'not %s' % line[1])
+                endian = _ENDIANS[line[1]]
+            elif line[0] == 'element':
+                elements.append((line[1], int(line[2]), []))
+            elif line[0] == 'property' and line[1] == 'list':
+                elements[-1][2].append((line[4], _TYPES[line[2]],
+                                        _TYPES[line[3]]))
+            elif line[0] == 'property':
+                elements[-1][2].append((line[2], _TYPES[line[1]]))
+            else:
+                raise ValueError('Invalid PLY header line: %s'
+                                 % ' '.join(line))
+        if endian is None:
+            raise ValueError('PLY header has no format')
+
+        # The records of each element. The records of elements with a list
+        # property are gathered by number of items.
+        self.elements = {}
+        offset = end
+        for name, count, props in elements:
+            if sum(len(p) == 3 for p in props) > 1:
+                raise ValueError('PLY elements with several lists are not '
+                                 'supported')
+            self.elements[name], offset = self._readElement(
+                count, props, endian, offset)
+
+    @classmethod
+    def read(cls, fname):
+        """ read(fname)
+
+        This classmethod is the entry point for reading PLY files.
+
+        Parameters
+        ----------
+        fname : str
+            The name of the file to read.
+        """
+        return cls(fname).finish()
+
+    def _readElement(self, count, props, endian, offset):
+        """ Read the records of an element, as a list of (number of items
+        in the list, records, indices) groups. The indices of the records
+        in the element are None when a group holds all records.
+        """
+        def make_dtype(n):
+            dtype = []
+            for prop in props:
+                if len(prop) == 2:
+                    dtype.append((prop[0], endian + prop[1]))
+                else:
+                    dtype.extend([('__count', endian + prop[1]),
+                                  (prop[0], endian + prop[2], (n,))])
+            return np.dtype(dtype)
+
+        lists = [prop for prop in props if len(prop) == 3]
+        if not lists:
+            dtype = make_dtype(0)
+            end = offset + count * dtype.itemsize
+            if end > len(self._data):
+                raise ValueError('PLY file is truncated')
+            return [(0, self._data[offset:end].view(dtype), None)], end
+
+        starts, counts, end = self._scanRecords(
+            offset, count, make_dtype(0), np.dtype(endian + lists[0][2]))
+        if not len(counts) or (counts == counts[0]).all():
+            n = int(counts[0]) if len(counts) else 0
+            return [(n, self._data[offset:end].view(make_dtype(n)), None)], end
+        # records with different numbers of items are gathered by number
+        groups = []
+        for n in np.unique(counts):
+            dtype = make_dtype(n)
+            index = np.flatnonzero(counts == n)
+            records = np.empty(len(index), dtype)
+            raw = records.view(np.uint8).reshape((-1, dtype.itemsize))
+            step = max(_SCAN_BLOCK // dtype.itemsize, 1)
+            for i in range(0, len(index), step):
+                first = starts[index[i:i + step], np.newaxis]
+                raw[i:i + step] = self._data[first + np.arange(dtype.itemsize)]
+            groups.append((int(n), records, index))
+        return groups, end
+
+    def _scanRecords(self, offset, count, dtype, item):
+        """ Find the offsets and numbers of items of records with a list
+
+        The size of a record depends on its number of items, so the
+        offset of a record depends on all records before it. The file is
+        scanned in blocks of bytes, where the number of items of a record
+        starting at each byte gives the offset of the next record. Runs of
+        records of the same size are found directly, and the rest of a
+        block by pointer doubling once the runs get short (e.g. for mixed
+        triangles and quads).
+        """
+        at = dtype.fields['__count'][1]
+        counter = dtype.fields['__count'][0]
+        fixed = dtype.itemsize  # the size of a record without items
+        starts, counts = [], []
+        while count:
+            # the number of items of a record starting at each byte
+            last = len(self._data) - counter.itemsize - at
+            m = min(_SCAN_BLOCK, last - offset + 1)
+            if m <= 0:
+                raise ValueError('PLY file is truncated')
+            raw = as_strided(self._data[offset + at:],
+                             shape=(m, counter.itemsize), strides=(1, 1))
+            n = raw.copy().view(counter)[:, 0].astype(np.int64)
+            size = np.maximum(fixed + n * item.itemsize, 1)
+            pos = 0
+            while pos < m and count:
+                run = np.arange(pos, m, size[pos])[:count]
+                k = int(np.argmin(n[run] == n[pos])) or len(run)
+                if k < min(_MIN_RUN, len(run)):
+                    run = pos + _follow(size[pos:], count)
+                    k = len(run)
+                run = run[:k]
+                if (n[run] < 0).any():
+                    raise ValueError('Invalid PLY list size')
+                starts.append(offset + run)
+                counts.append(n[run])
+                count -= k
+                pos = int(run[-1] + size[run[-1]])
+            offset += pos
+        if offset > len(self._data):
+            raise ValueError('PLY file is truncated')
+        if not starts:
+            return np.zeros(0, np.int64), np.zeros(0, np.int64), offset
+        return np.concatenate(starts), np.concatenate(counts), offset
+
+    def finish(self):
+        """ Returns the vertices, faces, normals and texture coordinates.
+        """
+        if 'vertex' not in self.elements:
+            raise ValueError('PLY file has no vertex element')
+        records = self.elements['vertex'][0][1]
+        names = records.dtype.names
+        vertices = _field_view(records, ('x', 'y', 'z'), np.float32)
+        normals = texcoords = None
+        if all(name in names for name in ('nx', 'ny', 'nz')):
+            normals = _field_view(records, ('nx', 'ny', 'nz'), np.float32)
+        for uv in _TEXCOORDS:
+            if all(name in names for name in uv):
+                texcoords = _field_view(records, uv, np.float32)
+                break
+
+        faces = None
+        runs = self.elements.get('face')
+        if runs:
+            field = [name for name in runs[0][1].dtype.names
+                     if name in ('vertex_indices', 'vertex_index')]
+            if not field:
+                raise ValueError('PLY faces have no vertex indices')
+            if len(runs) == 1 and runs[0][0] == 3:
+                faces = runs[0][1][field[0]]
+                if faces.dtype in (np.dtype('<i4'), np.dtype('<u4')):
+                    faces = faces.view(np.uint32)
+                else:
+                    faces = faces.astype(np.uint32)
+            else:
+                # the fans of each group, back in the order of the file
+                faces, order = [], []
+                for n, records, index in runs:
+                    corners = records[field[0]].ravel().astype(np.uint32)
+                    faces.append(_fan_triangles(
+                        np.repeat(n, len(records)), corners))
+                    if index is not None:
+                        order.append(np.repeat(index, max(n - 2, 0)))
+                faces = np.concatenate(faces)
+                if order:
+                    faces = faces[np.argsort(np.concatenate(order),
+                                             kind='mergesort')]
+        return vertices, faces, normals, texcoords
+
+
+class PlyWriter(object):
+    """ Streaming writer of binary PLY files
+
+    All vertices are written first, with any number of calls to
+    ``add_vertices``, then all faces with ``add_faces``. The counts of
+    the header are filled in when the writer is closed.
+
+    Parameters
+    ----------
+    fname : str
+        The name of the file to write.
+    normals : bool
+        Whether the vertices have normals.
+    texcoords : bool
+        Whether the vertices have texture coordinates.
+    name : str
+        The name of the object (e.g. 'teapot').
+    """
+
+    def __init__(self, fname, normals=False, texcoords=False, name=''):
+        fields = ['x', 'y', 'z']
+        if normals:
+            fields += ['nx', 'ny', 'nz']
+        if texcoords:
+            fields += ['u', 'v']
+        self._vertex_dtype = np.dtype([(f, '<f4') for f in fields])
+        self._name = name
+        self._n_vertices = self._n_faces = 0
+        self._f = open(fname, 'wb')
+        self._f.write(self._header())
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    @classmethod
+    def write(cls, fname, vertices, faces, normals, texcoords, name=''):
+        """ This classmethod is the entry point for writing mesh data to PLY.
+
+        Parameters
+        ----------
+        fname : string
+            The filename to write to.
+        vertices : numpy array
+            The vertex data
+        faces : numpy array | None
+            The face data. If None, every three vertices form a triangle.
+        normals : numpy array
+            The normal per vertex
+        texcoords : numpy array
+            The texture coordinate per vertex
+        name : str
+            The name of the object (e.g. 'teapot')
+        """
+        if faces is None:
+            if len(vertices) % 3:
+                raise ValueError('Without faces, the number of vertices must '
+                                 'be a multiple of 3, not %d' % len(vertices))
+            faces = np.arange(len(vertices)).reshape((-1, 3))
+        with cls(fname, normals is not None, texcoords is not None,
+                 name) as writer:
+            for i in range(0, len(vertices), _WRITE_CHUNK):
+                chunk = slice(i, i + _WRITE_CHUNK)
+                writer.add_vertices(
+                    vertices[chunk],
+                    None if normals is None else normals[chunk],
+                    None if texcoords is None else texcoords[chunk])
+            for i in range(0, len(faces), _WRITE_CHUNK):
+                writer.add_faces(faces[i:i + _WRITE_CHUNK])
+
+    def _header(self):
+        lines = ['ply', 'format binary_little_endian 1.0',
+                 'comment Created by vispy.']
+        if self._name:
+            lines.append('comment object %s' % self._name)
+        lines.append('element vertex %0*d' % (_COUNT_WIDTH, self._n_vertices))
+        lines.extend('property float %s' % f
+                     for f in self._vertex_dtype.names)
+        lines.append('element face %0*d' % (_COUNT_WIDTH, self._n_faces))
+        lines.extend(['property list uchar int vertex_indices',
+                      'end_header', ''])
+        return '\n'.join(lines).encode('ascii')
+
+    def add_vertices(self, vertices, normals=None, texcoords=None):
+        """ Write a chunk of vertices
+
+        Parameters
+        ----------
+        vertices : ndarray, shape (Nv, 3) | shape (Nv, 2)
+            The vertex coordinates. 2D vertices are written with z=0.
+        normals : ndarray, shape (Nv, 3) | None
+            The vertex normals, if the writer was created with normals.
+        texcoords : ndarray, shape (Nv, 2) | None
+            The texture coordinates, if the writer was created with them.
+        """
+        if self._n_faces:
+            raise RuntimeError('All vertices must be written before the '
+                               'faces')
+        fields = self._vertex_dtype.names
+        if (normals is None) == ('nx' in fields) or \
+                (texcoords is None) == ('u' in fields):
+            raise ValueError('normals and texcoords must be given if and '
+                             'only if the writer was created with them')
+        vertices = np.asarray(vertices)
+        if vertices.ndim != 2 or vertices.shape[1] not in (2, 3):
+            raise ValueError('vertices must have shape (N, 2) or (N, 3), '
+                             'not %s' % (vertices.shape,))
+        records = np.zeros(len(vertices), self._vertex_dtype)
+        for values, names in ((vertices, fields[:3]),
+                              (normals, ('nx', 'ny', 'nz')),
+                              (texcoords, ('u', 'v'))):
+            if values is not None:
+                values = np.asarray(values)
+                for i, name in enumerate(names[:values.shape[1]]):
+                    records[name] = values[:, i]
+        self._f.write(records.tostring())
+        self._n_vertices += len(records)
+
+    def add_faces(self, faces):
+        """ Write a chunk of faces
+
+        Parameters
+        ----------
+        faces : ndarray, shape (Nf, N)
+            The vertex indices of the faces, which are polygons of N
+            vertices (e.g. 3 for triangles).
+        """
+        faces = np.asarray(faces)
+        records = np.empty(len(faces), [('count', 'u1'),
+                                        ('indices', '<i4', faces.shape[1:])])
+        records['count'] = faces.shape[1]
+        records['indices'] = faces
+        self._f.write(records.tostring())
+        self._n_faces += len(records)
+
+    def close(self):
+        """ Write the counts in the header and close the file
+        """
+        if self._f.closed:
+            return
+        self._f.seek(0)
+        self._f.write(self._header())
+        self._f.close()
@@ -0,0 +1,181 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2014, Vispy Development Team.
+# Distributed under the (new) BSD License. See LICENSE.txt for more info.
+
+"""
+Reading and writing of binary STL (stereolithography) files.
+
+http://en.wikipedia.org/wiki/STL_(file_format)
+
+A binary STL file is an array of fixed-size records, one per triangle,
+which the reader views on the memory-mapped file. STL files do not share
+vertices between triangles, so each triangle gets its own three vertices
+when the file is read as a mesh. The writer streams the triangles to the
+file chunk by chunk. ASCII STL files are not supported.
+"""
+
+import numpy as np
+
+from .wavefront import _WRITE_CHUNK
+
+_HEADER_SIZE = 84  # 80 bytes of header and the number of triangles
+_dtype = np.dtype([('normal', '<f4', (3,)), ('vertices', '<f4', (3, 3)),
+                   ('attribute', '<u2')])
+
+
+def _face_normals(triangles):
+    """ The unit normals of triangles of shape (N, 3, 3) """
+    normals = np.cross(triangles[:, 1] - triangles[:, 0],
+                       triangles[:, 2] - triangles[:, 0])
+    size = np.sqrt((normals ** 2).sum(axis=1))
+    size[size == 0] = 1.0  # prevent ugly divide-by-zero
+    return normals / size[:, np.newaxis]
+
+
+class StlReader(object):
+    """ Reader of binary STL files
+
+    Parameters
+    ----------
+    fname : str
+        The name of the file to read.
+    """
+
+    def __init__(self, fname):
+        data = np.memmap(fname, np.uint8, mode='r')
+        n = -1
+        if len(data) >= _HEADER_SIZE:
+            n = int(data[80:_HEADER_SIZE].view('<u4')[0])
+        if len(data) != _HEADER_SIZE + n * _dtype.itemsize:
+            if data[:5].tostring() == b'solid':
+                raise ValueError('Only binary STL files are supported')
+            raise ValueError('%s is not a binary STL file' % fname)
+        self._records = data[_HEADER_SIZE:].view(_dtype)
+
+    @classmethod
+    def read(cls, fname):
+        """ read(fname)
+
+        This classmethod is the entry point for reading STL files.
+
+        Parameters
+        ----------
+        fname : str
+            The name of the file to read.
+        """
+        return cls(fname).finish()
+
+    @property
+    def triangles(self):
+        """ The vertices of the triangles, shape (Nf, 3, 3), as a view on
+        the file
+        """
+        return self._records['vertices']
+
+    @property
+    def normals(self):
+        """ The normals of the triangles, shape (Nf, 3), as a view on the
+        file
+        """
+        return self._records['normal']
+
+    def finish(self):
+        """ Returns the vertices, faces, normals and texture coordinates,
+        with three vertices per triangle.
+        """
+        vertices = self.triangles.reshape((-1, 3))
+        faces = np.arange(len(vertices), dtype=np.uint32).reshape((-1, 3))
+        # the normals of the file, unless they are missing (zero)
+        normals = np.array(self.normals)
+        missing = (normals == 0).all(axis=1)
+        normals[missing] = _face_normals(self.triangles[missing])
+        return vertices, faces, np.repeat(normals, 3, axis=0), None
+
+
+class StlWriter(object):
+    """ Streaming writer of binary STL files
+
+    The triangles are written with any number of calls to
+    ``add_triangles``. Their count is filled in when the writer is closed.
+
+    Parameters
+    ----------
+    fname : str
+        The name of the file to write.
+    name : str
+        The name of the object (e.g. 'teapot').
+    """
+
+    def __init__(self, fname, name=''):
+        self._n_faces = 0
+        self._f = open(fname, 'wb')
+        # The header must not start with "solid", which marks ASCII files
+        header = ('Created by vispy. %s' % name).encode('ascii')[:80]
+        self._f.write(header.ljust(80, b' '))
+        self._f.write(np.zeros(1, '<u4').tostring())
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    @classmethod
+    def write(cls, fname, vertices, faces, normals, texcoords, name=''):
+        """ This classmethod is the entry point for writing mesh data to STL.
+
+        STL files store the normals of the faces, which are computed from
+        the vertices. The normals and texture coordinates of the vertices
+        are not written.
+
+        Parameters
+        ----------
+        fname : string
+            The filename to write to.
+        vertices : numpy array
+            The vertex data
+        faces : numpy array
+            The face data
+        normals : numpy array
+            The normal per vertex (ignored)
+        texcoords : numpy array
+            The texture coordinate per vertex (ignored)
+        name : str
+            The name of the object (e.g. 'teapot')
+        """
+        vertices = np.asarray(vertices)
+        with cls(fname, name) as writer:
+            if faces is None:
+                for i in range(0, len(vertices) // 3, _WRITE_CHUNK):
+                    chunk = vertices[3 * i:3 * (i + _WRITE_CHUNK)]
+                    writer.add_triangles(chunk.reshape((-1, 3, 3)))
+            else:
+                for i in range(0, len(faces), _WRITE_CHUNK):
+                    writer.add_triangles(vertices[faces[i:i + _WRITE_CHUNK]])
+
+    def add_triangles(self, triangles, normals=None):
+        """ Write a chunk of triangles
+
+        Parameters
+        ----------
+        triangles : ndarray, shape (Nf, 3, 3)
+            The vertices of the triangles.
+        normals : ndarray, shape (Nf, 3) | None
+            The normals of the triangles. If None, they are computed.
+        """
+        triangles = np.asarray(triangles, np.float64)
+        records = np.zeros(len(triangles), _dtype)
+        records['vertices'] = triangles
+        records['normal'] = (_face_normals(triangles) if normals is None
+                             else normals)
+        self._f.write(records.tostring())
+        self._n_faces += len(records)
+
+    def close(self):
+        """ Write the number of triangles and close the file
+        """
+        if self._f.closed:
+            return
+        self._f.seek(80)
+        self._f.write(np.array([self._n_faces], '<u4').tostring())
+        self._f.close()
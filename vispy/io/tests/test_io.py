@@ -6,7 +6,10 @@ from os import path as op
 from numpy.testing import assert_allclose, assert_array_equal
 
 from vispy.io import write_mesh, read_mesh, load_data_file
-from vispy.geometry import _fast_cross_3d
+from vispy.io import ply
+from vispy.io.ply import PlyWriter, PlyReader
+from vispy.io.stl import StlReader
+from vispy.geometry import _fast_cross_3d, create_sphere
 from vispy.util import _TempDir
 from vispy.testing import run_tests_if_main, assert_equal, assert_raises
 
@@ -36,6 +39,201 @@ def test_wavefront():
                     rtol=1e-7, atol=1e-7)
 
 
+def test_wavefront_roundtrip():
+    """Test writing and reading wavefront files"""
+    md = create_sphere(10, 20)
+    vertices, faces = md.get_vertices(), md.get_faces()
+    normals = md.get_vertex_normals()
+    texcoords = vertices[:, :2].copy()
+    for ext in ('obj', 'obj.gz'):
+        fname = op.join(temp_dir, 'sphere.' + ext)
+        for mesh in ((vertices, faces, normals, texcoords),
+                     (vertices, faces, None, None)):
+            write_mesh(fname, *mesh, overwrite=True)
+            mesh2 = read_mesh(fname)
+            assert_allclose(mesh2[0], vertices)
+            assert_array_equal(mesh2[1], faces)
+            if mesh[3] is None:
+                # the normals are computed
+                assert_allclose((mesh2[2] ** 2).sum(axis=1), 1.)
+                assert_equal(mesh2[3], None)
+            else:
+                assert_allclose(mesh2[2], normals)
+                assert_allclose(mesh2[3], texcoords)
+
+
+def test_wavefront_records():
+    """Test reading polygons and relative indices from wavefront files"""
+    fname = op.join(temp_dir, 'polygons.obj')
+    with open(fname, 'wb') as f:
+        f.write(b'# a square and a pentagon\n'
+                b'o square\n'
+                b'v 0 0 0\n'
+                b'  v 1 0 0 1\n'
+                b'v 1 1 0\n\n'
+                b'v 0 1 0\n'
+                b'vt 0 0\nvt 1 0\nvt 1 1\nvt 0 1\n'
+                b'f -4/1 -3/2 -2/3 -1/4\r\n'
+                b'v 0 0 1\n'
+                b'f 1/1 2/2 3/3 4/4 5/1\n')
+    vertices, faces, normals, texcoords = read_mesh(fname)
+    assert_array_equal(faces, [[0, 1, 2], [0, 2, 3],
+                               [0, 1, 2], [0, 2, 3], [0, 3, 4]])
+    assert_array_equal(vertices, [[0, 0, 0], [1, 0, 0], [1, 1, 0],
+                                  [0, 1, 0], [0, 0, 1]])
+    assert_array_equal(texcoords, [[0, 0], [1, 0], [1, 1], [0, 1], [0, 0]])
+    assert_equal(normals.shape, (5, 3))
+    # vertices without faces
+    with open(fname, 'wb') as f:
+        f.write(b'v 0 0 0\nv 1 0 0\n')
+    vertices, faces, normals, texcoords = read_mesh(fname)
+    assert_array_equal(vertices, [[0, 0, 0], [1, 0, 0]])
+    assert_equal(faces, None)
+    with open(fname, 'wb') as f:
+        f.write(b'v 0 0 0\nv 1 0 0\nv 0 1 0\nf 1 2 4\n')
+    assert_raises(IndexError, read_mesh, fname)
+    with open(fname, 'wb') as f:
+        f.write(b'v 0 0 zero\n')
+    assert_raises(ValueError, read_mesh, fname)
+
+
+def test_wavefront_cache():
+    """Test the cache of wavefront files"""
+    fname = op.join(temp_dir, 'cached.obj')
+    md = create_sphere(10, 20)
+    write_mesh(fname, md.get_vertices(), md.get_faces(), None, None)
+    mesh = read_mesh(fname, cache=True)
+    assert_equal(op.isfile(fname + '.npz'), True)
+    for x, y in zip(mesh, read_mesh(fname, cache=True)):
+        assert_array_equal(x, y)
+    # the cache follows changes of the file
+    write_mesh(fname, md.get_vertices()[:3], np.array([[0, 1, 2]]), None, None,
+               overwrite=True)
+    assert_equal(len(read_mesh(fname, cache=True)[0]), 3)
+
+
+def test_ply():
+    """Test reading and writing binary PLY files"""
+    md = create_sphere(10, 20)
+    vertices, faces = md.get_vertices(), md.get_faces()
+    normals = md.get_vertex_normals()
+    texcoords = vertices[:, :2].copy()
+    fname = op.join(temp_dir, 'sphere.ply')
+    write_mesh(fname, vertices, faces, normals, texcoords)
+    mesh = read_mesh(fname)
+    for x, y in zip(mesh, (vertices, faces, normals, texcoords)):
+        assert_array_equal(x, y)
+        # viewed on the memory-mapped file
+        assert_equal(x.flags.owndata or x.flags.writeable, False)
+    # memory-mapped files are not overwritten, for Windows
+    fname = op.join(temp_dir, 'sphere_nonormals.ply')
+    write_mesh(fname, vertices, faces, None, None)
+    assert_equal(read_mesh(fname)[2:], (None, None))
+    # polygons are triangulated
+    fname = op.join(temp_dir, 'polygons.ply')
+    with PlyWriter(fname) as writer:
+        writer.add_vertices(vertices[:4])
+        writer.add_vertices(vertices[4:6])
+        writer.add_faces([[0, 1, 2, 3]])
+        writer.add_faces([[3, 4, 5]] * 20)
+        assert_raises(RuntimeError, writer.add_vertices, vertices)
+    mesh = read_mesh(fname)
+    assert_equal(len(mesh[0]), 6)
+    assert_array_equal(mesh[1], [[0, 1, 2], [0, 2, 3]] + [[3, 4, 5]] * 20)
+    # without faces, every three vertices form a triangle
+    fname = op.join(temp_dir, 'triangles.ply')
+    write_mesh(fname, vertices[:6], None, None, None)
+    assert_array_equal(read_mesh(fname)[1], [[0, 1, 2], [3, 4, 5]])
+    assert_raises(ValueError, write_mesh, op.join(temp_dir, 'bad.ply'),
+                  vertices[:7], None, None, None)
+    # 2D vertices lie in the z=0 plane
+    fname = op.join(temp_dir, 'flat.ply')
+    write_mesh(fname, vertices[:6, :2], None, None, None)
+    assert_array_equal(read_mesh(fname)[0],
+                       np.column_stack((vertices[:6, :2], np.zeros(6))))
+    with PlyWriter(op.join(temp_dir, 'bad.ply')) as writer:
+        assert_raises(ValueError, writer.add_vertices, vertices[:, :1])
+        assert_raises(ValueError, writer.add_vertices, vertices[0])
+    # big-endian doubles are converted
+    fname = op.join(temp_dir, 'big_endian.ply')
+    with open(fname, 'wb') as f:
+        f.write(b'ply\nformat binary_big_endian 1.0\n'
+                b'element vertex 3\nproperty double x\nproperty double y\n'
+                b'property double z\nelement face 1\n'
+                b'property list uchar uint vertex_indices\nend_header\n')
+        f.write(vertices[:3].astype('>f8').tostring())
+        f.write(b'\x03' + np.arange(3, dtype='>u4').tostring())
+    mesh = read_mesh(fname)
+    assert_array_equal(mesh[0], vertices[:3])
+    assert_equal(mesh[0].dtype, np.float32)
+    assert_array_equal(mesh[1], [[0, 1, 2]])
+    fname = op.join(temp_dir, 'ascii.ply')
+    with open(fname, 'wb') as f:
+        f.write(b'ply\nformat ascii 1.0\nend_header\n')
+    assert_raises(ValueError, read_mesh, fname)
+
+
+def test_ply_mixed_polygons():
+    """Test reading PLY faces with different numbers of vertices"""
+    rng = np.random.RandomState(0)
+    polygons = [rng.randint(0, 10, n) for n in rng.randint(3, 7, 500)]
+    fname = op.join(temp_dir, 'mixed.ply')
+    with open(fname, 'wb') as f:
+        f.write(b'ply\nformat binary_little_endian 1.0\n'
+                b'element vertex 10\nproperty float x\nproperty float y\n'
+                b'property float z\nelement face 500\nproperty short flag\n'
+                b'property list uchar int vertex_indices\n'
+                b'property uchar quality\nend_header\n')
+        f.write(rng.rand(10, 3).astype('<f4').tostring())
+        for i, p in enumerate(polygons):
+            f.write(np.array([i], '<i2').tostring())
+            f.write(bytearray([len(p)]) + p.astype('<i4').tostring())
+            f.write(bytearray([i % 256]))
+    expected = [[p[0], p[k + 1], p[k + 2]]
+                for p in polygons for k in range(len(p) - 2)]
+    block = ply._SCAN_BLOCK
+    try:
+        # the scans across blocks, and in a single block
+        for size in (20, 1000, block):
+            ply._SCAN_BLOCK = size
+            reader = PlyReader(fname)
+            assert_array_equal(reader.finish()[1], expected)
+            for n, records, index in reader.elements['face']:
+                assert_array_equal(records['flag'], index)
+                assert_array_equal(records['quality'], index % 256)
+                assert_equal(records['vertex_indices'].shape, (len(index), n))
+    finally:
+        ply._SCAN_BLOCK = block
+    # truncated files
+    with open(fname, 'r+b') as f:
+        f.truncate(op.getsize(fname) - 5)
+    assert_raises(ValueError, read_mesh, fname)
+
+
+def test_stl():
+    """Test reading and writing binary STL files"""
+    md = create_sphere(10, 20)
+    vertices, faces = md.get_vertices(), md.get_faces()
+    fname = op.join(temp_dir, 'sphere.stl')
+    write_mesh(fname, vertices, faces, None, None)
+    reader = StlReader(fname)
+    assert_array_equal(reader.triangles, vertices[faces])
+    assert_equal(reader.triangles.flags.writeable, False)
+    mesh = read_mesh(fname)
+    assert_array_equal(mesh[0], vertices[faces].reshape(-1, 3))
+    assert_array_equal(mesh[1], np.arange(3 * len(faces)).reshape(-1, 3))
+    # the normals of the faces point out of the sphere
+    tri = vertices[faces]
+    assert_allclose((mesh[2] ** 2).sum(axis=1), 1., rtol=1e-5)
+    assert_equal(((mesh[2][::3] * tri.mean(axis=1)).sum(axis=1) > 0).all(),
+                 True)
+    assert_equal(mesh[3], None)
+    fname = op.join(temp_dir, 'ascii.stl')
+    with open(fname, 'wb') as f:
+        f.write(b'solid sphere\nendsolid sphere\n')
+    assert_raises(ValueError, read_mesh, fname)
+
+
 def _slow_calculate_normals(rr, tris):
     """Efficiently compute vertex normals for triangulated surface"""
     # first, compute triangle normals
@@ -14,208 +14,352 @@ to be described.
 This implementation does only supports mesh stuff, so no nurbs etc. Further,
 material properties are ignored, although this might be implemented later,
 
+The whole file is parsed at once with numpy: the records are separated with
+vectorized byte operations and their numbers are parsed in bulk, so that
+large meshes load quickly. Faces with more than three vertices are
+triangulated as fans. The parsed mesh can be cached in a sidecar ``.npz``
+file, next to the OBJ file, which is used as long as the modification time
+and size of the OBJ file do not change.
+
 The classes are written with compatibility of Python3 in mind.
 
 """
 
-import numpy as np
+import os
 import time
 from os import path as op
 
+import numpy as np
+
 from ..ext.gzip_open import gzip_open
 from ..geometry import _calculate_normals
 from ..util import logger
 
+# the kinds of lines, 0 being for all others
+_V, _VT, _VN, _F = 1, 2, 3, 4
+_BLANK, _SLASH = ord(' '), ord('/')
+_CACHE_VERSION = 1
+_WRITE_CHUNK = 100000  # the number of lines formatted at once when writing
+
+
+def _cache_fname(fname):
+    """ The name of the cache file of an OBJ file """
+    return fname + '.npz'
+
+
+def _cache_key(f):
+    """ The key identifying the state of an open file in its cache """
+    stat = os.fstat(f.fileno())
+    return np.array([stat.st_mtime, stat.st_size, _CACHE_VERSION])
+
+
+def _load_cache(fname, key):
+    """ The mesh cached for a file, or None if the cache is missing or stale
+    """
+    fname = _cache_fname(fname)
+    if not op.isfile(fname):
+        return None
+    try:
+        with np.load(fname) as npz:
+            if not np.array_equal(npz['key'], key):
+                return None
+            return tuple(npz[name] if name in npz.files else None
+                         for name in ('vertices', 'faces', 'normals',
+                                      'texcoords'))
+    except Exception as exp:
+        logger.debug('Could not read mesh cache %s: %s' % (fname, exp))
+        return None
+
+
+def _save_cache(fname, key, mesh):
+    """ Store a mesh in the cache of a file """
+    arrays = dict((name, value) for name, value in
+                  zip(('vertices', 'faces', 'normals', 'texcoords'), mesh)
+                  if value is not None)
+    fname = _cache_fname(fname)
+    try:
+        with open(fname, 'wb') as f:
+            np.savez(f, key=key, **arrays)
+    except (IOError, OSError) as exp:
+        logger.warning('Could not write mesh cache %s: %s' % (fname, exp))
+
+
+def _chars(data, pos, ends):
+    """ The characters at the given positions, or blanks past the ends of
+    their lines
+    """
+    if not len(data):
+        return np.zeros(len(pos), np.uint8) + _BLANK
+    chars = data[np.minimum(pos, len(data) - 1)]
+    return np.where(pos < ends, chars, _BLANK)
+
+
+def _tokens(buf, offsets):
+    """ The start of the whitespace-separated tokens in a buffer, and the
+    line (given by the offsets of the lines) that each belongs to
+    """
+    blank = (buf <= _BLANK).view(np.int8)
+    starts = np.flatnonzero(np.diff(blank) == -1) + 1
+    if len(blank) and not blank[0]:
+        starts = np.concatenate(([0], starts))
+    return starts, np.searchsorted(offsets, starts, 'right') - 1
+
+
+def _first_index(counts):
+    """ The index of the first of consecutive groups of *counts* items """
+    first = np.zeros(len(counts), np.intp)
+    np.cumsum(counts[:-1], out=first[1:])
+    return first
+
+
+def _fan_triangles(counts, corners):
+    """ Triangulate polygons as fans
+
+    Parameters
+    ----------
+    counts : ndarray
+        The number of corners of each polygon.
+    corners : ndarray
+        The vertex indices of the corners of all polygons, one polygon after
+        the other.
+
+    Returns
+    -------
+    faces : ndarray, shape (Nf, 3)
+        The triangles, with the dtype of *corners*.
+    """
+    n_tri = np.maximum(counts - 2, 0)
+    face = np.repeat(np.arange(len(counts)), n_tri)
+    k = np.arange(len(face)) - np.repeat(_first_index(n_tri), n_tri)
+    first = _first_index(counts)[face]
+    return np.column_stack((corners[first], corners[first + k + 1],
+                            corners[first + k + 2]))
 
-class WavefrontReader(object):
-
-    def __init__(self, f):
-        self._f = f
-
-        # Original vertices, normals and texture coords.
-        # These are not necessarily of the same length.
-        self._v = []
-        self._vn = []
-        self._vt = []
-
-        # Final vertices, normals and texture coords.
-        # All three lists are of the same length, as opengl wants it.
-        self._vertices = []
-        self._normals = []
-        self._texcords = []
 
-        # The faces, indices to vertex/normal/texcords arrays.
-        self._faces = []
+class WavefrontReader(object):
 
-        # Dictionary to keep track of processed face data, so we can
-        # convert the original v/vn/vn to the final vertices/normals/texcords.
-        self._facemap = {}
+    def __init__(self, data):
+        # The content of the file, as a uint8 array
+        self._data = data
+
+        # Where the lines start (after any leading whitespace) and end
+        nl = np.flatnonzero(data == 10)
+        self._starts = np.concatenate(([0], nl + 1))
+        self._ends = np.concatenate((nl, [len(data)]))
+        for i in np.flatnonzero(_chars(data, self._starts, self._ends) <=
+                                _BLANK):
+            # the rare lines that are indented (or blank) one by one
+            line = data[self._starts[i]:self._ends[i]]
+            self._starts[i] += np.argmax(np.append(line > _BLANK, True))
+
+        # The kind of each line
+        starts, ends = self._starts, self._ends
+        c0, c1, c2 = [_chars(data, starts + i, ends) for i in range(3)]
+        self._kinds = np.zeros(len(starts), np.uint8)
+        vertex = c0 == ord('v')
+        self._kinds[vertex & (c1 <= _BLANK)] = _V
+        self._kinds[vertex & (c1 == ord('t')) & (c2 <= _BLANK)] = _VT
+        self._kinds[vertex & (c1 == ord('n')) & (c2 <= _BLANK)] = _VN
+        self._kinds[(c0 == ord('f')) & (c1 <= _BLANK)] = _F
+        other = (self._kinds == 0) & (starts < ends) & (c0 != ord('#'))
+        self._warnCommands(np.flatnonzero(other))
 
     @classmethod
-    def read(cls, fname):
-        """ read(fname, fmt)
+    def read(cls, fname, cache=False):
+        """ read(fname, cache=False)
 
         This classmethod is the entry point for reading OBJ files.
 
         Parameters
         ----------
         fname : str
-            The name of the file to read.
-        fmt : str
-            Can be "obj" or "gz" to specify the file format.
+            The name of the file to read. Must end with ".obj" or ".gz".
+        cache : bool
+            Whether to cache the mesh in a ``.npz`` file next to the file,
+            to load it faster the next time.
         """
         # Open file
         fmt = op.splitext(fname)[1].lower()
         assert fmt in ('.obj', '.gz')
         opener = open if fmt == '.obj' else gzip_open
-        with opener(fname, 'rb') as f:
-            try:
-                reader = WavefrontReader(f)
-                while True:
-                    reader.readLine()
-            except EOFError:
-                pass
-
-        # Done
         t0 = time.time()
-        mesh = reader.finish()
-        logger.debug('reading mesh took ' + str(time.time() - t0) + ' seconds')
+        with open(fname, 'rb') as f:
+            key = _cache_key(f)
+            mesh = _load_cache(fname, key) if cache else None
+            if mesh is not None:
+                logger.debug('reading mesh from cache took %s seconds'
+                             % (time.time() - t0))
+                return mesh
+            if fmt == '.obj' and key[1] > 0:
+                data = np.memmap(f, np.uint8, mode='r')
+            else:
+                with opener(fname, 'rb') as fz:
+                    data = np.frombuffer(fz.read(), np.uint8)
+            mesh = WavefrontReader(data).finish()
+        logger.debug('reading mesh took %s seconds' % (time.time() - t0))
+        if cache:
+            _save_cache(fname, key, mesh)
         return mesh
 
-    def readLine(self):
-        """ The method that reads a line and processes it.
+    def _warnCommands(self, lines):
+        """ Warn once about each kind of line that is ignored.
         """
-
-        # Read line
-        line = self._f.readline().decode('ascii', 'ignore')
-        if not line:
-            raise EOFError()
-        line = line.strip()
-
-        if line.startswith('v '):
-            # self._vertices.append( *self.readTuple(line) )
-            self._v.append(self.readTuple(line))
-        elif line.startswith('vt '):
-            self._vt.append(self.readTuple(line, 3))
-        elif line.startswith('vn '):
-            self._vn.append(self.readTuple(line))
-        elif line.startswith('f '):
-            self._faces.append(self.readFace(line))
-        elif line.startswith('#'):
-            pass  # Comment
-        elif line.startswith('mtllib '):
-            logger.warning('Notice reading .OBJ: material properties are '
-                           'ignored.')
-        elif any(line.startswith(x) for x in ('g ', 's ', 'o ', 'usemtl ')):
-            pass  # Ignore groups and smoothing groups, obj names, material
-        elif not line.strip():
-            pass
-        else:
-            logger.warning('Notice reading .OBJ: ignoring %s command.'
-                           % line.strip())
-
-    def readTuple(self, line, n=3):
-        """ Reads a tuple of numbers. e.g. vertices, normals or teture coords.
+        seen = set()
+        for i in lines:
+            line = self._data[self._starts[i]:self._ends[i]].tostring()
+            line = line.decode('ascii', 'ignore').strip()
+            command = line.split()[0]
+            if command in seen:
+                continue
+            seen.add(command)
+            if command == 'mtllib':
+                logger.warning('Notice reading .OBJ: material properties are '
+                               'ignored.')
+            elif command not in ('g', 's', 'o', 'usemtl'):
+                # Groups, smoothing groups, obj names and materials are
+                # ignored silently
+                logger.warning('Notice reading .OBJ: ignoring %s command.'
+                               % line)
+
+    def readRecords(self, kind):
+        """ Gather the lines of one kind in a single buffer, with their
+        keyword blanked out. Returns the buffer, the offsets of the lines in
+        it and the indices of the lines.
         """
-        numbers = [num for num in line.split(' ') if num]
-        return [float(num) for num in numbers[1:n + 1]]
-
-    def readFace(self, line):
+        lines = np.flatnonzero(self._kinds == kind)
+        if not len(lines):
+            return np.zeros(0, np.uint8), np.zeros(0, np.intp), lines
+        # runs of consecutive lines are contiguous in the file
+        breaks = np.flatnonzero(np.diff(lines) != 1) + 1
+        first = lines[np.concatenate(([0], breaks))]
+        last = lines[np.concatenate((breaks, [len(lines)])) - 1]
+        begin, end = self._starts[first], self._ends[last]
+        pieces = []
+        newline = np.array([10], np.uint8)
+        for b, e in zip(begin, end):
+            pieces.extend((self._data[b:e], newline))
+        buf = np.concatenate(pieces)
+        run_offsets = _first_index(end - begin + 1)
+        run = np.repeat(np.arange(len(first)),
+                        np.diff(np.concatenate(([0], breaks, [len(lines)]))))
+        offsets = self._starts[lines] - begin[run] + run_offsets[run]
+        for i in range(1 if kind in (_V, _F) else 2):
+            buf[offsets + i] = _BLANK
+        return buf, offsets, lines
+
+    def readTuples(self, kind, n=3):
+        """ Reads the tuples of numbers of all lines of one kind, e.g.
+        vertices, normals or texture coords. Only the first *n* numbers
+        of each line are kept, or less if some lines have less numbers.
+        """
+        buf, offsets, lines = self.readRecords(kind)
+        starts, line = _tokens(buf, offsets)
+        numbers = np.fromstring(buf.tostring(), np.float64, sep=' ')
+        if len(numbers) != len(starts):
+            raise ValueError('Invalid numbers in .OBJ file')
+        counts = np.bincount(line, minlength=len(lines))
+        n = min(n, counts.min()) if len(lines) else n
+        column = np.arange(len(starts)) - np.repeat(_first_index(counts),
+                                                    counts)
+        return numbers[column < n].reshape(-1, n)
+
+    def readFaces(self):
         """ Each face consists of three or more sets of indices. Each set
-        consists of 1, 2 or 3 indices to vertices/normals/texcords.
+        consists of 1, 2 or 3 indices to vertices/texcords/normals. Returns
+        the number of sets of each face and the (zero-based) indices of each
+        set, with -1 for the indices that are not given.
         """
-
-        # Get parts (skip first)
-        indexSets = [num for num in line.split(' ') if num][1:]
-
-        final_face = []
-        for indexSet in indexSets:
-
-            # Did we see this exact index earlier? If so, it's easy
-            final_index = self._facemap.get(indexSet)
-            if final_index is not None:
-                final_face.append(final_index)
-                continue
-
-            # If not, we need to sync the vertices/normals/texcords ...
-
-            # Get and store final index
-            final_index = len(self._vertices)
-            final_face.append(final_index)
-            self._facemap[indexSet] = final_index
-
-            # What indices were given?
-            indices = [i for i in indexSet.split('/')]
-
-            # Store new set of vertex/normal/texcords.
-            # If there is a single face that does not specify the texcord
-            # index, the texcords are ignored. Likewise for the normals.
-            if True:
-                vertex_index = self._absint(indices[0], len(self._v))
-                self._vertices.append(self._v[vertex_index])
-            if self._texcords is not None:
-                if len(indices) > 1 and indices[1]:
-                    texcord_index = self._absint(indices[1], len(self._vt))
-                    self._texcords.append(self._vt[texcord_index])
-                else:
-                    if self._texcords:
-                        logger.warning('Ignoring texture coordinates because '
-                                       'it is not specified for all faces.')
-                    self._texcords = None
-            if self._normals is not None:
-                if len(indices) > 2 and indices[2]:
-                    normal_index = self._absint(indices[2], len(self._vn))
-                    self._normals.append(self._vn[normal_index])
-                else:
-                    if self._normals:
-                        logger.warning('Ignoring normals because it is not '
-                                       'specified for all faces.')
-                    self._normals = None
-
-        # Check face
-        if self._faces and len(self._faces[0]) != len(final_face):
-            raise RuntimeError(
-                'Vispy requires that all faces are either triangles or quads.')
-
-        # Done
-        return final_face
-
-    def _absint(self, i, ref):
-        i = int(i)
-        if i > 0:
-            return i - 1
-        else:
-            return ref + i
-
-    def _calculate_normals(self):
-        vertices, faces = self._vertices, self._faces
-        if faces is None:
-            # ensure it's always 2D so we can use our methods
-            faces = np.arange(0, vertices.size, dtype=np.uint32)[:, np.newaxis]
-        normals = _calculate_normals(vertices, faces)
-        return normals
+        buf, offsets, lines = self.readRecords(_F)
+        starts, line = _tokens(buf, offsets)
+        counts = np.bincount(line, minlength=len(lines))
+        # the slashes tell which indices each set gives
+        slash = buf == _SLASH
+        n_slash = np.bincount(np.searchsorted(starts, np.flatnonzero(slash),
+                                              'right') - 1,
+                              minlength=len(starts))
+        double = np.flatnonzero(slash[:-1] & slash[1:])
+        double = np.bincount(np.searchsorted(starts, double, 'right') - 1,
+                             minlength=len(starts))
+        if (n_slash > 2).any() or (double > 1).any():
+            raise ValueError('Invalid faces in .OBJ file')
+        buf[slash] = _BLANK
+        numbers = np.fromstring(buf.tostring(), np.int64, sep=' ')
+        n_numbers = 1 + n_slash - double
+        if len(numbers) != n_numbers.sum():
+            raise ValueError('Invalid faces in .OBJ file')
+        first = _first_index(n_numbers)
+        has_texcords = (n_slash > 0) & (double == 0)
+        indices = -np.ones((len(starts), 3), np.int64)
+        indices[:, 0] = numbers[first]
+        indices[has_texcords, 1] = numbers[first[has_texcords] + 1]
+        has_normals = n_slash == 2
+        indices[has_normals, 2] = numbers[(first + n_numbers - 1)[has_normals]]
+        # OBJ counts from 1, or backwards from the last record read
+        for i, kind in enumerate((_V, _VT, _VN)):
+            given = indices[:, i] != -1 if i else slice(None)
+            n_read = np.cumsum(self._kinds == kind)
+            ind = indices[given, i]
+            ind = np.where(ind > 0, ind - 1, n_read[lines][line][given] + ind)
+            if len(ind) and (ind.min() < 0 or ind.max() >= n_read[-1]):
+                raise IndexError('Invalid index in .OBJ faces')
+            indices[given, i] = ind
+        return counts, indices
 
     def finish(self):
-        """ Converts gathere lists to numpy arrays and creates
-        BaseMesh instance.
+        """ Parses the records and converts them to numpy arrays of
+        vertices, faces, normals and texture coordinates.
         """
-        self._vertices = np.array(self._vertices, 'float32')
-        if self._faces:
-            self._faces = np.array(self._faces, 'uint32')
-        else:
+        v = self.readTuples(_V).astype(np.float32)
+        counts, indices = self.readFaces()
+        if not len(indices):
             # Use vertices only
-            self._vertices = np.array(self._v, 'float32')
-            self._faces = None
-        if self._normals:
-            self._normals = np.array(self._normals, 'float32')
+            return (v, None, _calculate_normals(v, np.zeros((0, 3), int)),
+                    None)
+
+        # If there is a single face that does not specify the texcord
+        # index, the texcords are ignored. Likewise for the normals.
+        given = (indices[:, 1:] != -1).all(axis=0)
+        some = (indices[:, 1:] != -1).any(axis=0)
+        if some[0] and not given[0]:
+            logger.warning('Ignoring texture coordinates because '
+                           'it is not specified for all faces.')
+        if some[1] and not given[1]:
+            logger.warning('Ignoring normals because it is not '
+                           'specified for all faces.')
+        indices = indices[:, np.concatenate(([True], given))]
+
+        # Final vertices, normals and texture coords, one for each distinct
+        # set of indices, in order of first use, as opengl wants it.
+        sizes = [int(x) + 1 for x in indices.max(axis=0)]
+        if np.prod(sizes, dtype=float) < 2 ** 62:
+            # a single integer is faster to sort than the rows
+            keys = indices[:, 0].copy()
+            for i, size in enumerate(sizes[1:]):
+                keys *= size
+                keys += indices[:, i + 1]
         else:
-            self._normals = self._calculate_normals()
-        if self._texcords:
-            self._texcords = np.array(self._texcords, 'float32')
+            indices = np.ascontiguousarray(indices)
+            keys = indices.view([('', indices.dtype)] *
+                                indices.shape[1]).ravel()
+        _, index, inverse = np.unique(keys, return_index=True,
+                                      return_inverse=True)
+        order = np.argsort(index, kind='mergesort')
+        rank = np.empty(len(order), np.intp)
+        rank[order] = np.arange(len(order))
+        indices = indices[index[order]]
+        corners = rank[inverse].astype(np.uint32)
+
+        faces = _fan_triangles(counts, corners)
+
+        vertices = v[indices[:, 0]]
+        texcords = normals = None
+        if given[0]:
+            texcords = self.readTuples(_VT)[indices[:, 1]].astype(np.float32)
+        if given[1]:
+            normals = self.readTuples(_VN)[indices[:, -1]].astype(np.float32)
         else:
-            self._texcords = None
-
-        return self._vertices, self._faces, self._normals, self._texcords
+            normals = _calculate_normals(vertices, faces)
+        return vertices, faces, normals, texcords
 
 
 class WavefrontWriter(object):
@@ -262,33 +406,39 @@ class WavefrontWriter(object):
         text += '\n'
         self._f.write(text.encode('ascii'))
 
-    def writeTuple(self, val, what):
-        """ Writes a tuple of numbers (on one line).
+    def writeTuples(self, val, what):
+        """ Writes tuples of numbers, one per line, in bulk.
         """
         # Limit to three values. so RGBA data drops the alpha channel
         # Format can handle up to 3 texcords
-        val = val[:3]
-        # Make string
-        val = ' '.join([str(v) for v in val])
-        # Write line
-        self.writeLine('%s %s' % (what, val))
-
-    def writeFace(self, val, what='f'):
-        """ Write the face info to the net line.
+        val = np.asarray(val)
+        val = val.reshape(len(val), -1)[:, :3]
+        fmt = '%.9g' if val.dtype.itemsize <= 4 else '%.17g'
+        self.writeRows(val, ' '.join([what] + [fmt] * val.shape[1]))
+
+    def writeFaces(self, val, what='f'):
+        """ Write the faces, one per line, in bulk.
         """
         # OBJ counts from 1
-        val = [v + 1 for v in val]
-        # Make string
+        val = np.asarray(val, np.int64) + 1
         if self._hasValues and self._hasNormals:
-            val = ' '.join(['%i/%i/%i' % (v, v, v) for v in val])
+            index, n = '%i/%i/%i', 3
         elif self._hasNormals:
-            val = ' '.join(['%i//%i' % (v, v) for v in val])
+            index, n = '%i//%i', 2
         elif self._hasValues:
-            val = ' '.join(['%i/%i' % (v, v) for v in val])
+            index, n = '%i/%i', 2
         else:
-            val = ' '.join(['%i' % v for v in val])
-        # Write line
-        self.writeLine('%s %s' % (what, val))
+            index, n = '%i', 1
+        self.writeRows(np.repeat(val, n, axis=1),
+                       ' '.join([what] + [index] * val.shape[1]))
+
+    def writeRows(self, val, fmt):
+        """ Format the rows of an array as lines, a chunk at a time.
+        """
+        for i in range(0, len(val), _WRITE_CHUNK):
+            chunk = val[i:i + _WRITE_CHUNK]
+            text = (fmt + '\n') * len(chunk) % tuple(chunk.ravel().tolist())
+            self._f.write(text.encode('ascii'))
 
     def writeMesh(self, vertices, faces, normals, values, name=''):
         """ Write the given mesh instance.
@@ -335,15 +485,9 @@ class WavefrontWriter(object):
         self.writeLine('')
 
         # Write data
-        if True:
-            for i in range(N):
-                self.writeTuple(vertices[i], 'v')
+        self.writeTuples(vertices, 'v')
         if self._hasNormals:
-            for i in range(N):
-                self.writeTuple(normals[i], 'vn')
+            self.writeTuples(normals, 'vn')
         if self._hasValues:
-            for i in range(N):
-                self.writeTuple(values[i], 'vt')
-        if True:
-            for i in range(faces.shape[0]):
-                self.writeFace(faces[i])
+            self.writeTuples(values, 'vt')
+        self.writeFaces(faces)
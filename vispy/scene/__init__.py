@@ -30,13 +30,14 @@ For more information see:
 
 """
 
-__all__ = ['SceneCanvas', 'Node']
+__all__ = ['SceneCanvas', 'Node', 'InteractionQuality']
 
 from .visuals import *  # noqa
 from .cameras import *  # noqa
 from ..visuals.transforms import *  # noqa
 from .widgets import *  # noqa
 from .canvas import SceneCanvas  # noqa
+from .quality import InteractionQuality  # noqa
 from . import visuals  # noqa
 from ..visuals import transforms  # noqa
 from . import widgets  # noqa
@@ -9,6 +9,7 @@ import math
 import numpy as np
 
 from ...app import Timer
+from ...util.event import Event
 from ...util.quaternion import Quaternion
 from ...util import keys
 from ..node import Node
@@ -71,6 +72,12 @@ class BaseCamera(Node):
     name : str
         Name used to identify the camera in the scene.
 
+    Events
+    ------
+    interaction : Event
+        Emitted while the user changes the view (dragging, scrolling, or
+        flying). A SceneCanvas uses it to lower the rendering quality while
+        interacting, see ``SceneCanvas.interaction_quality``.
     """
 
     # These define the state of the camera
@@ -81,6 +88,7 @@ class BaseCamera(Node):
 
     def __init__(self, interactive=True, flip=None, up='+z', **kwargs):
         super(BaseCamera, self).__init__(**kwargs)
+        self.events.add(interaction=Event)
 
         # The viewbox for which this camera is active
         self._viewbox = None
@@ -401,6 +409,13 @@ class BaseCamera(Node):
             self._key_events_bound = True
             event.canvas.events.key_press.connect(self.viewbox_key_event)
             event.canvas.events.key_release.connect(self.viewbox_key_event)
+            self.events.interaction.connect(
+                event.canvas._on_camera_interaction)
+        # Dragging and scrolling change the view interactively
+        if self.interactive and (event.type == 'mouse_wheel' or
+                                 (event.type == 'mouse_move' and
+                                  event.press_event is not None)):
+            self.events.interaction()
 
     def viewbox_key_event(self, event):
         if event.key == keys.BACKSPACE:
@@ -1533,6 +1548,7 @@ class FlyCamera(PerspectiveCamera):
         # Update
         if self._speed.any() or roll_angle or self._update_from_mouse:
             self._update_from_mouse = False
+            self.events.interaction()
             self.view_changed()
 
     def viewbox_key_event(self, event):
@@ -85,6 +85,9 @@ class SceneCanvas(app.Canvas):
         A scale factor to apply between logical and physical pixels in addition
         to the actual scale factor determined by the backend. This option 
         allows the scale factor to be adjusted for testing.
+    interaction_quality : InteractionQuality | None
+        The policy to lower the quality of expensive visuals while a camera
+        is being moved. None (default) always draws at full quality.
 
     See also
     --------
@@ -99,6 +102,8 @@ class SceneCanvas(app.Canvas):
         self._central_widget = None
 
         self._bgcolor = Color(kwargs.pop('bgcolor', 'black')).rgba
+        self._interaction_quality = None
+        self.interaction_quality = kwargs.pop('interaction_quality', None)
 
         app.Canvas.__init__(self, *args, **kwargs)
         self.events.mouse_press.connect(self._process_mouse_event)
@@ -149,6 +154,27 @@ class SceneCanvas(app.Canvas):
     def _scene_update(self, event):
         self.update()
 
+    @property
+    def interaction_quality(self):
+        """ The InteractionQuality policy used while cameras are moved, or
+        None to always draw at full quality.
+        """
+        return self._interaction_quality
+
+    @interaction_quality.setter
+    def interaction_quality(self, policy):
+        if self._interaction_quality is not None:
+            self._interaction_quality.events.change.disconnect(
+                self._scene_update)
+        self._interaction_quality = policy
+        if policy is not None:
+            # redraw at full quality when the interaction ends
+            policy.events.change.connect(self._scene_update)
+
+    def _on_camera_interaction(self, event):
+        if self._interaction_quality is not None:
+            self._interaction_quality.interaction()
+
     def on_draw(self, event):
         if self._scene is None:
             return  # Can happen on initialization
@@ -229,6 +255,9 @@ class SceneCanvas(app.Canvas):
         
         scene_event = SceneDrawEvent(canvas=self, event=event, 
                                      transform_cache=tr_cache)
+        quality = self._interaction_quality
+        if quality is not None and quality.active:
+            scene_event.quality = quality
         prof('create SceneDrawEvent')
         
         vp = (0, 0) + self.physical_size if viewport is None else viewport
@@ -0,0 +1,87 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2014, Vispy Development Team.
+# Distributed under the (new) BSD License. See LICENSE.txt for more info.
+
+from __future__ import division
+
+import time
+
+from ..app import Timer
+from ..util.event import EmitterGroup, Event
+
+
+class InteractionQuality(object):
+    """ Policy to lower the quality of expensive visuals while the view
+    is being changed interactively
+
+    Cameras emit an ``interaction`` event while the user drags or zooms
+    the view. From the first interaction until input has been idle for
+    *idle_delay* seconds, the policy is active: visuals that support it
+    (e.g. volumes and images) draw to a downscaled offscreen buffer, and
+    volumes take larger steps along the rays. The scene is then redrawn
+    once at full quality.
+
+    Set the policy with ``SceneCanvas.interaction_quality``.
+
+    Parameters
+    ----------
+    resolution : float
+        The resolution to draw at while interacting, relative to the full
+        resolution.
+    step_factor : float
+        The factor by which the ray step size of volumes is increased while
+        interacting.
+    idle_delay : float
+        The time in seconds without interaction after which the scene is
+        drawn at full quality.
+
+    Events
+    ------
+    change : Event
+        Emitted when the policy becomes active or inactive. The ``active``
+        attribute of the event tells which.
+    """
+
+    def __init__(self, resolution=0.5, step_factor=2.0, idle_delay=0.3):
+        if not 0 < resolution <= 1:
+            raise ValueError('resolution must be in (0, 1], not %r'
+                             % resolution)
+        if step_factor < 1:
+            raise ValueError('step_factor must be at least 1, not %r'
+                             % step_factor)
+        self.resolution = float(resolution)
+        self.step_factor = float(step_factor)
+        self.idle_delay = float(idle_delay)
+        self.events = EmitterGroup(source=self, change=Event)
+        self._active = False
+        self._last = 0.
+        self._timer = None
+
+    @property
+    def active(self):
+        """ Whether the view is being changed interactively """
+        return self._active
+
+    def interaction(self, event=None):
+        """ Report an interaction. Connect camera ``interaction`` events
+        to this method.
+        """
+        self._last = time.time()
+        if self._timer is None:
+            self._timer = Timer(connect=self._check_idle)
+        if not self._timer.running:
+            # poll for the end of the interaction
+            self._timer.start(max(self.idle_delay / 4., 0.01))
+        if not self._active:
+            self._active = True
+            self.events.change(active=True)
+
+    def _check_idle(self, event=None):
+        """ End the interaction if input has been idle long enough """
+        if time.time() - self._last < self.idle_delay:
+            return
+        if self._timer is not None:
+            self._timer.stop()
+        if self._active:
+            self._active = False
+            self.events.change(active=False)
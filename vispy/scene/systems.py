@@ -21,6 +21,7 @@ class DrawingSystem(object):
         # Draw this node if it is a visual
         if isinstance(node, Visual) and node.visible:
             try:
+                node.update_lod(event)
                 node.draw(event)
                 prof('draw')
             except Exception:
@@ -0,0 +1,68 @@
+# -*- coding: utf-8 -*-
+# -----------------------------------------------------------------------------
+# Copyright (c) 2014, Vispy Development Team. All Rights Reserved.
+# Distributed under the (new) BSD License. See LICENSE.txt for more info.
+# -----------------------------------------------------------------------------
+import time
+
+import numpy as np
+from pytest import raises
+
+from vispy import scene
+from vispy.scene import InteractionQuality
+from vispy.testing import (requires_application, TestingCanvas,
+                           run_tests_if_main, assert_equal, assert_true)
+
+
+def test_interaction_quality_policy():
+    """Test the interaction quality policy"""
+    for kwargs in (dict(resolution=0), dict(resolution=1.5),
+                   dict(step_factor=0.5)):
+        with raises(ValueError):
+            InteractionQuality(**kwargs)
+    policy = InteractionQuality(resolution=0.25, step_factor=3)
+    assert_equal((policy.resolution, policy.step_factor), (0.25, 3.))
+    assert_true(not policy.active)
+    changes = []
+    policy.events.change.connect(lambda event: changes.append(event.active))
+    policy._check_idle()
+    assert_equal(changes, [])
+    # cameras report interactions with an event
+    cam = scene.TurntableCamera()
+    cam.events.interaction.connect(lambda event: changes.append('camera'))
+    cam.events.interaction()
+    assert_equal(changes, ['camera'])
+
+
+@requires_application()
+def test_interaction_quality():
+    """Test drawing at reduced quality while the camera moves"""
+    policy = InteractionQuality(resolution=0.5, idle_delay=0.05)
+    with TestingCanvas(size=(80, 60), interaction_quality=policy) as c:
+        assert_true(c.interaction_quality is policy)
+        view = c.central_widget.add_view()
+        view.camera = 'turntable'
+        vol = np.zeros((20, 20, 20), np.float32)
+        vol[5:15, 5:15, 5:15] = 1.
+        scene.visuals.Volume(vol, parent=view.scene)
+        view.camera.set_range()
+        full = c.render()
+
+        # dragging the camera makes the policy active
+        press = c.events.mouse_press(pos=(40, 30), button=1, modifiers=())
+        c.events.mouse_move(pos=(41, 30), button=1, buttons=[1],
+                            modifiers=(), press_event=press,
+                            last_event=press)
+        assert_true(policy.active)
+        draft = c.render()
+        assert_equal(draft.shape, full.shape)
+        assert_true(draft[..., :3].any())
+
+        # full quality once input is idle
+        time.sleep(0.1)
+        policy._check_idle()
+        assert_true(not policy.active)
+        c.interaction_quality = None
+
+
+run_tests_if_main()
@@ -31,5 +31,5 @@ from .surface_plot import SurfacePlotVisual  # noqa
 from .text import TextVisual  # noqa
 from .tube import TubeVisual  # noqa
 from .visual import Visual  # noqa
-from .volume import VolumeVisual  # noqa
+from .volume import VolumeVisual, BrickedVolumeVisual  # noqa
 from .xyz_axis import XYZAxisVisual  # noqa
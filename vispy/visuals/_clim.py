@@ -0,0 +1,112 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2014, Vispy Development Team.
+# Distributed under the (new) BSD License. See LICENSE.txt for more info.
+"""
+Scalar textures in their native data type, with contrast limits applied
+on the GPU.
+
+Integer data is uploaded as normalized fixed-point textures of the same
+size (signed data is shifted to unsigned on the way), and other data as
+float textures. The shader maps texture values back to data values and
+applies the contrast limits with a single multiply-add, so that changing
+the limits only changes a uniform.
+"""
+
+from __future__ import division
+
+import numpy as np
+
+from .shaders import Function
+
+_channels = {1: 'r', 2: 'rg', 3: 'rgb', 4: 'rgba'}
+
+# GLSL snippet: map a texture value to [0, 1] given the contrast limits
+APPLY_CLIM = """
+float apply_clim(vec4 color) {
+    return clamp(color.r * $clim_scale.x + $clim_scale.y, 0.0, 1.0);
+}
+"""
+
+
+def scalar_texture_data(data, n_channels=1):
+    """ Prepare scalar data for upload as a texture
+
+    Parameters
+    ----------
+    data : ndarray
+        The data.
+    n_channels : int
+        The number of channels, stored along the last axis if more than one.
+
+    Returns
+    -------
+    data : ndarray
+        The data to upload: uint8 or uint16 for integer data up to 16 bits,
+        and float32 otherwise.
+    internalformat : str
+        The texture internal format to use for the data.
+    scale : tuple
+        The (scale, offset) that maps texture values to data values.
+    """
+    data = np.asarray(data)
+    base = _channels[n_channels]
+    kind, size = data.dtype.kind, data.dtype.itemsize
+    if kind == 'b':
+        return data.view(np.uint8), base + '8', (255., 0.)
+    if kind == 'u' and size == 1:
+        return data, base + '8', (255., 0.)
+    if kind == 'u' and size == 2:
+        return data, base + '16', (65535., 0.)
+    if kind == 'i' and size == 1:
+        return data.view(np.uint8) ^ np.uint8(0x80), base + '8', (255., -128.)
+    if kind == 'i' and size == 2:
+        return (data.view(np.uint16) ^ np.uint16(0x8000), base + '16',
+                (65535., -32768.))
+    return (np.asarray(data, np.float32), base + '32f', (1., 0.))
+
+
+def clim_scale(clim, scale):
+    """ The multiply-add that maps texture values to [0, 1]
+
+    Parameters
+    ----------
+    clim : tuple
+        The contrast limits, in data values.
+    scale : tuple
+        The (scale, offset) that maps texture values to data values, as
+        returned by ``scalar_texture_data``.
+
+    Returns
+    -------
+    clim_scale : tuple
+        The (a, b) such that ``texture_value * a + b`` is 0 at the lower
+        and 1 at the upper contrast limit.
+    """
+    lo, hi = float(clim[0]), float(clim[1])
+    s, o = scale
+    if hi == lo:
+        # a step: everything at or above the limit is 1
+        lo -= max(abs(lo), 1.) * 1e-6
+    k = 1. / (hi - lo)
+    return s * k, (o - lo) * k
+
+
+def colormap_function(cmap):
+    """ The shader function of a colormap, for scalar data
+
+    It samples the lookup table of the colormap in a texture, which is a
+    single fetch however complex the colormap is.
+
+    Parameters
+    ----------
+    cmap : BaseColormap
+        The colormap.
+
+    Returns
+    -------
+    function : Function
+        The function mapping [0, 1] to rgba colors.
+    """
+    function = Function(cmap.glsl_lut)
+    function['lut'] = cmap.texture_lut()
+    return function
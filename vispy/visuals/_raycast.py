@@ -0,0 +1,226 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2014, Vispy Development Team.
+# Distributed under the (new) BSD License. See LICENSE.txt for more info.
+"""
+Empty-space skipping for volume raycasting, and a CPU reference raycaster.
+
+The volume is divided in cubic blocks, and the maximum value that can be
+sampled inside each block (including the voxels bordering the block, which
+take part in the linear interpolation) is stored in a low-resolution grid.
+While marching, a ray leaps over a whole block when its maximum cannot
+change the result: below the current maximum for MIP, below the threshold
+for isosurfaces and at the lower contrast limit for translucent rendering.
+Rays also stop as soon as the result cannot change anymore.
+
+The reference raycaster implements the same algorithm with numpy, so that
+it can be tested without a GPU.
+"""
+
+from __future__ import division
+
+import numpy as np
+
+from ..color import get_colormap
+
+# Opacity at which translucent rays stop
+STOP_OPACITY = 0.99
+
+
+def block_max(data, block_size):
+    """ Maximum value of each block of a volume
+
+    The maximum includes the voxels that border the block, so that it
+    bounds all values that can be obtained by linear interpolation inside
+    the block.
+
+    Parameters
+    ----------
+    data : ndarray
+        The volume, with shape (depth, height, width).
+    block_size : int
+        Size of the (cubic) blocks in voxels.
+
+    Returns
+    -------
+    grid : ndarray
+        The maximum of each block, with shape ``ceil(data.shape /
+        block_size)``, of the same type as the data.
+    """
+    data = np.asarray(data)
+    if data.ndim != 3:
+        raise ValueError('Volume must be 3D, not %s' % (data.shape,))
+    K = int(block_size)
+    for axis in range(3):
+        data = _block_max_axis(data, K, axis)
+    return data
+
+
+def _block_max_axis(a, K, axis):
+    """ Block maximum along one axis, including the bordering voxels """
+    a = np.swapaxes(a, 0, axis)
+    n = a.shape[0]
+    g = -(-n // K)
+    if g * K != n:
+        # pad by repeating the edge, as sampling with clamp_to_edge does
+        a = np.concatenate([a, np.repeat(a[-1:], g * K - n, axis=0)])
+    m = a.reshape((g, K) + a.shape[1:]).max(axis=1)
+    # last voxel of the previous block and first voxel of the next one
+    m[1:] = np.maximum(m[1:], a[K - 1::K][:g - 1])
+    m[:-1] = np.maximum(m[:-1], a[K::K])
+    return np.swapaxes(m, 0, axis)
+
+
+def _sample(data, pos):
+    """ Trilinear interpolation at (x, y, z) voxel positions, clamping to
+    the edges """
+    shape = np.array(data.shape[::-1])
+    pos = np.clip(pos, 0, shape - 1)
+    i0 = np.minimum(np.floor(pos).astype(int), shape - 2).clip(0)
+    f = pos - i0
+    i1 = np.minimum(i0 + 1, shape - 1)
+    val = 0.
+    for cz in (0, 1):
+        z, wz = (i1[:, 2], f[:, 2]) if cz else (i0[:, 2], 1 - f[:, 2])
+        for cy in (0, 1):
+            y, wy = (i1[:, 1], f[:, 1]) if cy else (i0[:, 1], 1 - f[:, 1])
+            for cx in (0, 1):
+                x, wx = (i1[:, 0], f[:, 0]) if cx else (i0[:, 0], 1 - f[:, 0])
+                val = val + data[z, y, x] * (wz * wy * wx)
+    return val
+
+
+def raycast(data, origins, directions, method='mip', clim=None,
+            threshold=0.5, step_size=0.8, cmap='grays', block_size=None):
+    """ Cast rays through a volume on the CPU
+
+    This is a reference implementation of the raycasting done by the
+    volume visual, including empty-space skipping and early ray
+    termination.
+
+    Parameters
+    ----------
+    data : ndarray
+        The volume, with shape (depth, height, width). Voxel (z, y, x) is
+        centered at position (x, y, z).
+    origins : ndarray
+        The (N, 3) start positions of the rays, in front of the volume.
+    directions : ndarray
+        The (N, 3) directions of the rays.
+    method : {'mip', 'iso', 'translucent'}
+        The render method.
+    clim : tuple of two floats | None
+        The contrast limits. Default maps between min and max.
+    threshold : float
+        The iso threshold, relative to the contrast limits.
+    step_size : float
+        The distance between samples, in voxels.
+    cmap : str
+        Colormap to use.
+    block_size : int | None
+        Size of the blocks for empty-space skipping. None disables
+        skipping.
+
+    Returns
+    -------
+    colors : ndarray
+        The (N, 4) colors of the rays. Rays that do not hit anything are
+        transparent.
+    n_samples : ndarray
+        The number of samples taken along each ray.
+    """
+    if method not in ('mip', 'iso', 'translucent'):
+        raise ValueError('Unknown render method %r' % method)
+    data = np.asarray(data, np.float64)
+    cmap = get_colormap(cmap)
+    if clim is None:
+        clim = data.min(), data.max()
+    lo, hi = float(clim[0]), float(clim[1])
+    scale = 1. / (hi - lo) if hi != lo else 1e12
+
+    def normalize(v):
+        return np.clip((v - lo) * scale, 0., 1.)
+
+    origins = np.atleast_2d(np.asarray(origins, np.float64))
+    directions = np.atleast_2d(np.asarray(directions, np.float64))
+    directions = directions / np.sqrt((directions ** 2).sum(axis=1))[:, None]
+    N = len(origins)
+
+    # entry and exit distance of each ray
+    box_lo = np.full(3, -0.5)
+    box_hi = np.array(data.shape[::-1]) - 0.5
+    with np.errstate(divide='ignore', invalid='ignore'):
+        t_a = (box_lo - origins) / directions
+        t_b = (box_hi - origins) / directions
+    t_a[np.isnan(t_a)] = -np.inf
+    t_b[np.isnan(t_b)] = np.inf
+    t0 = np.maximum(np.minimum(t_a, t_b).max(axis=1), 0)
+    t1 = np.maximum(t_a, t_b).min(axis=1)
+    n_steps = np.where(t1 > t0, np.floor((t1 - t0) / step_size) + 1, 0)
+    n_steps = n_steps.astype(int)
+
+    if block_size is not None:
+        K = int(block_size)
+        grid = normalize(block_max(data, K))
+        grid_shape = np.array(grid.shape[::-1])
+
+    k = np.zeros(N, int)
+    n_samples = np.zeros(N, int)
+    done = np.zeros(N, bool)
+    maxval = np.full(N, -np.inf)
+    hit = np.full(N, np.nan)
+    rgb = np.zeros((N, 3))
+    alpha = np.zeros(N)
+    limit = {'iso': threshold, 'translucent': 0.}.get(method)
+
+    while True:
+        active = np.where(~done & (k < n_steps))[0]
+        if len(active) == 0:
+            break
+        pos = (origins[active] + directions[active] *
+               (t0[active] + k[active] * step_size)[:, None])
+        if block_size is not None:
+            # leap over blocks that cannot change the result
+            block = np.floor((pos + 0.5) / K)
+            gi = block.clip(0, grid_shape - 1).astype(int)
+            bmax = grid[gi[:, 2], gi[:, 1], gi[:, 0]]
+            skip = bmax <= (maxval[active] if method == 'mip' else limit)
+            if skip.any():
+                d = directions[active][skip] * step_size
+                bound = (block[skip] + (d > 0)) * K - 0.5
+                with np.errstate(divide='ignore', invalid='ignore'):
+                    t = np.abs(bound - pos[skip]) / np.abs(d)
+                t[d == 0] = np.inf
+                leap = np.floor(t.min(axis=1)).astype(int) + 1
+                k[active[skip]] += leap
+                active, pos = active[~skip], pos[~skip]
+                if len(active) == 0:
+                    continue
+        n_samples[active] += 1
+        k[active] += 1
+        val = normalize(_sample(data, pos))
+        if method == 'mip':
+            maxval[active] = np.maximum(maxval[active], val)
+            done[active] = maxval[active] >= 1.
+        elif method == 'iso':
+            over = val > threshold
+            hit[active[over]] = val[over]
+            done[active] = over
+        else:
+            color = cmap[val].rgba.astype(np.float64)
+            a = 1 - (1 - np.clip(color[:, 3] * val, 0, 1)) ** step_size
+            w = (1 - alpha[active]) * a
+            rgb[active] += w[:, None] * color[:, :3]
+            alpha[active] += w
+            done[active] = alpha[active] >= STOP_OPACITY
+
+    colors = np.zeros((N, 4))
+    if method == 'translucent':
+        valid = alpha > 0
+        colors[valid, :3] = rgb[valid] / alpha[valid, None]
+        colors[valid, 3] = alpha[valid]
+    else:
+        values = maxval if method == 'mip' else hit
+        valid = (n_samples > 0) if method == 'mip' else ~np.isnan(hit)
+        if valid.any():
+            colors[valid] = cmap[values[valid]].rgba
+    return colors, n_samples
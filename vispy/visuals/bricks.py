@@ -0,0 +1,269 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2014, Vispy Development Team.
+# Distributed under the (new) BSD License. See LICENSE.txt for more info.
+"""
+Bricking of large volumes.
+
+A volume is split in cubic bricks that are read on demand, so that the
+data never needs to be in memory (or on the GPU) as a whole. Any array-like
+object with ``shape``, ``dtype`` and numpy-style slicing can be used as a
+source: numpy arrays, memory-mapped files, or chunked datasets such as
+those of h5py.
+
+The value range of each brick is stored in a min/max octree, which is used
+to find the bricks that can contribute to the rendering (e.g. that contain
+values above an iso threshold) without touching the data again.
+"""
+
+from __future__ import division
+
+from collections import OrderedDict
+
+import numpy as np
+
+
+class BrickedVolume(object):
+    """ A volume split in bricks, with a min/max octree over the bricks
+
+    Parameters
+    ----------
+    data : array-like
+        The volume, with shape (depth, height, width). Only the parts that
+        are needed are read.
+    brick_size : int
+        Size of the (cubic) bricks in voxels.
+    max_read : int
+        Maximum number of voxels read at once while computing the brick
+        statistics.
+    """
+
+    def __init__(self, data, brick_size=32, max_read=2**26):
+        shape = tuple(int(s) for s in data.shape)
+        if len(shape) != 3:
+            raise ValueError('Bricked volumes must be 3D, not %s'
+                             % (shape,))
+        self.data = data
+        self.shape = shape
+        self.brick_size = int(brick_size)
+        B = self.brick_size
+        self.grid = tuple(-(-s // B) for s in shape)
+        self._max_read = max_read
+        self._levels = None
+        self._sums = None
+
+    @property
+    def n_bricks(self):
+        """ The total number of bricks """
+        return int(np.prod(self.grid))
+
+    def _compute_stats(self):
+        """ Compute min, max and sum of each brick, reading the data in
+        slabs of bricks """
+        B = self.brick_size
+        gz, gy, gx = self.grid
+        D, H, W = self.shape
+        bmin = np.empty(self.grid, np.float64)
+        bmax = np.empty(self.grid, np.float64)
+        bsum = np.empty(self.grid, np.float64)
+        # number of brick rows (in y) per read
+        rows = max(1, self._max_read // (B * B * W) // B)
+        for k in range(gz):
+            for j0 in range(0, gy, rows):
+                j1 = min(j0 + rows, gy)
+                slab = np.asarray(self.data[k * B:(k + 1) * B,
+                                            j0 * B:j1 * B], np.float64)
+                # pad to whole bricks by repeating the edge values
+                pad = [(0, B - slab.shape[0]), (0, (j1 - j0) * B -
+                                                slab.shape[1]),
+                       (0, gx * B - W)]
+                if any(p[1] for p in pad):
+                    slab = np.pad(slab, pad, mode='edge')
+                slab = slab.reshape(B, j1 - j0, B, gx, B)
+                bmin[k, j0:j1] = slab.min(axis=(0, 2, 4))
+                bmax[k, j0:j1] = slab.max(axis=(0, 2, 4))
+                bsum[k, j0:j1] = slab.sum(axis=(0, 2, 4))
+        self._levels = [(bmin, bmax)]
+        while max(self._levels[-1][0].shape) > 1:
+            lo, hi = self._levels[-1]
+            self._levels.append((_reduce2(lo, np.minimum, np.inf),
+                                 _reduce2(hi, np.maximum, -np.inf)))
+        # the sums include the padding, which is fine for an estimate
+        self._sums = bsum
+
+    @property
+    def levels(self):
+        """ The min/max octree: a list of (min, max) arrays, from the
+        brick level to the root """
+        if self._levels is None:
+            self._compute_stats()
+        return self._levels
+
+    @property
+    def range(self):
+        """ The (min, max) value of the volume """
+        lo, hi = self.levels[-1]
+        return float(lo.ravel()[0]), float(hi.ravel()[0])
+
+    def mean(self):
+        """ Approximate mean of the volume, from the brick statistics """
+        if self._sums is None:
+            self._compute_stats()
+        B = self.brick_size
+        return float(self._sums.sum() / (np.prod(self.grid) * B ** 3))
+
+    def find_bricks(self, lo=-np.inf, hi=np.inf):
+        """ Find the bricks holding values in a range
+
+        Parameters
+        ----------
+        lo : float
+            Lower bound of the range.
+        hi : float
+            Upper bound of the range.
+
+        Returns
+        -------
+        bricks : array
+            Flat indices of the bricks whose value range overlaps
+            [lo, hi], in increasing order.
+        """
+        levels = self.levels
+        # walk down the octree, only expanding overlapping cells
+        cells = np.zeros((1, 3), int)
+        for bmin, bmax in levels[::-1]:
+            shape = np.array(bmin.shape)
+            inside = np.all(cells < shape, axis=1)
+            cells = cells[inside]
+            z, y, x = cells.T
+            keep = (bmax[z, y, x] >= lo) & (bmin[z, y, x] <= hi)
+            cells = cells[keep]
+            if bmin is levels[0][0]:
+                break
+            cells = (2 * cells[:, np.newaxis] + _children).reshape(-1, 3)
+        return np.sort(np.ravel_multi_index(cells.T, self.grid))
+
+    def brick_origin(self, brick):
+        """ The (z, y, x) index of the first voxel of a brick """
+        return tuple(int(i) * self.brick_size
+                     for i in np.unravel_index(brick, self.grid))
+
+    def read_brick(self, brick, dtype=None):
+        """ Read a brick, with a one-voxel apron around it
+
+        The apron holds the neighbouring voxels, so that linear
+        interpolation is continuous across bricks. At the borders of the
+        volume the edge voxels are repeated.
+
+        Parameters
+        ----------
+        brick : int
+            Flat index of the brick.
+        dtype : dtype | None
+            Type to convert the data to.
+
+        Returns
+        -------
+        data : array
+            Array of shape (brick_size + 2,) * 3.
+        """
+        B = self.brick_size
+        origin = self.brick_origin(brick)
+        sl, pad = [], []
+        for o, s in zip(origin, self.shape):
+            a, b = max(o - 1, 0), min(o + B + 1, s)
+            sl.append(slice(a, b))
+            pad.append((a - (o - 1), (o + B + 1) - b))
+        data = np.asarray(self.data[tuple(sl)])
+        if dtype is not None:
+            data = data.astype(dtype, copy=False)
+        if any(p != (0, 0) for p in pad):
+            data = np.pad(data, pad, mode='edge')
+        return data
+
+
+_children = np.array([[i, j, k] for i in (0, 1) for j in (0, 1)
+                      for k in (0, 1)])
+
+
+def _reduce2(a, func, fill):
+    """ Reduce an array by a factor 2 along each axis """
+    shape = [s + s % 2 for s in a.shape]
+    if list(a.shape) != shape:
+        b = np.empty(shape, a.dtype)
+        b.fill(fill)
+        b[:a.shape[0], :a.shape[1], :a.shape[2]] = a
+        a = b
+    a = a.reshape(shape[0] // 2, 2, shape[1] // 2, 2, shape[2] // 2, 2)
+    return func.reduce(func.reduce(func.reduce(a, axis=5), axis=3), axis=1)
+
+
+class BrickCache(object):
+    """ Assignment of bricks to a fixed number of slots, with least
+    recently used eviction
+
+    Parameters
+    ----------
+    n_slots : int
+        The number of slots.
+    """
+
+    def __init__(self, n_slots):
+        self.n_slots = int(n_slots)
+        self.clear()
+
+    def clear(self):
+        """ Remove all bricks """
+        self._slots = OrderedDict()  # brick -> slot, oldest first
+        self._free = list(range(self.n_slots))[::-1]
+
+    def __contains__(self, brick):
+        return brick in self._slots
+
+    def __len__(self):
+        return len(self._slots)
+
+    def slot(self, brick):
+        """ The slot of a resident brick """
+        return self._slots[brick]
+
+    def touch(self, bricks):
+        """ Mark bricks as recently used """
+        slots = self._slots
+        for brick in bricks:
+            if brick in slots:
+                slots[brick] = slots.pop(brick)
+
+    def insert(self, brick, protect=()):
+        """ Insert a brick, evicting the least recently used brick if
+        there is no free slot
+
+        Parameters
+        ----------
+        brick : int
+            The brick to insert.
+        protect : container
+            Bricks that must not be evicted.
+
+        Returns
+        -------
+        slot : int | None
+            The slot assigned to the brick, or None if all slots are
+            taken by protected bricks.
+        evicted : int | None
+            The brick that was evicted to make room, if any.
+        """
+        if brick in self._slots:
+            self.touch([brick])
+            return self._slots[brick], None
+        evicted = None
+        if len(self._free):
+            slot = self._free.pop()
+        else:
+            for evicted in self._slots:
+                if evicted not in protect:
+                    break
+            else:
+                return None, None
+            slot = self._slots.pop(evicted)
+        self._slots[brick] = slot
+        return slot, evicted
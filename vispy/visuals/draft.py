@@ -0,0 +1,121 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2014, Vispy Development Team.
+# Distributed under the (new) BSD License. See LICENSE.txt for more info.
+"""
+Drawing of visuals at reduced resolution.
+
+While the view is being changed interactively, visuals that are expensive
+to draw per pixel (e.g. volumes) can draw themselves to a smaller offscreen
+framebuffer, which is then stretched over the region of the view. The
+quality to use is given by the ``quality`` attribute of the
+TransformSystem passed to ``Visual.draw``, which is set by the
+SceneCanvas when an interaction quality policy is active.
+"""
+
+from __future__ import division
+
+import numpy as np
+
+from .. import gloo
+
+_VERT = """
+attribute vec2 a_position;
+attribute vec2 a_texcoord;
+varying vec2 v_texcoord;
+void main() {
+    gl_Position = vec4(a_position, 0.0, 1.0);
+    v_texcoord = a_texcoord;
+}
+"""
+
+_FRAG = """
+uniform sampler2D u_texture;
+varying vec2 v_texcoord;
+void main() {
+    gl_FragColor = texture2D(u_texture, v_texcoord);
+}
+"""
+
+
+class DraftBuffer(object):
+    """ Offscreen buffer to draw a visual at reduced resolution
+
+    The buffer covers the current viewbox (or the whole canvas), so that
+    the result is clipped to the view. The visual is drawn over transparent
+    black, and the result is blended as premultiplied color.
+    """
+
+    def __init__(self):
+        self._fbo = None
+        self._tex = None
+        self._program = None
+        self._vbo = None
+
+    @staticmethod
+    def region(transforms):
+        """ The (offset, size) of the region to draw, in canvas pixels """
+        canvas = transforms.canvas
+        view = transforms.viewbox
+        if view is None:
+            return (0., 0.), tuple(float(s) for s in canvas.size)
+        tr = transforms.node_transform(map_from=view,
+                                       map_to=transforms.canvas_cs)
+        p0 = tr.map((0, 0))[:2]
+        p1 = tr.map(view.size)[:2]
+        lo, hi = np.minimum(p0, p1), np.maximum(p0, p1)
+        return tuple(lo), tuple(hi - lo)
+
+    def _get_fbo(self, shape):
+        if self._fbo is None:
+            self._tex = gloo.Texture2D(shape + (4,), interpolation='linear',
+                                       wrapping='clamp_to_edge')
+            self._fbo = gloo.FrameBuffer(self._tex, gloo.RenderBuffer(shape))
+            self._program = gloo.Program(_VERT, _FRAG)
+            self._program['u_texture'] = self._tex
+            # the framebuffer has its origin in the lower left corner
+            self._program['a_texcoord'] = gloo.VertexBuffer(
+                np.array([[0, 1], [1, 1], [0, 0], [1, 0]], np.float32))
+            self._vbo = gloo.VertexBuffer(np.zeros((4, 2), np.float32))
+            self._program['a_position'] = self._vbo
+        elif self._tex.shape[:2] != shape:
+            self._fbo.color_buffer.resize(shape + (4,))
+            self._fbo.depth_buffer.resize(shape)
+        return self._fbo
+
+    def draw(self, transforms, resolution, draw):
+        """ Draw at reduced resolution
+
+        Parameters
+        ----------
+        transforms : SceneDrawEvent
+            The transforms of the visual.
+        resolution : float
+            The resolution, relative to that of the framebuffer.
+        draw : callable
+            Called without arguments to draw the visual, while the
+            offscreen buffer is active.
+        """
+        canvas = transforms.canvas
+        offset, size = self.region(transforms)
+        if size[0] <= 0 or size[1] <= 0:
+            return
+        scale = resolution * canvas.physical_size[0] / canvas.size[0]
+        shape = (max(1, int(round(size[1] * scale))),
+                 max(1, int(round(size[0] * scale))))
+        fbo = self._get_fbo(shape)
+        transforms.push_fbo(fbo, offset, size)
+        try:
+            gloo.clear(color=(0, 0, 0, 0), depth=True)
+            draw()
+        finally:
+            transforms.pop_fbo()
+
+        # Stretch the result over the region
+        x0, y0 = offset
+        x1, y1 = x0 + size[0], y0 + size[1]
+        corners = np.array([[x0, y0], [x1, y0], [x0, y1], [x1, y1]])
+        pos = canvas.render_transform.map(corners)
+        self._vbo.set_data((pos[:, :2] / pos[:, 3:4]).astype(np.float32))
+        gloo.set_state(blend=True, depth_test=False, cull_face=False,
+                       blend_func=('one', 'one_minus_src_alpha'))
+        self._program.draw('triangle_strip')
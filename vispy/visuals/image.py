@@ -11,6 +11,9 @@ from ..color import get_colormap
 from .shaders import ModularProgram, Function, FunctionChain
 from .transforms import NullTransform
 from .visual import Visual
+from .draft import DraftBuffer
+from ._clim import (APPLY_CLIM, scalar_texture_data, clim_scale,
+                    colormap_function)
 from ..ext.six import string_types
 
 
@@ -41,7 +44,6 @@ void main()
 """  # noqa
 
 _null_color_transform = 'vec4 pass(vec4 color) { return color; }'
-_c2l = 'float cmap(vec4 color) { return (color.r + color.g + color.b) / 3.; }'
 
 
 class ImageVisual(Visual):
@@ -78,12 +80,19 @@ class ImageVisual(Visual):
     Notes
     -----
     The colormap functionality through ``cmap`` and ``clim`` are only used
-    if the data are 2D.
+    if the data are 2D. Such data is stored on the GPU in its own type
+    (8 and 16 bit integers) or as float32, and the limits are applied in
+    the shader, so changing ``clim`` does not upload the data again.
+
+    While the view is changed interactively, the image may be drawn at
+    reduced resolution (see ``SceneCanvas.interaction_quality``).
     """
     def __init__(self, data=None, method='auto', grid=(10, 10),
                  cmap='cubehelix', clim='auto', **kwargs):
         super(ImageVisual, self).__init__(**kwargs)
         self._program = ModularProgram(VERT_SHADER, FRAG_SHADER)
+        self._clim_func = Function(APPLY_CLIM)
+        self._tex_scale = None
         self.clim = clim
         self.cmap = cmap
 
@@ -98,6 +107,7 @@ class ImageVisual(Visual):
         self._method_used = None
         self._grid = grid
         self._need_vertex_update = True
+        self._draft = DraftBuffer()
 
     def set_data(self, image):
         data = np.asarray(image)
@@ -121,9 +131,19 @@ class ImageVisual(Visual):
             if clim.shape != (2,):
                 raise ValueError('clim must have two elements')
         self._clim = clim
-        self._need_vertex_update = True
+        if self._tex_scale is not None:
+            self._update_clim()
         self.update()
 
+    def _update_clim(self):
+        """ Set the uniform that applies the contrast limits """
+        clim = self._clim
+        if isinstance(clim, string_types) and clim == 'auto':
+            clim = np.min(self._data), np.max(self._data)
+            self._clim = np.array(clim, float)
+        self._clim_func['clim_scale'] = clim_scale(self._clim,
+                                                   self._tex_scale)
+
     @property
     def cmap(self):
         return self._cmap
@@ -224,28 +244,22 @@ class ImageVisual(Visual):
 
     def _build_texture(self):
         data = self._data
-        if data.dtype == np.float64:
-            data = data.astype(np.float32)
-
+        internalformat = None
         if data.ndim == 2 or data.shape[2] == 1:
-            # deal with clim on CPU b/c of texture depth limits :(
-            # can eventually do this by simulating 32-bit float... maybe
-            clim = self._clim
-            if isinstance(clim, string_types) and clim == 'auto':
-                clim = np.min(data), np.max(data)
-            clim = np.asarray(clim, dtype=np.float32)
-            data = data - clim[0]  # not inplace so we don't modify orig data
-            if clim[1] - clim[0] > 0:
-                data /= clim[1] - clim[0]
-            else:
-                data[:] = 1 if data[0, 0] != 0 else 0
-            fun = FunctionChain(None, [Function(_c2l),
-                                       Function(self.cmap.glsl_map)])
-            self._clim = np.array(clim)
+            # native data type; clim is applied in the shader
+            data, internalformat, self._tex_scale = \
+                scalar_texture_data(data)
+            self._update_clim()
+            fun = FunctionChain(None, [self._clim_func,
+                                       colormap_function(self.cmap)])
         else:
+            if data.dtype == np.float64:
+                data = data.astype(np.float32)
+            self._tex_scale = None
             fun = Function(_null_color_transform)
         self._program.frag['color_transform'] = fun
-        self._texture = Texture2D(data, interpolation=self._interpolation)
+        self._texture = Texture2D(data, interpolation=self._interpolation,
+                                  internalformat=internalformat)
         self._program['u_texture'] = self._texture 
 
     def bounds(self, mode, axis):
@@ -257,7 +271,14 @@ class ImageVisual(Visual):
     def draw(self, transforms):
         if self._data is None:
             return
+        quality = transforms.quality
+        if quality is not None and quality.resolution < 1:
+            self._draft.draw(transforms, quality.resolution,
+                             lambda: self._draw(transforms))
+        else:
+            self._draw(transforms)
 
+    def _draw(self, transforms):
         set_state(cull_face='front_and_back')
 
         # upload texture is needed
@@ -7,7 +7,10 @@ from __future__ import division
 import numpy as np
 
 from .line import LineVisual
-from ..geometry.isocurve import isocurve
+from ..color import ColorArray
+from ..color.colormap import _normalize, get_colormap
+from ..ext.six import string_types
+from ..geometry.isocurve import TiledIsocurve
 
 
 class IsocurveVisual(LineVisual):
@@ -17,36 +20,64 @@ class IsocurveVisual(LineVisual):
     ----------
     data : ndarray | None
         2D scalar array.
-    level: float | None
-        The level at which the isocurve is constructed from *data*.
+    level: float | array-like | None
+        The level, or levels, at which the isocurve is constructed from
+        *data*.
+    color_lev : str | array | None
+        The colors of the levels: a colormap name, a color used by all
+        levels, or an array of shape (Nlev, 4) with one rgba color by level.
+        If None, all levels use the color of the line.
+    tile_shape : tuple of int
+        The number of data cells of the tiles whose curves are kept
+        between updates.
 
     Notes
     -----
+    The curves of all levels are drawn as segments of a single line. The
+    curves of each tile of the data are kept, so that ``set_data`` with a
+    *region* only extracts the tiles that changed, and a change of levels
+    only extracts the new levels.
     """
-    def __init__(self, data=None, level=None, **kwargs):
-        self._data = None
+    def __init__(self, data=None, level=None, color_lev=None,
+                 tile_shape=(256, 256), **kwargs):
+        self._iso = None
+        self._tile_shape = tile_shape
         self._level = level
+        self._color_lev = color_lev
         self._recompute = True
         kwargs['method'] = 'gl'
         kwargs['antialias'] = False
+        kwargs['connect'] = 'segments'
         LineVisual.__init__(self, **kwargs)
+        self._line_color = self._color
         if data is not None:
             self.set_data(data)
 
     @property
     def level(self):
-        """ The threshold at which the isocurve is constructed from the 
+        """ The threshold at which the isocurve is constructed from the
         2D data.
         """
         return self._level
-    
+
     @level.setter
     def level(self, level):
         self._level = level
         self._recompute = True
         self.update()
 
-    def set_data(self, data):
+    @property
+    def color_lev(self):
+        """ The colors of the levels """
+        return self._color_lev
+
+    @color_lev.setter
+    def color_lev(self, color):
+        self._color_lev = color
+        self._recompute = True
+        self.update()
+
+    def set_data(self, data, region=None):
         """ Set the scalar array data
 
         Parameters:
@@ -54,31 +85,58 @@ class IsocurveVisual(LineVisual):
         data : ndarray
             A 2D array of scalar values. The isocurve is constructed to show
             all locations in the scalar field equal to ``self.level``.
+        region : tuple | None
+            The ((row_start, row_stop), (col_start, col_stop)) range of the
+            values that differ from the previous data, which must have the
+            same shape. Default assumes all data changed.
         """
-        self._data = data
+        # the extractor is kept, it resets its tiles if region is None
+        if self._iso is None:
+            self._iso = TiledIsocurve(data, tile_shape=self._tile_shape,
+                                      extend_to_edge=True)
+        else:
+            self._iso.set_data(data, region)
         self._recompute = True
         self.update()
 
+    def _levels_to_colors(self, index):
+        """ The color of each vertex, from the index of its level """
+        levels = self._iso.levels
+        cmap = None
+        if isinstance(self._color_lev, string_types):
+            try:
+                cmap = get_colormap(self._color_lev)
+            except KeyError:
+                pass  # a color name
+        if cmap is not None:
+            lev = _normalize(levels, levels.min(), levels.max())
+            colors = cmap.map(lev)
+        else:
+            colors = ColorArray(self._color_lev).rgba
+            if len(colors) == 1:
+                return colors[0]
+        return np.asarray(colors, np.float32)[index]
+
+    def _update_curves(self):
+        """ Extract the curves and set them as the segments of the line """
+        self._iso.set_levels(self._level)
+        pos, index = self._iso.segments()
+        self._empty = len(pos) == 0
+        if not self._empty:
+            # data rows are along y; the color of the line is set again,
+            # since colors by vertex are not valid for other curves
+            color = self._line_color
+            if self._color_lev is not None:
+                color = self._levels_to_colors(index)
+            LineVisual.set_data(self, pos=pos[:, ::-1], color=color)
+        self._recompute = False
+
     def draw(self, transforms):
-        if self._data is None or self._level is None:
+        if self._iso is None or self._level is None:
             return
-        
+
         if self._recompute:
-            verts = []
-            paths = isocurve(self._data.astype(float).T, self._level, 
-                             extend_to_edge=True, connected=True)
-            tot = 0
-            gaps = []
-            for path in paths:
-                verts.extend(path)
-                tot += len(path)
-                gaps.append(tot-1)
-                
-            connect = np.ones(tot-1, dtype=bool)
-            connect[gaps[:-1]] = False
-            
-            verts = np.array(verts)
-            LineVisual.set_data(self, pos=verts, connect=connect)
-            self._recompute = False
-            
-        LineVisual.draw(self, transforms)
+            self._update_curves()
+
+        if not self._empty:
+            LineVisual.draw(self, transforms)
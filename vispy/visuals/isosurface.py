@@ -4,8 +4,10 @@
 
 from __future__ import division
 
+import numpy as np
+
 from .mesh import MeshVisual
-from ..geometry.isosurface import isosurface
+from ..geometry.isosurface import ChunkedIsosurface
 
 
 class IsosurfaceVisual(MeshVisual):
@@ -17,12 +19,27 @@ class IsosurfaceVisual(MeshVisual):
         3D scalar array.
     level: float | None
         The level at which the isosurface is constructed from *data*.
+    chunk_size : int | None
+        The number of cells along the first axis of the data that are
+        extracted at once. Default chooses slabs of about a million cells.
+    n_threads : int
+        The number of threads used to extract the slabs.
 
     Notes
     -----
+    The surface of each slab is kept, so that changing the level only
+    extracts the slabs whose range of values includes the new level, and
+    ``set_data`` with a *zrange* only extracts the slabs that changed.
+
+    With the *max_faces* argument of MeshVisual, large surfaces are drawn
+    simplified. The levels of detail are computed again when the surface
+    changes.
     """
-    def __init__(self, data=None, level=None, **kwargs):
-        self._data = None
+    def __init__(self, data=None, level=None, chunk_size=None, n_threads=1,
+                 **kwargs):
+        self._iso = None
+        self._chunk_size = chunk_size
+        self._n_threads = n_threads
         self._level = level
         self._recompute = True
         MeshVisual.__init__(self, **kwargs)
@@ -42,7 +59,7 @@ class IsosurfaceVisual(MeshVisual):
         self._recompute = True
         self.update()
 
-    def set_data(self, data):
+    def set_data(self, data, zrange=None):
         """ Set the scalar array data
 
         Parameters:
@@ -50,17 +67,27 @@ class IsosurfaceVisual(MeshVisual):
         data : ndarray
             A 3D array of scalar values. The isosurface is constructed to show
             all locations in the scalar field equal to ``self.level``.
+        zrange : tuple of int | None
+            The (start, stop) range along the first axis where the data
+            differs from the previous data, which must have the same shape.
+            Default assumes all data changed.
         """
-        self._data = data
+        data = np.asarray(data)
+        if self._iso is None or (zrange is None and
+                                 data.shape != self._iso.data.shape):
+            self._iso = ChunkedIsosurface(data, self._chunk_size,
+                                          self._n_threads)
+        else:
+            self._iso.set_data(data, zrange)
         self._recompute = True
         self.update()
 
     def draw(self, transforms):
-        if self._data is None or self._level is None:
+        if self._iso is None or self._level is None:
             return
         
         if self._recompute:
-            verts, faces = isosurface(self._data, self._level)
+            verts, faces = self._iso.extract(self._level)
             MeshVisual.set_data(self, vertices=verts, faces=faces)
             self._recompute = False
             
@@ -0,0 +1,230 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2014, Vispy Development Team.
+# Distributed under the (new) BSD License. See LICENSE.txt for more info.
+"""
+Baking of polylines into the vertex layout used by agg-method lines.
+
+Each line segment is expanded to four vertices (two per end, one on each
+side of the line) so that it can be antialiased independently of its
+neighbours.
+"""
+
+from __future__ import division
+
+from multiprocessing import cpu_count
+from multiprocessing.pool import ThreadPool
+
+import numpy as np
+
+
+agg_vtype = np.dtype([('a_position', 'f4', 2),
+                      ('a_tangents', 'f4', 4),
+                      ('a_segment',  'f4', 2),
+                      ('a_angles',   'f4', 2),
+                      ('a_texcoord', 'f4', 2),
+                      ('color', 'f4', 4)])
+
+_segment_index = np.array([0, 1, 2, 1, 2, 3], dtype=np.uint32)
+
+
+class AggLineBaker(object):
+    """ Bake polylines for agg-method lines.
+
+    The vertex and index arrays are written into buffers owned by the baker,
+    which grow as needed and are reused between calls; the returned arrays
+    are views on these buffers and are only valid until the next call.
+
+    Long polylines are split in chunks of segments that are baked in
+    parallel worker threads. When successive calls only differ in the tail
+    of the line (e.g. streaming data appended to the end), only the affected
+    segments are baked again.
+
+    Parameters
+    ----------
+    chunk_size : int
+        Number of segments baked per worker task.
+    n_threads : int | None
+        Number of worker threads. Defaults to the number of CPUs. Use 1 to
+        bake in the calling thread only.
+    """
+
+    def __init__(self, chunk_size=2**16, n_threads=None):
+        self.chunk_size = int(chunk_size)
+        self.n_threads = cpu_count() if n_threads is None else int(n_threads)
+        self._V = np.zeros(0, dtype=agg_vtype)
+        self._I = np.zeros(0, dtype=np.uint32)
+        self._L = np.zeros(0)
+        # previous input, used to detect unchanged vertices
+        self._P = np.zeros((0, 2))
+        self._C = None
+        self._closed = None
+
+    def bake(self, pos, color, closed=False):
+        """ Bake a polyline.
+
+        Parameters
+        ----------
+        pos : array
+            Array of shape (N, 2) with the vertices of the line.
+        color : array
+            Array of shape (4,) giving the color of the whole line, or of
+            shape (N, 4) giving one color per vertex.
+        closed : bool
+            Whether the last vertex should be connected to the first one.
+
+        Returns
+        -------
+        vertices : array
+            Structured array of dtype ``agg_vtype`` and length 4 * (N - 1).
+        indices : array
+            Triangle indices into *vertices*.
+        length : float
+            Total length of the line.
+        """
+        self._P = np.zeros((0, 2))
+        return self.update(pos, color, closed)[:3]
+
+    def update(self, pos, color, closed=False):
+        """ Bake a polyline, reusing the result of the previous call for
+        the vertices that did not change.
+
+        Returns the same values as ``bake`` followed by the index of the
+        first vertex that was rewritten.
+        """
+        # copies, so that in-place changes of the input are detected
+        P = np.array(pos, dtype=np.float64).reshape(-1, 2)
+        color = np.array(color, dtype=np.float32)
+        if color.ndim == 2 and len(color) != len(P):
+            raise ValueError('Color length %s does not match number of '
+                             'vertices %s' % (len(color), len(P)))
+        if closed and len(P) > 1 and np.abs(P[0] - P[-1]).max() > 1e-10:
+            # make sure first vertex = last vertex
+            P = np.concatenate([P, P[:1]])
+            if color.ndim == 2:
+                color = np.concatenate([color, color[-1:]])
+        n = len(P)
+        if n < 2:
+            raise ValueError('A line needs at least 2 vertices')
+
+        start = self._first_changed(P, color, closed)
+        self._P, self._C, self._closed = P, color, closed
+        n_seg = n - 1
+        k0 = max(start - 2, 0)
+        if start >= n:
+            return (self._V[:4 * n_seg], self._I[:6 * n_seg],
+                    self._L[n_seg - 1], 4 * n_seg)
+
+        self._reserve(n_seg)
+        # cumulative length at the end of each segment
+        T = P[k0 + 1:] - P[k0:-1]
+        L = self._L
+        L[k0:n_seg] = np.cumsum(np.sqrt((T ** 2).sum(axis=1)))
+        if k0 > 0:
+            L[k0:n_seg] += L[k0 - 1]
+
+        ranges = [(k, min(k + self.chunk_size, n_seg))
+                  for k in range(k0, n_seg, self.chunk_size)]
+        if len(ranges) > 1 and self.n_threads > 1:
+            # the pool only lives during the bake, so that no threads are
+            # left behind
+            pool = ThreadPool(min(self.n_threads, len(ranges)))
+            try:
+                pool.map(lambda r: self._bake_range(P, color, closed, *r),
+                         ranges)
+            finally:
+                pool.close()
+                pool.join()
+        else:
+            for r in ranges:
+                self._bake_range(P, color, closed, *r)
+        return (self._V[:4 * n_seg], self._I[:6 * n_seg], L[n_seg - 1],
+                4 * k0)
+
+    def _first_changed(self, P, color, closed):
+        """ Return the index of the first vertex that differs from the
+        previous input.
+        """
+        old = self._P
+        m = min(len(old), len(P))
+        if m == 0 or closed or self._closed:
+            return 0
+        C = self._C
+        if color.ndim != C.ndim or (color.ndim == 1 and
+                                    np.any(color != C)):
+            return 0
+        diff = np.any(P[:m] != old[:m], axis=1)
+        if color.ndim == 2:
+            diff |= np.any(color[:m] != C[:m], axis=1)
+        diff = np.nonzero(diff)[0]
+        if len(diff):
+            return int(diff[0])
+        return m if len(P) != len(old) else len(P)
+
+    def _reserve(self, n_seg):
+        """ Make sure the buffers can hold *n_seg* segments.
+        """
+        if 4 * n_seg <= len(self._V):
+            return
+        cap = max(n_seg, 2 * (len(self._V) // 4))
+        V = np.empty(4 * cap, dtype=agg_vtype)
+        V[:len(self._V)] = self._V
+        L = np.empty(cap)
+        L[:len(self._L)] = self._L
+        self._V, self._L = V, L
+        first = 4 * np.arange(cap, dtype=np.uint32)[:, np.newaxis]
+        self._I = (first + _segment_index).ravel()
+
+    def _bake_range(self, P, color, closed, k0, k1):
+        """ Write segments k0..k1-1 into the vertex buffer.
+        """
+        n = len(P)
+        lo = max(k0 - 1, 0)
+        hi = min(k1 + 2, n)
+        # tangents T[i] = P[i+1] - P[i] for i in lo..hi-2
+        T = P[lo + 1:hi] - P[lo:hi - 1]
+        v = np.arange(k0, k1 + 1)
+        t_prev = T[np.clip(v - 1 - lo, 0, len(T) - 1)]
+        t_next = T[np.clip(v - lo, 0, len(T) - 1)]
+        if closed:
+            if k0 == 0:
+                t_prev[0] = P[-1] - P[-2]
+            if k1 == n - 1:
+                t_next[-1] = P[1] - P[0]
+        cross = t_prev[:, 0] * t_next[:, 1] - t_prev[:, 1] * t_next[:, 0]
+        dot = (t_prev * t_next).sum(axis=1)
+        A = np.arctan2(cross, dot)
+
+        # Fill one record per segment end, then copy it to both sides of
+        # the line. The records are handled as rows of 16 floats (see
+        # agg_vtype), which is much faster than per-field broadcasting.
+        n_seg = k1 - k0
+        # per-vertex position and tangents
+        vert = np.empty((n_seg + 1, 6), dtype=np.float32)
+        vert[:, 0:2] = P[k0:k1 + 1]
+        vert[:, 2:4] = t_prev
+        vert[:, 4:6] = t_next
+        # per-segment cumulative lengths and angles
+        seg = np.empty((n_seg, 4), dtype=np.float32)
+        seg[0, 0] = self._L[k0 - 1] if k0 > 0 else 0
+        seg[1:, 0] = self._L[k0:k1 - 1]
+        seg[:, 1] = self._L[k0:k1]
+        seg[:, 2] = A[:-1]
+        seg[:, 3] = A[1:]
+
+        E = np.empty((n_seg, 2, 16), dtype=np.float32)
+        E[:, 0, 0:6] = vert[:-1]
+        E[:, 1, 0:6] = vert[1:]
+        E[:, :, 6:10] = seg[:, np.newaxis]
+        E[:, 0, 10] = -1
+        E[:, 1, 10] = 1
+        if color.ndim == 1:
+            E[:, :, 12:16] = color
+        else:
+            E[:, 0, 12:16] = color[k0:k1]
+            E[:, 1, 12:16] = color[k0 + 1:k1 + 1]
+
+        out = self._V[4 * k0:4 * k1].view(np.float32).reshape(n_seg, 2, 2, 16)
+        out[:, :, 0] = E
+        out[:, :, 1] = E
+        out[:, :, 0, 11] = -1
+        out[:, :, 1, 11] = 1
@@ -0,0 +1,200 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2014, Vispy Development Team.
+# Distributed under the (new) BSD License. See LICENSE.txt for more info.
+"""
+Min/max envelope (M4) decimation for lines with sorted x coordinates.
+
+For every horizontal pixel column, drawing the first, last, minimum and
+maximum samples falling in that column produces the same rasterized line as
+drawing every sample. This allows very long time series to be displayed by
+uploading only a few points per pixel.
+"""
+
+from __future__ import division
+
+import numpy as np
+
+
+class MinMaxDecimator(object):
+    """ Multi-level min/max pyramid over a line with sorted x coordinates.
+
+    The pyramid is built once (reading the data in chunks, so *pos* may be a
+    memory-mapped array) and is then used to extract, for any x range, the
+    indices of the samples needed to draw that range at a given horizontal
+    resolution.
+
+    Parameters
+    ----------
+    pos : array
+        Array of shape (N, 2) or (N, 3). The x coordinates (first column)
+        must be sorted in increasing order.
+    base : int
+        Number of samples per bin at the finest pyramid level. Views that
+        need less decimation than this are computed directly from the data.
+    chunk : int
+        Number of samples read at a time while building the pyramid.
+    """
+
+    def __init__(self, pos, base=64, chunk=2**22):
+        if pos.ndim != 2 or pos.shape[1] not in (2, 3):
+            raise ValueError('pos must have shape (N, 2) or (N, 3)')
+        self._pos = pos
+        self._base = int(base)
+        self._cache_key = None
+        self._cache = None
+        # each level holds (vmin, vmax, imin, imax) arrays, one entry per bin
+        self._levels = []
+        self._build(int(chunk))
+
+    @property
+    def pos(self):
+        """ The full-resolution vertex array.
+        """
+        return self._pos
+
+    @property
+    def n_levels(self):
+        """ Number of levels in the pyramid.
+        """
+        return len(self._levels)
+
+    def _build(self, chunk):
+        n = len(self._pos)
+        base = self._base
+        nbins = n // base
+        if nbins < 2:
+            return
+        chunk = max(chunk // base, 1) * base
+        vmin = np.empty(nbins, dtype=self._pos.dtype)
+        vmax = np.empty(nbins, dtype=self._pos.dtype)
+        imin = np.empty(nbins, dtype=np.int64)
+        imax = np.empty(nbins, dtype=np.int64)
+        for start in range(0, nbins * base, chunk):
+            stop = min(start + chunk, nbins * base)
+            y = np.asarray(self._pos[start:stop, 1]).reshape(-1, base)
+            sl = slice(start // base, stop // base)
+            offset = np.arange(sl.start, sl.stop) * base
+            imin[sl] = y.argmin(axis=1) + offset
+            imax[sl] = y.argmax(axis=1) + offset
+            vmin[sl] = y.min(axis=1)
+            vmax[sl] = y.max(axis=1)
+        self._levels.append((vmin, vmax, imin, imax))
+
+        # Each coarser level merges pairs of bins of the previous level
+        while len(vmin) > 1:
+            if len(vmin) % 2:
+                vmin, vmax = np.append(vmin, vmin[-1]), np.append(vmax,
+                                                                  vmax[-1])
+                imin, imax = np.append(imin, imin[-1]), np.append(imax,
+                                                                  imax[-1])
+            take_min = vmin[1::2] < vmin[0::2]
+            take_max = vmax[1::2] > vmax[0::2]
+            imin = np.where(take_min, imin[1::2], imin[0::2])
+            imax = np.where(take_max, imax[1::2], imax[0::2])
+            vmin = np.where(take_min, vmin[1::2], vmin[0::2])
+            vmax = np.where(take_max, vmax[1::2], vmax[0::2])
+            self._levels.append((vmin, vmax, imin, imax))
+
+    def bounds(self, axis):
+        """ Return the (min, max) of the data along *axis* without reading
+        the whole array.
+        """
+        if len(self._pos) == 0:
+            return None
+        if axis == 0:
+            return (self._pos[0, 0], self._pos[-1, 0])
+        if axis == 1 and self._levels:
+            vmin, vmax = self._levels[-1][:2]
+            n = len(self._levels[0][0]) * self._base
+            rest = self._pos[n:, 1]
+            if len(rest):
+                return (min(vmin[0], rest.min()), max(vmax[0], rest.max()))
+            return (vmin[0], vmax[0])
+        data = self._pos[:, axis]
+        return (data.min(), data.max())
+
+    def select(self, x0, x1, npix):
+        """ Return the sorted indices of the samples needed to draw the part
+        of the line between *x0* and *x1* across *npix* pixels.
+
+        Between 4 and 8 samples per pixel are returned, plus the samples just
+        outside the range so that the line reaches the edges of the view.
+        Consecutive calls that resolve to the same set of bins return the
+        cached array.
+        """
+        n = len(self._pos)
+        x = self._pos[:, 0]
+        i0 = max(int(np.searchsorted(x, x0, side='right')) - 1, 0)
+        i1 = min(int(np.searchsorted(x, x1, side='left')) + 1, n)
+        npix = max(int(npix), 1)
+        per_pixel = (i1 - i0) / npix
+
+        if per_pixel <= 4:
+            key = ('raw', i0, i1)
+        elif per_pixel < self._base or not self._levels:
+            key = ('m4', i0, i1, int(np.ceil(per_pixel)))
+        else:
+            level = min(int(np.log2(per_pixel / self._base)),
+                        len(self._levels) - 1)
+            size = self._base * 2 ** level
+            key = ('level', level, i0 // size, (i1 - 1) // size + 1)
+        if key == self._cache_key:
+            return self._cache
+
+        if key[0] == 'raw':
+            index = np.arange(i0, i1)
+        elif key[0] == 'm4':
+            index = self._m4(i0, i1, key[3])
+        else:
+            index = self._from_level(*key[1:])
+        self._cache_key = key
+        self._cache = index
+        return index
+
+    def decimate(self, x0, x1, npix):
+        """ Return the vertices needed to draw the line between *x0* and *x1*
+        across *npix* pixels. See ``select``.
+        """
+        return self._pos[self.select(x0, x1, npix)]
+
+    def _m4(self, i0, i1, size):
+        """ Compute the M4 indices directly from the samples in [i0, i1).
+        """
+        y = np.asarray(self._pos[i0:i1, 1])
+        nbins = len(y) // size
+        first = np.arange(nbins) * size
+        bins = y[:nbins * size].reshape(nbins, size)
+        index = np.column_stack([first, bins.argmin(axis=1) + first,
+                                 bins.argmax(axis=1) + first,
+                                 first + size - 1])
+        index.sort(axis=1)
+        index = np.concatenate([index.ravel(),
+                                np.arange(nbins * size, len(y))])
+        return self._unique_sorted(index + i0)
+
+    def _from_level(self, level, j0, j1):
+        """ Compute the M4 indices from bins j0..j1 of a pyramid level.
+        """
+        vmin, vmax, imin, imax = self._levels[level]
+        size = self._base * 2 ** level
+        n = len(self._pos)
+        j1 = min(j1, len(imin))
+        first = np.arange(j0, j1) * size
+        index = np.column_stack([first, imin[j0:j1], imax[j0:j1],
+                                 np.minimum(first + size, n) - 1])
+        index.sort(axis=1)
+        index = index.ravel()
+        # samples beyond the last full bin are not covered by the pyramid
+        end = len(self._levels[0][0]) * self._base
+        if j1 * size >= end:
+            return np.unique(np.concatenate([index, np.arange(end, n)]))
+        return self._unique_sorted(index)
+
+    @staticmethod
+    def _unique_sorted(index):
+        if len(index) == 0:
+            return index
+        keep = np.empty(len(index), dtype=bool)
+        keep[0] = True
+        keep[1:] = index[1:] != index[:-1]
+        return index[keep]
@@ -16,7 +16,9 @@ from ..shaders import ModularProgram, Function
 from ..visual import Visual
 from ...util.profiler import Profiler
 
+from .baking import AggLineBaker, agg_vtype
 from .dash_atlas import DashAtlas
+from .decimation import MinMaxDecimator
 from . import vertex
 from . import fragment
 
@@ -53,6 +55,12 @@ caps = {'': 0, 'none': 0, '.': 0,
         '|': 5}
 
 
+def _check_decimate_connect(connect):
+    """ Decimation only applies to lines drawn as a single strip """
+    if isinstance(connect, np.ndarray) or connect not in (None, 'strip'):
+        raise ValueError("Decimation requires connect='strip'.")
+
+
 class LineVisual(Visual):
     """Line visual
 
@@ -90,9 +98,16 @@ class LineVisual(Visual):
         Enables or disables antialiasing.
         For method='gl', this specifies whether to use GL's line smoothing, 
         which may be unavailable or inconsistent on some platforms.
+    decimate : bool
+        If True, only the samples needed to draw the visible x range at the
+        current horizontal resolution are uploaded (min/max envelope
+        decimation). Requires x coordinates sorted in increasing order and
+        connect='strip'. Useful for very long time series, which may be
+        given as memory-mapped arrays.
     """
     def __init__(self, pos=None, color=(0.5, 0.5, 0.5, 1), width=1,
-                 connect='strip', method='gl', antialias=False):
+                 connect='strip', method='gl', antialias=False,
+                 decimate=False):
         Visual.__init__(self)
 
         self._changed = {'pos': False, 'color': False, 'width': False,
@@ -103,6 +118,12 @@ class LineVisual(Visual):
         self._width = None
         self._connect = None
         self._bounds = None
+        # (start, stop) range of vertices changed by update_pos()
+        self._pos_range = None
+        self._pos_owned = False
+        self._decimate = bool(decimate)
+        self._decimator = None
+        self._decim_index = None
         
         # don't call subclass set_data; these often have different
         # signatures.
@@ -146,6 +167,22 @@ class LineVisual(Visual):
         for k in self._changed:
             self._changed[k] = True
 
+    @property
+    def decimate(self):
+        """Whether min/max envelope decimation is used for drawing"""
+        return self._decimate
+
+    @decimate.setter
+    def decimate(self, decimate):
+        decimate = bool(decimate)
+        if decimate:
+            _check_decimate_connect(self._connect)
+        self._decimate = decimate
+        self._update_decimator()
+        self._changed['pos'] = True
+        self._changed['color'] = True
+        self.update()
+
     def set_data(self, pos=None, color=None, width=None, connect=None):
         """ Set the data used to draw this visual.
 
@@ -169,9 +206,13 @@ class LineVisual(Visual):
               connect.
             * bool numpy arrays specify which _adjacent_ pairs to connect.
         """
+        if connect is not None and self._decimate:
+            _check_decimate_connect(connect)
         if pos is not None:
             self._bounds = None
             self._pos = pos
+            self._pos_owned = False
+            self._pos_range = None
             self._changed['pos'] = True
 
         if color is not None:
@@ -182,12 +223,68 @@ class LineVisual(Visual):
             self._width = width
             self._changed['width'] = True
 
-        if connect is not None:
+        if connect is not None and not self._same_connect(connect):
+            if isinstance(connect, np.ndarray):
+                # keep our own copy so that later comparisons are reliable
+                connect = connect.copy()
             self._connect = connect
             self._changed['connect'] = True
 
+        if pos is not None or connect is not None:
+            self._update_decimator()
         self.update()
 
+    def update_pos(self, pos, start=0):
+        """ Replace a contiguous range of vertex positions.
+
+        Only the modified range is uploaded to the GPU; colors and the
+        connection topology are left untouched. This is much cheaper than
+        ``set_data`` for animating part of a long line.
+
+        Parameters
+        ----------
+        pos : array
+            Array of shape (M, 2) or (M, 3) with the new positions.
+        start : int
+            Index of the first vertex to replace.
+        """
+        if self._pos is None:
+            raise ValueError('update_pos() requires positions to be set '
+                             'with set_data() first.')
+        pos = np.asarray(pos)
+        stop = start + len(pos)
+        if start < 0 or stop > len(self._pos):
+            raise ValueError('Vertex range %d:%d out of bounds for %d '
+                             'vertices' % (start, stop, len(self._pos)))
+        if not self._pos_owned:
+            # don't modify the array given to set_data()
+            dtype = np.promote_types(self._pos.dtype, np.float32)
+            self._pos = np.array(self._pos, dtype=dtype)
+            self._pos_owned = True
+        self._pos[start:stop] = pos
+        self._bounds = None
+        if self._decimator is not None:
+            self._update_decimator()
+            self._changed['pos'] = True
+        elif self._pos_range is None:
+            self._pos_range = (start, stop)
+        else:
+            self._pos_range = (min(start, self._pos_range[0]),
+                               max(stop, self._pos_range[1]))
+        self.update()
+
+    def _same_connect(self, connect):
+        """ Whether *connect* describes the current topology.
+        """
+        current = self._connect
+        if isinstance(connect, np.ndarray):
+            return (isinstance(current, np.ndarray) and
+                    connect.shape == current.shape and
+                    connect.dtype == current.dtype and
+                    np.array_equal(connect, current))
+        return (not isinstance(current, np.ndarray) and
+                connect == current)
+
     @property
     def color(self):
         return self._color
@@ -204,6 +301,39 @@ class LineVisual(Visual):
     def pos(self):
         return self._pos
 
+    @property
+    def _draw_pos(self):
+        """ The vertices to upload: the full array, or its decimated
+        subset.
+        """
+        if self._decim_index is None:
+            return self._pos
+        return self._pos[self._decim_index]
+
+    def _update_decimator(self):
+        self._decim_index = None
+        if self._decimate and self._pos is not None:
+            self._decimator = MinMaxDecimator(self._pos)
+        else:
+            self._decimator = None
+
+    def _update_decimation(self, transforms):
+        """ Select the samples needed for the current view.
+        """
+        if self._decimator is None:
+            return
+        ends = np.array([[-1, 0], [1, 0]])
+        xrange = transforms.get_full_transform().imap(ends)
+        xrange = xrange[:, 0] / xrange[:, 3]
+        px = transforms.framebuffer_to_render.imap(ends)[:, 0]
+        index = self._decimator.select(xrange.min(), xrange.max(),
+                                       abs(px[1] - px[0]))
+        if index is not self._decim_index:
+            self._decim_index = index
+            self._changed['pos'] = True
+            if isinstance(self._color, np.ndarray):
+                self._changed['color'] = True
+
     def _interpret_connect(self):
         if isinstance(self._connect, np.ndarray):
             # Convert a boolean connection array to a vertex index array
@@ -231,14 +361,22 @@ class LineVisual(Visual):
         elif isinstance(self._color, Function):
             color = Function(self._color)
         else:
-            color = ColorArray(self._color).rgba
+            color = self._color
+            if (self._decim_index is not None and
+                    isinstance(color, np.ndarray) and color.ndim == 2 and
+                    len(color) == len(self._pos)):
+                color = color[self._decim_index]
+            color = ColorArray(color).rgba
             if len(color) == 1:
                 color = color[0]
         return color
 
     def bounds(self, mode, axis):
         # Can and should we calculate bounds?
-        if (self._bounds is None) and self._pos is not None:
+        if (self._bounds is None) and self._decimator is not None:
+            self._bounds = [self._decimator.bounds(d)
+                            for d in range(self._pos.shape[1])]
+        elif (self._bounds is None) and self._pos is not None:
             pos = self._pos
             self._bounds = [(pos[:, d].min(), pos[:, d].max())
                             for d in range(pos.shape[1])]
@@ -254,9 +392,11 @@ class LineVisual(Visual):
     def draw(self, transforms):
         if self.width == 0:
             return
+        self._update_decimation(transforms)
         self._line_visual.draw(transforms)
         for k in self._changed:
             self._changed[k] = False
+        self._pos_range = None
 
     def set_gl_state(self, **kwargs):
         Visual.set_gl_state(self, **kwargs)
@@ -290,6 +430,7 @@ class _GLLineVisual(Visual):
         self._color_vbo = gloo.VertexBuffer()
         self._connect_ibo = gloo.IndexBuffer()
         self._connect = None
+        self._pos_dim = None
         
         # Set up the GL program
         self._program = ModularProgram(self.VERTEX_SHADER,
@@ -307,17 +448,25 @@ class _GLLineVisual(Visual):
         if self._parent._changed['pos']:
             if self._parent._pos is None:
                 return
-            # todo: does this result in unnecessary copies?
-            pos = np.ascontiguousarray(self._parent._pos.astype(np.float32))
+            pos = np.ascontiguousarray(self._parent._draw_pos,
+                                       dtype=np.float32)
             self._pos_vbo.set_data(pos)
-            self._program.vert['position'] = self._pos_vbo
-            if pos.shape[-1] == 2:
-                self._program.vert['to_vec4'] = vec2to4
-            elif pos.shape[-1] == 3:
-                self._program.vert['to_vec4'] = vec3to4
-            else:
-                raise TypeError("Got bad position array shape: %r"
-                                % (pos.shape,))
+            # Only touch the shader when the vertex layout changes
+            if pos.shape[-1] != self._pos_dim:
+                self._program.vert['position'] = self._pos_vbo
+                if pos.shape[-1] == 2:
+                    self._program.vert['to_vec4'] = vec2to4
+                elif pos.shape[-1] == 3:
+                    self._program.vert['to_vec4'] = vec3to4
+                else:
+                    raise TypeError("Got bad position array shape: %r"
+                                    % (pos.shape,))
+                self._pos_dim = pos.shape[-1]
+        elif self._parent._pos_range is not None:
+            start, stop = self._parent._pos_range
+            pos = np.ascontiguousarray(self._parent._pos[start:stop],
+                                       dtype=np.float32)
+            self._pos_vbo.set_subdata(pos, offset=start)
 
         if self._parent._changed['color']:
             color = self._parent._interpret_color()
@@ -380,18 +529,14 @@ class _GLLineVisual(Visual):
 
 
 class _AggLineVisual(Visual):
-    _agg_vtype = np.dtype([('a_position', 'f4', 2),
-                           ('a_tangents', 'f4', 4),
-                           ('a_segment',  'f4', 2),
-                           ('a_angles',   'f4', 2),
-                           ('a_texcoord', 'f4', 2),
-                           ('alength', 'f4', 1),
-                           ('color', 'f4', 4)])
+    _agg_vtype = agg_vtype
 
     def __init__(self, parent):
         self._parent = parent
         self._vbo = gloo.VertexBuffer()
         self._ibo = gloo.IndexBuffer()
+        self._baker = AggLineBaker()
+        self._length = 0.
 
         self._pos = None
         self._color = None
@@ -412,12 +557,13 @@ class _AggLineVisual(Visual):
         Visual.draw(self, transforms)
         
         bake = False
-        if self._parent._changed['pos']:
+        if (self._parent._changed['pos'] or
+                self._parent._pos_range is not None):
             if self._parent._pos is None:
                 return
             # todo: does this result in unnecessary copies?
             self._pos = np.ascontiguousarray(
-                self._parent._pos.astype(np.float32))
+                self._parent._draw_pos.astype(np.float32))
             bake = True
 
         if self._parent._changed['color']:
@@ -430,9 +576,15 @@ class _AggLineVisual(Visual):
                                           "allowed for agg-method lines.")
 
         if bake:
-            V, I = self._agg_bake(self._pos, self._color)
-            self._vbo.set_data(V)
-            self._ibo.set_data(I)
+            V, I, self._length, first = self._baker.update(self._pos,
+                                                           self._color)
+            if len(V) == self._vbo.size:
+                # only the tail of the line changed
+                if first < len(V):
+                    self._vbo.set_subdata(V[first:], offset=first)
+            else:
+                self._vbo.set_data(V)
+                self._ibo.set_data(I)
 
         gloo.set_state('translucent', depth_test=False)
         data_doc = transforms.visual_to_document
@@ -447,91 +599,10 @@ class _AggLineVisual(Visual):
         #self._program.prepare()
         self._program.bind(self._vbo)
         uniforms = dict(closed=False, miter_limit=4.0, dash_phase=0.0,
-                        linewidth=self._parent._width)
+                        linewidth=self._parent._width, alength=self._length)
         for n, v in uniforms.items():
             self._program[n] = v
         for n, v in self._U.items():
             self._program[n] = v
         self._program['u_dash_atlas'] = self._dash_atlas
         self._program.draw('triangles', self._ibo)
-
-    @classmethod
-    def _agg_bake(cls, vertices, color, closed=False):
-        """
-        Bake a list of 2D vertices for rendering them as thick line. Each line
-        segment must have its own vertices because of antialias (this means no
-        vertex sharing between two adjacent line segments).
-        """
-
-        n = len(vertices)
-        P = np.array(vertices).reshape(n, 2).astype(float)
-        idx = np.arange(n)  # used to eventually tile the color array
-
-        dx, dy = P[0] - P[-1]
-        d = np.sqrt(dx*dx+dy*dy)
-
-        # If closed, make sure first vertex = last vertex (+/- epsilon=1e-10)
-        if closed and d > 1e-10:
-            P = np.append(P, P[0]).reshape(n+1, 2)
-            idx = np.append(idx, idx[-1])
-            n += 1
-
-        V = np.zeros(len(P), dtype=cls._agg_vtype)
-        V['a_position'] = P
-
-        # Tangents & norms
-        T = P[1:] - P[:-1]
-
-        N = np.sqrt(T[:, 0]**2 + T[:, 1]**2)
-        # T /= N.reshape(len(T),1)
-        V['a_tangents'][+1:, :2] = T
-        V['a_tangents'][0, :2] = T[-1] if closed else T[0]
-        V['a_tangents'][:-1, 2:] = T
-        V['a_tangents'][-1, 2:] = T[0] if closed else T[-1]
-
-        # Angles
-        T1 = V['a_tangents'][:, :2]
-        T2 = V['a_tangents'][:, 2:]
-        A = np.arctan2(T1[:, 0]*T2[:, 1]-T1[:, 1]*T2[:, 0],
-                       T1[:, 0]*T2[:, 0]+T1[:, 1]*T2[:, 1])
-        V['a_angles'][:-1, 0] = A[:-1]
-        V['a_angles'][:-1, 1] = A[+1:]
-
-        # Segment
-        L = np.cumsum(N)
-        V['a_segment'][+1:, 0] = L
-        V['a_segment'][:-1, 1] = L
-        #V['a_lengths'][:,2] = L[-1]
-
-        # Step 1: A -- B -- C  =>  A -- B, B' -- C
-        V = np.repeat(V, 2, axis=0)[1:-1]
-        V['a_segment'][1:] = V['a_segment'][:-1]
-        V['a_angles'][1:] = V['a_angles'][:-1]
-        V['a_texcoord'][0::2] = -1
-        V['a_texcoord'][1::2] = +1
-        idx = np.repeat(idx, 2)[1:-1]
-
-        # Step 2: A -- B, B' -- C  -> A0/A1 -- B0/B1, B'0/B'1 -- C0/C1
-        V = np.repeat(V, 2, axis=0)
-        V['a_texcoord'][0::2, 1] = -1
-        V['a_texcoord'][1::2, 1] = +1
-        idx = np.repeat(idx, 2)
-
-        I = np.resize(np.array([0, 1, 2, 1, 2, 3], dtype=np.uint32),
-                      (n-1)*(2*3))
-        I += np.repeat(4*np.arange(n-1, dtype=np.uint32), 6)
-
-        # Length
-        V['alength'] = L[-1] * np.ones(len(V))
-
-        # Color
-        if color.ndim == 1:
-            color = np.tile(color, (len(V), 1))
-        elif color.ndim == 2 and len(color) == n:
-            color = color[idx]
-        else:
-            raise ValueError('Color length %s does not match number of '
-                             'vertices %s' % (len(color), n))
-        V['color'] = color
-
-        return V, I
@@ -39,7 +39,7 @@ uniform float antialias;
 uniform vec2 linecaps;
 uniform float linejoin;
 uniform float miter_limit;
-attribute float alength;
+uniform float alength;
 uniform float dash_phase;
 uniform float dash_period;
 uniform float dash_index;
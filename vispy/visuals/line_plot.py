@@ -36,6 +36,9 @@ class LinePlotVisual(Visual):
         Edge width of the marker.
     connect : str | array
         See LineVisual.
+    decimate : bool
+        Whether the line uses min/max envelope decimation. See LineVisual.
+        The markers are then drawn at the decimated samples of the line.
     **kwargs : keyword arguments
         Argements to pass to the super class.
 
@@ -58,12 +61,14 @@ class LinePlotVisual(Visual):
 
     def __init__(self, data, color='k', symbol='o', line_kind='-',
                  width=1., marker_size=10., edge_color='k', face_color='w',
-                 edge_width=1., connect='strip', **kwargs):
+                 edge_width=1., connect='strip', decimate=False, **kwargs):
         Visual.__init__(self, **kwargs)
         if line_kind != '-':
             raise ValueError('Only solid lines currently supported')
-        self._line = LineVisual()
+        self._line = LineVisual(decimate=decimate)
         self._markers = MarkersVisual()
+        self._marker_data = {}
+        self._marker_index = None  # the samples of the line with markers
         self.set_data(data, color=color, symbol=symbol,
                       width=width, marker_size=marker_size,
                       edge_color=edge_color, face_color=face_color,
@@ -104,13 +109,25 @@ class LinePlotVisual(Visual):
             if k in kwargs:
                 k_ = self._kw_trans[k] if k in self._kw_trans else k
                 marker_kwargs[k_] = kwargs.pop(k)
-        self._markers.set_data(pos=pos, **marker_kwargs)
+        self._marker_data.update(marker_kwargs)
+        self._marker_index = None
+        self._markers.set_data(pos=pos, **self._marker_data)
         if len(kwargs) > 0:
             raise TypeError("Invalid keyword arguments: %s" % kwargs.keys())
 
     def bounds(self, mode, axis):
         return self._line.bounds(mode, axis)
 
+    def _update_markers(self, transforms):
+        """ Put the markers on the samples selected by the decimation """
+        self._line._update_decimation(transforms)
+        index = self._line._decim_index
+        if index is not self._marker_index:
+            self._marker_index = index
+            self._markers.set_data(pos=self._line._draw_pos,
+                                   **self._marker_data)
+
     def draw(self, transforms):
+        self._update_markers(transforms)
         for v in self._line, self._markers:
             v.draw(transforms)
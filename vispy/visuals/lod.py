@@ -0,0 +1,209 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2014, Vispy Development Team.
+# Distributed under the (new) BSD License. See LICENSE.txt for more info.
+"""
+Level-of-detail support for visuals.
+
+A visual may register several precomputed representations of its data
+(decimated lines, simplified meshes, aggregated markers, ...). Before each
+draw, the representation that best matches the size the visual occupies on
+screen is selected and handed to the visual.
+"""
+
+from __future__ import division
+
+import threading
+
+import numpy as np
+
+from ..util.logs import logger
+
+
+class LevelOfDetail(object):
+    """ A set of representations of a visual's data, selected by the
+    projected screen-space size of the visual.
+
+    Each level is registered with a *max_size*: the largest on-screen extent
+    (in framebuffer pixels) for which the representation is considered
+    adequate. For a given size, the coarsest level whose *max_size* is at
+    least that size is selected. If the size exceeds every *max_size*, the
+    finest level is used.
+
+    Parameters
+    ----------
+    hysteresis : float
+        Relative margin used to avoid flickering between two levels when the
+        size hovers around a threshold. Switching to a finer level happens as
+        soon as the current level is exceeded, but switching back to a
+        coarser level only happens once the size has dropped below
+        ``max_size * (1 - hysteresis)`` of that level.
+    """
+
+    def __init__(self, hysteresis=0.2):
+        if not 0 <= hysteresis < 1:
+            raise ValueError('hysteresis must be in [0, 1)')
+        self._hysteresis = float(hysteresis)
+        self._levels = []  # list of (max_size, data), sorted by max_size
+        self._current = None
+        self._lock = threading.Lock()
+        self._threads = []
+
+    @property
+    def hysteresis(self):
+        """ Relative margin used when switching to a coarser level.
+        """
+        return self._hysteresis
+
+    @property
+    def levels(self):
+        """ List of (max_size, data) tuples, from coarsest to finest.
+        """
+        with self._lock:
+            return list(self._levels)
+
+    @property
+    def current(self):
+        """ Index of the currently selected level, or None.
+        """
+        return self._current
+
+    def __len__(self):
+        return len(self._levels)
+
+    def add_level(self, max_size, data):
+        """ Register a representation.
+
+        Parameters
+        ----------
+        max_size : float
+            Largest on-screen extent (in pixels) at which this level is used.
+            Use ``np.inf`` for the full-resolution representation.
+        data : object
+            The representation. Its meaning is defined by the visual that
+            consumes it (for most visuals, a dict of keyword arguments to
+            ``set_data``).
+        """
+        max_size = float(max_size)
+        if max_size <= 0:
+            raise ValueError('max_size must be positive')
+        with self._lock:
+            sizes = [level[0] for level in self._levels]
+            index = int(np.searchsorted(sizes, max_size, side='right'))
+            self._levels.insert(index, (max_size, data))
+            # Keep the current selection pointing at the same level
+            if self._current is not None and index <= self._current:
+                self._current += 1
+
+    def clear(self):
+        """ Remove all levels.
+        """
+        with self._lock:
+            self._levels = []
+            self._current = None
+
+    def select(self, size):
+        """ Select the level to use for a visual of the given screen size.
+
+        Parameters
+        ----------
+        size : float | None
+            Projected extent of the visual in pixels. If None, the finest
+            level is selected.
+
+        Returns
+        -------
+        index : int | None
+            Index of the selected level, or None if no level is registered.
+        changed : bool
+            Whether the selection differs from the previous call.
+        """
+        with self._lock:
+            n = len(self._levels)
+            if n == 0:
+                return None, False
+            if size is None:
+                new = n - 1
+            else:
+                sizes = np.array([level[0] for level in self._levels])
+                new = min(int(np.searchsorted(sizes, size, side='left')),
+                          n - 1)
+                cur = self._current
+                if cur is not None and new < cur:
+                    # Coarser levels must be comfortably below threshold
+                    ok = np.nonzero(sizes[new:cur] * (1 - self._hysteresis) >=
+                                    size)[0]
+                    new = new + int(ok[0]) if len(ok) else cur
+            changed = new != self._current
+            self._current = new
+            return new, changed
+
+    def build_async(self, max_size, func, args=(), callback=None):
+        """ Compute a level in a background thread.
+
+        Parameters
+        ----------
+        max_size : float
+            See ``add_level``.
+        func : callable
+            Called as ``func(*args)`` in a worker thread; the return value is
+            registered as the level data.
+        args : tuple
+            Arguments for *func*.
+        callback : callable | None
+            Called without arguments (from the worker thread) after the level
+            has been registered. Visuals use this to request a redraw.
+
+        Returns
+        -------
+        thread : threading.Thread
+            The worker thread.
+        """
+        def run():
+            try:
+                data = func(*args)
+            except Exception:
+                logger.log_exception()
+                logger.warning('Building level of detail failed')
+                return
+            self.add_level(max_size, data)
+            if callback is not None:
+                callback()
+
+        thread = threading.Thread(target=run)
+        thread.daemon = True
+        self._threads = [t for t in self._threads if t.is_alive()]
+        self._threads.append(thread)
+        thread.start()
+        return thread
+
+    def wait(self, timeout=None):
+        """ Block until all background builds have finished.
+        """
+        for thread in list(self._threads):
+            thread.join(timeout)
+        self._threads = [t for t in self._threads if t.is_alive()]
+
+
+def screen_size(visual, transforms):
+    """ Return the extent, in framebuffer pixels, of the projected bounding
+    box of *visual*, or None if the visual does not report bounds.
+    """
+    bounds = []
+    for axis in range(3):
+        try:
+            b = visual.bounds('visual', axis)
+        except IndexError:
+            b = None
+        bounds.append((0, 0) if b is None else b)
+    if all(b == (0, 0) for b in bounds):
+        return None
+    corners = np.array(np.meshgrid(*bounds)).reshape(3, -1).T
+    tr = transforms.document_to_framebuffer * transforms.visual_to_document
+    mapped = np.asarray(tr.map(corners), dtype=np.float64)
+    if mapped.shape[1] > 3:
+        w = mapped[:, 3:4]
+        w[w == 0] = 1
+        mapped = mapped[:, :2] / w
+    extent = mapped[:, :2].max(axis=0) - mapped[:, :2].min(axis=0)
+    size = float(np.sqrt((extent ** 2).sum()))
+    return size if np.isfinite(size) else None
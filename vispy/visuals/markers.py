@@ -19,6 +19,7 @@ vert = """
 uniform mat4 u_projection;
 uniform float u_antialias;
 uniform int u_px_scale;
+uniform float u_scale;
 
 attribute vec3  a_position;
 attribute vec4  a_fg_color;
@@ -32,8 +33,8 @@ varying float v_edgewidth;
 varying float v_antialias;
 
 void main (void) {
-    $v_size = a_size * u_px_scale;
-    v_edgewidth = a_edgewidth;
+    $v_size = a_size * u_px_scale * u_scale;
+    v_edgewidth = a_edgewidth * u_scale;
     v_antialias = u_antialias;
     v_fg_color  = a_fg_color;
     v_bg_color  = a_bg_color;
@@ -492,9 +493,127 @@ _marker_dict = {
 marker_types = tuple(sorted(list(_marker_dict.keys())))
 
 
+class _MarkerAttribute(object):
+    """ CPU storage and vertex buffer of a single marker attribute.
+
+    Each attribute lives in its own vertex buffer, so that changing e.g. the
+    positions does not require packing or uploading the colors. Values are
+    stored in *dtype* on the CPU (colors are stored as uint8 multiplied by
+    *scale*) and converted to float32 in chunks when uploaded. A value
+    shared by all markers is passed to the program as a constant attribute
+    and takes no buffer at all.
+    """
+
+    def __init__(self, name, ncomp, dtype, scale=1.):
+        self.name = name
+        self.ncomp = ncomp
+        self.dtype = np.dtype(dtype)
+        self.scale = scale
+        self.data = None  # per-marker values, or None if constant
+        self.value = None  # constant value as a tuple of floats
+        self.vbo = None
+        self.n = 0
+
+    def resize(self, n):
+        """ Drop all per-marker values and set the number of markers.
+        """
+        self.n = n
+        self.data = None
+        self.value = None
+
+    def pack(self, values):
+        """ Convert float values to the storage dtype. Values that already
+        have the storage dtype are returned unchanged.
+        """
+        values = np.asarray(values)
+        if values.dtype == self.dtype:
+            return values
+        if self.scale != 1:
+            values = np.round(values * self.scale)
+        return values.astype(self.dtype)
+
+    def set(self, program, values, start=0, parse=None, chunk=2**22):
+        """ Set the values of markers start..start+len(values).
+
+        A single value applies to all markers. *parse* is an optional
+        function applied to each chunk of values before packing.
+        """
+        values = np.asarray(values)
+        if values.ndim == 0 or (self.ncomp > 1 and values.ndim == 1):
+            if start != 0:
+                raise ValueError('a single %s value must be set for all '
+                                 'markers' % self.name)
+            if parse is not None:
+                values = parse(values)
+            value = values.astype(np.float64).ravel()
+            if values.dtype == self.dtype and self.scale != 1:
+                value /= self.scale
+            self.data = None
+            self.value = tuple(float(v) for v in value)
+            program[self.name] = (self.value if self.ncomp > 1 else
+                                  self.value[0])
+            return
+        stop = start + len(values)
+        if start < 0 or stop > self.n:
+            raise ValueError('markers %s..%s are out of range (%s markers)'
+                             % (start, stop, self.n))
+        full = self.data is None
+        if full:
+            shape = (self.n,) if self.ncomp == 1 else (self.n, self.ncomp)
+            self.data = np.zeros(shape, dtype=self.dtype)
+            if self.value is not None:
+                self.data[:] = self.pack(np.array(self.value)[:self.ncomp])
+            self.value = None
+        for i in range(0, len(values), chunk):
+            block = values[i:i + chunk]
+            if parse is not None:
+                block = parse(block)
+            block = self.pack(block)
+            if self.ncomp > 1:
+                self.data[start + i:start + i + len(block),
+                          :block.shape[1]] = block
+            else:
+                self.data[start + i:start + i + len(block)] = block
+        if full:
+            # switching from a constant to per-marker values
+            self._upload(program, 0, self.n, chunk, bind=True)
+        else:
+            self._upload(program, start, stop, chunk)
+
+    def _upload(self, program, start, stop, chunk=2**22, bind=False):
+        """ Upload the values of markers start..stop to the vertex buffer.
+        """
+        if self.vbo is None or self.vbo.size != self.n:
+            # allocate the buffer without building a full float32 copy
+            self.vbo = VertexBuffer(np.zeros((0, self.ncomp), np.float32))
+            self.vbo.resize_bytes(self.n * 4 * self.ncomp)
+        if bind:
+            program[self.name] = self.vbo
+        for i in range(start, stop, chunk):
+            block = self.data[i:min(i + chunk, stop)]
+            if self.dtype == np.float32:
+                block = np.ascontiguousarray(block)
+            else:
+                block = block.astype(np.float32)
+                if self.scale != 1:
+                    block /= self.scale
+            self.vbo.set_subdata(block, offset=i)
+
+
 class MarkersVisual(Visual):
     """ Visual displaying marker symbols.
+
+    Each marker attribute (position, colors, size and edge width) is kept in
+    a separate vertex buffer. ``set_positions``, ``set_colors`` and
+    ``set_sizes`` update a single attribute, optionally for a range of
+    markers only, and upload just the changed values. To reduce memory use
+    for large numbers of markers, colors are stored as uint8 and sizes as
+    float16.
     """
+
+    # Number of markers converted and uploaded at once
+    _chunk_size = 2**22
+
     def __init__(self):
         self._program = ModularProgram(vert, frag)
         self._v_size_var = Variable('varying float v_size')
@@ -502,6 +621,16 @@ class MarkersVisual(Visual):
         self._program.frag['v_size'] = self._v_size_var
         self._program.vert['scalarsize'] = Function(size1d)
         self._program.frag['scalarsize'] = Function(size1d)
+        self._attributes = dict(
+            a_position=_MarkerAttribute('a_position', 3, np.float32),
+            a_fg_color=_MarkerAttribute('a_fg_color', 4, np.uint8, 255.),
+            a_bg_color=_MarkerAttribute('a_bg_color', 4, np.uint8, 255.),
+            a_size=_MarkerAttribute('a_size', 1, np.float16),
+            a_edgewidth=_MarkerAttribute('a_edgewidth', 1, np.float16))
+        self._edge_width_rel = None
+        self._bounds = {}
+        self.scaling = False
+        self.antialias = 1.
         Visual.__init__(self)
         self.set_gl_state(depth_test=False, blend=True,
                           blend_func=('src_alpha', 'one_minus_src_alpha'))
@@ -551,31 +680,87 @@ class MarkersVisual(Visual):
         self.set_symbol(symbol)
         self.scaling = scaling
 
-        edge_color = ColorArray(edge_color).rgba
-        if len(edge_color) == 1:
-            edge_color = edge_color[0]
-
-        face_color = ColorArray(face_color).rgba
-        if len(face_color) == 1:
-            face_color = face_color[0]
-
-        n = len(pos)
-        data = np.zeros(n, dtype=[('a_position', np.float32, 3),
-                                  ('a_fg_color', np.float32, 4),
-                                  ('a_bg_color', np.float32, 4),
-                                  ('a_size', np.float32, 1),
-                                  ('a_edgewidth', np.float32, 1)])
-        data['a_fg_color'] = edge_color
-        data['a_bg_color'] = face_color
+        for attr in self._attributes.values():
+            attr.resize(len(pos))
+        self._edge_width_rel = edge_width_rel
+        self.set_positions(pos)
+        self.set_colors(face_color, edge_color)
         if edge_width is not None:
-            data['a_edgewidth'] = edge_width
-        else:
-            data['a_edgewidth'] = size*edge_width_rel
-        data['a_position'][:, :pos.shape[1]] = pos
-        data['a_size'] = size
-        self.antialias = 1.
-        self._data = data
-        self._vbo = VertexBuffer(data)
+            self._set('a_edgewidth', edge_width)
+        self.set_sizes(size)
+
+    def set_positions(self, pos, start=0):
+        """ Set the positions of markers start..start+len(pos).
+
+        Parameters
+        ----------
+        pos : array
+            Array of shape (N, 2) or (N, 3).
+        start : int
+            Index of the first marker to update.
+        """
+        pos = np.asarray(pos)
+        if pos.ndim != 2 or pos.shape[1] not in (2, 3):
+            raise ValueError('pos must be an array of shape (N, 2) or '
+                             '(N, 3), not %s' % (pos.shape,))
+        self._set('a_position', pos, start)
+        self._bounds = {}
+        self.events.bounds_change()
+
+    def set_colors(self, face_color=None, edge_color=None, start=0):
+        """ Set the colors of markers start..start+len(color).
+
+        Parameters
+        ----------
+        face_color : Color | ColorArray | array | None
+            The color used to draw each symbol interior. A single color
+            applies to all markers. Arrays of dtype uint8 are used as
+            packed RGBA colors without conversion. None leaves the
+            colors unchanged.
+        edge_color : Color | ColorArray | array | None
+            The color used to draw each symbol outline.
+        start : int
+            Index of the first marker to update.
+        """
+        for name, color in (('a_bg_color', face_color),
+                            ('a_fg_color', edge_color)):
+            if color is None:
+                continue
+            parse = None
+            if isinstance(color, np.ndarray) and color.dtype == np.uint8:
+                if color.shape[-1] != 4:
+                    raise ValueError('packed colors must have 4 channels')
+            elif isinstance(color, np.ndarray) and color.ndim == 2:
+                parse = _parse_colors
+            else:
+                color = _parse_colors(color)
+                if len(color) == 1:
+                    color = color[0]
+            self._set(name, color, start, parse)
+
+    def set_sizes(self, size, start=0):
+        """ Set the sizes of markers start..start+len(size).
+
+        Parameters
+        ----------
+        size : float | array
+            The symbol size in px. A single value applies to all markers.
+        start : int
+            Index of the first marker to update.
+
+        Notes
+        -----
+        If the edge width was given relative to the marker size, the edge
+        widths of these markers are updated as well.
+        """
+        size = np.asarray(size, dtype=np.float32)
+        self._set('a_size', size, start)
+        if self._edge_width_rel is not None:
+            self._set('a_edgewidth', size * self._edge_width_rel, start)
+
+    def _set(self, name, values, start=0, parse=None):
+        self._attributes[name].set(self._program, values, start, parse,
+                                   self._chunk_size)
         self.update()
 
     def set_symbol(self, symbol='o'):
@@ -589,35 +774,37 @@ class MarkersVisual(Visual):
         
         xform = transforms.get_full_transform()
         self._program.vert['transform'] = xform
-        # TO DO: find a way to avoid copying data and rebinding them to the vbo
+        scale = 1.
         if self.scaling:
-            update_data = self._data.copy()
             # 0.5 factor due to the difference between the viewbox spanning
             # [-1, 1] in the framebuffer coordinates intervals
             # and the viewbox spanning [0, 1] intervals
             # in the Visual coordinates
             # TO DO: find a way to get the scale directly
-            scale = (
+            scale = min(
                 0.5*transforms.visual_to_document.simplified().scale[:2] *
                 transforms.document_to_framebuffer.simplified().scale[:2] *
                 transforms.framebuffer_to_render.simplified().scale[:2]
             )
-            update_data['a_size'] *= min(scale)
-            update_data['a_edgewidth'] *= min(scale)
-            self._vbo.set_data(update_data)
         self._program.prepare()
         self._program['u_antialias'] = self.antialias
+        self._program['u_scale'] = scale
         
         d2f = transforms.document_to_framebuffer
         self._program['u_px_scale'] = (d2f.map((1, 0)) - d2f.map((0, 0)))[0]
-        self._program.bind(self._vbo)
         self._program.draw('points')
 
     def bounds(self, mode, axis):
-        pos = self._data['a_position']
+        pos = self._attributes['a_position'].data
         if pos is None:
             return None
-        if pos.shape[1] > axis:
-            return (pos[:, axis].min(), pos[:, axis].max())
-        else:
-            return (0, 0)
+        if axis not in self._bounds:
+            if pos.shape[1] > axis:
+                self._bounds[axis] = (pos[:, axis].min(), pos[:, axis].max())
+            else:
+                self._bounds[axis] = (0, 0)
+        return self._bounds[axis]
+
+
+def _parse_colors(color):
+    return ColorArray(color).rgba
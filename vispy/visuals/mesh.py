@@ -16,6 +16,7 @@ from .shaders import ModularProgram, Function, Varying
 from ..gloo import VertexBuffer, IndexBuffer
 from ..geometry import MeshData
 from ..color import Color
+from ..util import logger
 
 ## Snippet templates (defined as string to force user to create fresh Function)
 # Consider these stored in a central location in vispy ...
@@ -70,9 +71,39 @@ vec4 vec2to4(vec2 xyz) {
 
 
 class MeshVisual(Visual):
+    """Mesh visual
+
+    Parameters
+    ----------
+    vertices : array-like | None
+        The vertices.
+    faces : array-like | None
+        The faces.
+    vertex_colors : array-like | None
+        Colors to use for each vertex.
+    face_colors : array-like | None
+        Colors to use for each face.
+    color : instance of Color
+        The color to use.
+    meshdata : instance of MeshData | None
+        The meshdata.
+    shading : str | None
+        Shading to use.
+    mode : str
+        The drawing mode.
+    max_faces : int | None
+        The largest number of faces to draw. Larger meshes are drawn at the
+        finest level of detail of ``MeshData.get_lod_chain()`` that has at
+        most *max_faces* faces. The levels share the vertex buffers of the
+        mesh when it is drawn with an index buffer (smooth shading). Levels
+        registered with ``add_lod(max_size, max_faces=n)`` select it from
+        the size of the mesh on screen.
+    **kwargs : dict
+        Keyword arguments to pass to `Visual`.
+    """
     def __init__(self, vertices=None, faces=None, vertex_colors=None,
                  face_colors=None, color=(0.5, 0.5, 1, 1), meshdata=None,
-                 shading=None, mode='triangles', **kwargs):
+                 shading=None, mode='triangles', max_faces=None, **kwargs):
         Visual.__init__(self, **kwargs)
         
         self.set_gl_state('translucent', depth_test=True,
@@ -108,9 +139,17 @@ class MeshVisual(Visual):
         # Function for computing phong shading
         self._phong = Function(phong_template)
 
+        # The state of the mesh data in each buffer, and the layout of the
+        # data the shaders were set up for
+        self._uploaded = {}
+        self._layout = None
+        self._vertex_dim = None
+
         # Init
         self.shading = shading
+        self._max_faces = max_faces
         self._bounds = None
+        self._meshdata = None
         # Note we do not call subclass set_data -- often the signatures
         # do no match.
         MeshVisual.set_data(self, vertices=vertices, faces=faces,
@@ -119,17 +158,38 @@ class MeshVisual(Visual):
                             color=color)
 
     def set_data(self, vertices=None, faces=None, vertex_colors=None,
-                 face_colors=None, meshdata=None, color=None):
+                 face_colors=None, meshdata=None, color=None,
+                 optimize=False):
+        """ Set the mesh data
+
+        Only the data that changed is uploaded: passing the current
+        *meshdata* again updates the buffers of the attributes changed
+        through its setters, and passing only *color* keeps the mesh.
+
+        If *optimize* is True, the faces and vertices of the mesh data are
+        reordered in place for the vertex caches of the GPU, see
+        ``MeshData.optimize``.
+        """
         if meshdata is not None:
+            if meshdata is not self._meshdata:
+                self._uploaded = {}
             self._meshdata = meshdata
-        else:
+        elif (self._meshdata is None or vertices is not None or
+              faces is not None or vertex_colors is not None or
+              face_colors is not None):
             self._meshdata = MeshData(vertices=vertices, faces=faces,
                                       vertex_colors=vertex_colors,
                                       face_colors=face_colors)
+            self._uploaded = {}
+        if optimize and self._meshdata.n_faces:
+            acmr = self._meshdata.optimize()
+            logger.debug('Mesh vertex cache misses per face: %.3f -> %.3f'
+                         % acmr)
         self._bounds = self._meshdata.get_bounds()
+        self._build_lod_chain()
         if color is not None:
             self._color = Color(color)
-        self.mesh_data_changed()
+        self.update()
 
     @property
     def mode(self):
@@ -157,6 +217,19 @@ class MeshVisual(Visual):
     def mesh_data(self):
         """The mesh data"""
         return self._meshdata
+
+    @property
+    def max_faces(self):
+        """The largest number of faces to draw, or None to always draw
+        the full mesh
+        """
+        return self._max_faces
+
+    @max_faces.setter
+    def max_faces(self, n):
+        self._max_faces = n
+        self._build_lod_chain()
+        self.update()
     
     @property
     def color(self):
@@ -172,64 +245,154 @@ class MeshVisual(Visual):
         self.set_data(color=c)
 
     def mesh_data_changed(self):
-        self._data_changed = True
+        """ Upload all the mesh data again, e.g. after arrays of the mesh
+        data were modified in place.
+        """
+        self._uploaded = {}
+        self._bounds = self._meshdata.get_bounds()
+        self._build_lod_chain()
         self.update()
 
     def _update_data(self):
         md = self.mesh_data
-        # Update vertex/index buffers
-        if self.shading == 'smooth' and not md.has_face_indexed_data():
-            v = md.get_vertices()
-            if v is None:
-                return False
-            if v.shape[-1] == 2:
-                v = np.concatenate((v, np.zeros((v.shape[:-1] + (1,)))), -1)
-            self._vertices.set_data(v, convert=True)
-            self._normals.set_data(md.get_vertex_normals(), convert=True)
-            self._faces.set_data(md.get_faces(), convert=True)
-            self._indexed = True
-            if md.has_vertex_color():
-                self._colors.set_data(md.get_vertex_colors(), convert=True)
-            elif md.has_face_color():
-                self._colors.set_data(md.get_face_colors(), convert=True)
-            else:
-                self._colors.set_data(np.zeros((0, 4), dtype=np.float32))
+        indexed = self.shading == 'smooth' and not md.has_face_indexed_data()
+        versions = md.get_versions()
+        # the mesh data each buffer is derived from
+        if indexed:
+            deps = dict(vertices=('vertices',), faces=('faces',),
+                        normals=('normals',), colors=('colors',))
         else:
-            v = md.get_vertices(indexed='faces')
-            if v is None:
-                return False
-            if v.shape[-1] == 2:
-                v = np.concatenate((v, np.zeros((v.shape[:-1] + (1,)))), -1)
-            self._vertices.set_data(v, convert=True)
-            if self.shading == 'smooth':
-                normals = md.get_vertex_normals(indexed='faces')
-                self._normals.set_data(normals, convert=True)
-            elif self.shading == 'flat':
-                normals = md.get_face_normals(indexed='faces')
-                self._normals.set_data(normals, convert=True)
-            else:
-                self._normals.set_data(np.zeros((0, 3), dtype=np.float32))
-            self._indexed = False
-            if md.has_vertex_color():
-                self._colors.set_data(md.get_vertex_colors(indexed='faces'), 
-                                      convert=True)
-            elif md.has_face_color():
-                self._colors.set_data(md.get_face_colors(indexed='faces'), 
-                                      convert=True)
-            else:
-                self._colors.set_data(np.zeros((0, 4), dtype=np.float32))
+            deps = dict(vertices=('vertices', 'faces'), faces=(),
+                        normals=('normals', 'faces'),
+                        colors=('colors', 'faces'))
+        # the level of detail only changes the index buffer if there is one
+        level = self._lod_level(md)
+        state = {}
+        for buf, names in deps.items():
+            lod = None
+            if level is not None and (buf == 'faces' or not indexed):
+                lod = level
+                names += ('vertices', 'faces')
+            state[buf] = ((indexed, self.shading, lod) +
+                          tuple(versions[name] for name in names))
+        changed = [buf for buf in state if self._uploaded.get(buf) !=
+                   state[buf]]
+        if changed and self._update_buffers(md, indexed, changed,
+                                            level) is False:
+            return False
+        self._uploaded.update(state)
+        if 'vertices' in changed:
+            self._bounds = md.get_bounds()
+
+        # Only edit the shaders if the layout of the data changed
+        use_colors = self._colors.size > 0
+        layout = (self._vertex_dim, use_colors, self.shading,
+                  self._normals.size > 0,
+                  None if use_colors else tuple(self._color.rgba))
+        if layout != self._layout:
+            self._update_program(use_colors)
+            self._layout = layout
+
+    def _set_lod_data(self, data):
+        if 'max_faces' in data:
+            data = dict(data)
+            self.max_faces = data.pop('max_faces')
+        if data:
+            self.set_data(**data)
+
+    def _needs_lod(self, md):
+        return (self._max_faces is not None and
+                (md.n_faces or 0) > self._max_faces)
+
+    def _build_lod_chain(self):
+        """ Compute the levels of detail when the data or *max_faces* are
+        set, rather than on the next draw
+        """
+        md = self._meshdata
+        if md is not None and self._needs_lod(md):
+            md.get_lod_chain()
+
+    def _lod_level(self, md):
+        """ The level of detail of the mesh to draw, or None for the full
+        mesh
+        """
+        if not self._needs_lod(md):
+            return None
+        return md.get_lod_chain().select(self._max_faces)
+
+    def _update_buffers(self, md, indexed, changed, level):
+        """ Upload the buffers in *changed* """
+        if indexed:
+            if 'vertices' in changed:
+                v = md.get_vertices()
+                if v is None:
+                    return False
+                self._set_vertices(v)
+            if 'normals' in changed:
+                self._normals.set_data(md.get_vertex_normals(), convert=True)
+            if 'faces' in changed:
+                if level is None:
+                    faces = md.get_faces()
+                else:
+                    faces = md.get_lod_chain().get_faces(level)
+                self._faces.set_data(faces, convert=True)
+            if 'colors' in changed:
+                if md.has_vertex_color():
+                    self._colors.set_data(md.get_vertex_colors(),
+                                          convert=True)
+                elif md.has_face_color():
+                    self._colors.set_data(md.get_face_colors(), convert=True)
+                else:
+                    self._colors.set_data(np.zeros((0, 4), dtype=np.float32))
+        else:
+            if level is not None:
+                md = md.get_lod(level)
+            if 'vertices' in changed:
+                v = md.get_vertices(indexed='faces')
+                if v is None:
+                    return False
+                self._set_vertices(v)
+            if 'normals' in changed:
+                if self.shading == 'smooth':
+                    normals = md.get_vertex_normals(indexed='faces')
+                    self._normals.set_data(normals, convert=True)
+                elif self.shading == 'flat':
+                    normals = md.get_face_normals(indexed='faces')
+                    self._normals.set_data(normals, convert=True)
+                else:
+                    self._normals.set_data(np.zeros((0, 3),
+                                                    dtype=np.float32))
+            if 'colors' in changed:
+                if md.has_vertex_color():
+                    self._colors.set_data(
+                        md.get_vertex_colors(indexed='faces'), convert=True)
+                elif md.has_face_color():
+                    self._colors.set_data(
+                        md.get_face_colors(indexed='faces'), convert=True)
+                else:
+                    self._colors.set_data(np.zeros((0, 4), dtype=np.float32))
+        self._indexed = indexed
+
+    def _set_vertices(self, v):
+        if v.shape[-1] not in (2, 3):
+            raise TypeError("Vertex data must have shape (...,2) or (...,3).")
+        self._vertex_dim = v.shape[-1]
+        if v.shape[-1] == 2:
+            v = np.concatenate((v, np.zeros((v.shape[:-1] + (1,)))), -1)
+        self._vertices.set_data(v, convert=True)
+
+    def _update_program(self, use_colors):
+        """ Set up the shaders for the current layout of the data """
         self._program.vert['position'] = self._vertices
 
         # Position input handling
-        if v.shape[-1] == 2:
+        if self._vertex_dim == 2:
             self._program.vert['to_vec4'] = vec2to4
-        elif v.shape[-1] == 3:
-            self._program.vert['to_vec4'] = vec3to4
         else:
-            raise TypeError("Vertex data must have shape (...,2) or (...,3).")
+            self._program.vert['to_vec4'] = vec3to4
 
         # Color input handling
-        colors = self._colors if self._colors.size > 0 else self._color.rgba
+        colors = self._colors if use_colors else self._color.rgba
         self._program.vert[self._color_var] = colors
 
         # Shading
@@ -251,8 +414,6 @@ class MeshVisual(Visual):
             self._phong['ambient'] = (0.3, 0.3, 0.3, 1.0)
 
             self._program.frag['color'] = self._phong(self._color_var)
-            
-        self._data_changed = False
 
     @property
     def shading(self):
@@ -266,11 +427,9 @@ class MeshVisual(Visual):
         self._shading = value
 
     def draw(self, transforms):
-        if self._data_changed:
-            if self._update_data() is False:
-                return
-            self._data_changed = False
-            
+        if self._update_data() is False:
+            return
+
         Visual.draw(self, transforms)
 
         full_tr = transforms.get_full_transform()
@@ -35,6 +35,10 @@ class SurfacePlotVisual(MeshVisual):
     was initialized with smooth=False and very expensive if smooth=True.
     For faster performance, initialize with compute_normals=False and use
     per-vertex colors or a material that does not require normals.
+
+    With the *max_faces* argument of MeshVisual, large surfaces are drawn
+    simplified. The levels of detail are computed again when the vertex
+    positions change.
     """
     def __init__(self, x=None, y=None, z=None, colors=None, **kwargs):
         # The x, y, z, and colors arguments are passed to set_data().
@@ -1,9 +1,11 @@
 # -*- coding: utf-8 -*-
 import numpy as np
+from numpy.testing import assert_allclose
 
 from vispy.scene.visuals import Image
+from vispy.visuals import ImageVisual
 from vispy.testing import (requires_application, TestingCanvas,
-                           run_tests_if_main)
+                           run_tests_if_main, assert_equal)
 from vispy.testing.image_tester import assert_image_approved
 
 
@@ -22,4 +24,24 @@ def test_image():
                                   ("_rgb" if three_d else "_mono"))
 
 
+def test_image_clim():
+    """Test that clim is applied on the GPU"""
+    data = np.arange(12, dtype=np.uint8).reshape(3, 4) * 20
+    image = ImageVisual(data, clim='auto')
+    image._build_texture()
+    assert_equal(image.clim, (0, 220))
+    commands = image._texture._glir.clear()
+    assert_equal([c[0] for c in commands][-1], 'DATA')
+    assert_equal(commands[-1][3].dtype, np.uint8)
+    assert_allclose(image._clim_func['clim_scale'].value, (255. / 220, 0.))
+    image.clim = (20, 120)
+    assert_equal(image._texture._glir.clear(), [])
+    assert_allclose(image._clim_func['clim_scale'].value, (2.55, -0.2))
+    # floats are stored as float
+    image.set_data(data.astype(np.float64))
+    image._build_texture()
+    assert_equal(image._texture._glir.clear()[-1][3].dtype, np.float32)
+    assert_allclose(image._clim_func['clim_scale'].value, (0.01, -0.2))
+
+
 run_tests_if_main()
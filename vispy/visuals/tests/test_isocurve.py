@@ -0,0 +1,65 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2014, Vispy Development Team.
+# Distributed under the (new) BSD License. See LICENSE.txt for more info.
+
+import numpy as np
+from numpy.testing import assert_array_equal
+
+from vispy.color import get_colormap
+from vispy.visuals import IsocurveVisual
+from vispy.testing import run_tests_if_main, assert_equal, assert_true
+
+
+def test_isocurve_colors():
+    """Test the colors of the levels of IsocurveVisual"""
+    y, x = np.mgrid[:40, :50]
+    data = np.hypot(y - 20., x - 25.)
+    curve = IsocurveVisual(data, level=[5, 10, 15], color=(0, 1, 0, 1))
+
+    # a colormap, and the color of the line again
+    curve.color_lev = 'autumn'
+    curve._update_curves()
+    assert_equal(curve._color.shape, (len(curve._pos), 4))
+    colors = get_colormap('autumn').map(np.array([0., 0.5, 1.]))
+    assert_equal(set(map(tuple, curve._color.tolist())),
+                 set(map(tuple, colors.astype(np.float32).tolist())))
+    curve.color_lev = None
+    curve._update_curves()
+    assert_equal(curve._color, (0, 1, 0, 1))
+
+    # with other levels, the colors follow the vertices
+    curve.color_lev = 'autumn'
+    curve.level = [8, 12]
+    curve._update_curves()
+    assert_equal(curve._color.shape, (len(curve._pos), 4))
+
+    # a color name colors all levels
+    curve.color_lev = 'red'
+    curve._update_curves()
+    assert_array_equal(curve._color, [1, 0, 0, 1])
+
+
+def test_isocurve_set_data():
+    """Test that IsocurveVisual keeps its extractor across set_data"""
+    y, x = np.mgrid[:40, :50]
+    data = np.hypot(y - 20., x - 25.)
+    curve = IsocurveVisual(data, level=10, tile_shape=(16, 16))
+    iso = curve._iso
+    curve._update_curves()
+    pos = curve._pos.copy()
+
+    # new data of the same shape, and of another shape
+    curve.set_data(data + 1)
+    assert_true(curve._iso is iso)
+    curve.set_data(data)
+    curve._update_curves()
+    assert_array_equal(curve._pos, pos)
+    curve.set_data(data[:30])
+    assert_true(curve._iso is iso)
+    curve._update_curves()
+    other = IsocurveVisual(data[:30], level=10, tile_shape=(16, 16))
+    other._update_curves()
+    assert_array_equal(curve._pos, other._pos)
+
+
+run_tests_if_main()
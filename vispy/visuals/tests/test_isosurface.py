@@ -0,0 +1,36 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2014, Vispy Development Team.
+# Distributed under the (new) BSD License. See LICENSE.txt for more info.
+
+import threading
+
+import numpy as np
+from numpy.testing import assert_array_equal
+
+from vispy.geometry.isosurface import isosurface
+from vispy.visuals import IsosurfaceVisual
+from vispy.testing import run_tests_if_main, assert_equal, assert_true
+
+
+def test_isosurface_set_data():
+    """Test that updating an isosurface does not leave threads behind"""
+    rng = np.random.RandomState(0)
+    visual = IsosurfaceVisual(rng.rand(20, 10, 10), level=0.5,
+                              chunk_size=2, n_threads=3)
+    iso = visual._iso
+    n_threads = threading.active_count()
+    for i in range(5):
+        data = rng.rand(20, 10, 10)
+        visual.set_data(data)
+        verts, faces = visual._iso.extract(0.5)
+        assert_equal(threading.active_count(), n_threads)
+    # the extraction is kept while the shape is unchanged
+    assert_true(visual._iso is iso)
+    expected = isosurface(data, 0.5)
+    assert_array_equal(verts, expected[0])
+    assert_array_equal(faces, expected[1])
+    visual.set_data(rng.rand(10, 10, 10))
+    assert_true(visual._iso is not iso)
+
+
+run_tests_if_main()
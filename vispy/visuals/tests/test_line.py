@@ -0,0 +1,68 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2014, Vispy Development Team.
+# Distributed under the (new) BSD License. See LICENSE.txt for more info.
+import numpy as np
+from numpy.testing import assert_array_equal
+
+from vispy.visuals import LineVisual
+from vispy.testing import (run_tests_if_main, assert_equal, assert_true,
+                           assert_raises)
+
+
+def _reset(line):
+    for k in line._changed:
+        line._changed[k] = False
+    line._pos_range = None
+
+
+def test_line_connect_cache():
+    """Test that unchanged line topology is not re-uploaded"""
+    pos = np.random.normal(size=(10, 2))
+    connect = np.array([[0, 1], [1, 2], [5, 6]])
+    line = LineVisual(pos, connect=connect)
+    _reset(line)
+
+    # same topology given again, e.g. while animating positions
+    line.set_data(pos=pos + 1, connect=connect.copy())
+    assert_true(line._changed['pos'])
+    assert_true(not line._changed['connect'])
+    line.set_data(connect=connect[:2])
+    assert_true(line._changed['connect'])
+
+    line.set_data(connect='segments')
+    _reset(line)
+    line.set_data(connect='segments')
+    assert_true(not line._changed['connect'])
+
+    # in-place modification of the array given before is detected
+    bool_connect = np.ones(10, dtype=bool)
+    line.set_data(connect=bool_connect)
+    _reset(line)
+    bool_connect[3] = False
+    line.set_data(connect=bool_connect)
+    assert_true(line._changed['connect'])
+
+
+def test_line_update_pos():
+    """Test updating a range of line vertices"""
+    pos = np.zeros((10, 2), dtype=int)
+    line = LineVisual(pos)
+    _reset(line)
+    line.update_pos([[0.5, 0.5], [1, 1]], start=2)
+    assert_equal(line._pos_range, (2, 4))
+    assert_true(not line._changed['pos'] and not line._changed['color'])
+    line.update_pos([[2, 2]], start=7)
+    assert_equal(line._pos_range, (2, 8))
+    # the array given to set_data is left untouched
+    assert_array_equal(pos, 0)
+    assert_array_equal(line.pos[2:4], [[0.5, 0.5], [1, 1]])
+    assert_equal(line.bounds('visual', 0), (0, 2))
+
+    assert_raises(ValueError, line.update_pos, [[0, 0]], 10)
+    assert_raises(ValueError, line.update_pos, [[0, 0]], -1)
+    line.set_data(pos=pos)
+    assert_true(line._pos_range is None)
+    assert_raises(ValueError, LineVisual().update_pos, [[0, 0]])
+
+
+run_tests_if_main()
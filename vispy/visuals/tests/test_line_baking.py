@@ -0,0 +1,167 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2014, Vispy Development Team.
+# Distributed under the (new) BSD License. See LICENSE.txt for more info.
+import threading
+
+import numpy as np
+from numpy.testing import assert_allclose, assert_array_equal
+
+from vispy.visuals.line.baking import AggLineBaker, agg_vtype
+from vispy.testing import run_tests_if_main, assert_equal, assert_raises
+
+
+def _legacy_bake(vertices, color, closed=False):
+    """ The baking that _AggLineVisual used before AggLineBaker """
+    n = len(vertices)
+    P = np.array(vertices).reshape(n, 2).astype(float)
+    idx = np.arange(n)
+    if closed and np.sqrt(((P[0] - P[-1]) ** 2).sum()) > 1e-10:
+        P = np.append(P, P[0]).reshape(n + 1, 2)
+        idx = np.append(idx, idx[-1])
+        n += 1
+
+    V = np.zeros(len(P), dtype=agg_vtype.descr + [('alength', 'f4')])
+    V['a_position'] = P
+    T = P[1:] - P[:-1]
+    N = np.sqrt(T[:, 0] ** 2 + T[:, 1] ** 2)
+    V['a_tangents'][+1:, :2] = T
+    V['a_tangents'][0, :2] = T[-1] if closed else T[0]
+    V['a_tangents'][:-1, 2:] = T
+    V['a_tangents'][-1, 2:] = T[0] if closed else T[-1]
+
+    T1 = V['a_tangents'][:, :2]
+    T2 = V['a_tangents'][:, 2:]
+    A = np.arctan2(T1[:, 0] * T2[:, 1] - T1[:, 1] * T2[:, 0],
+                   T1[:, 0] * T2[:, 0] + T1[:, 1] * T2[:, 1])
+    V['a_angles'][:-1, 0] = A[:-1]
+    V['a_angles'][:-1, 1] = A[+1:]
+
+    L = np.cumsum(N)
+    V['a_segment'][+1:, 0] = L
+    V['a_segment'][:-1, 1] = L
+
+    V = np.repeat(V, 2, axis=0)[1:-1]
+    V['a_segment'][1:] = V['a_segment'][:-1]
+    V['a_angles'][1:] = V['a_angles'][:-1]
+    V['a_texcoord'][0::2] = -1
+    V['a_texcoord'][1::2] = +1
+    idx = np.repeat(idx, 2)[1:-1]
+
+    V = np.repeat(V, 2, axis=0)
+    V['a_texcoord'][0::2, 1] = -1
+    V['a_texcoord'][1::2, 1] = +1
+    idx = np.repeat(idx, 2)
+
+    index = np.resize(np.array([0, 1, 2, 1, 2, 3], dtype=np.uint32),
+                      (n - 1) * (2 * 3))
+    index += np.repeat(4 * np.arange(n - 1, dtype=np.uint32), 6)
+
+    V['alength'] = L[-1]
+    V['color'] = color[idx] if color.ndim == 2 else color
+    return V, index, L[-1]
+
+
+def _assert_baked_equal(a, b):
+    assert_equal(len(a), len(b))
+    for name in a.dtype.names:
+        assert_allclose(a[name], b[name], rtol=1e-6, atol=1e-6)
+
+
+def test_bake_simple():
+    """Test agg line baking of a simple polyline"""
+    pos = np.array([[0, 0], [3, 0], [3, 4]], dtype=np.float32)
+    V, I, length = AggLineBaker().bake(pos, np.array([1, 0, 0, 1]))
+    assert_equal(len(V), 8)
+    assert_equal(length, 7)
+    assert_array_equal(I, [0, 1, 2, 1, 2, 3, 4, 5, 6, 5, 6, 7])
+    assert_array_equal(V['a_position'][:4], [[0, 0], [0, 0], [3, 0], [3, 0]])
+    assert_array_equal(V['a_segment'][:4], [[0, 3]] * 4)
+    assert_array_equal(V['a_segment'][4:], [[3, 7]] * 4)
+    assert_array_equal(V['a_texcoord'][:4], [[-1, -1], [-1, 1],
+                                             [1, -1], [1, 1]])
+    # the tangent at the corner turns by 90 degrees
+    assert_array_equal(V['a_tangents'][2], [3, 0, 0, 4])
+    assert_allclose(V['a_angles'][0], [0, np.pi / 2])
+    assert_allclose(V['a_angles'][4], [np.pi / 2, 0])
+    assert_array_equal(V['color'], [[1, 0, 0, 1]] * 8)
+
+    # closed lines get an extra segment
+    V, I, length = AggLineBaker().bake(pos, np.array([1, 0, 0, 1]),
+                                       closed=True)
+    assert_equal(len(V), 12)
+    assert_equal(length, 12)
+    assert_array_equal(V['a_tangents'][0], [-3, -4, 3, 0])
+
+    assert_raises(ValueError, AggLineBaker().bake, pos[:1], [1, 1, 1, 1])
+    assert_raises(ValueError, AggLineBaker().bake, pos, np.ones((2, 4)))
+
+
+def test_bake_legacy():
+    """Test that AggLineBaker matches the previous baking"""
+    np.random.seed(1234)
+    pos = np.cumsum(np.random.normal(size=(500, 2)), axis=0)
+    color = np.random.uniform(size=(500, 4))
+    for closed, c in ((False, color), (False, color[0]), (True, color[0])):
+        V0, I0, L0 = _legacy_bake(pos, c, closed)
+        V1, I1, L1 = AggLineBaker(chunk_size=64, n_threads=2).bake(pos, c,
+                                                                   closed)
+        _assert_baked_equal(V1, V0)
+        assert_array_equal(I1, I0)
+        assert_allclose(L1, L0)
+
+
+def test_bake_chunked():
+    """Test that chunked and threaded baking match serial baking"""
+    np.random.seed(1234)
+    pos = np.random.normal(size=(1000, 2))
+    color = np.random.uniform(size=(1000, 4))
+    n_threads = threading.active_count()
+    for closed in (False, True):
+        c = color[0] if closed else color
+        V0, I0, L0 = AggLineBaker(n_threads=1).bake(pos, c, closed)
+        V0 = V0.copy()
+        V1, I1, L1 = AggLineBaker(chunk_size=37, n_threads=4).bake(pos, c,
+                                                                   closed)
+        _assert_baked_equal(V0, V1)
+        assert_array_equal(I0, I1)
+        assert_equal(L0, L1)
+    # the threads do not outlive the bake
+    assert_equal(threading.active_count(), n_threads)
+
+
+def test_bake_incremental():
+    """Test incremental baking of a streaming line"""
+    np.random.seed(1234)
+    pos = np.random.normal(size=(100, 2))
+    color = np.random.uniform(size=(100, 4))
+    baker = AggLineBaker(chunk_size=16, n_threads=2)
+    V, I, L, first = baker.update(pos, color)
+    assert_equal(first, 0)
+    # nothing changed
+    V, I, L, first = baker.update(pos, color)
+    assert_equal(first, len(V))
+    for step in range(10):
+        if step % 2:
+            # modify a vertex near the end
+            pos = pos.copy()
+            pos[-5] += 1
+            expected = 4 * (len(pos) - 7)
+        else:
+            # append new vertices
+            pos = np.concatenate([pos, np.random.normal(size=(30, 2))])
+            color = np.concatenate([color, np.random.uniform(size=(30, 4))])
+            expected = 4 * (len(pos) - 32)
+        V, I, L, first = baker.update(pos, color)
+        assert_equal(first, expected)
+        V_ref, I_ref, L_ref = AggLineBaker(n_threads=1).bake(pos, color)
+        _assert_baked_equal(V, V_ref)
+        assert_array_equal(I, I_ref)
+        assert_allclose(L, L_ref)
+
+    # changing the uniform color re-bakes everything
+    baker.update(pos, [1, 1, 1, 1])
+    V, I, L, first = baker.update(pos, [1, 0, 1, 1])
+    assert_equal(first, 0)
+
+
+run_tests_if_main()
@@ -0,0 +1,131 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2014, Vispy Development Team.
+# Distributed under the (new) BSD License. See LICENSE.txt for more info.
+import os.path as op
+
+import numpy as np
+from numpy.testing import assert_array_equal
+
+from vispy.util import _TempDir
+from vispy.util.bunch import SimpleBunch
+from vispy.visuals import LineVisual, LinePlotVisual
+from vispy.visuals.line.decimation import MinMaxDecimator
+from vispy.visuals.transforms import STTransform
+from vispy.testing import (run_tests_if_main, assert_equal, assert_true,
+                           assert_raises)
+
+temp_dir = _TempDir()
+
+
+def _random_walk(n):
+    np.random.seed(1234)
+    pos = np.empty((n, 2), dtype=np.float32)
+    pos[:, 0] = np.arange(n)
+    pos[:, 1] = np.cumsum(np.random.normal(size=n))
+    return pos
+
+
+def _check_envelope(pos, index, x0, x1, npix):
+    # indices are sorted and unique
+    assert_true(np.all(np.diff(index) > 0))
+    assert_true(len(index) <= 8 * npix + 64)
+    # the decimated line reaches both edges of the view
+    assert_true(pos[index[0], 0] <= x0 and pos[index[-1], 0] >= x1)
+    # extrema of the visible range are preserved
+    sel = pos[index]
+    sel = sel[(sel[:, 0] >= x0) & (sel[:, 0] <= x1)]
+    full = pos[(pos[:, 0] >= x0) & (pos[:, 0] <= x1)]
+    assert_equal(sel[:, 1].min(), full[:, 1].min())
+    assert_equal(sel[:, 1].max(), full[:, 1].max())
+
+
+def test_decimator():
+    """Test min/max envelope decimation"""
+    pos = _random_walk(100003)
+    dec = MinMaxDecimator(pos, base=16, chunk=1000)
+    assert_true(dec.n_levels > 5)
+    assert_equal(dec.bounds(0), (0, 100002))
+    assert_equal(dec.bounds(1), (pos[:, 1].min(), pos[:, 1].max()))
+
+    # full view, pyramid levels
+    for npix in (10, 100, 333):
+        index = dec.select(-10, 200000, npix)
+        _check_envelope(pos, index, 0, 100002, npix)
+    # zoomed in: direct M4 and raw samples
+    for x0, x1, npix in ((5000.5, 7000, 500), (5000, 5100, 800),
+                         (99000, 100002, 100)):
+        index = dec.select(x0, x1, npix)
+        _check_envelope(pos, index, x0, x1, npix)
+    index = dec.select(5000, 5100, 800)
+    assert_array_equal(index, np.arange(5000, 5101))
+
+    # unchanged views are cached
+    assert_true(dec.select(5000, 5100, 800) is index)
+    assert_array_equal(dec.decimate(5000, 5100, 800), pos[index])
+
+
+def test_decimator_memmap():
+    """Test decimation of memory-mapped data"""
+    pos = _random_walk(20000)
+    fname = op.join(temp_dir, 'line.dat')
+    mm = np.memmap(fname, dtype=np.float32, mode='w+', shape=pos.shape)
+    mm[:] = pos
+    mm.flush()
+    mm = np.memmap(fname, dtype=np.float32, mode='r', shape=pos.shape)
+    dec = MinMaxDecimator(mm)
+    index = dec.select(0, 20000, 100)
+    _check_envelope(pos, index, 0, 19999, 100)
+    del mm, dec
+
+
+def test_line_decimation():
+    """Test decimation in LineVisual"""
+    pos = _random_walk(50000)
+    color = np.random.uniform(size=(len(pos), 4)).astype(np.float32)
+    line = LineVisual(pos, color=color, decimate=True)
+    assert_equal(line.bounds('visual', 1),
+                 (pos[:, 1].min(), pos[:, 1].max()))
+
+    # map x in [0, 50000) to a 200 px wide framebuffer
+    view = STTransform(scale=(2 / 50000., 1.), translate=(-1, 0))
+    tr = SimpleBunch(get_full_transform=lambda: view,
+                     framebuffer_to_render=STTransform(scale=(0.01, 1.),
+                                                       translate=(-1, 0)))
+    line._update_decimation(tr)
+    n = len(line._draw_pos)
+    assert_true(n < 8 * 200 + 64)
+    assert_equal(len(line._interpret_color()), n)
+    assert_true(line._changed['pos'] and line._changed['color'])
+
+    line.decimate = False
+    assert_equal(len(line._draw_pos), len(pos))
+    line.set_data(connect='segments')
+    # decimation requires strip lines, and the line is left unchanged
+    assert_raises(ValueError, setattr, line, 'decimate', True)
+    assert_equal(line.decimate, False)
+    line.set_data(connect='strip')
+    line.decimate = True
+    assert_raises(ValueError, line.set_data, connect='segments')
+    assert_equal(line.connect, 'strip')
+
+
+def test_line_plot_decimation():
+    """Test that the markers of LinePlotVisual follow the decimation"""
+    pos = _random_walk(50000)
+    plot = LinePlotVisual(pos, decimate=True, face_color='r')
+    markers = plot._markers._attributes['a_position']
+    assert_equal(len(markers.data), len(pos))
+    view = STTransform(scale=(2 / 50000., 1.), translate=(-1, 0))
+    tr = SimpleBunch(get_full_transform=lambda: view,
+                     framebuffer_to_render=STTransform(scale=(0.01, 1.),
+                                                       translate=(-1, 0)))
+    plot._update_markers(tr)
+    index = plot._line._decim_index
+    assert_array_equal(markers.data[:, :2], pos[index])
+    assert_array_equal(plot._markers._attributes['a_bg_color'].value,
+                       [1, 0, 0, 1])
+    plot._update_markers(tr)
+    assert_true(plot._marker_index is index)
+
+
+run_tests_if_main()
@@ -0,0 +1,98 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2014, Vispy Development Team.
+# Distributed under the (new) BSD License. See LICENSE.txt for more info.
+
+import numpy as np
+
+from vispy.visuals import Visual
+from vispy.visuals.lod import LevelOfDetail, screen_size
+from vispy.visuals.transforms import STTransform, NullTransform
+from vispy.util.bunch import SimpleBunch
+from vispy.testing import run_tests_if_main, assert_equal, assert_raises
+
+
+class _BoxVisual(Visual):
+    def __init__(self):
+        Visual.__init__(self)
+        self.data = []
+        self.pos = np.array([[0., 0.], [10., 10.]])
+
+    def set_data(self, pos=None):
+        self.data.append(pos)
+
+    def bounds(self, mode, axis):
+        if axis > 1:
+            return None
+        return (self.pos[:, axis].min(), self.pos[:, axis].max())
+
+
+def _transforms(scale):
+    return SimpleBunch(visual_to_document=STTransform(scale=(scale, scale)),
+                       document_to_framebuffer=NullTransform())
+
+
+def test_lod_select():
+    """Test level selection and hysteresis"""
+    lod = LevelOfDetail(hysteresis=0.2)
+    assert_equal(lod.select(10), (None, False))
+    lod.add_level(np.inf, 'full')
+    lod.add_level(100, 'medium')
+    lod.add_level(10, 'coarse')
+    assert_equal([level[1] for level in lod.levels],
+                 ['coarse', 'medium', 'full'])
+
+    assert_equal(lod.select(5), (0, True))
+    assert_equal(lod.select(5), (0, False))
+    assert_equal(lod.select(50), (1, True))
+    assert_equal(lod.select(1000), (2, True))
+    # within the hysteresis margin: stay at the finer level
+    assert_equal(lod.select(90), (2, False))
+    assert_equal(lod.select(70), (1, True))
+    assert_equal(lod.select(9), (1, False))
+    assert_equal(lod.select(2), (0, True))
+    assert_equal(lod.select(None), (2, True))
+
+    # inserting a level keeps the current selection
+    lod.add_level(1, 'tiny')
+    assert_equal(lod.current, 3)
+    lod.clear()
+    assert_equal(len(lod), 0)
+    assert_raises(ValueError, lod.add_level, 0, 'bad')
+    assert_raises(ValueError, LevelOfDetail, 1.5)
+
+
+def test_lod_async():
+    """Test building levels in the background"""
+    called = []
+    lod = LevelOfDetail()
+    lod.build_async(50, lambda x: x * 2, (21,),
+                    callback=lambda: called.append(True))
+    lod.wait()
+    assert_equal(lod.levels, [(50., 42)])
+    assert_equal(called, [True])
+
+
+def test_visual_lod():
+    """Test level of detail selection on a visual"""
+    v = _BoxVisual()
+    assert_equal(screen_size(v, _transforms(1)), np.sqrt(200))
+    v.update_lod(_transforms(1))  # no levels; nothing happens
+    assert_equal(v.data, [])
+
+    v.add_lod(np.inf, pos='full')
+    v.add_lod(50, pos='coarse')
+    v.update_lod(_transforms(1))
+    v.update_lod(_transforms(2))
+    v.update_lod(_transforms(10))
+    v.update_lod(_transforms(10))
+    assert_equal(v.data, ['coarse', 'full'])
+
+    v.add_lod_async(100, lambda: dict(pos='async'))
+    v.lod.wait()
+    v.update_lod(_transforms(5))
+    assert_equal(v.data[-1], 'async')
+    v.clear_lods()
+    assert v.lod is None
+
+
+run_tests_if_main()
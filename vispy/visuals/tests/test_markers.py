@@ -1,8 +1,12 @@
 # -*- coding: utf-8 -*-
 import numpy as np
+from numpy.testing import assert_allclose, assert_array_equal
+
 from vispy.scene.visuals import Markers
+from vispy.visuals import MarkersVisual
 from vispy.testing import (requires_application, TestingCanvas,
-                           run_tests_if_main)
+                           run_tests_if_main, assert_equal, assert_true,
+                           assert_raises)
 from vispy.testing.image_tester import assert_image_approved
 
 
@@ -28,4 +32,52 @@ def test_markers():
         assert_image_approved("screenshot", "visuals/markers.png")
 
 
+def test_markers_attributes():
+    """Test per-attribute marker updates"""
+    np.random.seed(57983)
+    pos = np.random.normal(size=(1000, 2)).astype(np.float32)
+    markers = MarkersVisual()
+    markers._chunk_size = 300
+    markers.set_data(pos, face_color='red', size=np.arange(1000.))
+    attrs = markers._attributes
+    prog = markers._program
+    # single values are constant attributes, without buffers
+    assert_true(attrs['a_bg_color'].data is None)
+    assert_equal(prog['a_bg_color'], (1, 0, 0, 1))
+    assert_equal(attrs['a_position'].data.dtype, np.float32)
+    assert_array_equal(attrs['a_position'].data[:, :2], pos)
+    assert_equal(attrs['a_size'].data.dtype, np.float16)
+    assert_equal(markers.bounds('visual', 0),
+                 (pos[:, 0].min(), pos[:, 0].max()))
+
+    # partial position update only touches the position buffer
+    vbo = prog['a_position']
+    markers.set_positions(np.zeros((10, 3)), start=990)
+    assert_true(prog['a_position'] is vbo)
+    assert_array_equal(attrs['a_position'].data[990:], 0)
+    assert_equal(markers.bounds('visual', 2), (0, 0))
+    assert_true(attrs['a_bg_color'].data is None)
+
+    # per-marker colors are packed as uint8
+    colors = np.random.uniform(size=(50, 4))
+    markers.set_colors(face_color=colors, start=100)
+    bg = attrs['a_bg_color'].data
+    assert_equal(bg.dtype, np.uint8)
+    assert_array_equal(bg[:100], [[255, 0, 0, 255]] * 100)
+    assert_allclose(bg[100:150] / 255., colors, atol=0.5 / 255)
+    assert_equal(prog['a_bg_color'].size, 1000)
+    packed = np.zeros((2, 4), np.uint8)
+    markers.set_colors(edge_color=packed, start=998)
+    assert_array_equal(attrs['a_fg_color'].data[998:], 0)
+
+    # relative edge widths follow the sizes
+    markers.set_data(pos, size=4., edge_width=None, edge_width_rel=0.5)
+    assert_equal(prog['a_edgewidth'], 2.)
+    markers.set_sizes([8., 6.], start=10)
+    assert_array_equal(attrs['a_edgewidth'].data[9:13], [2, 4, 3, 2])
+    assert_raises(ValueError, markers.set_sizes, 1., start=10)
+    assert_raises(ValueError, markers.set_sizes, [1., 2.], start=999)
+    assert_raises(ValueError, markers.set_positions, np.zeros(3))
+
+
 run_tests_if_main()
@@ -0,0 +1,131 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2014, Vispy Development Team.
+# Distributed under the (new) BSD License. See LICENSE.txt for more info.
+import numpy as np
+from numpy.testing import assert_array_equal
+
+from vispy.geometry import create_sphere
+from vispy.geometry.optimization import simulate_vertex_cache
+from vispy.visuals import MeshVisual
+from vispy.testing import run_tests_if_main, assert_equal
+
+
+def _uploads(mesh):
+    """ Names of the buffers of the mesh that have pending uploads """
+    names = []
+    for name in ('vertices', 'normals', 'faces', 'colors'):
+        cmds = getattr(mesh, '_' + name)._glir.clear()
+        if any(c[0] in ('DATA', 'SIZE') for c in cmds):
+            names.append(name)
+    return names
+
+
+def test_mesh_partial_updates():
+    """Test that the mesh visual only uploads the data that changed"""
+    for shading in ('smooth', 'flat'):
+        md = create_sphere(8, 10)
+        md.set_vertex_colors(np.ones((md.n_vertices, 4)))
+        mesh = MeshVisual(meshdata=md, shading=shading)
+        mesh._update_data()
+        assert_equal(sorted(_uploads(mesh)),
+                     ['colors', 'faces', 'normals', 'vertices']
+                     if shading == 'smooth' else
+                     ['colors', 'normals', 'vertices'])
+        mesh._program._need_build = False
+        # nothing changed
+        mesh._update_data()
+        assert_equal(_uploads(mesh), [])
+        # colors only, without touching the shaders
+        colors = np.random.RandomState(0).rand(md.n_vertices, 4)
+        md.set_vertex_colors(colors)
+        mesh._update_data()
+        assert_equal(_uploads(mesh), ['colors'])
+        assert_equal(mesh._program._need_build, False)
+        # positions change the normals too
+        md.set_vertices(md.get_vertices() * 2)
+        mesh._update_data()
+        assert_equal(sorted(_uploads(mesh)), ['normals', 'vertices'])
+        assert_equal(mesh._program._need_build, False)
+        assert_equal(mesh.bounds(None, 0)[1], 2.)
+        # faces
+        md.set_faces(md.get_faces()[::-1])
+        mesh._update_data()
+        expected = (['faces', 'normals'] if shading == 'smooth' else
+                    ['colors', 'normals', 'vertices'])
+        assert_equal(sorted(_uploads(mesh)), expected)
+        # the uniform color and a change of layout rebuild the shaders
+        mesh.color = 'red'
+        mesh._update_data()
+        assert_equal(mesh._program._need_build, False)
+        assert_equal(mesh.mesh_data is md, True)
+        mesh.shading = None
+        mesh._update_data()
+        assert_equal(mesh._program._need_build, True)
+        mesh.shading = shading
+        # everything is uploaded again on request
+        mesh.mesh_data_changed()
+        mesh._update_data()
+        assert_equal(len(_uploads(mesh)), 4 if shading == 'smooth' else 3)
+    assert_array_equal(mesh.mesh_data.get_vertex_colors(), colors)
+
+
+def test_mesh_lod():
+    """Test drawing meshes at a level of detail"""
+    md = create_sphere(20, 40)
+    chain = md.get_lod_chain()
+    n = md.n_faces
+    mesh = MeshVisual(meshdata=md, shading='smooth', max_faces=n // 3)
+    mesh._update_data()
+    assert_equal(len(_uploads(mesh)), 4)
+    assert_equal(mesh._faces.size, chain.get_n_faces(1) * 3)
+    # the vertex buffers are shared by the levels
+    for max_faces in (n // 10, None, n // 2):
+        mesh.max_faces = max_faces
+        mesh._update_data()
+        assert_equal(_uploads(mesh), ['faces'])
+    assert_equal(mesh._faces.size, chain.get_n_faces(0) * 3)
+    # without index buffer, all the data comes from the level
+    mesh.shading = 'flat'
+    mesh._update_data()
+    assert_equal(mesh._vertices.size, chain.get_n_faces(0) * 3)
+    mesh.max_faces = n
+    mesh._update_data()
+    assert_equal(mesh._vertices.size, n * 3)
+    # levels selected by the size on screen
+    mesh._set_lod_data(dict(max_faces=n // 3))
+    assert_equal(mesh.max_faces, n // 3)
+    assert_equal(mesh.mesh_data is md, True)
+
+
+def test_mesh_lod_chain():
+    """Test that the levels of detail are not computed by the draw"""
+    md = create_sphere(20, 40)
+    n = md.n_faces
+    mesh = MeshVisual(meshdata=md, max_faces=n // 3)
+    chain = md._lods[1]
+    mesh._update_data()
+    assert_equal(md._lods[1] is chain, True)
+    # new data, or a smaller max_faces
+    mesh.set_data(vertices=md.get_vertices(), faces=md.get_faces())
+    assert_equal(mesh.mesh_data._lods is not None, True)
+    mesh = MeshVisual(meshdata=create_sphere(10, 20))
+    assert_equal(mesh.mesh_data._lods, None)
+    mesh.max_faces = n
+    assert_equal(mesh.mesh_data._lods, None)
+    mesh.max_faces = 100
+    assert_equal(mesh.mesh_data._lods is not None, True)
+
+
+def test_mesh_optimize():
+    """Test reordering the mesh for the vertex cache"""
+    md = create_sphere(20, 30)
+    faces = md.get_faces()[np.random.RandomState(0).permutation(md.n_faces)]
+    md.set_faces(faces)
+    MeshVisual(meshdata=md)
+    assert_array_equal(md.get_faces(), faces)
+    mesh = MeshVisual()
+    mesh.set_data(meshdata=md, optimize=True)
+    assert_equal(simulate_vertex_cache(md.get_faces()) < 0.8, True)
+
+
+run_tests_if_main()
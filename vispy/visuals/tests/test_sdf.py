@@ -1,13 +1,16 @@
 # -*- coding: utf-8 -*-
 # Copyright (c) 2014, Vispy Development Team.
 # Distributed under the (new) BSD License. See LICENSE.txt for more info.
+import threading
+
 import numpy as np
 from numpy.testing import assert_allclose
 
 from vispy.app import Canvas
-from vispy.visuals.text._sdf import SDFRenderer
+from vispy.visuals.text._sdf import SDFRenderer, SDFRendererCPU
 from vispy import gloo
-from vispy.testing import requires_application, run_tests_if_main
+from vispy.testing import (requires_application, run_tests_if_main,
+                           assert_equal)
 
 
 @requires_application()
@@ -40,4 +43,53 @@ def test_sdf():
         assert_allclose(result, expd, atol=1)
 
 
+def _sdf_reference(data, w, h):
+    """Brute-force SDF, sampled like the GL renderer"""
+    inside = data >= 128
+    yy, xx = np.mgrid[:data.shape[0], :data.shape[1]]
+    out = np.empty((h, w))
+    for i in range(h):
+        for j in range(w):
+            y = int((i + 0.5) * data.shape[0] / h)
+            x = int((j + 0.5) * data.shape[1] / w)
+            other = inside != inside[y, x]
+            d = np.sqrt((yy[other] - y) ** 2 + (xx[other] - x) ** 2).min()
+            if inside[y, x]:
+                out[i, j] = 0.5 - 7 / 256. + d / 32.
+            else:
+                out[i, j] = 0.5 - d / 32.
+    return np.round(out.clip(0, 1) * 255)
+
+
+def test_sdf_cpu():
+    """Test SDF calculation on the CPU"""
+    data = np.zeros((6, 9), np.uint8)
+    data[2:, 2:7] = 255
+    sdf = SDFRendererCPU().render([data], [(9, 6)])[0]
+    assert_equal(sdf.dtype, np.uint8)
+    assert_equal(sdf[2:, 2].tolist(), [128] * 4)  # on the edge
+    assert_equal(sdf[0, 0], 105)  # 0.5 - sqrt(8) / 32
+    assert_allclose(sdf, _sdf_reference(data, 9, 6))
+
+    # batches of glyphs of different sizes, downsampled
+    np.random.seed(0)
+    glyphs = []
+    for shape in [(40, 28), (37, 50), (64, 64), (10, 10)]:
+        yy, xx = np.mgrid[:shape[0], :shape[1]]
+        r = np.random.uniform(3, 10)
+        glyph = ((yy - shape[0] / 2.) ** 2 + (xx - shape[1] / 3.) ** 2 <
+                 r ** 2) * 255
+        glyphs.append(glyph.astype(np.uint8))
+    sizes = [(g.shape[1] // 4, g.shape[0] // 4) for g in glyphs]
+    n_threads = threading.active_count()
+    sdfs = SDFRendererCPU(batch_size=3, n_threads=2).render(glyphs, sizes)
+    assert_equal(threading.active_count(), n_threads)
+    for glyph, size, sdf in zip(glyphs, sizes, sdfs):
+        assert_equal(sdf.shape, size[::-1])
+        assert_allclose(sdf, _sdf_reference(glyph, *size))
+    # glyphs without any pixels set (e.g. space)
+    sdf = SDFRendererCPU().render([np.zeros((8, 8), np.uint8)], [(2, 2)])[0]
+    assert_equal(sdf.tolist(), [[0, 0], [0, 0]])
+
+
 run_tests_if_main()
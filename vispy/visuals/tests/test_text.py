@@ -1,9 +1,32 @@
 # -*- coding: utf-8 -*-
+import gc
+import os.path as op
+
+import numpy as np
+from numpy.testing import assert_array_equal, assert_allclose
+
+from vispy.gloo.context import GLShared
 from vispy.scene.visuals import Text
+from vispy.util import _TempDir
+from vispy.util.bunch import SimpleBunch
+from vispy.visuals.text._atlas import GlyphAtlas
+from vispy.visuals.text._cache import GlyphCache
+from vispy.visuals.text.text import (FontManager, get_context_font_manager,
+                                     _layout_text)
+from vispy.visuals import TextVisual
 from vispy.testing import (requires_application, TestingCanvas,
-                           run_tests_if_main)
+                           run_tests_if_main, assert_equal, assert_true,
+                           assert_raises)
 from vispy.testing.image_tester import assert_image_approved
 
+temp_dir = _TempDir()
+
+
+def _fake_glyph(char, kerning=None):
+    sdf = ((np.arange(30) + ord(char)) % 256).astype(np.uint8).reshape(5, 6)
+    return dict(char=char, offset=(1., 2.), advance=ord(char) / 8.,
+                size=(6, 5), sdf=sdf, kerning=kerning or {})
+
 
 @requires_application()
 def test_text():
@@ -18,4 +41,201 @@ def test_text():
         assert_image_approved("screenshot", 'visuals/text1.png')
 
 
+def test_glyph_cache():
+    """Test the persistent SDF glyph cache"""
+    font = dict(face='OpenSans', bold=False, italic=False)
+    params = dict(size=256, lowres_size=64, spread=32)
+    cache = GlyphCache(op.join(temp_dir, 'cache'))
+    assert_equal(cache.load(font, params, 'ab'), ({}, []))
+    glyphs = [_fake_glyph('a'), _fake_glyph('b', {'a': -1.5, 'c': 0.})]
+    cache.store(font, params, glyphs)
+
+    # another instance (e.g. in another process) sees the glyphs
+    other = GlyphCache(op.join(temp_dir, 'cache'))
+    found, kerning = other.load(font, params, 'abc')
+    assert_equal(sorted(found), ['a', 'b'])
+    assert_array_equal(found['b']['sdf'], glyphs[1]['sdf'])
+    assert_equal(found['b']['advance'], glyphs[1]['advance'])
+    assert_equal(found['a']['size'], (6, 5))
+    assert_equal(kerning, [('a', 'b', -1.5)])
+    # kerning with already loaded glyphs
+    assert_equal(other.load(font, params, 'b', loaded='a')[1],
+                 [('a', 'b', -1.5)])
+    assert_equal(other.load(font, params, 'b')[1], [])
+    # different SDF parameters or faces do not share glyphs
+    assert_equal(other.load(font, dict(params, spread=16), 'a')[0], {})
+    assert_equal(other.load(dict(font, bold=True), params, 'a')[0], {})
+
+    # glyphs are only added once; incomplete records are ignored
+    other.store(font, params, [_fake_glyph('a'), _fake_glyph('\u2022')])
+    fdir = cache._font_dir(font, params)
+    with open(op.join(fdir, 'index.dat'), 'ab') as fid:
+        fid.write(b'\x00' * 7)
+    found, _ = cache.load(font, params, 'a\u2022')
+    assert_equal(len(found), 2)
+    assert_equal(op.getsize(op.join(fdir, 'pool.dat')), 3 * 30)
+    assert_true(not op.isfile(op.join(fdir, 'lock')))
+
+
+def test_font_prewarm():
+    """Test loading glyphs from the cache without rendering"""
+    cache = GlyphCache(op.join(temp_dir, 'prewarm'))
+    manager = FontManager(glyph_cache=cache, sdf_method='cpu')
+    font = manager.get_font('OpenSans')
+    cache.store(font._font, font._sdf_params,
+                [_fake_glyph('x'), _fake_glyph('y', {'x': 2.})])
+    font.prewarm('xyxy')
+    assert_equal(sorted(font._glyphs), ['x', 'y'])
+    assert_equal(font['y']['kerning'], {'x': 2.})
+    u0, v0, u1, v1 = font['x']['texcoords']
+    assert_equal(((u1 - u0) * font._atlas.page_shape[1],
+                  (v1 - v0) * font._atlas.page_shape[0]), (6, 5))
+
+
+def test_font_manager_cache():
+    """Test that glyphs are only cached on disk when asked for"""
+    assert_true(FontManager()._glyph_cache is None)
+    assert_true(isinstance(FontManager(glyph_cache=True)._glyph_cache,
+                           GlyphCache))
+    cache = GlyphCache(op.join(temp_dir, 'manager'))
+    assert_true(FontManager(glyph_cache=cache)._glyph_cache is cache)
+
+
+def _fake_font_manager(name):
+    """Font manager with made-up glyphs, that needs no font files"""
+    cache = GlyphCache(op.join(temp_dir, name))
+    manager = FontManager(glyph_cache=cache, sdf_method='cpu')
+    font = manager.get_font('OpenSans')
+    glyphs = [_fake_glyph(chr(c)) for c in range(32, 127)]
+    glyphs[ord('V') - 32]['kerning']['A'] = -8.
+    cache.store(font._font, font._sdf_params, glyphs)
+    return manager
+
+
+def test_text_layout():
+    """Test vectorized layout of multiple strings"""
+    font = _fake_font_manager('layout').get_font('OpenSans')
+    font.prewarm('AVhy')
+    vertices, lengths, pages = _layout_text(['AV', 'A', ''], font, 'left',
+                                            'baseline', 64)
+    assert_equal(lengths.tolist(), [2, 1, 0])
+    assert_array_equal(pages, [0, 0, 0])
+    assert_equal(len(vertices), 12)
+    x = vertices['a_position'][:, 0] * 64
+    advance = ord('A') / 8. / font.ratio
+    # second glyph moved by the advance of the first, plus kerning
+    assert_equal(x[4] - x[0], advance - 8. / font.ratio)
+    # every string starts at its anchor
+    assert_array_equal(vertices[8:], vertices[:4])
+    u0, v0, u1, v1 = font['A']['texcoords']
+    assert_allclose(vertices['a_texcoord'][:4],
+                    [[u0, v0], [u0, v1], [u1, v1], [u1, v0]])
+    # centering is halfway between left and right alignment
+    x = [_layout_text(['AV', 'A'], font, anchor, 'baseline', 64)[0]
+         for anchor in ('left', 'center', 'right')]
+    x = [v['a_position'][:, 0] for v in x]
+    assert_allclose(x[1], (x[0] + x[2]) / 2.)
+
+
+def test_text_multi():
+    """Test drawing many strings with one visual"""
+    manager = _fake_font_manager('multi')
+    text = TextVisual(['1.0', '2.5', '10'], pos=np.zeros((3, 2)),
+                      font_manager=manager)
+    text._load_glyphs(None)
+    text._update_vertices()
+    text._update_pos()
+    assert_equal(text._vertices.size, 32)
+    assert_equal([(page, ib.size) for page, ib in text._ibs], [(0, 48)])
+    assert_equal(text._pos_vbo.size, 32)
+    vertices = text._glyph_vertices.copy()
+    text._vertices._glir.clear()
+    text._pos_vbo._glir.clear()
+
+    # same-length changes only update the changed strings
+    text.text = ['1.0', '3.5', '10']
+    text._load_glyphs(None)
+    text._update_vertices()
+    commands = text._vertices._glir.clear()
+    assert_equal([c[0] for c in commands], ['DATA'])
+    assert_equal(commands[0][2], 12 * 16)  # byte offset of the 2nd string
+    assert_equal(len(commands[0][3]), 12)
+    assert_array_equal(text._glyph_vertices[:12], vertices[:12])
+    assert_true(np.any(text._glyph_vertices[12:24] != vertices[12:24]))
+    # moving a string only uploads its positions
+    text.pos = [[0, 0], [0, 0], [5, 5]]
+    text._update_pos()
+    commands = text._pos_vbo._glir.clear()
+    assert_equal([c[0] for c in commands], ['DATA'])
+    assert_equal(len(commands[0][3]), 8)
+    # other changes lay out everything again
+    text.text = ['1.0', '3.5', '100']
+    assert_true(text._vertices is None)
+    text.text = ['1']
+    # positions must match the strings
+    text._update_vertices()
+    assert_raises(ValueError, text._update_pos)
+
+
+def test_glyph_atlas():
+    """Test allocating and freeing glyph atlas regions"""
+    atlas = GlyphAtlas(page_shape=(64, 64), max_pages=2)
+    page, a = atlas.allocate(30, 10)
+    assert_equal((page, a), (0, (0, 0, 30, 10)))
+    # similar heights share a shelf, others get a new one
+    assert_equal(atlas.allocate(30, 12)[1], (30, 0, 30, 12))
+    assert_equal(atlas.allocate(10, 30)[1], (0, 16, 10, 30))
+    assert_equal(atlas.allocate(10, 5)[1], (0, 48, 10, 5))
+    # freed regions are reused
+    atlas.free(0, a)
+    assert_equal(atlas.allocate(20, 9)[1], (0, 0, 20, 9))
+    assert_equal(atlas.n_used, 16 * 50 + 32 * 10 + 8 * 10)
+    # new pages when full, up to the maximum
+    assert_equal(atlas.allocate(60, 60)[0], 1)
+    assert_equal(len(atlas.pages), 2)
+    assert_raises(RuntimeError, atlas.allocate, 60, 60)
+    assert_raises(RuntimeError, atlas.allocate, 65, 1)
+    u0, v0, u1, v1 = atlas.texcoords((16, 32, 16, 8))
+    assert_equal((u0, v0, u1, v1), (0.25, 0.5, 0.5, 0.625))
+
+
+def test_font_sharing():
+    """Test glyph sharing and reference counting across visuals"""
+    manager = _fake_font_manager('sharing')
+    font = manager.get_font('OpenSans')
+    # faces share the atlas of their manager
+    assert_true(manager.get_font('OpenSans', bold=True)._atlas is
+                font._atlas)
+    a = TextVisual('ab', font_manager=manager)
+    b = TextVisual('bc', font_manager=manager)
+    a._load_glyphs(None)
+    b._load_glyphs(None)
+    assert_equal(sorted(font._glyphs), ['a', 'b', 'c', 'h', 'y'])
+    used = font._atlas.n_used
+    # glyphs that are no longer used are freed
+    a.text = 'b'
+    a._load_glyphs(None)
+    assert_equal(sorted(font._glyphs), ['b', 'c', 'h', 'y'])
+    del b
+    gc.collect()
+    assert_equal(sorted(font._glyphs), ['b', 'h', 'y'])
+    assert_true(font._atlas.n_used < used)
+    # their atlas space is reused
+    a.text = 'abc'
+    a._load_glyphs(None)
+    assert_equal(font._atlas.n_used, used)
+    del a
+    gc.collect()
+    assert_equal(font._glyphs, {})
+    assert_equal(font._atlas.n_used, 0)
+
+    # contexts that share objects share a font manager
+    shared = GLShared()
+    manager = get_context_font_manager(SimpleBunch(shared=shared))
+    assert_true(get_context_font_manager(SimpleBunch(shared=shared)) is
+                manager)
+    assert_true(get_context_font_manager(SimpleBunch(shared=GLShared()))
+                is not manager)
+
+
 run_tests_if_main()
@@ -1,11 +1,19 @@
 # -*- coding: utf-8 -*-
 
+import os.path as op
+
 import numpy as np
+from numpy.testing import assert_array_equal, assert_allclose
 from pytest import raises
 from vispy import scene
 
+from vispy.util import _TempDir
+from vispy.visuals import BrickedVolumeVisual
+from vispy.visuals.bricks import BrickedVolume, BrickCache
+from vispy.visuals._raycast import block_max, raycast, STOP_OPACITY
 from vispy.testing import (TestingCanvas, requires_application,
-                           run_tests_if_main, requires_pyopengl)
+                           run_tests_if_main, requires_pyopengl,
+                           assert_equal, assert_true)
 from vispy.testing.image_tester import assert_image_approved
 
 
@@ -58,4 +66,188 @@ def test_volume_draw():
         assert_image_approved(c.render(), 'visuals/volume.png')
 
 
+def test_volume_native_dtype():
+    """Test that volumes keep their type and clim is applied on the GPU"""
+    vol = np.zeros((10, 12, 14), np.uint16)
+    vol[2:5] = 1000
+    V = BrickedVolumeVisual(vol, clim=(0, 2000), brick_size=8)
+    assert_equal(V._tex_scale, (65535., 0.))
+    V = scene.visuals.Volume(vol, clim=(0, 2000))
+    assert_equal(V.clim, (0, 2000))
+    cmd = [c for c in V._tex._glir.clear() if c[0] in ('SIZE', 'DATA')]
+    assert_equal(cmd[-2][3:], ('luminance', 'r16'))
+    assert_true(np.may_share_memory(cmd[-1][3], vol))  # no copy
+    assert_allclose(V._clim_func['clim_scale'].value, (65535. / 2000, 0.))
+    # changing clim does not touch the texture
+    V.clim = (500, 1000)
+    assert_allclose(V._clim_func['clim_scale'].value,
+                    (65535. / 500, -1.))
+    assert_equal(V._tex._glir.clear(), [])
+    # signed data is shifted, floats are stored as float
+    V.set_data(np.array([[[-128, 0, 127]]], np.int8), clim=(-128, 127))
+    cmd = V._tex._glir.clear()
+    assert_array_equal(cmd[-1][3].ravel(), [0, 128, 255])
+    assert_allclose(V._clim_func['clim_scale'].value, (1., 0.))
+    V.set_data(np.ones((2, 2, 2)))
+    assert_equal(V._tex._glir.clear()[-1][3].dtype, np.float32)
+
+
+def test_block_max():
+    """Test the block maxima used for empty-space skipping"""
+    np.random.seed(1)
+    vol = np.random.randint(0, 1000, (13, 9, 20)).astype(np.int16)
+    grid = block_max(vol, 4)
+    assert_equal(grid.shape, (4, 3, 5))
+    assert_equal(grid.dtype, np.int16)
+    for z, y, x in np.ndindex(*grid.shape):
+        block = vol[max(4 * z - 1, 0):4 * z + 5, max(4 * y - 1, 0):4 * y + 5,
+                    max(4 * x - 1, 0):4 * x + 5]
+        assert_equal(grid[z, y, x], block.max())
+    assert_array_equal(block_max(vol, 1).max(), vol.max())
+    with raises(ValueError):
+        block_max(vol[0], 4)
+
+
+def test_raycast_skipping():
+    """Test that empty-space skipping and early termination do not change
+    the rendering"""
+    vol = _sparse_volume((30, 40, 50))
+    vol[20:28, 25:35, 5:15] = 2.
+    y, x = np.mgrid[0:40:0.9, 0:50:0.9]
+    origins = np.c_[x.ravel(), y.ravel(), np.zeros(x.size) - 1]
+    for direction in ((0, 0, 1), (0.4, -0.3, 1), (0.2, 0.3, 1)):
+        dirs = np.tile(direction, (len(origins), 1))
+        for method in ('mip', 'iso', 'translucent'):
+            ref, n_ref = raycast(vol, origins - 30 * dirs, dirs, method,
+                                 clim=(0, 1.5), threshold=0.6)
+            col, n = raycast(vol, origins - 30 * dirs, dirs, method,
+                             clim=(0, 1.5), threshold=0.6, block_size=4)
+            assert_array_equal(col, ref)
+            assert_true(0 < n.sum() < n_ref.sum() / 3.)
+            assert_true((ref[:, 3] > 0).sum() > 50)
+    # rays that saturate stop early
+    dirs = np.tile((0, 0, 1), (len(origins), 1))
+    col, n = raycast(np.ones((200, 40, 50)), origins, dirs, 'translucent',
+                     clim=(0, 5))
+    assert_true(n.max() < 30)
+    assert_true(np.all(col[n > 0, 3] >= STOP_OPACITY))
+    with raises(ValueError):
+        raycast(vol, origins, dirs, 'foo')
+
+
+def test_volume_skip_grid():
+    """Test the empty-space skipping grid of the volume visual"""
+    vol = np.zeros((20, 30, 40), np.uint8)
+    vol[2:5, 3:6, 30:35] = 51
+    V = scene.visuals.Volume(vol, method='translucent', skip_block_size=8)
+    assert_equal(V.method, 'translucent')
+    grid = V._grid_tex._glir.clear()[-1][3][..., 0]
+    assert_equal(grid.shape, (3, 4, 5))
+    assert_allclose(grid, block_max(vol, 8) / 255.)
+    assert_allclose(V._empty_steps['block_extent'].value,
+                    (8 / 40., 8 / 30., 8 / 20.))
+    # the grid does not depend on clim or threshold
+    V.clim = (10, 20)
+    V.threshold = 0.2
+    assert_equal(V._grid_tex._glir.clear(), [])
+    # bricks are skipped by the maximum of their neighbourhood
+    V = BrickedVolumeVisual(vol, brick_size=8)
+    grid = V._grid_tex._glir.clear()[-1][3][..., 0]
+    assert_allclose(grid, block_max(block_max(vol, 8), 1) / 255.)
+    with raises(ValueError):
+        V.method = 'ray'
+
+
+temp_dir = _TempDir()
+
+
+def _sparse_volume(shape=(70, 50, 40)):
+    np.random.seed(0)
+    vol = np.zeros(shape, np.float32)
+    vol[10:20, 5:9, 30:35] = np.random.uniform(0.5, 1, (10, 4, 5))
+    vol[60:, 40:, :3] = 0.25
+    return vol
+
+
+def test_bricked_volume():
+    """Test splitting a volume in bricks"""
+    vol = _sparse_volume()
+    fname = op.join(temp_dir, 'vol.dat')
+    mm = np.memmap(fname, np.float32, 'w+', shape=vol.shape)
+    mm[:] = vol
+    mm.flush()
+    mm = np.memmap(fname, np.float32, 'r', shape=vol.shape)
+    # small reads, to check the slab-wise statistics
+    bricks = BrickedVolume(mm, 16, max_read=16 * 16 * 40 * 2)
+    assert_equal(bricks.grid, (5, 4, 3))
+    assert_equal(bricks.range, (0., vol.max()))
+    B = 16
+    bmax = np.array([vol[z:z + B, y:y + B, x:x + B].max()
+                     for z in range(0, 70, B) for y in range(0, 50, B)
+                     for x in range(0, 40, B)])
+    assert_array_equal(bricks.levels[0][1].ravel(), bmax)
+    assert_equal(bricks.levels[-1][0].shape, (1, 1, 1))
+    for lo, hi in ((0.1, np.inf), (0.2, 0.3), (-1, 0), (2, 3)):
+        assert_array_equal(bricks.find_bricks(lo, hi),
+                           np.nonzero((bmax >= lo) & (bricks.levels[0][0]
+                                                      .ravel() <= hi))[0])
+    # bricks have a one-voxel apron, repeating the edge of the volume
+    data = bricks.read_brick(1)
+    assert_equal(data.shape, (18, 18, 18))
+    assert_array_equal(data[1:, 1:-1, 1:-1], vol[:17, :16, 16:32])
+    assert_array_equal(data[0], data[1])
+    data = bricks.read_brick(bricks.n_bricks - 1)
+    assert_array_equal(data[1:7, 1:3, 1:9], vol[64:, 48:, 32:])
+    assert_array_equal(data[7:, :, :], np.repeat(data[6:7], 11, axis=0))
+    del mm, bricks
+
+
+def test_brick_cache():
+    """Test least recently used brick eviction"""
+    cache = BrickCache(3)
+    assert_equal([cache.insert(b) for b in (5, 6, 7)],
+                 [(0, None), (1, None), (2, None)])
+    cache.touch([5])
+    assert_equal(cache.insert(8), (1, 6))
+    assert_true(6 not in cache and 5 in cache)
+    # protected bricks are not evicted
+    assert_equal(cache.insert(9, protect=(7, 5)), (1, 8))
+    assert_equal(cache.insert(10, protect=(7, 5, 9)), (None, None))
+    assert_equal(len(cache), 3)
+
+
+def test_bricked_volume_visual():
+    """Test streaming bricks to the cache texture"""
+    vol = _sparse_volume()
+    V = BrickedVolumeVisual(vol, brick_size=16, cache_shape=(2, 1, 1),
+                            bricks_per_draw=1)
+    assert_equal(V.clim, (0, vol.max()))
+    # empty bricks are never loaded
+    assert_array_equal(V._needed_bricks(), [1, 2, 13, 14, 42, 45, 54, 57])
+    V.clim = (0.3, 1.)
+    assert_array_equal(V._needed_bricks(), [1, 2, 13, 14])
+    V.method = 'iso'
+    V.threshold = 2.
+    assert_array_equal(V._needed_bricks(), [])
+    V.method = 'mip'
+    V.threshold = 0.
+
+    # one brick per draw, up to the size of the cache
+    table = V._table.reshape(-1, 4)
+    for n in (1, 2, 2):
+        V._update_bricks(None)
+        assert_equal(len(V._cache), n)
+    assert_array_equal(table[[1, 2, 13, 14], 3], [255, 255, 0, 0])
+    assert_equal(sorted(table[[1, 2], 2]), [0, 1])  # slots along z
+    cmd = [c for c in V._tex._glir.clear() if c[0] == 'DATA'][-1]
+    assert_equal(cmd[2], (18, 0, 0))
+    assert_equal(cmd[3].dtype, np.float32)
+    # a change of contrast keeps the resident bricks
+    V.clim = (0.5, 1.)
+    assert_equal(len(V._cache), 2)
+    assert_allclose(V._clim_func['clim_scale'].value, (2., -1.))
+    V._update_bricks(None)
+    assert_equal([c[0] for c in V._tex._glir.clear()], [])
+
+
 run_tests_if_main()
@@ -0,0 +1,168 @@
+# -*- coding: utf-8 -*-
+# -----------------------------------------------------------------------------
+# Copyright (c) 2014, Vispy Development Team. All Rights Reserved.
+# Distributed under the (new) BSD License. See LICENSE.txt for more info.
+# -----------------------------------------------------------------------------
+"""
+Paged glyph atlas, shared by all fonts of a font manager.
+
+Glyphs are packed on shelves (horizontal strips of a page). The height of a
+shelf is a multiple of ``shelf_step`` pixels, and a glyph only goes on a
+shelf that is at most ``shelf_step`` pixels taller than itself. Freed regions
+are kept in a per-shelf free list and reused for glyphs of the same shelf
+height, so long-running applications that load and unload many glyphs do
+not fragment the atlas. When a page is full, a new page is added.
+"""
+
+from __future__ import division
+
+import numpy as np
+
+from ...gloo import Texture2D
+
+
+class GlyphAtlas(object):
+    """Paged texture atlas with reusable regions
+
+    Parameters
+    ----------
+    page_shape : tuple of int
+        Shape (height, width) of each page.
+    max_pages : int | None
+        Maximum number of pages. None means no limit.
+    shelf_step : int
+        Shelf heights are rounded up to a multiple of this.
+    """
+    def __init__(self, page_shape=(1024, 1024), max_pages=None,
+                 shelf_step=8):
+        self.page_shape = tuple(int(s) for s in page_shape)
+        self.max_pages = max_pages
+        self.shelf_step = int(shelf_step)
+        self.pages = []
+        # per page: list of shelves [y, height, x_end, free list of (x, w)]
+        self._shelves = []
+        self._page_top = []
+
+    @property
+    def n_used(self):
+        """The number of pixels in allocated regions"""
+        n = 0
+        for shelves in self._shelves:
+            for y, h, x_end, free in shelves:
+                n += h * (x_end - sum(w for x, w in free))
+        return n
+
+    def allocate(self, width, height):
+        """Allocate a region
+
+        Parameters
+        ----------
+        width : int
+            Width of the region.
+        height : int
+            Height of the region.
+
+        Returns
+        -------
+        region : tuple
+            The page index and the (x, y, width, height) of the region.
+        """
+        width, height = int(width), int(height)
+        H, W = self.page_shape
+        if width > W or height > H:
+            raise RuntimeError('Glyph of size %sx%s does not fit in atlas'
+                               % (width, height))
+        step = self.shelf_step
+        shelf_h = min(-(-max(height, 1) // step) * step, H)
+        for page, shelves in enumerate(self._shelves):
+            for shelf in shelves:
+                if not height <= shelf[1] <= shelf_h:
+                    continue
+                x = self._take(shelf, width)
+                if x is not None:
+                    return page, (x, shelf[0], width, height)
+            if self._page_top[page] + shelf_h <= H:
+                return page, self._add_shelf(page, shelf_h, width, height)
+        if self.max_pages is not None and len(self.pages) >= self.max_pages:
+            raise RuntimeError('Glyph atlas is full (%s pages)'
+                               % len(self.pages))
+        self._add_page()
+        return len(self.pages) - 1, self._add_shelf(len(self.pages) - 1,
+                                                    shelf_h, width, height)
+
+    def _take(self, shelf, width):
+        """Take space for a region on a shelf, or return None"""
+        free = shelf[3]
+        for ii, (x, w) in enumerate(free):
+            if w >= width:
+                if w == width:
+                    del free[ii]
+                else:
+                    free[ii] = (x + width, w - width)
+                return x
+        if shelf[2] + width <= self.page_shape[1]:
+            x = shelf[2]
+            shelf[2] += width
+            return x
+        return None
+
+    def _add_shelf(self, page, shelf_h, width, height):
+        y = self._page_top[page]
+        self._page_top[page] += shelf_h
+        self._shelves[page].append([y, shelf_h, width, []])
+        return 0, y, width, height
+
+    def _add_page(self):
+        shape = self.page_shape + (3,)
+        # zeros: the area around glyphs reads as "far outside"
+        page = Texture2D(np.zeros(shape, np.uint8), interpolation='linear',
+                         wrapping='clamp_to_edge')
+        self.pages.append(page)
+        self._shelves.append([])
+        self._page_top.append(0)
+
+    def free(self, page, region):
+        """Free a region returned by ``allocate``
+
+        Parameters
+        ----------
+        page : int
+            The page index.
+        region : tuple
+            The (x, y, width, height) of the region.
+        """
+        x, y, w, h = region
+        for shelf in self._shelves[page]:
+            if shelf[0] == y:
+                break
+        else:
+            raise ValueError('Region %s is not allocated' % (region,))
+        free = shelf[3]
+        free.append((x, w))
+        free.sort()
+        # merge adjacent free space
+        merged = [free[0]]
+        for fx, fw in free[1:]:
+            px, pw = merged[-1]
+            if px + pw == fx:
+                merged[-1] = (px, pw + fw)
+            else:
+                merged.append((fx, fw))
+        if merged[-1][0] + merged[-1][1] == shelf[2]:
+            shelf[2] = merged.pop()[0]
+        shelf[3][:] = merged
+
+    def set_data(self, page, region, data):
+        """Upload data (uint8 or float in [0, 1]) to a region of a page"""
+        x, y, w, h = region
+        data = np.asarray(data)
+        if data.ndim == 2:
+            data = np.repeat(data[:, :, np.newaxis], 3, axis=2)
+        assert data.shape[:2] == (h, w)
+        self.pages[page].set_data(data, offset=(y, x), copy=True)
+
+    def texcoords(self, region):
+        """The texture coordinates (u0, v0, u1, v1) of a region"""
+        x, y, w, h = region
+        H, W = self.page_shape
+        return x / W, y / H, (x + w) / W, (y + h) / H
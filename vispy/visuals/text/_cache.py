@@ -0,0 +1,283 @@
+# -*- coding: utf-8 -*-
+# -----------------------------------------------------------------------------
+# Copyright (c) 2014, Vispy Development Team. All Rights Reserved.
+# Distributed under the (new) BSD License. See LICENSE.txt for more info.
+# -----------------------------------------------------------------------------
+"""
+Persistent on-disk cache of SDF glyphs.
+
+Each font (face, bold, italic and SDF parameters) gets its own directory
+holding three append-only files:
+
+* ``pool.dat``: the low-res SDF bitmaps (uint8), memory-mapped for reading.
+* ``index.dat``: one fixed-size record per glyph with its metrics and the
+  location of its bitmap in the pool.
+* ``kerning.dat``: one record per non-zero kerning pair.
+
+Bitmaps are written before the index record that refers to them, and
+readers ignore incomplete trailing records, so readers never need a lock.
+Writers from different processes are serialized with a lock file.
+"""
+
+from __future__ import division
+
+import errno
+import hashlib
+import os
+from os import path as op
+import time
+
+import numpy as np
+
+from ...ext.six import unichr
+from ...util import logger
+from ...util.config import config
+
+_index_dtype = np.dtype([('code', '<u4'), ('offset', '<u8'),
+                         ('width', '<u2'), ('height', '<u2'),
+                         ('left', '<f4'), ('top', '<f4'),
+                         ('advance', '<f4')])
+_kerning_dtype = np.dtype([('left', '<u4'), ('right', '<u4'),
+                           ('value', '<f4')])
+_version = 1
+
+
+def _default_cache_dir():
+    """Get the default cache directory, or None if there is none"""
+    data_path = config['data_path']
+    if data_path is None:
+        return None
+    return op.join(data_path, 'glyph_cache')
+
+
+class _FileLock(object):
+    """Lock shared between processes, using exclusive file creation"""
+    def __init__(self, fname, timeout=10., stale=60.):
+        self._fname = fname
+        self._timeout = timeout
+        self._stale = stale
+
+    def __enter__(self):
+        t0 = time.time()
+        while True:
+            try:
+                fd = os.open(self._fname, os.O_CREAT | os.O_EXCL | os.O_RDWR)
+            except OSError as exp:
+                if exp.errno != errno.EEXIST:
+                    raise
+                try:
+                    # break locks left behind by a crashed process
+                    if time.time() - op.getmtime(self._fname) > self._stale:
+                        os.remove(self._fname)
+                        continue
+                except OSError:
+                    continue  # lock was just released
+                if time.time() - t0 > self._timeout:
+                    raise RuntimeError('Could not acquire lock %s'
+                                       % self._fname)
+                time.sleep(0.01)
+            else:
+                os.close(fd)
+                return self
+
+    def __exit__(self, *args):
+        try:
+            os.remove(self._fname)
+        except OSError:
+            pass
+
+
+class GlyphCache(object):
+    """Persistent cache of low-res SDF glyphs, shared across processes
+
+    Parameters
+    ----------
+    directory : str | None
+        Directory to store the cache in. None uses a ``glyph_cache``
+        directory in the vispy data path.
+    """
+    def __init__(self, directory=None):
+        self._dir = _default_cache_dir() if directory is None else directory
+        self._fonts = {}
+
+    @property
+    def directory(self):
+        """The cache directory"""
+        return self._dir
+
+    def _font_dir(self, font, params):
+        key = repr((_version, font['face'], bool(font['bold']),
+                    bool(font['italic']), tuple(sorted(params.items()))))
+        key = hashlib.sha1(key.encode('utf-8')).hexdigest()[:16]
+        return op.join(self._dir, key)
+
+    def _get(self, font, params):
+        fdir = self._font_dir(font, params)
+        if fdir not in self._fonts:
+            self._fonts[fdir] = _FontCache(fdir)
+        return self._fonts[fdir]
+
+    def load(self, font, params, chars, loaded=()):
+        """Load glyphs from the cache
+
+        Parameters
+        ----------
+        font : dict
+            Dict with entries "face", "bold", "italic".
+        params : dict
+            SDF parameters (sizes and spread) the glyphs were made with.
+        chars : iterable of str
+            The characters to load.
+        loaded : iterable of str
+            Characters that are already loaded, for which kerning pairs
+            with the found glyphs are also returned.
+
+        Returns
+        -------
+        glyphs : dict
+            Glyphs found in the cache, by character. Each glyph is a dict
+            with entries "char", "offset", "advance", "size", "sdf" (the
+            low-res SDF bitmap, uint8) and an empty "kerning" dict.
+        kerning : list of tuple
+            Non-zero kerning pairs (left, right, value) between the found
+            glyphs and the found or loaded glyphs.
+        """
+        if self._dir is None:
+            return {}, []
+        return self._get(font, params).load(chars, loaded)
+
+    def store(self, font, params, glyphs):
+        """Store glyphs in the cache
+
+        Parameters
+        ----------
+        font : dict
+            Dict with entries "face", "bold", "italic".
+        params : dict
+            SDF parameters (sizes and spread) the glyphs were made with.
+        glyphs : list of dict
+            Glyphs in the format returned by ``load``. Glyphs that are
+            already in the cache, or that have no "sdf" entry, are skipped.
+        """
+        if self._dir is None or len(glyphs) == 0:
+            return
+        try:
+            self._get(font, params).store(glyphs)
+        except (IOError, OSError, RuntimeError) as exp:
+            logger.warning('Could not write glyph cache: %s' % exp)
+
+
+class _FontCache(object):
+    """The cached glyphs of a single font"""
+    def __init__(self, directory):
+        self._dir = directory
+        self._index = np.zeros(0, _index_dtype)
+        self._codes = {}
+        self._kerning = np.zeros(0, _kerning_dtype)
+        self._pool = None
+
+    def _fname(self, name):
+        return op.join(self._dir, name)
+
+    def _read_records(self, name, dtype):
+        fname = self._fname(name)
+        if not op.isfile(fname):
+            return np.zeros(0, dtype)
+        with open(fname, 'rb') as fid:
+            data = fid.read()
+        n = len(data) // dtype.itemsize  # ignore incomplete records
+        return np.frombuffer(data[:n * dtype.itemsize], dtype).copy()
+
+    def _refresh(self, force=False):
+        """Re-read the index, e.g. after other processes added glyphs"""
+        index = self._read_records('index.dat', _index_dtype)
+        if len(index) != len(self._index):
+            self._index = index
+            self._codes = dict((int(c), i)
+                               for i, c in enumerate(index['code']))
+            self._pool = None
+            force = True
+        if force:
+            self._kerning = self._read_records('kerning.dat', _kerning_dtype)
+
+    def _bitmap(self, rec):
+        offset = int(rec['offset'])
+        w, h = int(rec['width']), int(rec['height'])
+        if w * h == 0:
+            return np.zeros((h, w), np.uint8)
+        if self._pool is None or offset + w * h > len(self._pool):
+            self._pool = np.memmap(self._fname('pool.dat'), np.uint8,
+                                   mode='r')
+        return np.array(self._pool[offset:offset + w * h]).reshape(h, w)
+
+    def load(self, chars, loaded=()):
+        chars = [c for c in chars]
+        if any(ord(c) not in self._codes for c in chars):
+            self._refresh()
+        glyphs = {}
+        for char in chars:
+            ii = self._codes.get(ord(char))
+            if ii is None:
+                continue
+            rec = self._index[ii]
+            glyphs[char] = dict(char=char,
+                                offset=(float(rec['left']),
+                                        float(rec['top'])),
+                                advance=float(rec['advance']),
+                                size=(int(rec['width']), int(rec['height'])),
+                                sdf=self._bitmap(rec), kerning={})
+        kerning = []
+        if len(glyphs) and len(self._kerning):
+            found = np.array([ord(c) for c in glyphs], np.uint32)
+            known = np.array([ord(c) for c in loaded] + list(found),
+                             np.uint32)
+            kern = self._kerning
+            left = np.in1d(kern['left'], found)
+            right = np.in1d(kern['right'], found)
+            kern = kern[(left & np.in1d(kern['right'], known)) |
+                        (right & np.in1d(kern['left'], known))]
+            kerning = [(unichr(left), unichr(right), float(value))
+                       for left, right, value in kern]
+        return glyphs, kerning
+
+    def store(self, glyphs):
+        if not op.isdir(self._dir):
+            try:
+                os.makedirs(self._dir)
+            except OSError:
+                if not op.isdir(self._dir):
+                    raise
+        with _FileLock(self._fname('lock')):
+            self._refresh(force=True)
+            new = [g for g in glyphs if 'sdf' in g and
+                   ord(g['char']) not in self._codes]
+            known = set(zip(self._kerning['left'], self._kerning['right']))
+            kerning = [(ord(other), ord(g['char']), value)
+                       for g in glyphs for other, value in g['kerning'].items()
+                       if value != 0 and
+                       (ord(other), ord(g['char'])) not in known]
+            if len(new):
+                index = np.zeros(len(new), _index_dtype)
+                with open(self._fname('pool.dat'), 'ab') as fid:
+                    fid.seek(0, os.SEEK_END)
+                    offset = fid.tell()
+                    for ii, glyph in enumerate(new):
+                        sdf = np.ascontiguousarray(glyph['sdf'], np.uint8)
+                        index['code'][ii] = ord(glyph['char'])
+                        index['offset'][ii] = offset
+                        index['height'][ii], index['width'][ii] = sdf.shape
+                        index['left'][ii], index['top'][ii] = glyph['offset']
+                        index['advance'][ii] = glyph['advance']
+                        fid.write(sdf.tostring())
+                        offset += sdf.size
+                    fid.flush()
+                    os.fsync(fid.fileno())
+            if len(kerning):
+                kerning = np.array(kerning, _kerning_dtype)
+                with open(self._fname('kerning.dat'), 'ab') as fid:
+                    fid.write(kerning.tostring())
+            if len(new):
+                # the index goes last: it makes the new glyphs visible
+                with open(self._fname('index.dat'), 'ab') as fid:
+                    fid.write(index.tostring())
+            self._refresh(force=True)
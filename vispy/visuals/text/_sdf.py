@@ -5,8 +5,17 @@ Author: Stefan Gustavson (stefan.gustavson@gmail.com)
 2010-08-24. This code is in the public domain.
 
 Adapted to `vispy` by Eric Larson <larson.eric.d@gmail.com>.
+
+The CPU renderer computes the same output with an exact Euclidean distance
+transform, following P. Felzenszwalb and D. Huttenlocher, "Distance
+Transforms of Sampled Functions", Theory of Computing 8 (2012).
 """
 
+from __future__ import division
+
+from multiprocessing import cpu_count
+from multiprocessing.pool import ThreadPool
+
 import numpy as np
 from os import path as op
 from ...gloo import (Program, FrameBuffer, VertexBuffer, Texture2D, 
@@ -315,3 +324,184 @@ class SDFRenderer(object):
                 self.program_flood.draw('triangle_strip')
             stepsize //= 2
         return comp_texs[last_rend]
+
+
+class SDFRendererCPU(object):
+    """Compute glyph SDFs on the CPU
+
+    This gives the same output as SDFRenderer, but does not need a GL
+    context, so that glyphs can be prepared before a context exists or in
+    worker threads. Glyphs are processed in batches, as a stacked 3D array.
+
+    Parameters
+    ----------
+    batch_size : int
+        Number of glyphs processed at once.
+    n_threads : int | None
+        Number of worker threads used for multiple batches. Defaults to the
+        number of CPUs. Use 1 to compute in the calling thread only.
+    """
+    def __init__(self, batch_size=64, n_threads=None):
+        self.batch_size = int(batch_size)
+        self.n_threads = cpu_count() if n_threads is None else int(n_threads)
+
+    def render(self, data, sizes):
+        """Compute low-res SDFs of a list of glyph bitmaps
+
+        Parameters
+        ----------
+        data : list of array
+            2D arrays of type np.ubyte.
+        sizes : list of tuple of int
+            Size (w, h) of each output SDF.
+
+        Returns
+        -------
+        sdfs : list of array
+            2D arrays of type np.ubyte and shape (h, w).
+        """
+        batches = [(data[ii:ii + self.batch_size],
+                    sizes[ii:ii + self.batch_size])
+                   for ii in range(0, len(data), self.batch_size)]
+        if len(batches) > 1 and self.n_threads > 1:
+            # the pool only lives during the call, so that no threads are
+            # left behind
+            pool = ThreadPool(min(self.n_threads, len(batches)))
+            try:
+                out = pool.map(lambda b: _calc_sdf_batch(*b), batches)
+            finally:
+                pool.close()
+                pool.join()
+        else:
+            out = [_calc_sdf_batch(*b) for b in batches]
+        return [sdf for batch in out for sdf in batch]
+
+    def render_to_texture(self, data, texture, offset, size):
+        """Render a SDF to a texture at a given offset and size
+
+        Parameters
+        ----------
+        data : array
+            Must be 2D with type np.ubyte.
+        texture : instance of Texture2D
+            The texture to render to.
+        offset : tuple of int
+            Offset (x, y) to render to inside the texture.
+        size : tuple of int
+            Size (w, h) to render inside the texture.
+        """
+        sdf = self.render([data], [size])[0]
+        sdf = np.repeat(sdf[:, :, np.newaxis], texture.shape[2], axis=2)
+        texture.set_data((sdf / 255.).astype(np.float32),
+                         offset=offset[::-1])
+
+
+def _calc_sdf_batch(data, sizes):
+    """Compute the low-res SDFs of a batch of glyphs"""
+    # stack the glyphs, padded with background
+    H = max(d.shape[0] for d in data)
+    W = max(d.shape[1] for d in data)
+    h = max(s[1] for s in sizes)
+    w = max(s[0] for s in sizes)
+    inside = np.zeros((len(data), H, W), bool)
+    # high-res pixels sampled by each low-res pixel (nearest sampling at
+    # the pixel centers, as done by the GL renderer)
+    rows = np.zeros((len(data), h), int)
+    cols = np.zeros((len(data), w), int)
+    for ii, (d, (sw, sh)) in enumerate(zip(data, sizes)):
+        inside[ii, :d.shape[0], :d.shape[1]] = d >= 128
+        rows[ii] = ((np.arange(h).clip(0, sh - 1) + 0.5) *
+                    d.shape[0] / sh).astype(int)
+        cols[ii] = ((np.arange(w).clip(0, sw - 1) + 0.5) *
+                    d.shape[1] / sw).astype(int)
+    d_out = _edt_sampled(inside, rows, cols)
+    d_in = _edt_sampled(~inside, rows, cols)
+    # same scaling as frag_insert
+    shrink = 8.
+    sdf = np.where(inside[np.arange(len(data))[:, np.newaxis, np.newaxis],
+                          rows[:, :, np.newaxis], cols[:, np.newaxis, :]],
+                   0.5 - (shrink - 1.) / 256. + d_in * shrink / 256.,
+                   0.5 - d_out * shrink / 256.)
+    sdf = np.round(sdf.clip(0, 1) * 255).astype(np.uint8)
+    return [sdf[ii, :s[1], :s[0]] for ii, s in enumerate(sizes)]
+
+
+def _edt_sampled(feature, rows, cols):
+    """Euclidean distance to the nearest feature pixel, at sampled pixels
+
+    Parameters
+    ----------
+    feature : array
+        Boolean array of shape (N, H, W).
+    rows : array
+        Integer array of shape (N, h), the rows to sample.
+    cols : array
+        Integer array of shape (N, w), the (increasing) columns to sample.
+
+    Returns
+    -------
+    dist : array
+        Array of shape (N, h, w).
+    """
+    N, H, W = feature.shape
+    big = float(H + W)  # larger than any distance within the image
+    # 1D distance along the columns, with a forward and a backward scan
+    g = np.empty((N, H, W))
+    prev = np.full((N, W), big)
+    for y in range(H):
+        prev = np.where(feature[:, y], 0., prev + 1)
+        g[:, y] = prev
+    prev = np.full((N, W), big)
+    for y in range(H - 1, -1, -1):
+        prev = np.where(feature[:, y], 0., prev + 1)
+        np.minimum(g[:, y], prev, g[:, y])
+    # only the sampled rows are needed for the second pass
+    f = g[np.arange(N)[:, np.newaxis], rows].reshape(-1, W) ** 2
+    x = np.repeat(cols, rows.shape[1], axis=0)
+    return np.sqrt(_lower_envelope(f, x)).reshape(N, rows.shape[1], -1)
+
+
+def _lower_envelope(f, x):
+    """Squared distance transform of sampled functions
+
+    Computes min_q (f[r, q] + (x[r, j] - q) ** 2) for each row r and
+    sample j, for all rows at once, using the lower envelope of the
+    parabolas rooted at each q.
+    """
+    R, n = f.shape
+    # work on flat arrays; row r of an (R, m) array starts at r * m
+    f = f.ravel()
+    f_off = np.arange(R) * n
+    z_off = np.arange(R) * (n + 1)
+    v = np.zeros(R * n, int)  # roots of the parabolas in the envelope
+    z = np.empty(R * (n + 1))  # boundaries between the parabolas
+    z[z_off] = -np.inf
+    z[z_off + 1] = np.inf
+    k = np.zeros(R, int)  # index of the last parabola in the envelope
+    for q in range(1, n):
+        fq = f[f_off + q] + q * q
+        rows = np.arange(R)
+        s = np.empty(R)
+        while len(rows):
+            vk = v[f_off[rows] + k[rows]]
+            s[rows] = ((fq[rows] - (f[f_off[rows] + vk] + vk * vk)) /
+                       (2 * (q - vk)))
+            # drop the parabolas hidden by the new one
+            rows = rows[s[rows] <= z[z_off[rows] + k[rows]]]
+            k[rows] -= 1
+        k += 1
+        v[f_off + k] = q
+        z[z_off + k] = s
+        z[z_off + k + 1] = np.inf
+    # evaluate the envelope at the (increasing) sample positions
+    out = np.empty(x.shape)
+    k[:] = 0
+    for j in range(x.shape[1]):
+        xj = x[:, j]
+        rows = np.arange(R)
+        while len(rows):
+            rows = rows[z[z_off[rows] + k[rows] + 1] < xj[rows]]
+            k[rows] += 1
+        vk = v[f_off + k]
+        out[:, j] = f[f_off + vk] + (xj - vk) ** 2
+    return out
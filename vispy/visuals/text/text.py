@@ -14,10 +14,13 @@ import numpy as np
 from copy import deepcopy
 from os import path as op
 import sys
+import weakref
 
-from ._sdf import SDFRenderer
-from ...gloo import (TextureAtlas, set_state, IndexBuffer, VertexBuffer,
-                     set_viewport)
+from ._atlas import GlyphAtlas
+from ._cache import GlyphCache
+from ._sdf import SDFRenderer, SDFRendererCPU
+from ...gloo import (Texture2D, set_state, IndexBuffer, VertexBuffer,
+                     set_viewport, read_pixels)
 from ...gloo import gl
 from ...gloo.wrappers import _check_valid
 from ...ext.six import string_types
@@ -32,18 +35,27 @@ from ...io import _data_dir
 class TextureFont(object):
     """Gather a set of glyphs relative to a given font name and size
 
+    Glyphs are reference counted by the visuals that use them (see ``use``),
+    and are removed from the atlas when no visual uses them anymore.
+
     Parameters
     ----------
     font : dict
         Dict with entries "face", "size", "bold", "italic".
-    renderer : instance of SDFRenderer
+    renderer : instance of SDFRenderer | SDFRendererCPU
         SDF renderer to use.
+    cache : instance of GlyphCache | None
+        Persistent cache to take SDF glyphs from and to store newly
+        rendered glyphs in.
+    atlas : instance of GlyphAtlas | None
+        Atlas to store the glyphs in, which can be shared with other fonts.
+        None creates a new atlas.
     """
-    def __init__(self, font, renderer):
-        self._atlas = TextureAtlas()
-        self._atlas.wrapping = 'clamp_to_edge'
-        self._kernel = np.load(op.join(_data_dir, 'spatial-filters.npy'))
+    def __init__(self, font, renderer, cache=None, atlas=None):
+        self._atlas = GlyphAtlas() if atlas is None else atlas
+        self._kernel = None
         self._renderer = renderer
+        self._cache = cache
         self._font = deepcopy(font)
         self._font['size'] = 256  # use high resolution point size for SDF
         self._lowres_size = 64  # end at this point size for storage
@@ -54,6 +66,17 @@ class TextureFont(object):
         self._spread = 32
         assert self._spread % self.ratio == 0
         self._glyphs = {}
+        self._table = None
+        self._version = 0  # incremented when glyphs are added or removed
+        self._refs = {}  # char -> number of users
+        self._users = {}  # id(user) -> (weakref, set of chars)
+
+    @property
+    def kernel(self):
+        """The interpolation kernel used when drawing large text"""
+        if self._kernel is None:
+            self._kernel = _load_kernel()
+        return self._kernel
 
     @property
     def ratio(self):
@@ -65,140 +88,408 @@ class TextureFont(object):
         """Extra space along each glyph edge due to SDF borders"""
         return self._spread // self.ratio
 
+    @property
+    def _sdf_params(self):
+        """The parameters that determine the SDF of a glyph"""
+        return dict(size=self._font['size'], lowres_size=self._lowres_size,
+                    spread=self._spread)
+
     def __getitem__(self, char):
         if not (isinstance(char, string_types) and len(char) == 1):
             raise TypeError('index must be a 1-character string')
         if char not in self._glyphs:
-            self._load_char(char)
+            self.prewarm(char)
         return self._glyphs[char]
 
+    def prewarm(self, chars):
+        """Load the glyphs of a set of characters
+
+        Glyphs are taken from the glyph cache when possible. The others are
+        rendered, and added to the cache in a single write. Glyphs that are
+        loaded this way stay in the atlas until a visual that uses them
+        (see ``use``) stops using them.
+
+        Parameters
+        ----------
+        chars : str | iterable of str
+            The characters to load, e.g. a whole character set.
+        """
+        chars = sorted(set(c for c in chars if c not in self._glyphs))
+        if len(chars) == 0:
+            return
+        self._version += 1
+        params = self._sdf_params
+        if self._cache is not None:
+            found, kerning = self._cache.load(self._font, params, chars,
+                                              self._glyphs)
+            for char in chars:
+                if char in found:
+                    self._add_sdf(found[char])
+            for left, right, value in kerning:
+                self._glyphs[right]['kerning'][left] = value
+        new = [char for char in chars if char not in self._glyphs]
+        data = [self._load_char(char) for char in new]
+        if isinstance(self._renderer, SDFRendererCPU):
+            # compute all SDFs at once, without GL
+            sizes = [(d.shape[1] // self.ratio, d.shape[0] // self.ratio)
+                     for d in data]
+            for char, sdf in zip(new, self._renderer.render(data, sizes)):
+                glyph = self._glyphs[char]
+                glyph.update(sdf=sdf, size=sdf.shape[::-1])
+                self._add_sdf(glyph)
+        else:
+            for char, d in zip(new, data):
+                self._render_sdf(self._glyphs[char], d)
+        if self._cache is not None and len(new):
+            self._cache.store(self._font, params, list(self._glyphs.values()))
+
+    def use(self, user, chars):
+        """Set the characters used by an object, e.g. a TextVisual
+
+        Glyphs of new characters are loaded. Glyphs that are no longer used
+        by any object are freed, also when the object is garbage collected.
+
+        Parameters
+        ----------
+        user : object
+            The object using the glyphs. Only a weak reference is kept.
+        chars : iterable of str
+            All characters the object uses.
+        """
+        key = id(user)
+        if key not in self._users:
+            ref = weakref.ref(user, lambda r, key=key: self._drop_user(key))
+            self._users[key] = (ref, set())
+        ref, old = self._users[key]
+        new = set(chars)
+        self.prewarm(new)
+        for char in new - old:
+            self._refs[char] = self._refs.get(char, 0) + 1
+        self._users[key] = (ref, new)
+        self._release(old - new)
+
+    def _drop_user(self, key):
+        ref, chars = self._users.pop(key, (None, ()))
+        self._release(chars)
+
+    def _release(self, chars):
+        for char in chars:
+            self._refs[char] -= 1
+            if self._refs[char] == 0:
+                del self._refs[char]
+                self._free_glyph(char)
+
+    def _free_glyph(self, char):
+        """Remove a glyph from the font and free its atlas region"""
+        glyph = self._glyphs.pop(char)
+        if 'region' in glyph:
+            self._atlas.free(glyph['page'], glyph['region'])
+        self._version += 1
+
+    def _get_table(self):
+        """Get the glyph metrics as arrays, for vectorized text layout
+
+        Returns
+        -------
+        table : dict
+            Entries "code" (sorted codepoints), "offset", "size",
+            "texcoords", "page" and "advance" hold one row per glyph.
+            Entries "kern_key" (sorted, left codepoint * 2**32 + right
+            codepoint) and "kern" hold the non-zero kerning pairs.
+        """
+        if self._table is not None and self._table['version'] == \
+                self._version:
+            return self._table
+        chars = sorted(self._glyphs)
+        glyphs = [self._glyphs[c] for c in chars]
+        table = dict(version=self._version)
+        table['code'] = np.array([ord(c) for c in chars], np.uint64)
+        for key, dim in (('offset', 2), ('size', 2), ('texcoords', 4)):
+            table[key] = np.array([g[key] for g in glyphs],
+                                  np.float64).reshape(-1, dim)
+        table['advance'] = np.array([g['advance'] for g in glyphs],
+                                    np.float64)
+        table['page'] = np.array([g['page'] for g in glyphs], int)
+        pairs = [(ord(left) * 2**32 + ord(right), value)
+                 for right, g in zip(chars, glyphs)
+                 for left, value in g['kerning'].items()
+                 if value != 0 and left in self._glyphs]
+        pairs = sorted(pairs)
+        table['kern_key'] = np.array([p[0] for p in pairs], np.uint64)
+        table['kern'] = np.array([p[1] for p in pairs], np.float64)
+        self._table = table
+        return table
+
+    def _get_region(self, glyph, width, height):
+        """Allocate an atlas region, with a 1-pixel margin"""
+        page, region = self._atlas.allocate(width + 2, height + 2)
+        glyph.update(page=page, region=region)
+        x, y, w, h = region
+        return x + 1, y + 1, w - 2, h - 2
+
+    def _set_texcoords(self, glyph, x, y, w, h):
+        texcoords = self._atlas.texcoords((x, y, w, h))
+        glyph.update(dict(size=(w, h), texcoords=texcoords))
+
+    def _add_sdf(self, glyph):
+        """Put a glyph with a precomputed low-res SDF into the atlas"""
+        w, h = glyph['size']
+        x, y, w, h = self._get_region(glyph, w, h)
+        # upload with the zero margin, regions may be reused
+        data = np.zeros((h + 2, w + 2), np.uint8)
+        data[1:-1, 1:-1] = glyph['sdf']
+        self._atlas.set_data(glyph['page'], glyph['region'], data)
+        self._set_texcoords(glyph, x, y, w, h)
+        self._glyphs[glyph['char']] = glyph
+
     def _load_char(self, char):
-        """Build and store a glyph corresponding to an individual character
+        """Load the glyph of an individual character from the font
 
         Parameters:
         -----------
         char : str
             A single character to be represented.
+
+        Returns
+        -------
+        data : array
+            The high-res glyph bitmap, padded for SDF calculation.
         """
         assert isinstance(char, string_types) and len(char) == 1
         assert char not in self._glyphs
         # load new glyph data from font
         _load_glyph(self._font, char, self._glyphs)
-        # put new glyph into the texture
-        glyph = self._glyphs[char]
-        bitmap = glyph['bitmap']
+        bitmap = self._glyphs[char]['bitmap']
 
         # convert to padded array
         data = np.zeros((bitmap.shape[0] + 2*self._spread,
                          bitmap.shape[1] + 2*self._spread), np.uint8)
         data[self._spread:-self._spread, self._spread:-self._spread] = bitmap
+        return data
 
+    def _render_sdf(self, glyph, data):
+        """Render the SDF of a glyph into the texture"""
         # Store, while scaling down to proper size
         height = data.shape[0] // self.ratio
         width = data.shape[1] // self.ratio
-        region = self._atlas.get_free_region(width + 2, height + 2)
-        if region is None:
-            raise RuntimeError('Cannot store glyph')
-        x, y, w, h = region
-        x, y, w, h = x + 1, y + 1, w - 2, h - 2
-
-        self._renderer.render_to_texture(data, self._atlas, (x, y), (w, h))
-        u0 = x / float(self._atlas.shape[1])
-        v0 = y / float(self._atlas.shape[0])
-        u1 = (x+w) / float(self._atlas.shape[1])
-        v1 = (y+h) / float(self._atlas.shape[0])
-        texcoords = (u0, v0, u1, v1)
-        glyph.update(dict(size=(w, h), texcoords=texcoords))
+        x, y, w, h = self._get_region(glyph, width, height)
+        page = glyph['page']
+        # clear the margin, regions may be reused
+        self._atlas.set_data(page, glyph['region'],
+                             np.zeros((h + 2, w + 2), np.uint8))
+        self._renderer.render_to_texture(data, self._atlas.pages[page],
+                                         (x, y), (w, h))
+        self._set_texcoords(glyph, x, y, w, h)
+        if self._cache is not None:
+            sdf = self._read_sdf(x, y, w, h)
+            if sdf is not None:
+                glyph['sdf'] = sdf
+
+    def _read_sdf(self, x, y, w, h):
+        """Read a rendered SDF back from the atlas, for the glyph cache"""
+        try:
+            with self._renderer.fbo_to[-1]:
+                sdf = read_pixels((x, y, w, h), alpha=False)
+        except RuntimeError:  # e.g. remote GLIR parser
+            return None
+        # read_pixels flips the rows, go back to texture order
+        return sdf[::-1, :, 0].copy()
+
+
+def _load_kernel():
+    return Texture2D(np.load(op.join(_data_dir, 'spatial-filters.npy')))
 
 
 class FontManager(object):
-    """Helper to create TextureFont instances and reuse them when possible"""
-    # todo: store a font-manager on each context,
-    # or let TextureFont use a TextureAtlas for each context
-    def __init__(self):
+    """Helper to create TextureFont instances and reuse them when possible
+
+    All fonts of a font manager store their glyphs in one paged atlas.
+    Visuals that do not get a font manager use the one of their GL context
+    (see ``get_context_font_manager``), so that glyphs are shared by all
+    text in the context.
+
+    Parameters
+    ----------
+    glyph_cache : bool | instance of GlyphCache
+        Persistent SDF glyph cache to use. True uses a cache in the vispy
+        data path. False (default) only keeps the glyphs of each font in
+        memory, and writes nothing to disk.
+    sdf_method : str
+        How glyph SDFs are computed: 'gpu' (jump flooding in GLSL) or
+        'cpu' (exact distance transform in numpy, does not need a GL
+        context).
+    atlas_pages : int | None
+        Maximum number of 1024x1024 atlas pages. None means no limit.
+    """
+    def __init__(self, glyph_cache=False, sdf_method='gpu',
+                 atlas_pages=None):
+        _check_valid('sdf_method', sdf_method, ('gpu', 'cpu'))
         self._fonts = {}
-        self._renderer = SDFRenderer()
+        if sdf_method == 'cpu':
+            self._renderer = SDFRendererCPU()
+        else:
+            self._renderer = SDFRenderer()
+        if glyph_cache is True:
+            glyph_cache = GlyphCache()
+        self._glyph_cache = glyph_cache or None
+        self._atlas = GlyphAtlas(max_pages=atlas_pages)
+        self._kernel = None
+
+    @property
+    def atlas(self):
+        """The glyph atlas shared by all fonts"""
+        return self._atlas
 
     def get_font(self, face, bold=False, italic=False):
         """Get a font described by face and size"""
         key = '%s-%s-%s' % (face, bold, italic)
         if key not in self._fonts:
+            if self._kernel is None:
+                self._kernel = _load_kernel()
             font = dict(face=face, bold=bold, italic=italic)
-            self._fonts[key] = TextureFont(font, self._renderer)
+            self._fonts[key] = TextureFont(font, self._renderer,
+                                           self._glyph_cache, self._atlas)
+            self._fonts[key]._kernel = self._kernel
         return self._fonts[key]
 
 
+_context_font_managers = weakref.WeakKeyDictionary()
+
+
+def get_context_font_manager(context):
+    """Get the font manager of a GL context
+
+    Contexts that share objects also share their font manager.
+
+    Parameters
+    ----------
+    context : instance of GLContext
+        The context.
+
+    Returns
+    -------
+    font_manager : instance of FontManager
+        The font manager.
+    """
+    shared = context.shared
+    if shared not in _context_font_managers:
+        _context_font_managers[shared] = FontManager()
+    return _context_font_managers[shared]
+
+
 ##############################################################################
 # The visual
 
 
-def _text_to_vbo(text, font, anchor_x, anchor_y, lowres_size):
-    """Convert text characters to VBO"""
-    text_vtype = np.dtype([('a_position', 'f4', 2),
-                           ('a_texcoord', 'f4', 2)])
-    vertices = np.zeros(len(text) * 4, dtype=text_vtype)
-    prev = None
-    width = height = ascender = descender = 0
-    ratio, slop = 1. / font.ratio, font.slop
-    x_off = -slop
+_text_vtype = np.dtype([('a_position', 'f4', 2),
+                        ('a_texcoord', 'f4', 2)])
+
+
+def _text_to_unicode(text):
     # Need to make sure we have a unicode string here (Py2.7 mis-interprets
     # characters like "•" otherwise)
     if sys.version[0] == '2' and isinstance(text, str):
         text = text.decode('utf-8')
-    # Need to store the original viewport, because the font[char] will
-    # trigger SDF rendering, which changes our viewport
-    # todo: get rid of call to glGetParameter!
-    orig_viewport = gl.glGetParameter(gl.GL_VIEWPORT)
-    for ii, char in enumerate(text):
-        glyph = font[char]
-        kerning = glyph['kerning'].get(prev, 0.) * ratio
-        x0 = x_off + glyph['offset'][0] * ratio + kerning
-        y0 = glyph['offset'][1] * ratio + slop
-        x1 = x0 + glyph['size'][0]
-        y1 = y0 - glyph['size'][1]
-        u0, v0, u1, v1 = glyph['texcoords']
-        position = [[x0, y0], [x0, y1], [x1, y1], [x1, y0]]
-        texcoords = [[u0, v0], [u0, v1], [u1, v1], [u1, v0]]
-        vi = ii * 4
-        vertices['a_position'][vi:vi+4] = position
-        vertices['a_texcoord'][vi:vi+4] = texcoords
-        x_move = glyph['advance'] * ratio + kerning
-        x_off += x_move
-        ascender = max(ascender, y0 - slop)
-        descender = min(descender, y1 + slop)
-        width += x_move
-        height = max(height, glyph['size'][1] - 2*slop)
-        prev = char
+    return text
+
+
+def _layout_text(texts, font, anchor_x, anchor_y, lowres_size):
+    """Lay out a list of strings, all at once
+
+    The glyphs of all characters (and of "h" and "y") must have been
+    loaded in the font.
+
+    Returns
+    -------
+    vertices : array
+        Four vertices per character, with positions relative to the
+        anchor of the string.
+    lengths : array
+        The number of characters of each string.
+    pages : array
+        The atlas page of each character.
+    """
+    lengths = np.array([len(t) for t in texts], int)
+    n = lengths.sum()
+    vertices = np.zeros(4 * n, dtype=_text_vtype)
+    if n == 0:
+        return vertices, lengths, np.zeros(0, int)
+    table = font._get_table()
+    ratio, slop = 1. / font.ratio, font.slop
+
+    # gather the metrics of each glyph by codepoint
+    code = np.frombuffer(u''.join(texts).encode('utf-32-le'), '<u4')
+    code = code.astype(np.uint64)
+    gi = np.searchsorted(table['code'], code)
+    first = np.cumsum(lengths) - lengths  # first glyph of each string
+    nonempty = lengths > 0
+    string = np.repeat(np.arange(len(texts)), lengths)
+    kerning = np.zeros(n)
+    if len(table['kern']) and n > 1:
+        key = code[:-1] * np.uint64(2**32) + code[1:]
+        ki = np.searchsorted(table['kern_key'], key)
+        ki = ki.clip(0, len(table['kern']) - 1)
+        kerning[1:] = np.where(table['kern_key'][ki] == key,
+                               table['kern'][ki] * ratio, 0.)
+        kerning[first[nonempty]] = 0.
+    x_move = table['advance'][gi] * ratio + kerning
+    # pen position, restarting at each string
+    x_off = np.cumsum(x_move) - x_move
+    x_off -= x_off[first[string]] + slop
+    x0 = x_off + table['offset'][gi, 0] * ratio + kerning
+    y0 = table['offset'][gi, 1] * ratio + slop
+    x1 = x0 + table['size'][gi, 0]
+    y1 = y0 - table['size'][gi, 1]
+
     # Also analyse chars with large ascender and descender, otherwise the
     # vertical alignment can be very inconsistent
-    for char in 'hy':
-        glyph = font[char]
-        y0 = glyph['offset'][1] * ratio + slop
-        y1 = y0 - glyph['size'][1]
-        ascender = max(ascender, y0 - slop)
-        descender = min(descender, y1 + slop)
-        height = max(height, glyph['size'][1] - 2*slop)
-    set_viewport(*orig_viewport)
+    hy = np.searchsorted(table['code'], [ord('h'), ord('y')])
+    hy_y0 = table['offset'][hy, 1] * ratio + slop
+    hy_y1 = hy_y0 - table['size'][hy, 1]
+    starts = first[nonempty]
+    ascender = np.maximum(np.maximum.reduceat(y0 - slop, starts),
+                          max((hy_y0 - slop).max(), 0))
+    descender = np.minimum(np.minimum.reduceat(y1 + slop, starts),
+                           min((hy_y1 + slop).min(), 0))
+    height = np.maximum(np.maximum.reduceat(table['size'][gi, 1], starts),
+                        table['size'][hy, 1].max()) - 2*slop
+    height = height.clip(0, None)
 
     # Tight bounding box (loose would be width, font.height /.asc / .desc)
-    width -= glyph['advance'] * ratio - (glyph['size'][0] - 2*slop)
-    dx = dy = 0
+    last = gi[starts + lengths[nonempty] - 1]
+    width = (np.add.reduceat(x_move, starts) -
+             (table['advance'][last] * ratio -
+              (table['size'][last, 0] - 2*slop)))
+    dx = np.zeros(len(texts))
+    dy = np.zeros(len(texts))
     if anchor_y == 'top':
-        dy = -ascender
+        dy[nonempty] = -ascender
     elif anchor_y in ('center', 'middle'):
-        dy = -(height / 2 + descender)
+        dy[nonempty] = -(height / 2 + descender)
     elif anchor_y == 'bottom':
-        dy = -descender
+        dy[nonempty] = -descender
     # Already referenced to baseline
     # elif anchor_y == 'baseline':
     #     dy = -descender
     if anchor_x == 'right':
-        dx = -width
+        dx[nonempty] = -width
     elif anchor_x == 'center':
-        dx = -width / 2.
-    vertices['a_position'] += (dx, dy)
-    vertices['a_position'] /= lowres_size
-    return VertexBuffer(vertices)
+        dx[nonempty] = -width / 2.
+    x0 += dx[string]
+    x1 += dx[string]
+    y0 += dy[string]
+    y1 += dy[string]
+
+    position = np.empty((n, 4, 2))
+    position[:, :, 0] = np.array([x0, x0, x1, x1]).T
+    position[:, :, 1] = np.array([y0, y1, y1, y0]).T
+    vertices['a_position'] = position.reshape(-1, 2) / lowres_size
+    u0, v0, u1, v1 = table['texcoords'][gi].T
+    texcoord = np.empty((n, 4, 2))
+    texcoord[:, :, 0] = np.array([u0, u0, u1, u1]).T
+    texcoord[:, :, 1] = np.array([v0, v1, v1, v0]).T
+    vertices['a_texcoord'] = texcoord.reshape(-1, 2)
+    return vertices, lengths, table['page'][gi]
 
 
 class TextVisual(Visual):
@@ -206,8 +497,9 @@ class TextVisual(Visual):
 
     Parameters
     ----------
-    text : str
-        Text to display.
+    text : str | list of str
+        Text to display. A list of strings is laid out and drawn at once,
+        with one position per string.
     color : instance of Color
         Color to use.
     bold : bool
@@ -218,19 +510,23 @@ class TextVisual(Visual):
         Font face to use.
     font_size : float
         Point size to use.
-    pos : tuple
-        Position (x, y) of the text.
+    pos : tuple | array
+        Position (x, y) of the text, or array of shape (N, 2) or (N, 3)
+        with one position per string.
     rotation : float
         Rotation (in degrees) of the text clockwise.
     anchor_x : str
         Horizontal text anchor.
     anchor_y : str
         Vertical text anchor.
+    font_manager : instance of FontManager | None
+        Font manager to use. None uses the font manager of the GL context
+        the text is drawn in.
     """
 
     VERTEX_SHADER = """
-        uniform vec3 u_pos;  // anchor position
         uniform float u_rotation;  // rotation in rad
+        attribute vec3 a_pos;  // anchor position
         attribute vec2 a_position; // in point units
         attribute vec2 a_texcoord;
         varying vec2 v_texcoord;
@@ -240,7 +536,7 @@ class TextVisual(Visual):
             mat4 rot = mat4(cos(u_rotation), -sin(u_rotation), 0, 0,
                             sin(u_rotation), cos(u_rotation), 0, 0,
                             0, 0, 1, 0, 0, 0, 0, 1);
-            vec4 pos = $transform(vec4(u_pos, 1.0)) +
+            vec4 pos = $transform(vec4(a_pos, 1.0)) +
                        $text_scale(rot * vec4(a_position, 0, 0));
             gl_Position = pos;
             v_texcoord = a_texcoord;
@@ -372,13 +668,16 @@ class TextVisual(Visual):
         _check_valid('anchor_y', anchor_y, valid_keys)
         valid_keys = ('left', 'center', 'right')
         _check_valid('anchor_x', anchor_x, valid_keys)
-        # Init font handling stuff
-        # _font_manager is a temporary solution to use global mananger
-        self._font_manager = font_manager or FontManager()
-        self._font = self._font_manager.get_font(face, bold, italic)
+        # Init font handling stuff; the font is obtained when drawing
+        self._font_manager = font_manager
+        self._face = (face, bold, italic)
+        self._font = None
         self._program = ModularProgram(self.VERTEX_SHADER,
                                        self.FRAGMENT_SHADER)
         self._vertices = None
+        self._texts = []
+        self._changed_texts = set()
+        self._pos_vbo = None
         self._anchors = (anchor_x, anchor_y)
         # Init text properties
         self.color = color
@@ -390,14 +689,31 @@ class TextVisual(Visual):
 
     @property
     def text(self):
-        """The text string"""
+        """The text string, or list of strings"""
         return self._text
 
     @text.setter
     def text(self, text):
-        assert isinstance(text, string_types)
+        if isinstance(text, string_types):
+            texts = [text]
+        else:
+            texts = list(text)
+            if not all(isinstance(t, string_types) for t in texts):
+                raise TypeError('text must be a string or a list of strings')
+        texts = [_text_to_unicode(t) for t in texts]
+        old = self._texts
+        if self._vertices is not None and len(old) == len(texts):
+            # strings keeping their length can be updated in place
+            changed = [ii for ii, (a, b) in enumerate(zip(old, texts))
+                       if a != b]
+            if all(len(old[ii]) == len(texts[ii]) for ii in changed):
+                self._changed_texts.update(changed)
+            else:
+                self._vertices = None
+        else:
+            self._vertices = None
         self._text = text
-        self._vertices = None
+        self._texts = texts
 
     @property
     def font_size(self):
@@ -431,34 +747,130 @@ class TextVisual(Visual):
 
     @property
     def pos(self):
-        """ The position of the text anchor in the local coordinate frame
+        """ The position of the text anchor in the local coordinate frame,
+        or the positions of all strings
         """
         return self._pos
 
     @pos.setter
     def pos(self, pos):
-        self._pos = np.array(pos, np.float32)
-        if self._pos.ndim != 1 or self._pos.size not in (2, 3):
-            raise ValueError('pos must be array-like with 2 or 3 elements')
-        if self._pos.size == 2:
-            self._pos = np.concatenate((self._pos, [0.]))
+        pos = np.array(pos, np.float32)
+        if pos.ndim == 1:
+            if pos.size not in (2, 3):
+                raise ValueError('pos must be array-like with 2 or 3 '
+                                 'elements')
+        elif pos.ndim != 2 or pos.shape[1] not in (2, 3):
+            raise ValueError('pos must have shape (N, 2) or (N, 3)')
+        if pos.shape[-1] == 2:
+            pos = np.concatenate((pos, np.zeros(pos.shape[:-1] + (1,),
+                                                np.float32)), axis=-1)
+        self._pos = pos
+
+    def _string_pos(self):
+        """The position of each string, as an (N, 3) array"""
+        pos = np.atleast_2d(self._pos)
+        if len(pos) == 1:
+            pos = np.repeat(pos, len(self._texts), axis=0)
+        elif len(pos) != len(self._texts):
+            raise ValueError('Got %s positions for %s strings'
+                             % (len(pos), len(self._texts)))
+        return pos
+
+    def _get_font(self, transforms):
+        """Get the font, from the font manager of the context by default"""
+        if self._font is None:
+            manager = self._font_manager
+            if manager is None:
+                manager = get_context_font_manager(transforms.canvas.context)
+            self._font = manager.get_font(*self._face)
+        return self._font
+
+    def _load_glyphs(self, transforms):
+        """Make sure all glyphs needed by the text are loaded, and release
+        the glyphs that are no longer needed"""
+        font = self._get_font(transforms)
+        chars = set(u''.join(self._texts) + 'hy')
+        missing = [c for c in chars if c not in font._glyphs]
+        if len(missing) == 0 or isinstance(font._renderer, SDFRendererCPU):
+            font.use(self, chars)
+            return
+        # GL SDF rendering changes our viewport, so store the original one
+        transforms.canvas.context.flush_commands()  # flush GLIR commands
+        orig_viewport = gl.glGetParameter(gl.GL_VIEWPORT)
+        font.use(self, chars)
+        set_viewport(*orig_viewport)
+
+    def _update_vertices(self):
+        """Lay out the text, or only the strings that changed"""
+        args = (self._font, self._anchors[0], self._anchors[1],
+                self._font._lowres_size)
+        if self._vertices is None:
+            vertices, lengths, pages = _layout_text(self._texts, *args)
+            self._glyph_vertices = vertices
+            self._glyph_pages = pages
+            self._first = 4 * (np.cumsum(lengths) - lengths)
+            self._lengths = lengths
+            self._vertices = VertexBuffer(vertices)
+            self._program.bind(self._vertices)
+            self._last_pos = None
+            self._ibs = None
+        elif len(self._changed_texts):
+            changed = np.array(sorted(self._changed_texts))
+            vertices, lengths, pages = _layout_text([self._texts[ii]
+                                                     for ii in changed],
+                                                    *args)
+            index = _ranges(self._first[changed], 4 * lengths)
+            self._glyph_vertices[index] = vertices
+            if len(index):
+                lo, hi = index[0], index[-1] + 1
+                self._vertices.set_subdata(self._glyph_vertices[lo:hi],
+                                           offset=lo)
+            glyphs = index[::4] // 4
+            if np.any(self._glyph_pages[glyphs] != pages):
+                self._glyph_pages[glyphs] = pages
+                self._ibs = None
+        self._changed_texts = set()
+        if self._ibs is None:
+            self._ibs = self._page_indices()
+
+    def _page_indices(self):
+        """Make an index buffer per atlas page, with the glyphs on it"""
+        ibs = []
+        for page in np.unique(self._glyph_pages):
+            first = 4 * np.nonzero(self._glyph_pages == page)[0]
+            idx = (np.array([0, 1, 2, 0, 2, 3], np.uint32) +
+                   first.astype(np.uint32)[:, np.newaxis])
+            ibs.append((page, IndexBuffer(idx.ravel())))
+        return ibs
+
+    def _update_pos(self):
+        """Upload the positions of the strings that moved"""
+        pos = self._string_pos()
+        old = self._last_pos
+        if old is None or old.shape != pos.shape:
+            self._pos_vbo = VertexBuffer(np.repeat(pos, 4 * self._lengths,
+                                                   axis=0))
+            self._program['a_pos'] = self._pos_vbo
+        else:
+            moved = np.nonzero(np.any(pos != old, axis=1))[0]
+            if len(moved) == 0:
+                return
+            lo, hi = moved[0], moved[-1] + 1
+            data = np.repeat(pos[lo:hi], 4 * self._lengths[lo:hi], axis=0)
+            if len(data):
+                self._pos_vbo.set_subdata(data, offset=self._first[lo])
+        self._last_pos = pos
 
     def draw(self, transforms):
         # attributes / uniforms are not available until program is built
-        if len(self.text) == 0:
+        if sum(len(t) for t in self._texts) == 0:
             return
-        if self._vertices is None:
+        if self._vertices is None or len(self._changed_texts):
             # we delay creating vertices because it requires a context,
             # which may or may not exist when the object is initialized
-            transforms.canvas.context.flush_commands()  # flush GLIR commands
-            self._vertices = _text_to_vbo(self._text, self._font,
-                                          self._anchors[0], self._anchors[1],
-                                          self._font._lowres_size)
-            idx = (np.array([0, 1, 2, 0, 2, 3], np.uint32) +
-                   np.arange(0, 4*len(self._text), 4,
-                             dtype=np.uint32)[:, np.newaxis])
-            self._ib = IndexBuffer(idx.ravel())
-            self._program.bind(self._vertices)
+            self._load_glyphs(transforms)
+            self._update_vertices()
+        self._update_pos()
 
         # todo: do some testing to verify that the scaling is correct
         n_pix = (self._font_size / 72.) * transforms.dpi  # logical pix
@@ -469,12 +881,21 @@ class TextVisual(Visual):
         self._text_scale.scale = px_scale * n_pix
         self._program.vert['text_scale'] = self._text_scale
         self._program['u_npix'] = n_pix
-        self._program['u_kernel'] = self._font._kernel
+        self._program['u_kernel'] = self._font.kernel
         self._program['u_rotation'] = self._rotation
-        self._program['u_pos'] = self._pos
         self._program['u_color'] = self._color.rgba
-        self._program['u_font_atlas'] = self._font._atlas
-        self._program['u_font_atlas_shape'] = self._font._atlas.shape[:2]
+        atlas = self._font._atlas
+        self._program['u_font_atlas_shape'] = atlas.page_shape
         set_state(blend=True, depth_test=False,
                   blend_func=('src_alpha', 'one_minus_src_alpha'))
-        self._program.draw('triangles', self._ib)
+        for page, ib in self._ibs:
+            self._program['u_font_atlas'] = atlas.pages[page]
+            self._program.draw('triangles', ib)
+
+
+def _ranges(starts, lengths):
+    """Concatenate the index ranges start..start+length"""
+    lengths = np.asarray(lengths, int)
+    index = np.arange(lengths.sum())
+    offset = np.cumsum(lengths) - lengths
+    return index + np.repeat(np.asarray(starts, int) - offset, lengths)
@@ -130,6 +130,11 @@ class TransformSystem(object):
 
     """
 
+    # The reduced quality to draw at while the view is changed
+    # interactively (an object with ``resolution`` and ``step_factor``
+    # attributes), or None to draw at full quality.
+    quality = None
+
     def __init__(self, canvas, dpi=None):
         self._canvas = canvas
         self._cache = TransformCache()
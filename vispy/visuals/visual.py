@@ -6,6 +6,7 @@ from __future__ import division
 
 from ..util.event import EmitterGroup, Event
 from .shaders import StatementList
+from .lod import LevelOfDetail, screen_size
 from .. import gloo
 
 """
@@ -32,6 +33,8 @@ class Visual(object):
 
     """
 
+    _lod = None
+
     def __init__(self):
         self._visible = True
         self.events = EmitterGroup(source=self,
@@ -124,6 +127,71 @@ class Visual(object):
         """
         self.events.update()
 
+    @property
+    def lod(self):
+        """ The LevelOfDetail describing alternate representations of this
+        visual's data, or None if no level has been registered.
+        """
+        return self._lod
+
+    def add_lod(self, max_size, **data):
+        """ Register a precomputed representation of this visual's data.
+
+        Before each draw, the representation matching the projected
+        screen-space size of the visual is selected and passed to
+        ``set_data(**data)``. The full-resolution data should be registered
+        as well, with ``max_size=np.inf``.
+
+        Parameters
+        ----------
+        max_size : float
+            Largest on-screen extent (in framebuffer pixels) at which this
+            representation is used.
+        **data : dict
+            Keyword arguments for ``set_data``.
+        """
+        if self._lod is None:
+            self._lod = LevelOfDetail()
+        self._lod.add_level(max_size, data)
+        self.update()
+
+    def add_lod_async(self, max_size, func, *args):
+        """ Build a representation of this visual's data in a background
+        thread.
+
+        *func* is called as ``func(*args)`` and must return a dict of
+        keyword arguments for ``set_data``. The visual is redrawn once the
+        level is available.
+        """
+        if self._lod is None:
+            self._lod = LevelOfDetail()
+        return self._lod.build_async(max_size, func, args,
+                                     callback=self.update)
+
+    def clear_lods(self):
+        """ Remove all registered levels of detail.
+        """
+        self._lod = None
+
+    def update_lod(self, transforms):
+        """ Select the level of detail to use for the next draw.
+
+        This is called automatically by the scenegraph before the visual is
+        drawn; it does nothing unless levels have been registered.
+        """
+        if self._lod is None or len(self._lod) == 0:
+            return
+        index, changed = self._lod.select(screen_size(self, transforms))
+        if changed:
+            self._set_lod_data(self._lod.levels[index][1])
+
+    def _set_lod_data(self, data):
+        """ Apply the data of a level of detail. Subclasses that consume
+        representations other than ``set_data`` keyword arguments should
+        reimplement this method.
+        """
+        self.set_data(**data)
+
     def _get_hook(self, shader, name):
         """Return a FunctionChain that Filters may use to modify the program.
         
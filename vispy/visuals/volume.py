@@ -36,6 +36,11 @@ which the number of steps is very small.
 
 from ..gloo import Texture3D, TextureEmulated3D, VertexBuffer, IndexBuffer
 from . import Visual
+from ._clim import (APPLY_CLIM, scalar_texture_data, clim_scale,
+                    colormap_function)
+from ._raycast import STOP_OPACITY, block_max
+from .bricks import BrickedVolume, BrickCache
+from .draft import DraftBuffer
 from .shaders import Function, ModularProgram
 from ..color import get_colormap
 
@@ -149,6 +154,14 @@ void main() {{
         {{
             // Calculate location and sample color
             vec3 loc = edgeloc + float(iter) * ray;
+            
+            // Leap over blocks that cannot change the result
+            int leap = $empty_steps(loc, ray, {skip_limit});
+            if (leap > 0) {{
+                iter -= leap - 1;
+                continue;
+            }}
+            
             vec4 color = $sample(u_volumetex, loc);
             float val = color.g;
             
@@ -316,6 +329,12 @@ MIP_SNIPPETS = dict(
         float r = float(val > maxval);
         maxval = (1.0 - r) * maxval + r * val;
         maxi = (1.0 - r) * maxi + r * float(iter);
+        
+        // The maximum cannot get any higher
+        if (maxval >= 1.0) {
+            iter = 0;
+            break;
+        }
         """,
     after_loop="""
         vec4 color = vec4(0.0);
@@ -326,6 +345,7 @@ MIP_SNIPPETS = dict(
         }
         gl_FragColor = color;
         """,
+    skip_limit="maxval",
 )
 
 MIP_FRAG_SHADER = FRAG_SHADER.format(**MIP_SNIPPETS)
@@ -357,11 +377,70 @@ ISO_SNIPPETS = dict(
         // If we get here, the ray did not meet the threshold
         discard;
         """,
+    skip_limit="u_threshold",
 )
 
 ISO_FRAG_SHADER = FRAG_SHADER.format(**ISO_SNIPPETS)
 
-frag_dict = {'mip': MIP_FRAG_SHADER, 'iso': ISO_FRAG_SHADER}
+TRANSLUCENT_SNIPPETS = dict(
+    before_loop="""
+        vec4 integrated = vec4(0.0);  // premultiplied color and opacity
+        """,
+    in_loop="""
+        // Composite front to back, with the opacity corrected for the
+        // step size
+        vec4 c = $cmap(val);
+        float a = 1.0 - pow(1.0 - clamp(c.a * val, 0.0, 1.0),
+                            u_relative_step_size);
+        integrated.rgb += (1.0 - integrated.a) * a * c.rgb;
+        integrated.a += (1.0 - integrated.a) * a;
+        
+        // Stop when nothing behind can be seen
+        if (integrated.a >= %s) {
+            iter = 0;
+            break;
+        }
+        """ % STOP_OPACITY,
+    after_loop="""
+        if (integrated.a <= 0.0)
+            discard;
+        gl_FragColor = vec4(integrated.rgb / integrated.a, integrated.a);
+        """,
+    skip_limit="0.0",
+)
+
+TRANSLUCENT_FRAG_SHADER = FRAG_SHADER.format(**TRANSLUCENT_SNIPPETS)
+
+frag_dict = {'mip': MIP_FRAG_SHADER, 'iso': ISO_FRAG_SHADER,
+             'translucent': TRANSLUCENT_FRAG_SHADER}
+
+# Empty-space skipping: the number of steps to leap over the block holding
+# loc, or 0 if values in the block can exceed the limit. The grid holds the
+# maximum texture value of each block. The ray points against the marching
+# direction.
+EMPTY_STEPS = """
+int empty_steps(vec3 loc, vec3 ray, float limit)
+{
+    vec3 block = floor(loc / $block_extent);
+    vec3 coord = (block + 0.5) / $grid_shape;
+    if ($apply_clim($grid_sample($grid, coord)) > limit)
+        return 0;
+    // distance to the exit of the block, in steps
+    vec3 d = -ray;
+    vec3 bound = (block + step(0.0, d)) * $block_extent;
+    vec3 t = abs(bound - loc) / max(abs(d), vec3(1e-9));
+    return int(floor(min(min(t.x, t.y), t.z))) + 1;
+}
+"""
+
+# Sample the volume texture and apply the contrast limits
+SAMPLE_CLIM = """
+vec4 sample_clim(%s tex, vec3 loc)
+{
+    float v = $apply_clim($sample(tex, loc));
+    return vec4(v, v, v, 1.0);
+}
+"""
 
 
 class VolumeVisual(Visual):
@@ -374,8 +453,10 @@ class VolumeVisual(Visual):
     clim : tuple of two floats | None
         The contrast limits. The values in the volume are mapped to
         black and white corresponding to these values. Default maps
-        between min and max.
-    method : {'mip', 'iso'}
+        between min and max. The limits are applied on the GPU, on data
+        that is stored in its own type (8 and 16 bit integers) or as
+        float32.
+    method : {'mip', 'iso', 'translucent'}
         The render method to use. See corresponding docs for details.
         Default 'mip'.
     threshold : float
@@ -390,26 +471,43 @@ class VolumeVisual(Visual):
     emulate_texture : bool
         Use 2D textures to emulate a 3D texture. OpenGL ES 2.0 compatible,
         but has lower performance on desktop platforms.
+    skip_block_size : int
+        Size of the blocks for empty-space skipping. Rays leap over blocks
+        that cannot change the result (e.g. below the iso threshold), and
+        stop as soon as the result is known. Smaller blocks skip more
+        space, at the cost of a larger grid.
+
+    Notes
+    -----
+    While the view is changed interactively, the volume may be drawn at
+    reduced resolution and with larger steps (see
+    ``SceneCanvas.interaction_quality``).
     """
 
     def __init__(self, vol, clim=None, method='mip', threshold=None, 
                  relative_step_size=0.8, cmap='grays',
-                 emulate_texture=False):
+                 emulate_texture=False, skip_block_size=8):
         Visual.__init__(self)
         tex_cls = TextureEmulated3D if emulate_texture else Texture3D
 
         # Storage of information of volume
         self._vol_shape = ()
         self._vertex_cache_id = ()
-        self._clim = None      
+        self._clim = None
+        self._tex_scale = (1., 0.)
+        self._tex_format = None
+        self._clim_func = Function(APPLY_CLIM)
 
         # Set the colormap
         self._cmap = get_colormap(cmap)
+        self._cmap_func = colormap_function(self._cmap)
 
         # Create gloo objects
         self._vbo = None
         self._tex = tex_cls((10, 10, 10), interpolation='linear', 
                             wrapping='clamp_to_edge')
+        self._init_skipping(tex_cls, skip_block_size)
+        self._draft = DraftBuffer()
 
         # Create program
         self._program = ModularProgram(VERT_SHADER)
@@ -442,15 +540,22 @@ class VolumeVisual(Visual):
         if self._clim is None:
             self._clim = vol.min(), vol.max()
         
-        # Apply clim
-        vol = np.array(vol, dtype='float32', copy=False)
-        vol -= self._clim[0]
-        vol *= 1.0 / (self._clim[1] - self._clim[0])
-        
-        # Apply to texture
+        # Apply to texture, in the native data type
+        n_channels = vol.shape[3] if vol.ndim == 4 else 1
+        vol, internalformat, self._tex_scale = \
+            scalar_texture_data(vol, n_channels)
+        if self._tex.shape[:3] != vol.shape[:3] or \
+                self._tex_format != internalformat:
+            self._tex.resize(vol.shape if vol.ndim == 4 else
+                             vol.shape + (1,), internalformat=internalformat)
+            self._tex_format = internalformat
         self._tex.set_data(vol)  # will be efficient if vol is same shape
         self._program['u_shape'] = vol.shape[2], vol.shape[1], vol.shape[0]
         self._vol_shape = vol.shape[:3]
+        grid = block_max(vol[..., 0] if vol.ndim == 4 else vol,
+                         self._skip_block_size)
+        self._set_grid(grid / self._tex_scale[0], self._skip_block_size)
+        self._update_clim()
         
         # Create vertices?
         if self._index_buffer is None:
@@ -458,10 +563,50 @@ class VolumeVisual(Visual):
     
     @property
     def clim(self):
-        """ The contrast limits that were applied to the volume data.
-        Settable via set_data().
+        """ The contrast limits that are applied to the volume data.
         """
         return self._clim
+
+    @clim.setter
+    def clim(self, clim):
+        clim = tuple(float(c) for c in clim)
+        if len(clim) != 2:
+            raise ValueError('clim must be a 2-element array-like')
+        self._clim = clim
+        self._update_clim()
+
+    def _update_clim(self):
+        """ Set the uniform that applies the contrast limits """
+        self._clim_func['clim_scale'] = clim_scale(self._clim,
+                                                   self._tex_scale)
+        self.update()
+
+    def _init_skipping(self, tex_cls, block_size):
+        """ Create the grid of block maxima for empty-space skipping """
+        self._skip_block_size = int(block_size)
+        self._grid_tex = tex_cls((1, 1, 1), interpolation='nearest',
+                                 wrapping='clamp_to_edge',
+                                 internalformat='r32f')
+        self._empty_steps = Function(EMPTY_STEPS)
+        self._empty_steps['grid'] = self._grid_tex
+        self._empty_steps['apply_clim'] = self._clim_func
+
+    def _set_grid(self, grid, block_size):
+        """ Upload the block maxima, in texture values
+
+        The maxima are stored in the same units as the volume texture, so
+        that changing the contrast limits or the threshold does not change
+        the grid.
+        """
+        grid = np.asarray(grid, np.float32)
+        if self._grid_tex.shape[:3] != grid.shape:
+            self._grid_tex.resize(grid.shape + (1,), internalformat='r32f')
+        self._grid_tex.set_data(grid)
+        self._empty_steps['grid_sample'] = self._grid_tex.glsl_sample
+        self._empty_steps['grid_shape'] = tuple(float(g)
+                                                for g in grid.shape[::-1])
+        self._empty_steps['block_extent'] = tuple(
+            float(block_size) / s for s in self._vol_shape[::-1])
     
     @property
     def cmap(self):
@@ -470,7 +615,8 @@ class VolumeVisual(Visual):
     @cmap.setter
     def cmap(self, cmap):
         self._cmap = get_colormap(cmap)
-        self._program.frag['cmap'] = Function(self._cmap.glsl_map)
+        self._cmap_func = colormap_function(self._cmap)
+        self._program.frag['cmap'] = self._cmap_func
         self.update()
 
     @property
@@ -484,13 +630,15 @@ class VolumeVisual(Visual):
             * iso: isosurface. Cast a ray until a certain threshold is
               encountered. At that location, lighning calculations are
               performed to give the visual appearance of a surface.  
+            * translucent: composite the colors (and opacities) of the
+              colormap along the ray, from front to back.
         """
         return self._method
     
     @method.setter
     def method(self, method):
         # Check and save
-        known_methods = ('mip', 'iso', 'ray')
+        known_methods = ('mip', 'iso', 'translucent')
         if method not in known_methods:
             raise ValueError('Volume render method should be in %r, not %r' %
                              (known_methods, method))
@@ -501,9 +649,17 @@ class VolumeVisual(Visual):
         self._program.frag = frag_dict[method]
         self._program.frag['calculate_steps'] = Function(calc_steps)
         self._program.frag['sampler_type'] = self._tex.glsl_sampler_type
-        self._program.frag['sample'] = self._tex.glsl_sample
-        self._program.frag['cmap'] = Function(self._cmap.glsl_map)
+        self._program.frag['sample'] = self._sample_function()
+        self._program.frag['empty_steps'] = self._empty_steps
+        self._program.frag['cmap'] = self._cmap_func
         self.update()
+
+    def _sample_function(self):
+        """ The GLSL function that samples the volume """
+        sample = Function(SAMPLE_CLIM % self._tex.glsl_sampler_type)
+        sample['sample'] = self._tex.glsl_sample
+        sample['apply_clim'] = self._clim_func
+        return sample
     
     @property
     def threshold(self):
@@ -618,11 +774,23 @@ class VolumeVisual(Visual):
         return 0, self._vol_shape[2-axis]
     
     def draw(self, transforms):
+        quality = transforms.quality
+        if quality is None:
+            self._draw(transforms)
+        elif quality.resolution < 1:
+            self._draft.draw(transforms, quality.resolution,
+                             lambda: self._draw(transforms,
+                                                quality.step_factor))
+        else:
+            self._draw(transforms, quality.step_factor)
+
+    def _draw(self, transforms, step_factor=1.):
         Visual.draw(self, transforms)
         
         full_tr = transforms.get_full_transform()
         self._program.vert['transform'] = full_tr
-        self._program['u_relative_step_size'] = self._relative_step_size
+        self._program['u_relative_step_size'] = (self._relative_step_size *
+                                                 step_factor)
         
         # Get and set transforms
         view_tr_f = transforms.visual_to_document
@@ -637,3 +805,230 @@ class VolumeVisual(Visual):
         
         # Draw!
         self._program.draw('triangle_strip', self._index_buffer)
+
+
+# Sampling of a bricked volume. The page table holds, for each brick of the
+# volume, the slot of the brick in the cache texture (rgb) and whether the
+# brick is resident (a). Each slot holds a brick with a one-voxel apron, so
+# that linear interpolation does not need neighbouring bricks.
+BRICK_SAMPLE = """
+vec4 sample_bricked(sampler3D cache, vec3 loc)
+{
+    vec3 voxel = clamp(loc * $vol_shape - 0.5, vec3(0.0), $vol_shape - 1.0);
+    vec3 brick = floor(voxel / $brick_size);
+    vec4 entry = texture3D($page_table, (brick + 0.5) / $n_bricks);
+    if (entry.a < 0.5)
+        return vec4(0.0, 0.0, 0.0, 1.0);
+    vec3 slot = floor(entry.rgb * 255.0 + 0.5);
+    vec3 local = voxel - brick * $brick_size + 1.0;
+    float v = $apply_clim(texture3D(cache, (slot * ($brick_size + 2.0) +
+                                            local + 0.5) / $cache_shape));
+    return vec4(v, v, v, 1.0);
+}
+"""
+
+
+class BrickedVolumeVisual(VolumeVisual):
+    """ Displays a 3D volume that is too large for GPU memory
+
+    The volume is split in bricks that are read on demand (e.g. from a
+    memory-mapped file or a chunked dataset) and kept in a cache texture
+    with a fixed number of slots. Bricks that cannot contribute to the
+    image (all values below the lower contrast limit, or below the iso
+    threshold) are never loaded. The other bricks are streamed over
+    successive draws, the bricks in view and nearest to the camera first,
+    and the least recently used bricks are evicted when the cache is full.
+    Rays leap over the bricks that cannot change the result.
+
+    Parameters
+    ----------
+    vol : array-like
+        The volume to display, with shape (depth, height, width). Any object
+        with ``shape``, ``dtype`` and numpy-style slicing can be used.
+    clim : tuple of two floats | None
+        The contrast limits. Default maps between min and max.
+    method : {'mip', 'iso', 'translucent'}
+        The render method to use.
+    threshold : float
+        The threshold to use for the isosurafce render method. By default
+        the mean of the volume is used.
+    relative_step_size : float
+        The relative step size to step through the volume.
+    cmap : str
+        Colormap to use.
+    brick_size : int
+        Size of the (cubic) bricks in voxels.
+    cache_shape : tuple of int
+        Number of brick slots of the cache texture along each axis.
+    bricks_per_draw : int
+        Maximum number of bricks uploaded per draw.
+    """
+
+    def __init__(self, vol, clim=None, method='mip', threshold=None,
+                 relative_step_size=0.8, cmap='grays', brick_size=32,
+                 cache_shape=(8, 8, 8), bricks_per_draw=32):
+        Visual.__init__(self)
+        self._vol_shape = ()
+        self._vertex_cache_id = ()
+        self._clim = None
+        self._clim_func = Function(APPLY_CLIM)
+        self._cmap = get_colormap(cmap)
+        self._cmap_func = colormap_function(self._cmap)
+        self._cache_grid = tuple(int(c) for c in cache_shape)
+        self.bricks_per_draw = int(bricks_per_draw)
+        self._vbo = None
+        self._index_buffer = None
+        self._tex = None
+        self._table_tex = None
+        self._program = ModularProgram(VERT_SHADER)
+        self._sample = Function(BRICK_SAMPLE)
+        self._sample['apply_clim'] = self._clim_func
+        self._init_skipping(Texture3D, brick_size)
+        self._draft = DraftBuffer()
+        self._method = None
+        self.set_data(vol, clim, brick_size)
+        self.method = method
+        self.relative_step_size = relative_step_size
+        self.threshold = (threshold if threshold is not None
+                          else self._bricks.mean())
+
+    def set_data(self, vol, clim=None, brick_size=None):
+        """ Set the volume data.
+        """
+        if len(getattr(vol, 'shape', ())) != 3:
+            raise ValueError('Volume visual needs a 3D image.')
+        if brick_size is None:
+            brick_size = self._bricks.brick_size
+        self._bricks = BrickedVolume(vol, brick_size)
+        if clim is not None:
+            clim = np.array(clim, float)
+            if not (clim.ndim == 1 and clim.size == 2):
+                raise ValueError('clim must be a 2-element array-like')
+            self._clim = tuple(clim)
+        if self._clim is None:
+            self._clim = self._bricks.range
+        self._vol_shape = self._bricks.shape
+        self._program['u_shape'] = self._vol_shape[::-1]
+
+        # Cache texture (in the native data type), page table and brick
+        # bookkeeping
+        B = self._bricks.brick_size
+        grid = self._bricks.grid
+        cache_shape = tuple((B + 2) * c for c in self._cache_grid)
+        _, internalformat, self._tex_scale = \
+            scalar_texture_data(np.zeros(0, vol.dtype))
+        self._tex = Texture3D(cache_shape, interpolation='linear',
+                              wrapping='clamp_to_edge',
+                              internalformat=internalformat)
+        self._program['u_volumetex'] = self._tex
+        self._cache = BrickCache(np.prod(self._cache_grid))
+        self._table = np.zeros(grid + (4,), np.uint8)
+        self._table_tex = Texture3D(self._table, interpolation='nearest',
+                                    wrapping='clamp_to_edge')
+        self._table_changed = False
+        self._needed = None
+        self._sample['page_table'] = self._table_tex
+        self._sample['vol_shape'] = tuple(float(s)
+                                          for s in self._vol_shape[::-1])
+        self._sample['brick_size'] = float(B)
+        self._sample['n_bricks'] = tuple(float(g) for g in grid[::-1])
+        self._sample['cache_shape'] = tuple(float(s)
+                                            for s in cache_shape[::-1])
+        self._create_vertex_data()
+        # skip bricks by their maximum, including that of the neighbouring
+        # bricks that are sampled at their borders
+        s, o = self._tex_scale
+        grid = block_max(self._bricks.levels[0][1], 1)
+        self._set_grid((grid - o) / s, B)
+        self._update_clim()
+
+    def _update_clim(self):
+        # other bricks may be needed, but resident bricks stay valid
+        self._needed = None
+        VolumeVisual._update_clim(self)
+
+    @property
+    def method(self):
+        """The render method to use ('mip', 'iso' or 'translucent')
+        """
+        return self._method
+
+    @method.setter
+    def method(self, method):
+        VolumeVisual.method.fset(self, method)
+        self._needed = None
+
+    @property
+    def threshold(self):
+        """ The threshold value to apply for the isosurface render method.
+        """
+        return self._threshold
+
+    @threshold.setter
+    def threshold(self, value):
+        self._threshold = float(value)
+        self._needed = None
+        self.update()
+
+    def _sample_function(self):
+        return self._sample
+
+    def _needed_bricks(self):
+        """ The bricks that can contribute to the image """
+        if self._needed is None:
+            lo, hi = self._clim
+            # values are normalized by clim; anything <= 0 looks like an
+            # empty brick
+            limit = lo
+            if self._method == 'iso':
+                limit = max(lo, lo + self._threshold * (hi - lo))
+            needed = self._bricks.find_bricks(lo=limit)
+            # bricks with constant values at the limit are empty too
+            bmax = self._bricks.levels[0][1].ravel()[needed]
+            self._needed = needed[bmax > limit]
+        return self._needed
+
+    def _brick_priority(self, bricks, transforms):
+        """ Sort bricks: in view first, then nearest to the camera """
+        if transforms is None or len(bricks) == 0:
+            return bricks
+        B = self._bricks.brick_size
+        centers = np.array(np.unravel_index(bricks, self._bricks.grid),
+                           float).T[:, ::-1] * B + (B - 1) / 2.
+        ndc = transforms.get_full_transform().map(centers)
+        ndc = ndc[:, :3] / ndc[:, 3:4]
+        outside = np.any(np.abs(ndc[:, :2]) > 1.2, axis=1)
+        doc = transforms.visual_to_document.map(centers)
+        depth = -doc[:, 2] / doc[:, 3]  # +z points to the camera
+        return bricks[np.lexsort((depth, outside))]
+
+    def _update_bricks(self, transforms):
+        """ Upload the most important missing bricks """
+        needed = self._brick_priority(self._needed_bricks(), transforms)
+        cache = self._cache
+        wanted = needed[:cache.n_slots].tolist()
+        cache.touch(wanted[::-1])
+        missing = [b for b in wanted if b not in cache]
+        protect = set(wanted)
+        B2 = self._bricks.brick_size + 2
+        for brick in missing[:self.bricks_per_draw]:
+            slot, evicted = cache.insert(brick, protect)
+            if slot is None:
+                break
+            if evicted is not None:
+                self._table.reshape(-1, 4)[evicted] = 0
+            data = scalar_texture_data(self._bricks.read_brick(brick))[0]
+            sz, sy, sx = np.unravel_index(slot, self._cache_grid)
+            self._tex.set_data(data, offset=(sz * B2, sy * B2, sx * B2),
+                               copy=True)
+            self._table.reshape(-1, 4)[brick] = (sx, sy, sz, 255)
+            self._table_changed = True
+        if self._table_changed:
+            self._table_tex.set_data(self._table)
+            self._table_changed = False
+        if len(missing) > self.bricks_per_draw:
+            self.update()  # stream the remaining bricks in the next draws
+
+    def draw(self, transforms):
+        self._update_bricks(transforms)
+        VolumeVisual.draw(self, transforms)